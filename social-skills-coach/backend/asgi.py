@@ -0,0 +1,511 @@
+"""
+Async (ASGI) serving mode for the Social Skills Coach API.
+
+/api/conversation and /api/conversation/stream are served on the event loop:
+the model is called through the LLM provider's async interface (AsyncOpenAI
+for OpenAI and the stub) and the database is used through an AsyncSession,
+so a request waiting on the model holds a coroutine rather than a
+worker thread, and one worker can keep hundreds of calls in flight. Every
+other route is passed to the Flask app from factory.create_app() on a small
+thread pool, so the API and its response shapes are the same as under WSGI.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 2
+
+The async database URL defaults to SQLALCHEMY_DATABASE_URI with the asyncpg
+(PostgreSQL) or aiosqlite (SQLite) driver; set ASYNC_DATABASE_URL to
+override it. An in-memory SQLite database is not shared between the two
+engines.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from flask_jwt_extended import decode_token
+from jwt import ExpiredSignatureError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import config
+import factory
+import resources
+from metrics import HANDLER_SECONDS, async_timed_iteration, stage_timer
+from singleflight import AsyncSingleFlight
+import tracing
+
+logger = logging.getLogger(__name__)
+
+def async_database_url(url):
+    """Return url with the async driver for its database (asyncpg or aiosqlite)."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend in ('postgresql', 'postgres'):
+        return url.set(drivername='postgresql+asyncpg')
+    if backend == 'sqlite':
+        return url.set(drivername='sqlite+aiosqlite')
+    return url
+
+async def read_body(receive):
+    """Return the whole request body of an ASGI HTTP request."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b"".join(chunks)
+
+def encode_headers(headers):
+    """Return a dict of headers as ASGI header pairs."""
+    return [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in (headers or {}).items()]
+
+async def send_json(send, body, status, headers=None):
+    """Send body as a JSON response, formatted like Flask-RESTful's."""
+    data = (json.dumps(body) + "\n").encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(data)).encode()),
+            (b'access-control-allow-origin', b'*'),
+            *encode_headers(headers)
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': data})
+
+class Request:
+    """The parts of an ASGI HTTP request that the conversation handlers use."""
+
+    def __init__(self, scope, body):
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        self.remote_addr = scope['client'][0] if scope.get('client') else None
+        self.body = body
+
+    def get_json(self):
+        """
+        Parse the body like Flask's request.get_json().
+
+        Returns:
+            tuple: (data, None) or (None, (body, 400)) if the body is not JSON
+        """
+        # Flask-RESTful answers both cases with Werkzeug's generic BadRequest message
+        bad_request = ({"message": "The browser (or proxy) sent a request that this server could not understand."}, 400)
+        if self.headers.get('content-type', '').split(';')[0].strip() != 'application/json':
+            return None, bad_request
+        try:
+            return json.loads(self.body), None
+        except ValueError:
+            return None, bad_request
+
+class WSGIBridge:
+    """
+    Serve ASGI HTTP requests with a WSGI app on a thread pool.
+
+    Response bodies are collected before they are sent, which suits the
+    JSON routes left to Flask.
+    """
+
+    def __init__(self, wsgi_app, executor):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        environ = self.environ(scope, await read_body(receive))
+        status, headers, body = await asyncio.get_running_loop().run_in_executor(self.executor, self.run, environ)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    def environ(scope, body):
+        """Build the WSGI environ for an ASGI HTTP scope."""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': '',
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ[name] = value
+            elif name != 'CONTENT_LENGTH':
+                key = f"HTTP_{name}"
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def run(self, environ):
+        """Call the WSGI app and return (status, headers, body)."""
+        response = {}
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+            return chunks.append
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            chunks.extend(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], b"".join(chunks)
+
+class AsyncConversationApp:
+    """
+    ASGI application serving the conversation endpoints on the event loop.
+
+    Args:
+        flask_app: App from factory.create_app() with the 'api' subsystem;
+            it provides the configuration, caches and rate limit counters,
+            and serves every other route
+        threads: Threads for the routes served by Flask
+    """
+
+    def __init__(self, flask_app, threads=8):
+        self.flask_app = flask_app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='asgi-wsgi')
+        self.wsgi = WSGIBridge(flask_app, self.executor)
+        self.single_flight = AsyncSingleFlight()
+        self.routes = {
+            ('POST', '/api/conversation'): self.conversation,
+            ('POST', '/api/conversation/stream'): self.conversation_stream
+        }
+        # Same handler series as the resources (measure_performance); streams are timed to their end
+        self.handler_series = {
+            self.conversation: HANDLER_SECONDS.labels('ConversationResource', 'post'),
+            self.conversation_stream: HANDLER_SECONDS.labels('ConversationStreamResource', 'post')
+        }
+        self._sessions = None
+        self._engine = None
+
+    @property
+    def sessions(self):
+        """AsyncSession factory, created on first use."""
+        if self._sessions is None:
+            url = config.ASYNC_DATABASE_URL or async_database_url(self.flask_app.config['SQLALCHEMY_DATABASE_URI'])
+            self._engine = create_async_engine(url)
+            # Users loaded for the access check are read again after the session closes
+            self._sessions = async_sessionmaker(self._engine, expire_on_commit=False)
+        return self._sessions
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return  # WebSockets are not served
+
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is None:
+            await self.wsgi(scope, receive, send)
+            return
+        request = Request(scope, await read_body(receive))
+        root = self.flask_app.extensions['tracer'].start_trace(
+            f"{scope['method']} {scope['path']}", request.headers.get('traceparent'),
+            **{"http.method": scope['method'], "http.route": scope['path']}
+        )
+
+        async def send_traced(message):
+            if message['type'] == 'http.response.start':
+                message = {**message, 'headers': [*message['headers'], (b'x-trace-id', root.trace_id.encode())]}
+                root.set_attribute("http.status_code", message['status'])
+            await send(message)
+
+        try:
+            with self.handler_series[handler].time():
+                await handler(request, send_traced)
+        except Exception as e:
+            root.record_error(e)
+            raise
+        finally:
+            root.end()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if config.PREWARM:
+                    await asyncio.to_thread(factory.warm_up, self.flask_app)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def close(self):
+        """Release the database connections and the HTTP client, flush the write-behind queue and stop the thread pool."""
+        if self._engine is not None:
+            await self._engine.dispose()
+        await resources.get_llm_provider().aclose()
+        if 'write_behind' in self.flask_app.extensions:
+            await asyncio.to_thread(self.flask_app.extensions['write_behind'].close)
+        self.executor.shutdown(wait=False)
+
+    def _in_app(self, fn, *args):
+        with self.flask_app.app_context():
+            return fn(*args)
+
+    async def _in_app_thread(self, fn, *args):
+        """Run fn in a thread with the Flask app context (for the cache backends, which may block)."""
+        return await asyncio.to_thread(self._in_app, fn, *args)
+
+    def _identity(self, request):
+        """
+        Return the JWT identity like @jwt_required(optional=True).
+
+        Returns:
+            tuple: (identity or None, None) or (None, (body, status)) for a bad token
+        """
+        scheme, _, token = request.headers.get('authorization', '').partition(' ')
+        if scheme != 'Bearer' or not token:
+            return None, None
+        with self.flask_app.app_context():
+            try:
+                claims = decode_token(token)
+            except ExpiredSignatureError:
+                return None, ({"msg": "Token has expired"}, 401)
+            except Exception as e:
+                return None, ({"msg": str(e)}, 422)
+            return claims[self.flask_app.config['JWT_IDENTITY_CLAIM']], None
+
+    async def _start(self, request):
+        """
+        Run the checks that precede a conversation response.
+
+        Returns:
+            tuple: ((user, user_input, category, client_class, headers), None) or (None, (body, status[, headers]))
+                where headers are the RateLimit-* headers for the response
+        """
+        identity, error = self._identity(request)
+        if error:
+            return None, error
+        # The tier is read from the database only when its cached copy is stale
+        client_class = await self._in_app_thread(resources.client_class, identity) if identity else 'anonymous'
+        # Same policies and counters as the WSGI resources, so both modes share the limit
+        # In a thread: with the socket backend the check is a round trip to the store
+        limit = await self._in_app_thread(resources.rate_limit_result, 'conversation', identity or request.remote_addr,
+                                          client_class)
+        if limit is not None and not limit.allowed:
+            return None, resources.rate_limit_exceeded(limit)
+
+        data, error = request.get_json()
+        if error:
+            return None, error
+        if not data or 'user_input' not in data:
+            return None, ({"success": False, "message": "User input is required"}, 400)
+
+        user_input = data.get('user_input')
+        category = data.get('category', 'small_talk')  # Default to small_talk if not specified
+        if identity:
+            async with self.sessions() as session:
+                user, error = await session.run_sync(
+                    lambda sync_session: resources.conversation_access(user_input, category, identity, sync_session)
+                )
+        else:
+            user, error = resources.conversation_access(user_input, category, None)
+        if error:
+            return None, error
+        return (user, user_input, category, client_class, limit.headers() if limit else {}), None
+
+    async def _charge(self, user):
+        """Count a free user's scenario once the response is produced (see resources.charge_scenario)."""
+        if user is None or (user.tier or 'free') != 'free':
+            return
+        async with self.sessions() as session:
+            await session.run_sync(lambda sync_session: resources.charge_scenario(user, sync_session))
+
+    async def _save(self, user, user_input, ai_text, feedback, category):
+        if await self._in_app_thread(resources.enqueue_conversation, user, user_input, ai_text, feedback, category):
+            return
+        async with self.sessions() as session:
+            await session.run_sync(
+                lambda sync_session: resources.save_conversation(user, user_input, ai_text, feedback, category, sync_session)
+            )
+
+    async def generate(self, user_input, model, system_prompt):
+        """Async counterpart of resources.generate_conversation_response."""
+        try:
+            with stage_timer('llm_call'), tracing.span('llm.complete', **{"llm.model": model}):
+                reply = await resources.get_llm_provider().acomplete(
+                    resources.conversation_messages(user_input, system_prompt), model, **resources.GENERATION_PARAMS
+                )
+            return reply.strip()
+        except Exception as e:
+            logger.error(f"LLM provider error: {str(e)}")
+            return resources.FALLBACK_RESPONSE
+
+    async def stream(self, user_input, model, system_prompt):
+        """Async counterpart of resources.stream_conversation_response."""
+        pieces = resources.get_llm_provider().astream(
+            resources.conversation_messages(user_input, system_prompt), model, **resources.GENERATION_PARAMS
+        )
+        async for text in tracing.async_traced_generator('llm.stream', async_timed_iteration('llm_call', pieces),
+                                                         **{"llm.model": model}):
+            yield text
+
+    async def conversation(self, request, send):
+        """POST /api/conversation, see resources.ConversationResource."""
+        context, error = await self._start(request)
+        if error:
+            await send_json(send, *error)
+            return
+        user, user_input, category, client_class, headers = context
+
+        system_prompt = resources.SYSTEM_PROMPT.format(category=category)
+        model = resources.conversation_model(category)
+        cache_key, semantic_context, cached_response = await self._in_app_thread(
+            resources.cached_conversation, user_input, category, model, system_prompt
+        )
+
+        if cached_response:
+            logger.info("Cache hit for conversation response")
+            ai_text, feedback = cached_response
+        else:
+            logger.info("Cache miss for conversation response")
+
+            async def generate_and_cache():
+                # Only the leader calls the model, so only the leader takes a slot; waiters hold none
+                slot = self._in_app(resources.llm_slot, client_class)
+                if slot is None:
+                    raise resources.LLMCapacityExceeded(client_class)
+                with slot:
+                    ai_text = await self.generate(user_input, model, system_prompt)
+                feedback = resources.conversation_feedback(user_input)
+                await self._in_app_thread(resources.cache_conversation, cache_key, semantic_context,
+                                          category, user_input, ai_text, feedback)
+                return ai_text, feedback
+
+            try:
+                # Concurrent misses for the same key share one upstream call
+                ai_text, feedback = await self.single_flight.do(cache_key, generate_and_cache, timeout=config.SINGLE_FLIGHT_TIMEOUT)
+            except resources.LLMCapacityExceeded:
+                await send_json(send, *resources.llm_capacity_exceeded())
+                return
+            except Exception as e:
+                logger.error(f"Error generating response: {str(e)}")
+                ai_text = resources.FALLBACK_RESPONSE
+                feedback = "Try again later for more personalized feedback."
+
+        if ai_text != resources.FALLBACK_RESPONSE:
+            await self._charge(user)
+        if user:
+            await self._save(user, user_input, ai_text, feedback, category)
+
+        await send_json(send, {
+            "success": True,
+            "response": ai_text,
+            "feedback": feedback,
+            "category": category,
+            "tier_required": resources.CATEGORIES[category],
+            **resources.conversation_usage(user)
+        }, 200, headers)
+
+    async def conversation_stream(self, request, send):
+        """POST /api/conversation/stream, see resources.ConversationStreamResource."""
+        context, error = await self._start(request)
+        if error:
+            await send_json(send, *error)
+            return
+        user, user_input, category, client_class, headers = context
+
+        system_prompt = resources.SYSTEM_PROMPT.format(category=category)
+        model = resources.conversation_model(category)
+        cache_key, semantic_context, cached_response = await self._in_app_thread(
+            resources.cached_conversation, user_input, category, model, system_prompt
+        )
+        slot = None
+        if not cached_response:
+            slot = self._in_app(resources.llm_slot, client_class)
+            if slot is None:
+                await send_json(send, *resources.llm_capacity_exceeded())
+                return
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                (b'access-control-allow-origin', b'*'),
+                *encode_headers(headers)
+            ]
+        })
+
+        async def send_event(event, data):
+            await send({'type': 'http.response.body', 'body': resources.sse_event(event, data).encode(), 'more_body': True})
+
+        if cached_response:
+            logger.info("Cache hit for streamed conversation response")
+            ai_text, feedback = cached_response
+            await send_event('token', {"text": ai_text})
+        else:
+            logger.info("Cache miss for streamed conversation response")
+            parts = []
+            try:
+                async for text in self.stream(user_input, model, system_prompt):
+                    parts.append(text)
+                    await send_event('token', {"text": text})
+                ai_text = "".join(parts).strip()
+                feedback = resources.conversation_feedback(user_input)
+                await self._in_app_thread(resources.cache_conversation, cache_key, semantic_context,
+                                          category, user_input, ai_text, feedback)
+            except Exception as e:
+                logger.error(f"Error streaming response: {str(e)}")
+                await send_event('error', {"message": "The response could not be completed."})
+                ai_text = resources.FALLBACK_RESPONSE
+                feedback = "Try again later for more personalized feedback."
+            finally:
+                slot.release()
+
+        if ai_text != resources.FALLBACK_RESPONSE:
+            await self._charge(user)
+        if user:
+            await self._save(user, user_input, ai_text, feedback, category)
+
+        await send_event('done', {
+            "success": True,
+            "response": ai_text,
+            "feedback": feedback,
+            "category": category,
+            "tier_required": resources.CATEGORIES[category],
+            **resources.conversation_usage(user)
+        })
+        await send({'type': 'http.response.body', 'body': b''})
+
+def create_asgi_app(flask_app=None):
+    """
+    Create the ASGI application.
+
+    Args:
+        flask_app: Flask app to serve the other routes, factory.create_app() if None
+
+    Returns:
+        AsyncConversationApp: The ASGI callable
+    """
+    flask_app = flask_app or factory.create_app()
+    if 'api' not in flask_app.config['SUBSYSTEMS']:
+        raise ValueError("The async serving mode needs the 'api' subsystem")
+    return AsyncConversationApp(flask_app, threads=config.ASGI_THREADS)
+
+app = create_asgi_app()
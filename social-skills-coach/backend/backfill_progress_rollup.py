@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Script to rebuild the user_progress_rollup table from existing conversations.
+
+Run once after applying the migration that creates the table, or whenever
+the rollup needs to be recomputed:
+
+    python backfill_progress_rollup.py [--batch-size 500] [--user-id ID]
+"""
+
+import argparse
+from factory import create_app
+import progress_service
+
+def backfill(batch_size, user_id=None):
+    """Rebuild the progress rollup in batches."""
+    app = create_app(subsystems=())
+    with app.app_context():
+        scope = f"user {user_id}" if user_id is not None else "all users"
+        print(f"Rebuilding progress rollup for {scope} (batch size {batch_size})...")
+        processed = progress_service.rebuild_progress_rollup(batch_size=batch_size, user_id=user_id)
+        print(f"Done: {processed} conversation(s) processed.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the user progress rollup table.")
+    parser.add_argument('--batch-size', type=int, default=500, help="Conversations read per query")
+    parser.add_argument('--user-id', type=int, default=None, help="Only rebuild this user's rollup")
+    args = parser.parse_args()
+
+    backfill(args.batch_size, args.user_id)
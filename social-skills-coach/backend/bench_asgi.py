@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Load benchmark: WSGI (gunicorn, threaded workers) against ASGI (uvicorn, asgi.py).
+
+Starts fake_llm_server.FakeLLMServer with an artificial model latency, then
+each server in a subprocess pointed at it, and sends --requests distinct
+/api/conversation requests with --concurrency clients in flight. Reports
+throughput, p50/p99 latency and failed requests for each deployment. Under
+WSGI, concurrency is capped at workers x threads; under ASGI the workers wait
+on the model without holding a thread.
+
+    python bench_asgi.py [--latency 1.0] [--requests 400] [--concurrency 200] [--workers 1] [--threads 8]
+
+Needs gunicorn and uvicorn (pip install gunicorn uvicorn).
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from fake_llm_server import FakeLLMServer
+
+logging.getLogger('httpx').setLevel(logging.WARNING)  # One line per request otherwise
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def wait_until_ready(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start within {timeout}s")
+
+async def run_load(url, requests, concurrency):
+    """Return (seconds, latencies of successful requests, failures)."""
+    latencies = []
+    failures = 0
+    slots = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        async def one(i):
+            nonlocal failures
+            async with slots:
+                start = time.perf_counter()
+                try:
+                    response = await client.post('/api/conversation', json={
+                        "user_input": f"How do I keep a conversation going with person {i}?",
+                        "category": "small_talk"
+                    })
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    failures += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(requests)])
+        return time.perf_counter() - start, latencies, failures
+
+def server_command(mode, port, workers, threads):
+    if mode == 'wsgi':
+        return ['gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+                '--workers', str(workers), '--threads', str(threads), '--timeout', '120', 'app:app']
+    return ['uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(workers), '--log-level', 'warning', '--backlog', '4096']
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare WSGI and ASGI throughput against a slow fake model.")
+    parser.add_argument('--latency', type=float, default=1.0, help="Fake model latency in seconds")
+    parser.add_argument('--requests', type=int, default=400, help="Requests per deployment")
+    parser.add_argument('--concurrency', type=int, default=200, help="Requests in flight")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes for both servers")
+    parser.add_argument('--threads', type=int, default=8, help="Threads per gunicorn worker")
+    args = parser.parse_args()
+
+    for tool in ('gunicorn', 'uvicorn'):
+        if shutil.which(tool) is None:
+            sys.exit(f"{tool} is not installed (pip install gunicorn uvicorn)")
+
+    llm = FakeLLMServer(first_token_delay=args.latency)
+    llm.start()
+    print(f"Fake model latency {args.latency:.2f}s, {args.requests} requests, {args.concurrency} in flight, "
+          f"{args.workers} worker(s), {args.threads} threads per WSGI worker")
+    print(f"{'mode':<5} {'req/s':>8} {'p50 s':>7} {'p99 s':>7} {'failed':>7}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            LLM_PROVIDER='stub',
+            LLM_STUB_URL=llm.url,
+            DATABASE_URL=f"sqlite:///{os.path.join(directory, 'bench.db')}",
+            APP_SUBSYSTEMS='api',
+            CONVERSATION_RATE_LIMIT='1000000',
+            PREWARM='False'
+        )
+        try:
+            for mode in ('wsgi', 'asgi'):
+                port = free_port()
+                process = subprocess.Popen(server_command(mode, port, args.workers, args.threads), env=env,
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                try:
+                    url = f"http://127.0.0.1:{port}"
+                    wait_until_ready(url, process)
+                    seconds, latencies, failures = asyncio.run(run_load(url, args.requests, args.concurrency))
+                    p50 = percentile(latencies, 0.5) if latencies else float('nan')
+                    p99 = percentile(latencies, 0.99) if latencies else float('nan')
+                    print(f"{mode:<5} {len(latencies) / seconds:>8.1f} {p50:>7.2f} {p99:>7.2f} {failures:>7}")
+                finally:
+                    process.terminate()
+                    process.wait(timeout=30)
+        finally:
+            llm.stop()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the in-process conversation cache (cache.LRUCache).
+
+Contention: several threads run a cache-aside loop (get, put on miss) over
+Zipf-distributed keys, and the script reports throughput and p99 lookup
+latency for one lock against N shards. Hit rate: a Zipf workload is mixed
+with a stream of one-off keys, which shows how much each admission policy
+protects the popular entries.
+
+    python bench_cache.py [--seconds 2] [--threads 1,4,8] [--shards 8] [--capacity 1000]
+"""
+
+import argparse
+import random
+import threading
+import time
+from cache import LRUCache
+
+RESPONSE = ("That's an interesting point. Could you tell me more about how this affects your social interactions?",
+            "Good job with your communication!")
+
+def zipf_keys(count, universe, exponent=1.0, seed=0):
+    """Return count keys drawn from universe ranks with Zipf weights."""
+    rng = random.Random(seed)
+    weights = [1 / (rank ** exponent) for rank in range(1, universe + 1)]
+    return [f"key-{rank}" for rank in rng.choices(range(universe), weights=weights, k=count)]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run_contention(cache, threads, seconds, keys):
+    stop = time.monotonic() + seconds
+    operations = [0] * threads
+    latencies = [[] for _ in range(threads)]
+
+    def client(index):
+        position = index * 7919
+        sample = latencies[index]
+        while time.monotonic() < stop:
+            for _ in range(200):
+                key = keys[position % len(keys)]
+                position += 1
+                start = time.perf_counter()
+                if cache.get(key) is None:
+                    cache.put(key, RESPONSE)
+                sample.append(time.perf_counter() - start)
+            operations[index] += 200
+
+    workers = [threading.Thread(target=client, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    all_latencies = [value for sample in latencies for value in sample[::10]]
+    return sum(operations) / seconds, percentile(all_latencies, 0.99)
+
+def run_hit_rate(admission, capacity, requests, scan_fraction):
+    rng = random.Random(1)
+    popular = zipf_keys(requests, capacity * 10, seed=2)
+    cache = LRUCache(capacity, admission=admission)
+    for i, key in enumerate(popular):
+        if rng.random() < scan_fraction:
+            key = f"once-{i}"  # Never requested again
+        if cache.get(key) is None:
+            cache.put(key, RESPONSE)
+    return cache.stats()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the in-process conversation cache.")
+    parser.add_argument('--seconds', type=float, default=2, help="Duration per contention run")
+    parser.add_argument('--threads', default='1,4,8', help="Comma-separated thread counts")
+    parser.add_argument('--shards', type=int, default=8, help="Shards for the sharded cache")
+    parser.add_argument('--capacity', type=int, default=1000, help="Cache capacity")
+    parser.add_argument('--requests', type=int, default=200000, help="Requests for the hit rate run")
+    args = parser.parse_args()
+
+    keys = zipf_keys(100000, args.capacity * 4)
+    print("Contention (cache-aside loop, Zipf keys)")
+    print(f"{'threads':>7} {'shards':>6} {'admission':>10} {'ops/s':>10} {'p99 us':>8}")
+    for threads in [int(value) for value in args.threads.split(',')]:
+        for shards, admission in [(1, None), (args.shards, None), (args.shards, 'w-tinylfu')]:
+            cache = LRUCache(args.capacity, shards=shards, admission=admission)
+            throughput, p99 = run_contention(cache, threads, args.seconds, keys)
+            print(f"{threads:>7} {shards:>6} {admission or 'none':>10} {throughput:>10,.0f} {p99 * 1e6:>8.1f}")
+
+    print("\nHit rate (Zipf workload with one-off keys)")
+    print(f"{'scan':>5} {'admission':>10} {'hit rate':>9} {'evictions':>10} {'rejections':>11}")
+    for scan_fraction in (0.0, 0.3, 0.6):
+        for admission in (None, 'tinylfu', 'w-tinylfu'):
+            stats = run_hit_rate(admission, args.capacity, args.requests, scan_fraction)
+            print(f"{scan_fraction:>5.0%} {admission or 'none':>10} {stats['hit_rate']:>9.1%} "
+                  f"{stats['evictions']:>10,} {stats['rejections']:>11,}")
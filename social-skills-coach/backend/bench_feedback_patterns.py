@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for feedback pattern matching.
+
+Compares one re.search per pattern (the original loop) with the compiled
+single-pass matcher on 10,000 generated feedback texts.
+
+    python bench_feedback_patterns.py [--texts 10000] [--repeat 5]
+"""
+
+import argparse
+import random
+import re
+import time
+from feedback_patterns import FEEDBACK_PATTERNS, feedback_matcher
+
+WORDS = (
+    "the a and to of i you we they went party talk people meet friend work nice great "
+    "good time really would could should about conversation new feel question listen"
+).split()
+HABITS = ["sorry", "um", "like", "never", "maybe", "i think", "can't", "always", "perhaps"]
+
+def generate_texts(count, seed=1):
+    """Generate utterances of 5-60 words, about half with a flagged habit."""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(5, 60))]
+        if rng.random() < 0.5:
+            words.insert(rng.randint(0, len(words)), rng.choice(HABITS))
+        texts.append(" ".join(words).capitalize() + ".")
+    return texts
+
+def legacy_match(text):
+    return [feedback for pattern, feedback in FEEDBACK_PATTERNS if re.search(pattern, text.lower())]
+
+def best_time(func, texts, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark feedback pattern matching.")
+    parser.add_argument('--texts', type=int, default=10000, help="Number of feedback texts")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per implementation (best is reported)")
+    args = parser.parse_args()
+
+    texts = generate_texts(args.texts)
+    assert [legacy_match(t) for t in texts] == [feedback_matcher.match_feedback(t) for t in texts]
+
+    legacy = best_time(legacy_match, texts, args.repeat)
+    compiled = best_time(feedback_matcher.match_feedback, texts, args.repeat)
+
+    print(f"Texts: {len(texts)}")
+    print(f"re.search per pattern: {legacy * 1000:.1f} ms ({legacy / len(texts) * 1e6:.2f} us/text)")
+    print(f"Compiled matcher:      {compiled * 1000:.1f} ms ({compiled / len(texts) * 1e6:.2f} us/text)")
+    print(f"Speedup: {legacy / compiled:.2f}x")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Start-up benchmark for importing the app.
+
+Runs `python -X importtime -c "import app"` in fresh interpreters and reports
+the median cumulative import time of the app, the slowest imports below it,
+and which heavy SDKs were loaded at import time instead of on first use.
+With --budget-ms the script exits with status 1 when the median exceeds the
+budget, so it can run in CI.
+
+    python bench_import_time.py [--runs 5] [--top 15] [--budget-ms 1500] [--module app]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Loaded on first use (see app.warm_up); importing the app must not pull them in
+DEFERRED_MODULES = ['openai', 'stripe', 'textblob', 'nltk', 'numpy']
+
+def import_times(module):
+    """Return {module: (self_us, cumulative_us)} for one fresh import of module."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the app.")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters to start")
+    parser.add_argument('--top', type=int, default=15, help="Slowest top-level imports to list")
+    parser.add_argument('--budget-ms', type=float, help="Fail if the median import time exceeds this")
+    parser.add_argument('--module', default='app', help="Module to import")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    totals = [run[args.module][1] / 1000 for run in runs]
+    median = statistics.median(totals)
+
+    print(f"import {args.module}: median {median:.0f} ms, min {min(totals):.0f} ms, max {max(totals):.0f} ms "
+          f"({args.runs} runs)")
+
+    # Slowest top-level packages in the last run, by cumulative time
+    packages = {}
+    for name, (_, cumulative_us) in runs[-1].items():
+        top = name.split('.')[0]
+        if name == top and top != args.module:
+            packages[top] = cumulative_us
+    print(f"\n{'package':<24} {'cumulative ms':>14}")
+    for name, cumulative_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<24} {cumulative_us / 1000:>14.1f}")
+
+    loaded = [name for name in DEFERRED_MODULES if name in runs[-1]]
+    print(f"\nDeferred SDKs loaded at import: {', '.join(loaded) if loaded else 'none'}")
+
+    if args.budget_ms is not None and median > args.budget_ms:
+        print(f"Median import time {median:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
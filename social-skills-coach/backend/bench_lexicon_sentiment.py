@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Throughput and memory benchmark for the sentiment engines.
+
+Scores a local corpus (one text per line, or generated utterances) with
+TextBlob, with the lexicon engine one text at a time, and with the lexicon
+engine's batch API. Reports texts per second, the memory held after loading
+each engine (including its imports), the peak memory while scoring the
+corpus, and how far the lexicon engine's results are from TextBlob's.
+
+    python bench_lexicon_sentiment.py [--corpus texts.txt] [--texts 10000] [--batch-size 1000]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+OPENERS = ["I", "I really", "Honestly I", "Sometimes I", "I never", "I don't", "I always", "Maybe I"]
+FEELINGS = [
+    "feel nervous", "feel very awkward", "love meeting new people", "hate small talk",
+    "am not good at parties", "think it went well", "was extremely anxious", "felt quite confident",
+    "am sorry for interrupting", "enjoy talking about music", "get bored easily", "was not happy"
+]
+ENDINGS = [
+    ".", "!", "!!", "...", " at work.", " with my friends.", ", you know?", " :)", " but it's fine.",
+    " and it was a great conversation!", " when someone asks me a hard question."
+]
+
+def generate_corpus(count, seed=1):
+    """Generate conversational utterances of one to four sentences."""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        sentences = [
+            f"{rng.choice(OPENERS)} {rng.choice(FEELINGS)}{rng.choice(ENDINGS)}"
+            for _ in range(rng.randint(1, 4))
+        ]
+        texts.append(" ".join(sentences))
+    return texts
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def measure_load(load):
+    """Return (engine, bytes still allocated) for loading an engine."""
+    tracemalloc.start()
+    engine = load()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return engine, size
+
+def measure_run(func, texts):
+    """Return (results, seconds, peak bytes) for scoring the corpus."""
+    # Timed without tracemalloc, which slows allocation-heavy code unevenly
+    start = time.perf_counter()
+    results = func(texts)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(texts)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return results, elapsed, peak
+
+def load_textblob():
+    from textblob import TextBlob
+    TextBlob("Load the lexicon.").sentiment
+    return TextBlob
+
+def load_lexicon():
+    from lexicon_sentiment import LexiconSentiment
+    return LexiconSentiment()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sentiment engine throughput and memory.")
+    parser.add_argument('--corpus', help="File with one text per line (generated if omitted)")
+    parser.add_argument('--texts', type=int, default=10000, help="Number of generated texts")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Texts per analyze_many call")
+    args = parser.parse_args()
+
+    texts = load_corpus(args.corpus) if args.corpus else generate_corpus(args.texts)
+
+    TextBlob, textblob_size = measure_load(load_textblob)
+    engine, lexicon_size = measure_load(load_lexicon)
+
+    def textblob_run(texts):
+        return [tuple(TextBlob(text).sentiment) for text in texts]
+
+    def lexicon_single(texts):
+        return [engine.analyze(text) for text in texts]
+
+    def lexicon_batch(texts):
+        results = []
+        for i in range(0, len(texts), args.batch_size):
+            results.extend(engine.analyze_many(texts[i:i + args.batch_size]))
+        return results
+
+    expected, textblob_time, textblob_peak = measure_run(textblob_run, texts)
+    single, single_time, single_peak = measure_run(lexicon_single, texts)
+    batch, batch_time, batch_peak = measure_run(lexicon_batch, texts)
+
+    max_diff = max(
+        max(abs(a[0] - b[0]), abs(a[1] - b[1])) for a, b in zip(batch, expected)
+    ) if texts else 0.0
+
+    print(f"Texts: {len(texts)} ({sum(map(len, texts)) / max(len(texts), 1):.0f} chars average)")
+    print(f"{'engine':<14} {'texts/s':>10} {'load KiB':>9} {'peak KiB':>9}")
+    print(f"{'textblob':<14} {len(texts) / textblob_time:>10.0f} {textblob_size / 1024:>9.0f} {textblob_peak / 1024:>9.0f}")
+    print(f"{'lexicon':<14} {len(texts) / single_time:>10.0f} {lexicon_size / 1024:>9.0f} {single_peak / 1024:>9.0f}")
+    print(f"{'lexicon batch':<14} {len(texts) / batch_time:>10.0f} {'':>9} {batch_peak / 1024:>9.0f}")
+    print(f"Batch speedup over TextBlob: {textblob_time / batch_time:.1f}x")
+    print(f"Largest difference from TextBlob: {max_diff:.2e}")
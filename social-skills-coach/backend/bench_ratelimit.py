@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the rate limiter (ratelimit.py) with 100,000 distinct keys.
+
+Several threads check limits for keys drawn from a large population (most
+clients send a few requests, a few send many), and the script reports
+throughput, p99 latency of one check and the memory the store holds. The
+previous limiter (a list of timestamps per key under one global lock) runs
+the same workload for comparison, and the socket store is measured against
+cache_server.py running in its own process.
+
+    python bench_ratelimit.py [--keys 100000] [--seconds 2] [--threads 1,8] [--shards 16]
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from ratelimit import MemoryRateLimitStore, RateLimiter, SocketRateLimitStore
+
+LIMIT = 10
+PERIOD = 60
+
+class LegacyLimiter:
+    """The limiter this module replaced: per-key timestamp lists, one lock, never pruned."""
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def hit(self, key, limit, period):
+        with self.lock:
+            now = time.time()
+            if key in self.calls:
+                self.calls[key] = [c for c in self.calls[key] if now - c[0] < period]
+                if sum(c[1] for c in self.calls[key]) >= limit:
+                    return False
+                self.calls[key].append((now, 1))
+            else:
+                self.calls[key] = [(now, 1)]
+            return True
+
+def workload(count, keys, seed=0):
+    """Keys for count checks: 80% spread over all keys, 20% on the hottest 1%."""
+    rng = random.Random(seed)
+    hot = max(1, keys // 100)
+    return [f"user-{rng.randrange(hot) if rng.random() < 0.2 else rng.randrange(keys)}" for _ in range(count)]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run(check, threads, seconds, keys):
+    stop = time.monotonic() + seconds
+    operations = [0] * threads
+    latencies = [[] for _ in range(threads)]
+
+    def client(index):
+        position = index * 7919
+        sample = latencies[index]
+        while time.monotonic() < stop:
+            for _ in range(100):
+                key = keys[position % len(keys)]
+                position += 1
+                start = time.perf_counter()
+                check(key)
+                sample.append(time.perf_counter() - start)
+            operations[index] += 100
+
+    workers = [threading.Thread(target=client, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    all_latencies = [value for sample in latencies for value in sample[::10]]
+    return sum(operations) / seconds, percentile(all_latencies, 0.99)
+
+def resident_bytes(build, keys):
+    """Bytes allocated by a limiter after one check for each of the given keys."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    limiter = build()
+    for key in keys:
+        limiter.hit(key, LIMIT, PERIOD)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, limiter
+
+def start_store(path):
+    process = subprocess.Popen([sys.executable, 'cache_server.py', '--socket', path, '--capacity', '1000000'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    deadline = time.monotonic() + 10
+    while not os.path.exists(path):
+        if time.monotonic() > deadline:
+            process.kill()
+            raise RuntimeError("cache_server.py did not start")
+        time.sleep(0.05)
+    return process
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the rate limiter with many distinct keys.")
+    parser.add_argument('--keys', type=int, default=100000, help="Distinct keys (clients)")
+    parser.add_argument('--seconds', type=float, default=2, help="Duration per run")
+    parser.add_argument('--threads', default='1,8', help="Comma-separated thread counts")
+    parser.add_argument('--shards', type=int, default=16, help="Shards of the memory store")
+    args = parser.parse_args()
+
+    keys = workload(200000, args.keys)
+    path = os.path.join(tempfile.mkdtemp(), 'ratelimit.sock')
+    store = start_store(path)
+    try:
+        limiters = {
+            "legacy (lists, 1 lock)": lambda: LegacyLimiter(),
+            "gcra memory, 1 shard": lambda: RateLimiter(MemoryRateLimitStore(shards=1)),
+            f"gcra memory, {args.shards} shards": lambda: RateLimiter(MemoryRateLimitStore(shards=args.shards)),
+            "gcra socket (shared)": lambda: RateLimiter(SocketRateLimitStore(f"unix://{path}", timeout=2)),
+        }
+
+        print(f"Checks over {args.keys:,} keys ({LIMIT} per {PERIOD}s)")
+        print(f"{'limiter':<26} {'threads':>7} {'checks/s':>10} {'p99 us':>8}")
+        for name, build in limiters.items():
+            for threads in [int(value) for value in args.threads.split(',')]:
+                limiter = build()
+                throughput, p99 = run(lambda key: limiter.hit(key, LIMIT, PERIOD), threads, args.seconds, keys)
+                print(f"{name:<26} {threads:>7} {throughput:>10,.0f} {p99 * 1e6:>8.1f}")
+
+        print(f"\nMemory after one check per key ({args.keys:,} keys)")
+        every_key = [f"user-{i}" for i in range(args.keys)]
+        for name in ("legacy (lists, 1 lock)", f"gcra memory, {args.shards} shards"):
+            size, limiter = resident_bytes(limiters[name], every_key)
+            print(f"{name:<26} {size / 1e6:>7.1f} MB {size / args.keys:>6.0f} B/key")
+
+        # Keys are only as old as their bucket: with a one-second period they all expire
+        limiter = RateLimiter(MemoryRateLimitStore(shards=args.shards))
+        for key in every_key:
+            limiter.hit(key, LIMIT, 1)
+        time.sleep(1.1)
+        for i in range(args.keys):
+            limiter.hit(f"later-{i}", LIMIT, 1)
+        print(f"\nIdle keys: {len(limiter.store):,} resident after {2 * args.keys:,} distinct keys, "
+              f"the first {args.keys:,} idle (1s period)")
+    finally:
+        store.terminate()
+        store.wait()
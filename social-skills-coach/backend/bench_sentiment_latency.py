@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the sentiment analysis executor under mixed load.
+
+Several threads send short utterances (the common case) while other
+threads keep submitting long paragraphs. Reports p50/p99 latency of the
+short requests for each executor mode, which shows how much one long
+input stalls everything else sharing the worker.
+
+    python bench_sentiment_latency.py [--seconds 5] [--short-clients 4] [--long-clients 1]
+"""
+
+import argparse
+import threading
+import time
+from sentiment import SentimentAnalyzer
+
+SHORT_TEXT = "I felt a bit nervous but the conversation went well."
+LONG_TEXT = " ".join(
+    ["I really love the way you explain things, but sometimes I feel awkward and nervous at big parties."] * 60
+)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run(mode, seconds, short_clients, long_clients, workers):
+    analyzer = SentimentAnalyzer(mode=mode, workers=workers, timeout=1.0, max_pending=workers * 4)
+    analyzer.warm_up()
+
+    stop = time.monotonic() + seconds
+    latencies = []
+    lock = threading.Lock()
+
+    def short_client():
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            analyzer.analyze(SHORT_TEXT)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    def long_client():
+        while time.monotonic() < stop:
+            analyzer.analyze(LONG_TEXT)
+
+    threads = [threading.Thread(target=short_client) for _ in range(short_clients)]
+    threads += [threading.Thread(target=long_client) for _ in range(long_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = analyzer.stats()
+    analyzer.shutdown()
+    return latencies, stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sentiment latency under mixed load.")
+    parser.add_argument('--seconds', type=float, default=5, help="Duration per mode")
+    parser.add_argument('--short-clients', type=int, default=4, help="Threads sending short texts")
+    parser.add_argument('--long-clients', type=int, default=1, help="Threads sending long paragraphs")
+    parser.add_argument('--workers', type=int, default=2, help="Pool size for thread/process modes")
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8} {'fallbacks':>10}")
+    for mode in ['inline', 'thread', 'process']:
+        latencies, stats = run(mode, args.seconds, args.short_clients, args.long_clients, args.workers)
+        fallbacks = stats["saturated"] + stats["timeouts"] + stats["errors"]
+        print(f"{mode:<8} {len(latencies):>9} {percentile(latencies, 0.5) * 1000:>8.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.1f} {fallbacks:>10}")
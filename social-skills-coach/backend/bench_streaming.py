@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Time-to-first-byte benchmark for /api/conversation and /api/conversation/stream.
+
+Starts fake_llm_server.FakeLLMServer with the given delays, points the API at
+it, and sends the same uncached questions to both endpoints. For each one it
+reports the median and p95 time until the first body bytes arrive and until
+the response is complete.
+
+    python bench_streaming.py [--requests 20] [--first-token-delay 0.3] [--token-delay 0.03]
+"""
+
+import os
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import argparse
+import statistics
+import time
+import config
+from factory import create_app
+from fake_llm_server import FakeLLMServer
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def measure(client, path, user_input):
+    """Return (seconds to the first body chunk, seconds to the end of the body)."""
+    start = time.perf_counter()
+    response = client.post(path, json={"user_input": user_input, "category": "small_talk"}, buffered=False)
+    chunks = response.iter_encoded()
+    next(chunks)
+    first = time.perf_counter() - start
+    for _ in chunks:
+        pass
+    return first, time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure time-to-first-byte with a fake streaming LLM.")
+    parser.add_argument('--requests', type=int, default=20, help="Requests per endpoint")
+    parser.add_argument('--first-token-delay', type=float, default=0.3, help="Fake model latency before the first word")
+    parser.add_argument('--token-delay', type=float, default=0.03, help="Fake model latency between words")
+    args = parser.parse_args()
+
+    server = FakeLLMServer(first_token_delay=args.first_token_delay, token_delay=args.token_delay)
+    server.start()
+    config.LLM_PROVIDER = 'stub'
+    config.LLM_STUB_URL = server.url
+
+    print(f"Fake model: {args.first_token_delay * 1000:.0f} ms to the first word, "
+          f"{args.token_delay * 1000:.0f} ms per word, {len(server.tokens)} words")
+    print(f"{'endpoint':<26} {'TTFB p50':>9} {'TTFB p95':>9} {'total p50':>10}")
+    try:
+        for path in ('/api/conversation', '/api/conversation/stream'):
+            firsts, totals = [], []
+            for i in range(args.requests):
+                # A new app per batch of requests keeps under the per-client rate limit
+                if i % 10 == 0:
+                    client = create_app(subsystems=['api']).test_client()
+                first, total = measure(client, path, f"How do I join a conversation at a party? ({path} {i})")
+                firsts.append(first)
+                totals.append(total)
+            print(f"{path:<26} {statistics.median(firsts) * 1000:>7.0f}ms {percentile(firsts, 0.95) * 1000:>7.0f}ms "
+                  f"{statistics.median(totals) * 1000:>8.0f}ms")
+    finally:
+        server.stop()
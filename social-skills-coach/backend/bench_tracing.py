@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the overhead of request tracing (tracing.py).
+
+Sends the same mix of conversation and feedback requests through the Flask
+test client with tracing off, at the default sample rate and with every
+request sampled (spans written to a temporary file), and reports the mean
+and p50 time per request and the overhead relative to tracing off.
+
+    python bench_tracing.py [--requests 2000] [--rates 0.01,1]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+import config
+from factory import create_app
+from models import db
+
+def build_app(exporter, sample_rate, path):
+    config.LLM_PROVIDER = 'mock'  # Keyword replies, without a network
+    config.TRACE_EXPORTER = exporter
+    config.TRACE_SAMPLE_RATE = sample_rate
+    config.TRACE_FILE = path
+    app = create_app(subsystems=['api'], config_overrides={'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    app.extensions['rate_policies'].update({'conversation': {'anonymous': '1000000/60'}, 'feedback': {'*': '1000000/60'}})
+    with app.app_context():
+        db.create_all()
+    return app
+
+def run(app, count):
+    client = app.test_client()
+    durations = []
+    for i in range(count):
+        start = time.perf_counter()
+        if i % 2:
+            client.post('/api/feedback', json={"user_input": f"I asked them about their weekend {i % 50}"})
+        else:
+            client.post('/api/conversation', json={"user_input": f"How do I start a conversation {i % 50}?"})
+        durations.append(time.perf_counter() - start)
+    app.extensions['tracer'].close()
+    return durations
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the overhead of request tracing.")
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per configuration")
+    parser.add_argument('--rates', default='0.01,1', help="Sample rates to compare with tracing off")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # Request logs would dominate the timings
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "spans.jsonl")
+        run(build_app('none', 0.0, path), args.requests // 10)  # Warm up imports and caches
+        configurations = [('off', 'none', 0.0)] + [(f"rate {rate}", 'file', float(rate)) for rate in args.rates.split(',')]
+        baseline = None
+        for label, exporter, rate in configurations:
+            durations = run(build_app(exporter, rate, path), args.requests)
+            mean = statistics.mean(durations)
+            baseline = baseline or mean
+            spans = sum(1 for _ in open(path)) if os.path.exists(path) else 0
+            print(f"{label:>10}: mean {mean * 1e6:8.1f} us  p50 {statistics.median(durations) * 1e6:8.1f} us  "
+                  f"overhead {100 * (mean / baseline - 1):+5.1f}%  spans exported {spans}")
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,626 @@
+"""
+Conversation response caches for the Social Skills Coach API.
+
+Two backends share the same get/put interface:
+
+    memory  LRUCache, private to each worker process, with optional TTL,
+            byte budget, TinyLFU admission and sharding
+    socket  SocketCache, shared by all workers through a local key/value
+            store that speaks the Redis protocol: a Redis-compatible server
+            or the bundled cache_server.py daemon
+
+Cached values must be JSON serializable for the shared backend; tuples
+come back as lists.
+"""
+
+import hashlib
+import json
+import logging
+import socket
+import time
+import unicodedata
+from threading import Lock, local
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKENDS = ('memory', 'socket')
+
+# Bump when the key layout changes, so old entries in a shared store are ignored
+CACHE_KEY_VERSION = 1
+
+CACHE_LOOKUPS = REGISTRY.counter('coach_cache_lookups_total', "Cache lookups, by cache and result.", ('cache', 'result'))
+CACHE_REMOVALS = REGISTRY.counter('coach_cache_removals_total',
+                                  "Entries evicted for space, expired, or refused by the admission policy, "
+                                  "by cache and reason.", ('cache', 'reason'))
+CACHE_ENTRIES = REGISTRY.gauge('coach_cache_entries', "Entries held, by cache.", ('cache',))
+CACHE_BYTES = REGISTRY.gauge('coach_cache_bytes', "Estimated bytes held by the entries, by cache.", ('cache',))
+
+# stats() key of each coach_cache_removals_total reason
+REMOVAL_REASONS = (("evictions", 'eviction'), ("expirations", 'expiration'), ("rejections", 'rejection'))
+
+def track_cache(cache, name):
+    """
+    Serve the counters in cache.stats() at /metrics, labeled cache=name.
+
+    Hits and misses go to coach_cache_lookups_total. Removals, entries and
+    bytes go to coach_cache_removals_total, coach_cache_entries and
+    coach_cache_bytes for the backends that keep them (in-process caches;
+    the shared store keeps its own).
+    """
+    def lookups(cache):
+        stats = cache.stats()
+        return {(name, 'hit'): stats["hits"], (name, 'miss'): stats["misses"]}
+
+    def removals(cache):
+        stats = cache.stats()
+        return {(name, reason): stats[key] for key, reason in REMOVAL_REASONS if key in stats}
+
+    def entries(cache):
+        entries = cache.stats().get("entries")
+        if isinstance(entries, dict):
+            entries = sum(entries.values())  # Per category
+        return {} if entries is None else {(name,): entries}
+
+    def resident_bytes(cache):
+        stats = cache.stats()
+        return {(name,): stats["bytes"]} if "bytes" in stats else {}
+
+    CACHE_LOOKUPS.track(cache, lookups)
+    CACHE_REMOVALS.track(cache, removals)
+    CACHE_ENTRIES.track(cache, entries)
+    CACHE_BYTES.track(cache, resident_bytes)
+
+class CacheBackend:
+    """Base class for cache backends, with hit and miss counters."""
+
+    name = None
+
+    def __init__(self):
+        self._stats_lock = Lock()
+        self._stats = {"hits": 0, "misses": 0, "errors": 0}
+
+    def get(self, key):
+        """Return the cached value for key, or None."""
+        raise NotImplementedError
+
+    def put(self, key, value, ttl=None):
+        """Store value under key, expiring after ttl seconds if given."""
+        raise NotImplementedError
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def stats(self):
+        """Return hit, miss and error counters and the hit rate."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["backend"] = self.name
+        return stats
+
+ADMISSION_POLICIES = (None, 'tinylfu', 'w-tinylfu')
+
+def estimate_size(value):
+    """
+    Estimate the bytes held by a cached value: the UTF-8 length of strings,
+    summed over tuples, lists and dicts, and 8 bytes for anything else.
+    """
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    return 8
+
+class FrequencySketch:
+    """
+    Count-min sketch of recent access frequencies, for TinyLFU admission.
+
+    A doorkeeper set absorbs the first access of each key, so one-off keys
+    never reach the counters and cannot inflate other keys' estimates.
+    Counters saturate at 15 and are all halved (and the doorkeeper cleared)
+    after 10 * capacity accesses, so keys that were popular long ago lose
+    their advantage.
+    """
+
+    DEPTH = 4
+    MAX_COUNT = 15
+    # Odd 64-bit multipliers, one independent hash per row
+    SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+
+    def __init__(self, capacity):
+        width = 16
+        while width < 2 * capacity:
+            width *= 2
+        self.width = width
+        self.shift = 64 - (width.bit_length() - 1)
+        self.counters = [0] * (self.DEPTH * width)  # DEPTH rows of width counters
+        self.doorkeeper = set()
+        self.sample_size = 10 * max(capacity, 16)
+        self.additions = 0
+
+    def _indexes(self, key):
+        # Multiplicative hashing: the top bits of hash * seed pick the counter in each row
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        shift = self.shift
+        width = self.width
+        s1, s2, s3, s4 = self.SEEDS
+        return (
+            ((h * s1) & 0xFFFFFFFFFFFFFFFF) >> shift,
+            width + (((h * s2) & 0xFFFFFFFFFFFFFFFF) >> shift),
+            2 * width + (((h * s3) & 0xFFFFFFFFFFFFFFFF) >> shift),
+            3 * width + (((h * s4) & 0xFFFFFFFFFFFFFFFF) >> shift)
+        )
+
+    def frequency(self, key):
+        if key not in self.doorkeeper:
+            return 0
+        counters = self.counters
+        a, b, c, d = self._indexes(key)
+        return 1 + min(counters[a], counters[b], counters[c], counters[d])
+
+    def increment(self, key):
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.counters = [count >> 1 for count in self.counters]
+            self.doorkeeper.clear()
+            self.additions //= 2
+
+        if key not in self.doorkeeper:
+            self.doorkeeper.add(key)
+            return
+        counters = self.counters
+        indexes = self._indexes(key)
+        a, b, c, d = indexes
+        current = min(counters[a], counters[b], counters[c], counters[d])
+        if current < self.MAX_COUNT:
+            # Conservative update: only the smallest counters grow
+            for i in indexes:
+                if counters[i] == current:
+                    counters[i] += 1
+
+class _Segment:
+    """One independently locked part of an LRUCache."""
+
+    def __init__(self, capacity, max_bytes, admission, sizeof):
+        self.lock = Lock()
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.main = OrderedDict()  # {key: (value, size, expires_at)}, least recently used first
+        self.window = OrderedDict()  # New entries under W-TinyLFU, before they compete for main
+        self.window_capacity = max(1, capacity // 100) if admission == 'w-tinylfu' and capacity > 1 else 0
+        self.main_capacity = capacity - self.window_capacity
+        self.sketch = FrequencySketch(capacity) if admission else None
+        self.bytes = 0
+        self.stats = dict.fromkeys(("hits", "misses", "evictions", "expirations", "rejections"), 0)
+
+    def get(self, key, now):
+        with self.lock:
+            if self.sketch is not None:
+                self.sketch.increment(key)
+
+            area = self.main if key in self.main else self.window
+            entry = area.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                del area[key]
+                self.bytes -= size
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            # Mark the entry as most recently used
+            area.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def put(self, key, value, ttl, now):
+        size = self.sizeof(value)
+        entry = (value, size, now + ttl if ttl else None)
+        with self.lock:
+            for area in (self.main, self.window):
+                old = area.pop(key, None)
+                if old is not None:
+                    self.bytes -= old[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                self.stats["rejections"] += 1
+                return
+
+            # Drop expired entries at the cold end before evicting live ones
+            while self.main:
+                head = next(iter(self.main))
+                expires_at = self.main[head][2]
+                if expires_at is None or expires_at > now:
+                    break
+                self.bytes -= self.main.pop(head)[1]
+                self.stats["expirations"] += 1
+
+            if self.window_capacity:
+                self.window[key] = entry
+                self.bytes += size
+                while len(self.window) > self.window_capacity:
+                    candidate_key, candidate = self.window.popitem(last=False)
+                    self.bytes -= candidate[1]
+                    self._admit(candidate_key, candidate)
+            else:
+                self._admit(key, entry)
+
+            # The window may still hold more than the byte budget allows
+            while self.max_bytes is not None and self.bytes > self.max_bytes:
+                area = self.main if self.main else self.window
+                self.bytes -= area.popitem(last=False)[1][1]
+                self.stats["evictions"] += 1
+
+    def _full(self, size):
+        return len(self.main) >= self.main_capacity or (
+            self.max_bytes is not None and self.bytes + size > self.max_bytes
+        )
+
+    def _admit(self, key, entry):
+        """Insert into main, evicting least recently used entries to make room."""
+        size = entry[1]
+        if self._full(size) and self.sketch is not None and self.main:
+            # TinyLFU: only replace the victim with a key that is used more often
+            victim = next(iter(self.main))
+            if self.sketch.frequency(key) <= self.sketch.frequency(victim):
+                self.stats["rejections"] += 1
+                return
+
+        while self.main and self._full(size):
+            self.bytes -= self.main.popitem(last=False)[1][1]
+            self.stats["evictions"] += 1
+        if len(self.main) >= self.main_capacity:
+            self.stats["rejections"] += 1
+            return
+        self.main[key] = entry
+        self.bytes += size
+
+class LRUCache(CacheBackend):
+    """
+    In-process LRU cache for conversation responses.
+
+    Entries can expire after a TTL, and the cache can be limited by a byte
+    budget as well as by entry count. With admission='tinylfu', a new entry
+    only replaces the least recently used one if it has been looked up more
+    often recently; 'w-tinylfu' first keeps new entries in a small LRU window
+    (1% of the capacity) so that bursts still get cached. With shards > 1,
+    keys are spread over independently locked segments, each with its share
+    of the capacity and byte budget.
+
+    Args:
+        capacity: Maximum number of entries
+        ttl: Default seconds before an entry expires (None keeps entries)
+        max_bytes: Maximum total size of the cached values (None for no limit)
+        admission: None, 'tinylfu' or 'w-tinylfu'
+        shards: Number of independently locked segments
+        sizeof: Returns the size of a value in bytes (estimate_size by default)
+    """
+
+    name = 'memory'
+
+    def __init__(self, capacity, ttl=None, max_bytes=None, admission=None, shards=1, sizeof=estimate_size):
+        super().__init__()
+        if admission not in ADMISSION_POLICIES:
+            raise ValueError(f"Invalid cache admission policy '{admission}'. Choose one of: tinylfu, w-tinylfu")
+        if shards < 1 or capacity < shards:
+            raise ValueError(f"Cache capacity ({capacity}) must be at least the number of shards ({shards})")
+        self.capacity = capacity
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.admission = admission
+        self.segments = [
+            _Segment(-(-capacity // shards), -(-max_bytes // shards) if max_bytes is not None else None, admission, sizeof)
+            for _ in range(shards)
+        ]
+
+    def _segment(self, key):
+        if len(self.segments) == 1:
+            return self.segments[0]
+        return self.segments[hash(key) % len(self.segments)]
+
+    def get(self, key):
+        return self._segment(key).get(key, time.monotonic())
+
+    def put(self, key, value, ttl=None):
+        self._segment(key).put(key, value, ttl if ttl is not None else self.ttl, time.monotonic())
+
+    def __len__(self):
+        return sum(len(segment.main) + len(segment.window) for segment in self.segments)
+
+    def stats(self):
+        """Return hit, miss, eviction, expiration and rejection counters, entries and resident bytes."""
+        stats = dict.fromkeys(("hits", "misses", "evictions", "expirations", "rejections", "entries", "bytes"), 0)
+        for segment in self.segments:
+            with segment.lock:
+                for key, count in segment.stats.items():
+                    stats[key] += count
+                stats["entries"] += len(segment.main) + len(segment.window)
+                stats["bytes"] += segment.bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["backend"] = self.name
+        stats["shards"] = len(self.segments)
+        return stats
+
+class CacheProtocolError(Exception):
+    """Raised for malformed messages or error replies from the store."""
+
+class CacheReplyError(CacheProtocolError):
+    """An error reply from the store (e.g. NOSCRIPT); the connection is still usable."""
+
+def encode_command(*args):
+    """Encode one command as a RESP array of bulk strings."""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+def read_message(reader):
+    """
+    Read one RESP message from a buffered binary file.
+
+    Returns:
+        bytes, int, list or None; error replies raise CacheProtocolError
+    """
+    line = reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Connection closed by the cache store")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload
+    if kind == b"-":
+        raise CacheReplyError(payload.decode(errors='replace'))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError("Connection closed by the cache store")
+        return data[:-2]
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [read_message(reader) for _ in range(length)]
+    raise CacheProtocolError(f"Unexpected message type {kind!r}")
+
+class SocketCache(CacheBackend):
+    """
+    Cache shared between processes through a Redis-protocol store.
+
+    Each thread keeps its own connection. If the store cannot be reached,
+    lookups count as misses and writes are dropped, so the cache never fails
+    a request; the connection is retried after retry_interval seconds.
+
+    Args:
+        url: unix:///path/to/socket, or redis://host:port/db for TCP
+        prefix: Prepended to every key, so several caches can share a store
+        ttl: Seconds before entries expire in the store (None keeps them)
+        timeout: Socket timeout in seconds
+        retry_interval: Seconds to wait before reconnecting after an error
+    """
+
+    name = 'socket'
+
+    def __init__(self, url, prefix='conversation:', ttl=None, timeout=0.5, retry_interval=5.0):
+        super().__init__()
+        parts = urlsplit(url)
+        if parts.scheme == 'unix':
+            self.address = (socket.AF_UNIX, parts.path)
+            self.database = 0
+        elif parts.scheme in ('redis', 'tcp'):
+            self.address = (socket.AF_INET, (parts.hostname or 'localhost', parts.port or 6379))
+            self.database = int(parts.path.strip('/') or 0)
+        else:
+            raise ValueError(f"Unsupported cache URL '{url}'. Use unix:///path or redis://host:port/db")
+        self.url = url
+        self.prefix = prefix
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._local = local()
+        self._retry_at = 0.0
+
+    def _connect(self):
+        family, address = self.address
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(address)
+            reader = sock.makefile('rb')
+            if self.database:
+                sock.sendall(encode_command("SELECT", self.database))
+                read_message(reader)
+        except Exception:
+            sock.close()
+            raise
+        return sock, reader
+
+    def _close(self):
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            sock, reader = connection
+            reader.close()
+            sock.close()
+
+    def _execute(self, commands, reply_errors=False):
+        """
+        Send commands in one pipelined write and return their replies.
+
+        Returns None when the store cannot be reached. With reply_errors,
+        error replies are returned as CacheReplyError instead of failing
+        the whole pipeline.
+        """
+        if time.monotonic() < self._retry_at:
+            return None
+        try:
+            if getattr(self._local, 'connection', None) is None:
+                self._local.connection = self._connect()
+            sock, reader = self._local.connection
+            sock.sendall(b"".join(encode_command(*command) for command in commands))
+            replies = []
+            for _ in commands:
+                try:
+                    replies.append(read_message(reader))
+                except CacheReplyError as e:
+                    if not reply_errors:
+                        raise
+                    replies.append(e)
+            return replies
+        except (OSError, ConnectionError, CacheProtocolError, ValueError) as e:
+            logger.warning(f"Conversation cache store {self.url} unavailable: {str(e)}")
+            self._count("errors")
+            self._close()
+            self._retry_at = time.monotonic() + self.retry_interval
+            return None
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    def _decode(self, reply):
+        if not isinstance(reply, bytes):
+            return None
+        try:
+            return json.loads(reply)
+        except ValueError:
+            # Not written by this cache
+            return None
+
+    def get(self, key):
+        replies = self._execute([("GET", self._key(key))])
+        value = self._decode(replies[0]) if replies else None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def put(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        command = ["SET", self._key(key), json.dumps(value)]
+        if ttl:
+            command += ["PX", int(ttl * 1000)]
+        self._execute([command])
+
+    def peek(self, key):
+        """Return the value under key without counting a hit or miss (None if absent or unreachable)."""
+        replies = self._execute([("GET", self._key(key))])
+        return self._decode(replies[0]) if replies else None
+
+    def add(self, key, value, ttl=None):
+        """
+        Store value only if key is absent (SET NX), e.g. to take a lock.
+
+        Returns:
+            True if stored, False if the key exists, None if the store is unreachable
+        """
+        command = ["SET", self._key(key), json.dumps(value), "NX"]
+        if ttl:
+            command += ["PX", int(ttl * 1000)]
+        replies = self._execute([command])
+        if replies is None:
+            return None
+        return replies[0] is not None
+
+    def delete(self, key):
+        """Remove key from the store."""
+        self._execute([("DEL", self._key(key))])
+
+    def evaluate(self, script, keys, args):
+        """
+        Run a Lua script atomically in the store: EVALSHA, then EVAL if the
+        store has not seen the script yet.
+
+        Returns:
+            The script's reply, None if the store is unreachable or the script failed
+        """
+        sha = hashlib.sha1(script.encode()).hexdigest()
+        keys = [self._key(key) for key in keys]
+        replies = self._execute([("EVALSHA", sha, len(keys), *keys, *args)], reply_errors=True)
+        if replies and isinstance(replies[0], CacheReplyError) and str(replies[0]).startswith("NOSCRIPT"):
+            replies = self._execute([("EVAL", script, len(keys), *keys, *args)], reply_errors=True)
+        if replies is None:
+            return None
+        if isinstance(replies[0], CacheReplyError):
+            logger.warning(f"Script failed in the cache store {self.url}: {str(replies[0])}")
+            self._count("errors")
+            return None
+        return replies[0]
+
+def normalize_text(text):
+    """Normalize text for cache lookups: Unicode NFC, case-folded, single spaces."""
+    return " ".join(unicodedata.normalize('NFC', text).casefold().split())
+
+def conversation_cache_key(user_input, category, model, system_prompt, params):
+    """
+    Build a deterministic cache key for a conversation response.
+
+    The key is a SHA-256 digest of everything that determines the response,
+    so it is the same in every process and across restarts, and changes
+    (invalidating old entries) when the model, prompt or parameters change.
+
+    Args:
+        user_input: Text sent by the user; normalized with normalize_text
+        category: Conversation category
+        model: Model name, or 'mock' for the placeholder responses
+        system_prompt: Full system prompt sent with the input
+        params: Generation parameters, e.g. {"max_tokens": 150, "temperature": 0.7}
+
+    Returns:
+        str: Key such as "v1:3f2a..."
+    """
+    material = json.dumps({
+        "input": normalize_text(user_input),
+        "category": category,
+        "model": model,
+        "system_prompt": hashlib.sha256(system_prompt.encode()).hexdigest(),
+        "params": params
+    }, sort_keys=True, ensure_ascii=False)
+    return f"v{CACHE_KEY_VERSION}:{hashlib.sha256(material.encode()).hexdigest()}"
+
+def conversation_context(model, system_prompt, params):
+    """
+    Return a digest of everything except the input that shapes a response.
+
+    Used by the semantic cache (semantic_cache.py) to drop a category's
+    entries when the model, prompt or parameters change.
+    """
+    material = json.dumps({"model": model, "system_prompt": system_prompt, "params": params}, sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+def create_cache(backend='memory', capacity=100, url=None, ttl=None, max_bytes=None, admission=None, shards=1):
+    """
+    Create a conversation cache backend.
+
+    Args:
+        backend: 'memory' or 'socket'
+        capacity: Entries kept by the in-process backend
+        url: Store URL for the shared backend
+        ttl: Seconds before entries expire (None keeps them)
+        max_bytes: Byte budget of the in-process backend (None for no limit)
+        admission: Admission policy of the in-process backend: None, 'tinylfu' or 'w-tinylfu'
+        shards: Independently locked segments of the in-process backend
+
+    Returns:
+        CacheBackend: The cache
+    """
+    if backend == 'memory':
+        return LRUCache(capacity, ttl=ttl, max_bytes=max_bytes, admission=admission, shards=shards)
+    if backend == 'socket':
+        return SocketCache(url, ttl=ttl)
+    raise ValueError(f"Invalid cache backend '{backend}'. Choose one of: {', '.join(CACHE_BACKENDS)}")
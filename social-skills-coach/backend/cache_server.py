@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Small key/value store for the shared conversation cache.
+
+Listens on a Unix socket and speaks the subset of the Redis protocol used by
+cache.SocketCache, singleflight.py and ratelimit.py (PING, GET, MGET, SET with NX and
+EX/PX, DEL, DBSIZE, FLUSHDB, SELECT 0, QUIT, and EVAL/EVALSHA for the scripts
+in SCRIPTS), so the shared cache can run without a Redis server, e.g.
+on a single host or in tests. Entries are evicted least recently used first
+once the store holds `capacity` keys.
+
+    python cache_server.py [--socket /tmp/social-skills-cache.sock] [--capacity 10000]
+
+Then set CONVERSATION_CACHE_BACKEND=socket and
+CONVERSATION_CACHE_URL=unix:///tmp/social-skills-cache.sock for the API.
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from cache import CacheProtocolError, read_message
+from ratelimit import GCRA_SCRIPT, gcra, script_sha
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def _simple(text):
+    return b"+%s\r\n" % text
+
+def _error(text):
+    return b"-ERR %s\r\n" % text.encode()
+
+def _integer(value):
+    return b":%d\r\n" % value
+
+def _bulk(value):
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+def _array(items):
+    return b"*%d\r\n" % len(items) + b"".join(items)
+
+class Store:
+    """Thread-safe LRU store of bytes values with optional expiry."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()  # {key: (value, expires_at or None)}
+        self.lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= now:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self.lock:
+            return [self._live(key, now) for key in keys]
+
+    def set(self, key, value, ttl=None, only_new=False):
+        """Store value; with only_new, only if key is absent. Returns whether it was stored."""
+        now = time.monotonic()
+        expires_at = now + ttl if ttl is not None else None
+        with self.lock:
+            if only_new and self._live(key, now) is not None:
+                return False
+            self.entries.pop(key, None)
+            while len(self.entries) >= self.capacity:
+                self.entries.popitem(last=False)
+            self.entries[key] = (value, expires_at)
+            return True
+
+    def update(self, key, fn):
+        """
+        Read, modify and write key atomically.
+
+        Args:
+            fn: Function (value or None) -> (new value or None to leave it, ttl, result)
+
+        Returns:
+            The result from fn
+        """
+        now = time.monotonic()
+        with self.lock:
+            value, ttl, result = fn(self._live(key, now))
+            if value is not None:
+                self.entries.pop(key, None)
+                while len(self.entries) >= self.capacity:
+                    self.entries.popitem(last=False)
+                self.entries[key] = (value, now + ttl if ttl is not None else None)
+            return result
+
+    def delete(self, keys):
+        with self.lock:
+            return sum(self.entries.pop(key, None) is not None for key in keys)
+
+    def size(self):
+        with self.lock:
+            return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+def run_gcra(store, keys, args):
+    """Native GCRA_SCRIPT: one rate limit check with the server's clock."""
+    interval, burst, cost = float(args[0]), float(args[1]), float(args[2])
+
+    def check(value):
+        now = time.time()
+        allowed, new_tat, retry_after, reset_after = gcra(float(value) if value else None, now, interval, burst, cost)
+        if not allowed:
+            return None, None, _array([_integer(0), _bulk(repr(retry_after).encode()), _bulk(repr(reset_after).encode())])
+        return repr(new_tat).encode(), new_tat - now, _array([_integer(1), _bulk(b"0"), _bulk(repr(reset_after).encode())])
+
+    return store.update(keys[0], check)
+
+# Scripts the server runs natively for EVAL and EVALSHA, by the SHA-1 of their Lua source
+SCRIPTS = {script_sha(GCRA_SCRIPT): run_gcra}
+
+class CacheRequestHandler(socketserver.StreamRequestHandler):
+    """Serve commands from one connection until it is closed."""
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            try:
+                command = read_message(self.rfile)
+            except (ConnectionError, OSError):
+                return
+            except (CacheProtocolError, ValueError) as e:
+                self.wfile.write(_error(f"Protocol error: {str(e)}"))
+                return
+
+            if not isinstance(command, list) or not command:
+                self.wfile.write(_error("Expected a command array"))
+                continue
+            name, args = command[0].upper(), command[1:]
+
+            if name == b"QUIT":
+                self.wfile.write(_simple(b"OK"))
+                return
+            self.wfile.write(self.execute(store, name, args))
+
+    def execute(self, store, name, args):
+        if name == b"PING":
+            return _simple(b"PONG")
+        if name == b"GET" and len(args) == 1:
+            return _bulk(store.get_many(args)[0])
+        if name == b"MGET" and args:
+            values = store.get_many(args)
+            return b"*%d\r\n" % len(values) + b"".join(_bulk(value) for value in values)
+        if name == b"SET" and len(args) >= 2:
+            ttl = None
+            only_new = False
+            options = [option.upper() for option in args[2:]]
+            position = 0
+            while position < len(options):
+                option = options[position]
+                if option == b"NX":
+                    only_new = True
+                    position += 1
+                elif option in (b"EX", b"PX") and position + 1 < len(options):
+                    try:
+                        ttl = int(options[position + 1]) / (1 if option == b"EX" else 1000)
+                    except ValueError:
+                        return _error("Value is not an integer")
+                    position += 2
+                else:
+                    return _error("Syntax error")
+            if not store.set(args[0], args[1], ttl, only_new):
+                return _bulk(None)
+            return _simple(b"OK")
+        if name == b"DEL" and args:
+            return _integer(store.delete(args))
+        if name in (b"EVAL", b"EVALSHA") and len(args) >= 2:
+            sha = hashlib.sha1(args[0]).hexdigest() if name == b"EVAL" else args[0].decode(errors='replace').lower()
+            script = SCRIPTS.get(sha)
+            if script is None:
+                return b"-NOSCRIPT No matching script\r\n"
+            try:
+                count = int(args[1])
+                return script(store, args[2:2 + count], args[2 + count:])
+            except (ValueError, IndexError):
+                return _error("Wrong arguments for script")
+        if name == b"DBSIZE":
+            return _integer(store.size())
+        if name in (b"FLUSHDB", b"FLUSHALL"):
+            store.clear()
+            return _simple(b"OK")
+        if name == b"SELECT" and args == [b"0"]:
+            return _simple(b"OK")
+        return _error(f"Unknown command or wrong number of arguments for '{name.decode(errors='replace')}'")
+
+class CacheServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix-socket cache server.
+
+    Args:
+        path: Socket path; an existing socket file is replaced
+        capacity: Maximum number of keys
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, capacity=10000):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.path = path
+        self.store = Store(capacity)
+        super().__init__(path, CacheRequestHandler)
+
+    def start(self):
+        """Serve in a background thread (for tests and benchmarks)."""
+        thread = threading.Thread(target=self.serve_forever, name='cache-server', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stop serving and remove the socket file."""
+        self.shutdown()
+        self.server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the shared conversation cache store.")
+    parser.add_argument('--socket', default='/tmp/social-skills-cache.sock', help="Unix socket path")
+    parser.add_argument('--capacity', type=int, default=10000, help="Maximum number of cached entries")
+    args = parser.parse_args()
+
+    server = CacheServer(args.socket, args.capacity)
+    logger.info(f"Cache server listening on {args.socket} (capacity {args.capacity})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
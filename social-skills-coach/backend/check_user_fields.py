@@ -3,9 +3,12 @@
 Script to check User model fields after migration.
 """
 
-from app import app, db, User
+from factory import create_app
+from models import db, User
 from datetime import date
 
+app = create_app(subsystems=())
+
 def check_user_fields():
     """Check User model fields after migration."""
     print("Checking User model fields after migration...")
@@ -2,7 +2,10 @@
 Script to check users in the database.
 """
 
-from app import app, db, User
+from factory import create_app
+from models import db, User
+
+app = create_app(subsystems=())
 
 def list_users():
     """List all users in the database."""
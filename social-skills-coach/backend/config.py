@@ -11,15 +11,147 @@ load_dotenv()
 
 # OpenAI API Configuration
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-3.5-turbo')
+# OpenAI-compatible API endpoint, e.g. http://127.0.0.1:8765/v1 for fake_llm_server.py (default: api.openai.com)
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None
+# Model per conversation category, e.g. "small_talk=gpt-4o-mini,dating=gpt-4o" (others use OPENAI_MODEL)
+CONVERSATION_MODELS = dict(
+    route.split('=', 1) for route in os.environ.get('CONVERSATION_MODELS', '').replace(' ', '').split(',') if route
+)
+
+# LLM provider: 'openai', 'mock' or 'stub' (default: openai with an API key, mock without)
+LLM_PROVIDER = os.environ.get('LLM_PROVIDER', '').lower()
+# Running fake_llm_server.py for the stub provider; empty starts one in each worker
+LLM_STUB_URL = os.environ.get('LLM_STUB_URL') or None
+# In-process stub: seconds before the first word and between words
+LLM_STUB_LATENCY = float(os.environ.get('LLM_STUB_LATENCY', 0.5))
+LLM_STUB_TOKEN_DELAY = float(os.environ.get('LLM_STUB_TOKEN_DELAY', 0.02))
+# In-process stub: fraction of requests failed with LLM_STUB_ERROR_STATUS
+LLM_STUB_ERROR_RATE = float(os.environ.get('LLM_STUB_ERROR_RATE', 0))
+LLM_STUB_ERROR_STATUS = int(os.environ.get('LLM_STUB_ERROR_STATUS', 503))
 
 # JWT Configuration
 JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'dev-key-not-for-production')
 
 # Request timeout configuration (seconds)
 REQUEST_TIMEOUT = int(os.environ.get('REQUEST_TIMEOUT', 10))
+# Conversation requests per minute for anonymous and free users (paid tiers get more, see RATE_LIMIT_POLICIES)
+CONVERSATION_RATE_LIMIT = int(os.environ.get('CONVERSATION_RATE_LIMIT', 10))
+
+# OpenAI HTTP transport: connections per pool, idle connections kept alive and for how long (seconds)
+OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 100))
+OPENAI_MAX_KEEPALIVE = int(os.environ.get('OPENAI_MAX_KEEPALIVE', 20))
+OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get('OPENAI_KEEPALIVE_EXPIRY', 30))
+# Negotiate HTTP/2 with the API (only if the h2 package is installed)
+OPENAI_HTTP2 = os.environ.get('OPENAI_HTTP2', 'True').lower() in ('true', '1', 't')
+# Seconds to connect, and for one attempt; all attempts of a call share REQUEST_TIMEOUT
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', 2))
+OPENAI_ATTEMPT_TIMEOUT = float(os.environ.get('OPENAI_ATTEMPT_TIMEOUT', 5))
+# Attempts per call (timeouts, connection errors, 408/409/429/5xx) and the backoff bounds (seconds)
+OPENAI_MAX_ATTEMPTS = int(os.environ.get('OPENAI_MAX_ATTEMPTS', 3))
+OPENAI_RETRY_BASE_DELAY = float(os.environ.get('OPENAI_RETRY_BASE_DELAY', 0.25))
+OPENAI_RETRY_MAX_DELAY = float(os.environ.get('OPENAI_RETRY_MAX_DELAY', 2))
+# Failed calls in a row that open the circuit breaker, and seconds before it lets a probe through
+OPENAI_BREAKER_THRESHOLD = int(os.environ.get('OPENAI_BREAKER_THRESHOLD', 5))
+OPENAI_BREAKER_RESET = float(os.environ.get('OPENAI_BREAKER_RESET', 30))
+
+# Practice sessions: token budget of each prompt (system prompt, summary, recent turns and the message)
+SESSION_CONTEXT_TOKENS = int(os.environ.get('SESSION_CONTEXT_TOKENS', 1500))
+# Tokens of that budget reserved for the rolling summary of older turns
+SESSION_SUMMARY_TOKENS = int(os.environ.get('SESSION_SUMMARY_TOKENS', 300))
+# How older turns are summarized: 'extractive' (locally, first sentences) or 'llm' (one model call per compaction)
+SESSION_SUMMARIZER = os.environ.get('SESSION_SUMMARIZER', 'extractive')
+
+# Store conversations through the write-behind queue (write_behind.py) instead of before responding
+WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'False').lower() in ('true', '1', 't')
+# Journal of the write-behind queue (SQLite file shared by the workers of one host)
+WRITE_BEHIND_PATH = os.environ.get('WRITE_BEHIND_PATH', '/tmp/social-skills-write-behind.db')
+# Records the journal may hold; beyond it requests wait, then store synchronously
+WRITE_BEHIND_MAX_PENDING = int(os.environ.get('WRITE_BEHIND_MAX_PENDING', 10000))
+# Seconds a request waits for room in a full journal
+WRITE_BEHIND_PUT_TIMEOUT = float(os.environ.get('WRITE_BEHIND_PUT_TIMEOUT', 0.5))
+# Records stored per transaction, and seconds between flushes while records trickle in
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 500))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL', 0.2))
+# fsync every append, so records also survive a power loss (not only a crash of the process)
+WRITE_BEHIND_DURABLE = os.environ.get('WRITE_BEHIND_DURABLE', 'False').lower() in ('true', '1', 't')
 
 # Conversation cache size
 CONVERSATION_CACHE_SIZE = int(os.environ.get('CONVERSATION_CACHE_SIZE', 100))
+# Conversation cache backend: 'memory' (per process) or 'socket' (shared, see cache.py)
+CONVERSATION_CACHE_BACKEND = os.environ.get('CONVERSATION_CACHE_BACKEND', 'memory')
+# Store for the shared backend: unix:///path (cache_server.py) or redis://host:port/db
+CONVERSATION_CACHE_URL = os.environ.get('CONVERSATION_CACHE_URL', 'unix:///tmp/social-skills-cache.sock')
+# Seconds before cache entries expire (0 keeps them until evicted)
+CONVERSATION_CACHE_TTL = int(os.environ.get('CONVERSATION_CACHE_TTL', 0))
+# Byte budget for the cached response text of the memory backend (0 for no limit)
+CONVERSATION_CACHE_MAX_BYTES = int(os.environ.get('CONVERSATION_CACHE_MAX_BYTES', 0))
+# Admission policy of the memory backend: 'none', 'tinylfu' or 'w-tinylfu'
+CONVERSATION_CACHE_ADMISSION = os.environ.get('CONVERSATION_CACHE_ADMISSION', 'none')
+# Independently locked segments of the memory backend
+CONVERSATION_CACHE_SHARDS = int(os.environ.get('CONVERSATION_CACHE_SHARDS', 1))
+# Semantic cache for near-duplicate prompts, checked after the exact-match cache
+SEMANTIC_CACHE_ENABLED = os.environ.get('SEMANTIC_CACHE_ENABLED', 'False').lower() in ('true', '1', 't')
+# Minimum cosine similarity (0-1) for a semantic cache hit
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', 0.9))
+# Semantic cache entries kept per category
+SEMANTIC_CACHE_SIZE = int(os.environ.get('SEMANTIC_CACHE_SIZE', 500))
+# Seconds a request waits for an identical in-flight conversation request
+SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT', REQUEST_TIMEOUT + 5))
+# Coalesce identical requests across workers through the store at CONVERSATION_CACHE_URL
+SINGLE_FLIGHT_SHARED = os.environ.get('SINGLE_FLIGHT_SHARED', 'False').lower() in ('true', '1', 't')
+
+# Rate limit counters: 'memory' (per process) or 'socket' (shared by all workers, see ratelimit.py)
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+# Store for the shared backend: unix:///path (cache_server.py) or redis://host:port/db
+RATE_LIMIT_URL = os.environ.get('RATE_LIMIT_URL', CONVERSATION_CACHE_URL)
+# Independently locked segments of the memory backend
+RATE_LIMIT_SHARDS = int(os.environ.get('RATE_LIMIT_SHARDS', 16))
+# Requests per period for each endpoint and client class: 'anonymous', a tier, 'authenticated'
+# (any signed-in user) or '*' (anyone); "N/seconds" or {"limit": N, "period": seconds, "burst": N}
+RATE_LIMIT_POLICIES = {
+    'conversation': {
+        'anonymous': f'{CONVERSATION_RATE_LIMIT}/60',
+        'free': f'{CONVERSATION_RATE_LIMIT}/60',
+        'basic': f'{3 * CONVERSATION_RATE_LIMIT}/60',
+        'premium': f'{6 * CONVERSATION_RATE_LIMIT}/60'
+    },
+    'practice_session': {
+        'free': f'{CONVERSATION_RATE_LIMIT}/60',
+        'basic': f'{3 * CONVERSATION_RATE_LIMIT}/60',
+        'premium': f'{6 * CONVERSATION_RATE_LIMIT}/60'
+    },
+    'practice': {'*': '30/60'},
+    'feedback': {'anonymous': '30/60', 'authenticated': '120/60'},
+    'login': {'*': {'limit': 10, 'period': 60, 'burst': 5}},
+    'register': {'*': '5/600'}
+}
+# In-flight LLM calls per worker for each client class (0 or absent: no cap); paid tiers are not capped
+LLM_CONCURRENCY = {
+    'anonymous': int(os.environ.get('LLM_CONCURRENCY_ANONYMOUS', 32)),
+    'free': int(os.environ.get('LLM_CONCURRENCY_FREE', 64))
+}
+# JSON file ({"limits": ..., "llm_concurrency": ...}) overriding those entries, reloaded when it changes
+RATE_LIMIT_POLICY_FILE = os.environ.get('RATE_LIMIT_POLICY_FILE') or None
+# Seconds between checks of the policy file for changes
+RATE_LIMIT_POLICY_RELOAD = float(os.environ.get('RATE_LIMIT_POLICY_RELOAD', 5))
+# Seconds a user's tier is cached for the rate limit checks
+RATE_LIMIT_TIER_TTL = float(os.environ.get('RATE_LIMIT_TIER_TTL', 60))
+
+# Maximum number of inputs accepted by /api/feedback/batch
+FEEDBACK_BATCH_MAX_SIZE = int(os.environ.get('FEEDBACK_BATCH_MAX_SIZE', 100))
+
+# Sentiment engine: 'textblob' or 'lexicon' (vectorized, same lexicon as TextBlob)
+SENTIMENT_ENGINE = os.environ.get('SENTIMENT_ENGINE', 'textblob')
+# Sentiment analysis executor: 'inline', 'thread' or 'process'
+SENTIMENT_EXECUTOR = os.environ.get('SENTIMENT_EXECUTOR', 'inline')
+SENTIMENT_WORKERS = int(os.environ.get('SENTIMENT_WORKERS', 2))
+# Seconds to wait for a pooled analysis before using the fallback heuristic
+SENTIMENT_TIMEOUT = float(os.environ.get('SENTIMENT_TIMEOUT', 2.0))
+# Queued analyses allowed before new requests use the fallback heuristic
+SENTIMENT_MAX_PENDING = int(os.environ.get('SENTIMENT_MAX_PENDING', SENTIMENT_WORKERS * 4))
+# multiprocessing start method for the process pool
+SENTIMENT_START_METHOD = os.environ.get('SENTIMENT_START_METHOD', 'spawn')
 
 # Database Configuration
 DB_USER = os.environ.get('DB_USER', 'postgres')
@@ -39,11 +171,53 @@ else:
 
 # Additional SQLAlchemy Settings
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+# Database URL for the async serving mode (asgi.py); by default SQLALCHEMY_DATABASE_URI with the asyncpg or aiosqlite driver
+ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL') or None
 
 # Application Settings
 DEBUG = os.environ.get('DEBUG', 'False').lower() in ('true', '1', 't')
 HOST = os.environ.get('HOST', '0.0.0.0')
 PORT = int(os.environ.get('PORT', 8000))
+# Subsystems built by create_app() by default (see factory.SUBSYSTEMS)
+APP_SUBSYSTEMS = tuple(
+    name.strip() for name in os.environ.get('APP_SUBSYSTEMS', 'api,sentiment,stripe,migrate').split(',') if name.strip()
+)
+# Load the OpenAI client, Stripe SDK and sentiment engine before serving (app.warm_up)
+PREWARM = os.environ.get('PREWARM', 'True').lower() in ('true', '1', 't')
+# Threads that run the Flask routes not served on the event loop in the async serving mode (asgi.py)
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+
+# Metrics (/metrics, see metrics.py): directory where each worker writes its series for the
+# others to add up, needed with several gunicorn workers; empty serves this process's only
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+# Seconds between writes of a worker's series to METRICS_DIR
+METRICS_WRITE_INTERVAL = float(os.environ.get('METRICS_WRITE_INTERVAL', 5))
+# Upper bounds (seconds) of the exported histogram buckets
+METRICS_BUCKETS = tuple(
+    float(bound) for bound in os.environ.get('METRICS_BUCKETS', '0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10').split(',')
+)
+
+# Tracing (see tracing.py): where sampled spans go, 'none', 'file' (JSON lines) or 'otlp' (OTLP/HTTP collector)
+TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER', 'none')
+# File the 'file' exporter appends to
+TRACE_FILE = os.environ.get('TRACE_FILE', '/tmp/social-skills-traces.jsonl')
+# Collector base URL for the 'otlp' exporter (spans are posted to /v1/traces)
+TRACE_OTLP_URL = os.environ.get('TRACE_OTLP_URL', 'http://127.0.0.1:4318')
+# Fraction of requests traced; 1% keeps the overhead well under 1% of request time
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+# service.name of the exported spans
+TRACE_SERVICE_NAME = os.environ.get('TRACE_SERVICE_NAME', 'social-skills-coach')
+# Finished spans held for export before new ones are dropped
+TRACE_MAX_QUEUE = int(os.environ.get('TRACE_MAX_QUEUE', 2048))
+# Spans per export
+TRACE_BATCH_SIZE = int(os.environ.get('TRACE_BATCH_SIZE', 512))
+# Seconds between exports
+TRACE_EXPORT_INTERVAL = float(os.environ.get('TRACE_EXPORT_INTERVAL', 1.0))
+
+# SQL statements slower than this many seconds are logged with the code that ran them (see query_log.py)
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_SECONDS', 0.1))
+# Fail calls that run more statements than their @query_budget, rather than log them (always on when the app is testing)
+QUERY_BUDGET_ENFORCE = os.environ.get('QUERY_BUDGET_ENFORCE', 'False').lower() in ('true', '1', 't')
 
 # Stripe Configuration
 STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY')
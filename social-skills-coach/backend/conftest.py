@@ -0,0 +1,70 @@
+"""
+Shared pytest fixtures for the API tests.
+
+    app       API app on an in-memory database with the users in USERS
+    make_app  make_app(**config_overrides) creates such an app, e.g. on a database file
+    auth      auth(app, email) returns the Authorization header of a user (learner by default)
+    llm       fake_llm_server.FakeLLMServer answering the conversations through the
+              stub provider (LLM_PROVIDER=stub, LLM_STUB_URL)
+"""
+
+import os
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('OPENAI_API_KEY', '')  # Empty key selects the mock responses
+
+import pytest
+from flask_jwt_extended import create_access_token
+from passlib.hash import sha256_crypt
+from sqlalchemy import insert
+import config
+import resources
+from factory import create_app
+from fake_llm_server import FakeLLMServer
+from models import db, User
+
+# Email and tier of the users every test app starts with; their password is "password123"
+USERS = {
+    "learner@example.com": 'premium',
+    "other@example.com": 'premium',
+    "basic@example.com": 'basic',
+    "free@example.com": 'free'
+}
+
+# Hashed once: the hash takes about 0.4 s, and every test app has all the users
+PASSWORD_HASH = sha256_crypt.hash("password123")
+
+@pytest.fixture
+def make_app():
+    def make_app(**config_overrides):
+        app = create_app(subsystems=['api'], config_overrides={'SQLALCHEMY_DATABASE_URI': 'sqlite://', **config_overrides})
+        with app.app_context():
+            db.create_all()
+            if not User.query.count():  # A database file keeps them between apps
+                db.session.execute(insert(User), [{"email": email, "password_hash": PASSWORD_HASH, "tier": tier}
+                                                  for email, tier in USERS.items()])
+                db.session.commit()
+        return app
+    return make_app
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+@pytest.fixture
+def auth():
+    def auth(app, email="learner@example.com"):
+        with app.app_context():
+            return {"Authorization": f"Bearer {create_access_token(identity=email)}"}
+    return auth
+
+@pytest.fixture
+def llm(monkeypatch):
+    server = FakeLLMServer()
+    server.start()
+    monkeypatch.setattr(config, 'LLM_PROVIDER', 'stub')
+    monkeypatch.setattr(config, 'LLM_STUB_URL', server.url)
+    monkeypatch.setattr(resources, '_llm_providers', {})  # The stub is created on first use, for this server
+    yield server
+    for provider in resources._llm_providers.values():
+        provider.close()
+    server.stop()
@@ -6,11 +6,9 @@ This will create all necessary tables defined in the app models.
 
 import os
 import sys
-from datetime import date
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 import config
+import factory
+from models import db, User, Conversation, Feedback
 import sqlalchemy as sa
 from sqlalchemy import inspect
 import psycopg2
@@ -49,47 +47,9 @@ def test_connection():
         return False
 
 def create_app():
-    """Create a minimal Flask app for database operations."""
+    """Create a database-only Flask app with the shared models."""
     print("Creating Flask application...")
-    app = Flask(__name__)
-    
-    # Configure the SQLAlchemy database
-    app.config['SQLALCHEMY_DATABASE_URI'] = config.SQLALCHEMY_DATABASE_URI
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = config.SQLALCHEMY_TRACK_MODIFICATIONS
-    
-    # Initialize the database
-    db = SQLAlchemy(app)
-    migrate = Migrate(app, db)
-    
-    # Define minimal models here to avoid circular imports
-    class User(db.Model):
-        __tablename__ = 'users'
-        id = db.Column(db.Integer, primary_key=True)
-        email = db.Column(db.String(120), unique=True, nullable=False)
-        password_hash = db.Column(db.String(255), nullable=False)
-        
-        # Subscription related fields
-        stripe_customer_id = db.Column(db.String(255), nullable=True)
-        subscription_id = db.Column(db.String(255), nullable=True)
-        subscription_status = db.Column(db.String(50), nullable=True)
-        tier = db.Column(db.String(50), default='free')
-        scenarios_accessed = db.Column(db.Integer, default=0)
-        last_reset = db.Column(db.Date, default=date.today)
-    
-    class Conversation(db.Model):
-        __tablename__ = 'conversations'
-        id = db.Column(db.Integer, primary_key=True)
-        user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-        timestamp = db.Column(db.DateTime, nullable=False)
-        user_input = db.Column(db.Text, nullable=False)
-        ai_response = db.Column(db.Text, nullable=False)
-    
-    class Feedback(db.Model):
-        __tablename__ = 'feedbacks'
-        id = db.Column(db.Integer, primary_key=True)
-        conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
-        feedback_text = db.Column(db.Text, nullable=False)
-    
+    app = factory.create_app(subsystems=())
     return app, db, User, Conversation, Feedback
 
 def create_tables(app, db):
@@ -125,6 +85,11 @@ def create_tables(app, db):
             else:
                 print("- Warning: Feedbacks table not created")
                 
+            if "user_progress_rollup" in table_names:
+                print("- User progress rollup table created successfully")
+            else:
+                print("- Warning: User progress rollup table not created")
+                
             return True
     except Exception as e:
         print(f"Error creating database tables: {str(e)}")
@@ -138,17 +103,8 @@ def create_test_user(app, db, User):
             if user_count == 0:
                 print("\nCreating test user...")
                 
-                # Import passlib for password hashing
-                from passlib.hash import sha256_crypt
-                
-                # Create new user
-                test_user = User(
-                    email="test@example.com",
-                    password_hash=sha256_crypt.hash("password123"),
-                    tier='free',
-                    scenarios_accessed=0,
-                    last_reset=date.today()
-                )
+                # Create new user (free tier, password hashed by the model)
+                test_user = User(email="test@example.com", password="password123")
                 db.session.add(test_user)
                 db.session.commit()
                 print("Test user created successfully:")
@@ -0,0 +1,242 @@
+"""
+Application factory for the Social Skills Coach API.
+
+create_app() builds an independent Flask app with only the subsystems the
+caller asks for. The database is always set up; everything else is opt-in:
+
+    api        REST resources, JWT, CORS, the conversation cache, the rate limiter, /metrics,
+               request tracing and the query log
+    sentiment  Sentiment analyzer (required by 'api')
+    stripe     Stripe webhook route
+    migrate    Flask-Migrate, for the `flask db` commands
+
+Per-app state lives in app.extensions, so several apps can run side by side
+in one process (tests, benchmarks) without sharing caches or counters.
+"""
+
+from flask import Flask
+import atexit
+from datetime import timedelta
+import config
+from models import db
+import time
+import logging
+import tracing  # Adds trace_id to log records before the format below uses it
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SUBSYSTEMS = ('api', 'sentiment', 'stripe', 'migrate')
+
+# Subsystems pulled in by another subsystem
+SUBSYSTEM_DEPENDENCIES = {'api': ('sentiment',)}
+
+def resolve_subsystems(subsystems):
+    """
+    Validate subsystem names and add their dependencies.
+
+    Args:
+        subsystems: Iterable of names from SUBSYSTEMS
+
+    Returns:
+        frozenset: The subsystems to build
+    """
+    resolved = set()
+    pending = list(subsystems)
+    while pending:
+        name = pending.pop()
+        if name not in SUBSYSTEMS:
+            raise ValueError(f"Unknown subsystem '{name}'. Available subsystems: {', '.join(SUBSYSTEMS)}")
+        if name not in resolved:
+            resolved.add(name)
+            pending.extend(SUBSYSTEM_DEPENDENCIES.get(name, ()))
+    return frozenset(resolved)
+
+def create_app(subsystems=None, config_overrides=None):
+    """
+    Create a Flask app with the given subsystems.
+
+    Args:
+        subsystems: Names from SUBSYSTEMS, config.APP_SUBSYSTEMS if None
+        config_overrides: Extra Flask config, e.g. a SQLALCHEMY_DATABASE_URI per app
+
+    Returns:
+        Flask: The configured application
+    """
+    enabled = resolve_subsystems(config.APP_SUBSYSTEMS if subsystems is None else subsystems)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = config.SQLALCHEMY_DATABASE_URI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = config.SQLALCHEMY_TRACK_MODIFICATIONS
+    app.config['JWT_SECRET_KEY'] = config.JWT_SECRET_KEY
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
+    app.config.update(config_overrides or {})
+    app.config['SUBSYSTEMS'] = enabled
+
+    db.init_app(app)
+
+    if 'sentiment' in enabled:
+        from sentiment import SentimentAnalyzer
+
+        # Sentiment analysis runs inline or on a warm worker pool (see sentiment.py)
+        app.extensions['sentiment_analyzer'] = SentimentAnalyzer(
+            mode=config.SENTIMENT_EXECUTOR,
+            engine=config.SENTIMENT_ENGINE,
+            workers=config.SENTIMENT_WORKERS,
+            timeout=config.SENTIMENT_TIMEOUT,
+            max_pending=config.SENTIMENT_MAX_PENDING,
+            start_method=config.SENTIMENT_START_METHOD
+        )
+
+    if 'api' in enabled:
+        from flask_cors import CORS
+        from flask_jwt_extended import JWTManager
+        from flask_restful import Api
+        from cache import SocketCache, create_cache, track_cache
+        from llm_providers import LLM_PROVIDERS
+        import metrics
+        import query_log
+        from ratelimit import create_rate_limiter
+        from rate_policies import PolicyEngine
+        from singleflight import SingleFlight
+        import resources
+
+        if config.LLM_PROVIDER and config.LLM_PROVIDER not in LLM_PROVIDERS:
+            raise ValueError(f"Unknown LLM provider '{config.LLM_PROVIDER}'. Available providers: {', '.join(LLM_PROVIDERS)}")
+
+        CORS(app)  # Enable CORS for all routes
+        JWTManager(app)
+        app.extensions['conversation_cache'] = create_cache(
+            config.CONVERSATION_CACHE_BACKEND,
+            capacity=config.CONVERSATION_CACHE_SIZE,
+            url=config.CONVERSATION_CACHE_URL,
+            ttl=config.CONVERSATION_CACHE_TTL or None,
+            max_bytes=config.CONVERSATION_CACHE_MAX_BYTES or None,
+            admission=None if config.CONVERSATION_CACHE_ADMISSION == 'none' else config.CONVERSATION_CACHE_ADMISSION,
+            shards=config.CONVERSATION_CACHE_SHARDS
+        )
+        track_cache(app.extensions['conversation_cache'], 'conversation')
+        if config.SEMANTIC_CACHE_ENABLED:
+            from semantic_cache import SemanticCache
+
+            app.extensions['semantic_cache'] = SemanticCache(
+                threshold=config.SEMANTIC_CACHE_THRESHOLD,
+                capacity=config.SEMANTIC_CACHE_SIZE
+            )
+            track_cache(app.extensions['semantic_cache'], 'semantic')
+        # Identical concurrent cache misses make one upstream call (see singleflight.py)
+        app.extensions['single_flight'] = SingleFlight(
+            shared=SocketCache(config.CONVERSATION_CACHE_URL, prefix='flight:') if config.SINGLE_FLIGHT_SHARED else None,
+            shared_errors=(resources.LLMCapacityExceeded,)  # A 503 in every worker, not a fallback reply
+        )
+        # GCRA limits, per app or shared by all workers (see ratelimit.py)
+        app.extensions['rate_limiter'] = create_rate_limiter(
+            config.RATE_LIMIT_BACKEND,
+            url=config.RATE_LIMIT_URL,
+            shards=config.RATE_LIMIT_SHARDS
+        )
+        # Limits per endpoint and tier, and LLM concurrency caps (see rate_policies.py)
+        app.extensions['rate_policies'] = PolicyEngine(
+            app.extensions['rate_limiter'],
+            config.RATE_LIMIT_POLICIES,
+            config.LLM_CONCURRENCY,
+            path=config.RATE_LIMIT_POLICY_FILE,
+            reload_interval=config.RATE_LIMIT_POLICY_RELOAD,
+            tier_ttl=config.RATE_LIMIT_TIER_TTL
+        )
+        app.after_request(resources.rate_limit_headers)
+        # Handler and stage timings, served at /metrics (see metrics.py)
+        metrics.instrument_commits()
+        if config.METRICS_DIR:
+            metrics.REGISTRY.start_writer(config.METRICS_DIR, config.METRICS_WRITE_INTERVAL)
+        app.register_blueprint(resources.metrics_routes)
+        # Trace IDs for every request, spans for a sample of them (see tracing.py)
+        app.extensions['tracer'] = tracing.create_tracer(
+            config.TRACE_EXPORTER,
+            path=config.TRACE_FILE,
+            url=config.TRACE_OTLP_URL,
+            service_name=config.TRACE_SERVICE_NAME,
+            sample_rate=config.TRACE_SAMPLE_RATE,
+            max_queue=config.TRACE_MAX_QUEUE,
+            batch_size=config.TRACE_BATCH_SIZE,
+            export_interval=config.TRACE_EXPORT_INTERVAL
+        )
+        tracing.init_app(app, app.extensions['tracer'])
+        tracing.instrument_engines()
+        if app.extensions['tracer'].exporter is not None:
+            atexit.register(app.extensions['tracer'].close)  # Export the last spans
+        # Query counts per request, the slow-query log and query budgets (see query_log.py)
+        query_log.instrument_engines(config.SLOW_QUERY_SECONDS)
+        app.extensions['query_log'] = query_log.QueryLog(enforce_budgets=config.QUERY_BUDGET_ENFORCE)
+        query_log.init_app(app, app.extensions['query_log'])
+        if config.WRITE_BEHIND_ENABLED:
+            app.extensions['write_behind'] = create_write_behind(app)
+        resources.register_resources(Api(app))
+
+    if 'stripe' in enabled:
+        import resources
+
+        app.register_blueprint(resources.stripe_webhooks)
+
+    if 'migrate' in enabled:
+        from flask_migrate import Migrate
+
+        Migrate(app, db)
+
+    return app
+
+def create_write_behind(app):
+    """
+    Create the write-behind queue that stores app's conversations (see write_behind.py).
+
+    It is closed at exit, flushing what it can; the rest is flushed when the
+    next worker starts.
+    """
+    from write_behind import WriteBehindQueue
+    import resources
+
+    def flush(records):
+        with app.app_context():
+            resources.store_queued_conversations(records)
+
+    queue = WriteBehindQueue(
+        config.WRITE_BEHIND_PATH,
+        flush,
+        max_pending=config.WRITE_BEHIND_MAX_PENDING,
+        batch_size=config.WRITE_BEHIND_BATCH_SIZE,
+        flush_interval=config.WRITE_BEHIND_FLUSH_INTERVAL,
+        put_timeout=config.WRITE_BEHIND_PUT_TIMEOUT,
+        durable=config.WRITE_BEHIND_DURABLE
+    )
+    atexit.register(queue.close)
+    return queue
+
+def warm_up(app):
+    """
+    Load everything that is otherwise loaded on first use: the OpenAI client,
+    the LLM provider (starting the stub server, if any), the Stripe SDK and
+    the sentiment engine (starting its worker pool, if any), and the
+    write-behind flusher, which first stores what a previous run left in the
+    journal. Call it once per worker before it serves requests.
+
+    Args:
+        app: Application from create_app(); only its subsystems are loaded
+    """
+    start = time.time()
+    enabled = app.config['SUBSYSTEMS']
+    if 'api' in enabled:
+        from resources import get_llm_provider, get_openai_client
+        get_openai_client()
+        get_llm_provider().warm_up()
+        if 'write_behind' in app.extensions:
+            app.extensions['write_behind'].start()
+    if {'api', 'stripe'} & enabled:
+        import stripe_service
+        stripe_service.get_stripe()
+    if 'sentiment' in enabled:
+        app.extensions['sentiment_analyzer'].warm_up()
+    logger.info(f"Warmed up in {time.time() - start:.2f}s")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Fake OpenAI-compatible chat completions server.
+
+Answers POST /v1/chat/completions with a fixed reply, either as one JSON
+completion or, with "stream": true, as Server-Sent Events one word at a
+time, with configurable delays before the first word and between words.
+A fraction of requests can be failed with an HTTP error. Connections are
+kept alive between JSON completions. Used by the streaming and transport
+tests, by the 'stub' LLM provider (see llm_providers.py) and to measure
+time-to-first-byte without calling OpenAI.
+
+    python fake_llm_server.py [--port 8765] [--first-token-delay 0.3] [--token-delay 0.03] [--error-rate 0.05] [--error-status 503]
+
+Then set OPENAI_BASE_URL=http://127.0.0.1:8765/v1 and any OPENAI_API_KEY for the API.
+"""
+
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPLY = ("Try opening with a question about something you both share, like the event or the food. "
+                 "Listen to the answer, then follow up on one detail to show you are interested.")
+
+class FakeLLMRequestHandler(BaseHTTPRequestHandler):
+    """Serve chat completion requests with the server's reply."""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+        self.server.record(body)
+
+        status = self.server.failure_status()
+        if status:
+            self._send_json(status, {"error": {"message": "Fake upstream failure", "type": "server_error"}})
+            return
+
+        model = body.get('model', 'fake')
+        time.sleep(self.server.first_token_delay)
+        if body.get('stream'):
+            self._stream(model)
+        else:
+            time.sleep(self.server.token_delay * (len(self.server.tokens) - 1))
+            self._send_json(200, {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.server.reply},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(self.server.tokens), "total_tokens": len(self.server.tokens)}
+            })
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, model):
+        # The stream has no length; closing the connection ends it
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        def chunk(delta, finish_reason=None):
+            payload = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            self.wfile.write(b"data: %s\n\n" % json.dumps(payload).encode())
+            self.wfile.flush()
+
+        chunk({"role": "assistant", "content": ""})
+        for position, token in enumerate(self.server.tokens):
+            if position:
+                time.sleep(self.server.token_delay)
+            chunk({"content": token})
+        chunk({}, finish_reason="stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """
+    Fake chat completions server on localhost.
+
+    Args:
+        port: TCP port, 0 picks a free one
+        reply: Text of every completion
+        first_token_delay: Seconds before the first word
+        token_delay: Seconds between words
+        error_rate: Fraction of requests answered with fail_status
+        fail_status: HTTP status of failed requests
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024  # Load tests open hundreds of connections at once
+
+    def __init__(self, port=0, reply=DEFAULT_REPLY, first_token_delay=0.0, token_delay=0.0, error_rate=0.0, fail_status=500):
+        self.reply = reply
+        self.tokens = re.findall(r"\S+\s*", reply)
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.fail = False  # Answer every request with fail_status
+        self.fail_count = 0  # Answer this many of the next requests with fail_status
+        self.error_rate = error_rate
+        self.fail_status = fail_status
+        self.requests = []
+        self._lock = threading.Lock()
+        super().__init__(('127.0.0.1', port), FakeLLMRequestHandler)
+
+    @property
+    def url(self):
+        """Base URL for the OpenAI client (OPENAI_BASE_URL)."""
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def record(self, body):
+        with self._lock:
+            self.requests.append(body)
+
+    def failure_status(self):
+        """Return the status to fail the current request with, or None."""
+        with self._lock:
+            if self.fail:
+                return self.fail_status
+            if self.fail_count > 0:
+                self.fail_count -= 1
+                return self.fail_status
+        if self.error_rate and random.random() < self.error_rate:
+            return self.fail_status
+        return None
+
+    def start(self):
+        """Serve in a background thread (for tests and benchmarks)."""
+        thread = threading.Thread(target=self.serve_forever, name='fake-llm-server', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible chat completions server.")
+    parser.add_argument('--port', type=int, default=8765, help="TCP port on 127.0.0.1")
+    parser.add_argument('--first-token-delay', type=float, default=0.3, help="Seconds before the first word")
+    parser.add_argument('--token-delay', type=float, default=0.03, help="Seconds between words")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument('--error-status', type=int, default=503, help="HTTP status of failed requests")
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.port, first_token_delay=args.first_token_delay, token_delay=args.token_delay,
+                           error_rate=args.error_rate, fail_status=args.error_status)
+    logger.info(f"Fake LLM server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
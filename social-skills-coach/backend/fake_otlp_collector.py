@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Fake OpenTelemetry collector for the OTLP/HTTP JSON trace exporter.
+
+Accepts POST /v1/traces, keeps the spans it receives and logs one line per
+trace. Used by the tracing tests and to look at the API's spans without
+running a real collector.
+
+    python fake_otlp_collector.py [--port 4318] [--output spans.jsonl]
+
+Then set TRACE_EXPORTER=otlp and TRACE_OTLP_URL=http://127.0.0.1:4318 for the API.
+"""
+
+import argparse
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class FakeCollectorRequestHandler(BaseHTTPRequestHandler):
+    """Store the spans of export requests."""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/traces':
+            self.send_error(404)
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+        except ValueError:
+            self.send_error(400)
+            return
+        self.server.record(body)
+        data = b"{}"
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+class FakeOTLPCollector(ThreadingHTTPServer):
+    """
+    Fake OTLP/HTTP trace collector on localhost.
+
+    Args:
+        port: TCP port, 0 picks a free one
+        output: File to append the received spans to as JSON lines, None to keep them in memory only
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, output=None):
+        self.output = output
+        self.spans = []
+        self.requests = 0
+        self._lock = threading.Lock()
+        super().__init__(('127.0.0.1', port), FakeCollectorRequestHandler)
+
+    @property
+    def url(self):
+        """Base URL for the exporter (TRACE_OTLP_URL)."""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def record(self, body):
+        """Keep the spans of one export request, with their service name."""
+        spans = []
+        for resource_spans in body.get('resourceSpans', []):
+            attributes = resource_spans.get('resource', {}).get('attributes', [])
+            service = next((a['value'].get('stringValue') for a in attributes if a.get('key') == 'service.name'), None)
+            for scope_spans in resource_spans.get('scopeSpans', []):
+                spans.extend({"service": service, **span} for span in scope_spans.get('spans', []))
+        with self._lock:
+            self.requests += 1
+            self.spans.extend(spans)
+            if self.output:
+                with open(self.output, 'a') as f:
+                    f.write("".join(json.dumps(span) + "\n" for span in spans))
+        for trace_id in sorted({span.get('traceId') for span in spans}):
+            logger.info(f"Trace {trace_id}: {sum(1 for span in spans if span.get('traceId') == trace_id)} spans")
+
+    def start(self):
+        """Serve in a background thread (for tests)."""
+        thread = threading.Thread(target=self.serve_forever, name='fake-otlp-collector', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake OTLP/HTTP trace collector.")
+    parser.add_argument('--port', type=int, default=4318, help="TCP port on 127.0.0.1")
+    parser.add_argument('--output', help="File to append the received spans to (JSON lines)")
+    args = parser.parse_args()
+
+    collector = FakeOTLPCollector(args.port, output=args.output)
+    logger.info(f"Fake OTLP collector listening on {collector.url}")
+    try:
+        collector.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.server_close()
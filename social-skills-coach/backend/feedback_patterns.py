@@ -0,0 +1,115 @@
+"""
+Feedback patterns for the Social Skills Coach API.
+
+Holds the keyword patterns used to flag communication habits and a
+precompiled matcher that finds all of them in a single scan of the text.
+"""
+
+import re
+
+# Keyword patterns for feedback enhancement
+FEEDBACK_PATTERNS = [
+    (r'\b(sorry|apologize|apologies)\b', "Try to avoid apologizing too much in your conversations. It can diminish your message."),
+    (r'\b(um|uh|like|you know)\b', "Try to reduce filler words to sound more confident and articulate."),
+    (r'\bi think\b', "Consider making more definitive statements instead of prefacing with 'I think' to sound more confident."),
+    (r'\b(cant|cannot|can\'t|won\'t|wont)\b', "Focus on what you can do rather than what you can't to maintain a positive tone."),
+    (r'\b(never|always)\b', "Avoid absolute terms like 'never' and 'always' as they can sound exaggerated or confrontational."),
+    (r'\b(maybe|perhaps|possibly)\b', "Too many qualifiers can make you sound uncertain. Be more direct when appropriate.")
+]
+
+def pattern_key(pattern):
+    """Return the stable key reported for a pattern, e.g. "never_always"."""
+    return pattern.replace(r'\b', '').replace('|', '_').replace('(', '').replace(')', '')
+
+def _literal_alternatives(pattern):
+    """
+    Split a pattern of the form r'\\b(a|b c)\\b' into its literal alternatives.
+
+    Returns None if the pattern uses anything other than escaped literals,
+    in which case the matcher searches for it separately.
+    """
+    if not (pattern.startswith(r'\b') and pattern.endswith(r'\b')):
+        return None
+    body = pattern[2:-2]
+    if body.startswith('(') and body.endswith(')'):
+        body = body[1:-1]
+    if re.search(r'[()\[\]{}*+?.^$]|\\\w', body):
+        return None
+    return [re.sub(r'\\(.)', r'\1', alternative) for alternative in body.split('|')]
+
+def _is_word_prefix(prefix, text):
+    """True if both \\b-delimited literals can match at the same position."""
+    return text.startswith(prefix) and (len(text) == len(prefix) or not (text[len(prefix)].isalnum() or text[len(prefix)] == '_'))
+
+class FeedbackPatternMatcher:
+    """
+    Find every matching feedback pattern with one pass over the text.
+
+    The literal patterns are combined into a single alternation with one
+    named group per pattern, guarded by a lookahead on the possible first
+    characters so most positions are rejected without trying any branch.
+    Patterns that are not plain literals, or whose alternatives could match
+    at the same position as another pattern's (and so be hidden by it),
+    are searched for individually to keep results identical to running
+    re.search for each pattern.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        self.keys = [pattern_key(pattern) for pattern, _ in patterns]
+        self.feedbacks = [feedback for _, feedback in patterns]
+
+        alternatives = [_literal_alternatives(pattern) for pattern, _ in patterns]
+        combined = []
+        self._separate = []
+        for index, (pattern, _) in enumerate(patterns):
+            shadowed = alternatives[index] is None or any(
+                _is_word_prefix(a, b) or _is_word_prefix(b, a)
+                for other, other_alternatives in enumerate(alternatives)
+                if other != index and other_alternatives is not None
+                for a in alternatives[index] for b in other_alternatives
+            )
+            if shadowed:
+                self._separate.append((index, re.compile(pattern)))
+            else:
+                combined.append(index)
+
+        self._regex = None
+        if combined:
+            first_chars = sorted({alternative[0] for index in combined for alternative in alternatives[index]})
+            branches = '|'.join(f"(?P<p{index}>{patterns[index][0][2:-2]})" for index in combined)
+            self._regex = re.compile(rf"\b(?=[{re.escape(''.join(first_chars))}])(?:{branches})\b")
+        self._combined_count = len(combined)
+
+    def match(self, text):
+        """
+        Return the indices of the patterns found in text, in pattern order.
+
+        Args:
+            text: Text to scan (matching is case-insensitive, as before)
+
+        Returns:
+            list: Indices into the pattern list
+        """
+        text_lower = text.lower()
+        found = set()
+        if self._regex is not None:
+            for match in self._regex.finditer(text_lower):
+                found.add(int(match.lastgroup[1:]))
+                if len(found) == self._combined_count:
+                    break
+        for index, regex in self._separate:
+            if regex.search(text_lower):
+                found.add(index)
+        return sorted(found)
+
+    def match_feedback(self, text):
+        """Return the feedback messages for the patterns found in text."""
+        return [self.feedbacks[index] for index in self.match(text)]
+
+    def match_keys(self, text):
+        """Return the keys of the patterns found in text."""
+        return [self.keys[index] for index in self.match(text)]
+
+# Shared matcher, compiled once at import
+feedback_matcher = FeedbackPatternMatcher(FEEDBACK_PATTERNS)
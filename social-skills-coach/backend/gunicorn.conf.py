@@ -0,0 +1,19 @@
+"""
+Gunicorn settings for the Social Skills Coach API.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Each worker imports the app without the OpenAI and Stripe SDKs or the
+sentiment lexicon, then loads them in post_worker_init, before it accepts
+its first request.
+"""
+
+# Not imported as "config": gunicorn reads every top-level name as a setting
+import config as app_config
+
+bind = f"{app_config.HOST}:{app_config.PORT}"
+
+def post_worker_init(worker):
+    if app_config.PREWARM:
+        import app
+        app.warm_up()
@@ -0,0 +1,334 @@
+"""
+Vectorized lexicon sentiment engine.
+
+Scores text with the same sentiment lexicon TextBlob's PatternAnalyzer uses
+(textblob/en/en-sentiment.xml), but without a per-word Python state machine:
+a batch of texts is tokenized with one regex pass, tokens are mapped to
+lexicon indices, and negation, intensifiers ("very good"), exclamation
+marks and the per-text averages are computed with NumPy array operations.
+
+Results agree with PatternAnalyzer to within a small tolerance (see
+test_lexicon_sentiment.py). Known differences are limited to emoticons:
+they are matched case-insensitively and a few spelled with several quotes
+are not recognized.
+"""
+
+import importlib.util
+import os
+import re
+from threading import Lock
+from xml.etree import ElementTree
+
+import numpy as np
+
+NEGATIONS = ("no", "not", "n't", "never")
+
+# Punctuation split from the start and end of words, as in TextBlob's tokenizer
+PUNCTUATION = ".,;:!?()[]{}`''\"@#$^&*+-|=~_"
+CONTRACTIONS_RE = re.compile(r"(n't|'d|'m|'s|'ll|'re|'ve)")
+QUOTES_RE = re.compile("([“”‘’'\"])")
+
+# Emoticons by polarity, as in TextBlob, plus "(!)" which marks irony
+EMOTICONS = {
+    +1.00: ("<3", "♥", ">:D", ":-D", ":D", "=-D", "=D", "X-D", "x-D", "XD", "xD", "8-D"),
+    +0.75: (">:P", ":-P", ":P", ":-p", ":p", ":-b", ":b", ":c)", ":o)", ":^)"),
+    +0.50: (">:)", ":-)", ":)", "=)", "=]", ":]", ":}", ":>", ":3", "8)", "8-)"),
+    +0.25: (">;]", ";-)", ";)", ";-]", ";]", ";D", ";^)", "*-)", "*)"),
+    +0.05: (">:o", ":-O", ":O", ":o", ":-o", "o_O", "o.O", "°O°", "°o°"),
+    -0.25: (">:/", ":-/", ":/", ":\\", ">:\\", ":-.", ":-s", ":s", ":S", ":-S", ">.>"),
+    -0.75: (">:[", ":-(", ":(", "=(", ":-[", ":[", ":{", ":-<", ":c", ":-c", "=/"),
+    -1.00: (":'(", ":'''(", ";'("),
+    0.00: ("(!)",)
+}
+
+# Separates texts in a batch; never appears in a tokenized text
+SEPARATOR = "\x00"
+
+def _spaced(emoticon):
+    """Every spelling of an emoticon with optional single spaces between characters."""
+    spellings = [emoticon[0]]
+    for char in emoticon[1:]:
+        spellings = [s + sep + char for s in spellings for sep in ("", " ")]
+    return spellings
+
+EMOTICON_SPELLINGS = {
+    spelling: emoticon.lower()
+    for emoticons in EMOTICONS.values() for emoticon in emoticons if not emoticon.isalpha()
+    for spelling in _spaced(emoticon.lower())
+}
+
+EMOTICON_POLARITY = {
+    emoticon.lower(): polarity for polarity, emoticons in EMOTICONS.items() for emoticon in emoticons
+}
+
+# Abbreviations keep their final period
+ABBREVIATIONS = (
+    "adj.", "adv.", "al.", "comp.", "conf.", "def.", "ed.", "esp.", "etc.", "ex.", "fig.",
+    "gen.", "id.", "int.", "med.", "mil.", "mr.", "orig.", "pl.", "pred.", "pres.", "ref.", "vs."
+)
+
+def _alternatives(strings):
+    return "|".join(map(re.escape, sorted(strings, key=len, reverse=True)))
+
+# An emoticon ending in punctuation is always split from what follows it, as
+# long as that is not the rest of "(!)"; other emoticons must end the word
+_edge = re.escape(PUNCTUATION)
+_emoticons_split = _alternatives(s for s in EMOTICON_SPELLINGS if s[-1] in PUNCTUATION and s[-1] != "(")
+_emoticons_open = _alternatives(s for s in EMOTICON_SPELLINGS if s[-1] == "(")
+_emoticons = _alternatives(s for s in EMOTICON_SPELLINGS if s[-1] not in PUNCTUATION)
+_abbreviations = "|".join(map(re.escape, ABBREVIATIONS))
+
+# One token per match: a batch separator, an emoticon, an abbreviation, a word
+# (inner punctuation is kept, as in "well-known"), an ellipsis or a punctuation mark
+TOKEN_RE = re.compile(
+    rf"\x00"
+    rf"|(?:{_emoticons_split})"
+    rf"|(?:{_emoticons_open})(?! ?! ?\))"
+    rf"|(?:{_emoticons})(?=[\s{_edge}]|$)"
+    rf"|(?:{_abbreviations}|(?:[a-z]\.)+)(?=[\s{_edge}]|$)"
+    rf"|[^\s{_edge}](?:\S*[^\s{_edge}])?"
+    rf"|\.\.\.+"
+    rf"|[{_edge}]"
+)
+
+# Token codes for words that are not in the lexicon
+UNKNOWN = -1
+NEGATION = -2
+EXCLAMATION = -3
+BREAK = -4
+
+def default_lexicon_path():
+    """Return the path of the en-sentiment.xml file bundled with TextBlob."""
+    spec = importlib.util.find_spec("textblob")
+    if spec is None or not spec.submodule_search_locations:
+        raise RuntimeError("TextBlob is not installed; pass the path to en-sentiment.xml explicitly")
+    return os.path.join(spec.submodule_search_locations[0], "en", "en-sentiment.xml")
+
+def _mean(values):
+    return sum(values) / float(len(values) or 1)
+
+def _load_senses(path):
+    """
+    Read the lexicon into {word: {pos: (polarity, subjectivity, intensity)}}.
+
+    Senses are averaged per part of speech, and adjectives are also entered
+    as "-ly" adverbs ("terrible" -> "terribly"), exactly as TextBlob does.
+    """
+    words = {}
+    for node in ElementTree.parse(path).getroot().findall("word"):
+        form = node.attrib.get("form")
+        if form:
+            words.setdefault(form, {}).setdefault(node.attrib.get("pos"), []).append((
+                float(node.attrib.get("polarity", 0.0)),
+                float(node.attrib.get("subjectivity", 0.0)),
+                float(node.attrib.get("intensity", 1.0))
+            ))
+
+    senses = {}
+    for form, by_pos in words.items():
+        senses[form] = {pos: tuple(_mean(column) for column in zip(*psi)) for pos, psi in by_pos.items()}
+        senses[form][None] = tuple(_mean(column) for column in zip(*senses[form].values()))
+
+    for form, by_pos in list(senses.items()):
+        if "JJ" in by_pos:
+            if form.endswith("y"):
+                form = form[:-1] + "i"
+            if form.endswith("le"):
+                form = form[:-2]
+            adverb = senses.setdefault(form + "ly", {})
+            adverb["RB"] = adverb[None] = by_pos["JJ"]
+    return senses
+
+class LexiconSentiment:
+    """
+    Polarity and subjectivity from a sentiment lexicon held in NumPy arrays.
+
+    Args:
+        path: Path to a TextBlob/Pattern sentiment XML file (defaults to the
+            English lexicon bundled with TextBlob)
+    """
+
+    def __init__(self, path=None):
+        senses = _load_senses(path or default_lexicon_path())
+        # Emoticons follow the words: (polarity, subjectivity, intensity) = (p, 1, 1)
+        emoticons = {
+            emoticon: (EMOTICON_POLARITY[emoticon], 1.0, 1.0) for emoticon in set(EMOTICON_SPELLINGS.values())
+        }
+        words = list(senses)
+        entries = words + [emoticon for emoticon in emoticons if emoticon not in senses]
+
+        self.index = {entry: i for i, entry in enumerate(entries)}
+        scores = np.array(
+            [senses[word][None] for word in words] + [emoticons[e] for e in entries[len(words):]],
+            dtype=np.float64
+        )
+        self.polarity = scores[:, 0].copy()
+        self.subjectivity = scores[:, 1].copy()
+        self.intensity = scores[:, 2].copy()
+        # Adverbs modify the next word ("very good"); "-ly" adverbs also take
+        # a following negation ("really not good")
+        self.is_modifier = np.array([entry in senses and "RB" in senses[entry] for entry in entries], dtype=bool)
+        self.is_ly = np.array([entry.endswith("ly") for entry in entries], dtype=bool)
+        # Emoticons are scored on their own, never modified or negated; like
+        # other short words, two-character ones keep a preceding modifier active
+        self.is_emoticon = np.arange(len(entries)) >= len(words)
+        self.is_short_emoticon = self.is_emoticon & np.array([len(entry) <= 2 for entry in entries], dtype=bool)
+
+        # Lexicon entries map to their index, other tokens to a negative code
+        self.codes = dict(self.index)
+        for spelling, emoticon in EMOTICON_SPELLINGS.items():
+            self.codes.setdefault(spelling, self.index[emoticon])
+        for word in NEGATIONS:
+            self.codes.setdefault(word, NEGATION)
+        self.codes.setdefault("!", EXCLAMATION)
+        self.codes[SEPARATOR] = BREAK
+
+    def tokenize(self, text):
+        """Split text into lowercase tokens the way TextBlob's tokenizer does."""
+        text = CONTRACTIONS_RE.sub(r" \1", text.lower())
+        return TOKEN_RE.findall(QUOTES_RE.sub(r" \1 ", text))
+
+    def analyze(self, text):
+        """
+        Return (polarity, subjectivity) for one text.
+
+        Args:
+            text: Text to analyze
+
+        Returns:
+            tuple: (polarity, subjectivity)
+        """
+        return self.analyze_many([text])[0]
+
+    def analyze_many(self, texts):
+        """
+        Return (polarity, subjectivity) for each text, in order.
+
+        All texts are tokenized together and scored with array operations,
+        so large batches cost little more per text than the tokenizing.
+
+        Args:
+            texts: List of texts
+
+        Returns:
+            list: (polarity, subjectivity) tuples
+        """
+        if not texts:
+            return []
+        polarity, subjectivity = self.score(texts)
+        return list(zip(polarity.tolist(), subjectivity.tolist()))
+
+    def score(self, texts):
+        """
+        Score a batch of texts.
+
+        Args:
+            texts: List of texts
+
+        Returns:
+            tuple: (polarity, subjectivity) float arrays with one entry per text
+        """
+        # Every text is followed by a separator token, so no state crosses texts
+        joined = f" {SEPARATOR} ".join(texts) + f" {SEPARATOR}"
+        if joined.count(SEPARATOR) != len(texts):
+            joined = "".join(text.replace(SEPARATOR, " ") + f" {SEPARATOR} " for text in texts)
+        tokens = self.tokenize(joined)
+        count = len(tokens)
+        codes = np.fromiter(map(self.codes.get, tokens, [UNKNOWN] * count), dtype=np.int64, count=count)
+        lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=count)
+        text_ids = np.cumsum(codes == BREAK) - (codes == BREAK)
+
+        known = codes >= 0
+        word = np.where(known, codes, 0)
+        unknown = ~known & (codes != BREAK)
+        negation = codes == NEGATION
+        is_modifier = known & self.is_modifier[word]
+        is_ly = known & self.is_ly[word]
+        is_emoticon = known & self.is_emoticon[word]
+        is_short_emoticon = known & self.is_short_emoticon[word]
+
+        # A modifier applies to the next known word, across words of two letters or less
+        modifier_breaks = (known & ~is_short_emoticon) | (codes == BREAK) | (unknown & (lengths > 2))
+        # ...and takes following negations if it is an "-ly" adverb ("really not good");
+        # each pass extends runs of attached negations by one
+        attached = np.zeros(count, dtype=bool)
+        while True:
+            before = _last_before(modifier_breaks & ~attached)
+            extended = negation & (before >= 0) & is_modifier[before] & is_ly[before]
+            if np.array_equal(extended, attached):
+                break
+            attached = extended
+        modified = known & ~is_emoticon & (before >= 0) & is_modifier[before]
+
+        # A negation applies to the next known word, across one-letter words
+        negation_breaks = known | (codes == BREAK) | (unknown & (lengths > 1)) | negation
+        before = _last_before(negation_breaks)
+        negated = known & ~is_emoticon & (before >= 0) & negation[before] & ~attached[before]
+
+        # Each known word not preceded by a modifier starts an assessment that
+        # runs through the words it modifies ("really very good"); a modified
+        # word after an emoticon continues the emoticon's assessment
+        starts = known & ~modified
+        assessment_of = np.cumsum(starts) - 1
+        total = int(starts.sum())
+        text_count = int(text_ids[-1]) + 1
+        if total == 0:
+            return np.zeros(text_count), np.zeros(text_count)
+        owner = text_ids[starts]
+
+        positions = np.flatnonzero(known)
+        chain = assessment_of[positions]
+        last = positions[np.append(chain[1:] != chain[:-1], True)]
+        previous = _last_before(known)[last]
+
+        # A modified word's scores are scaled by the previous word's intensity,
+        # inverted if that word was negated
+        p = self.polarity[word[last]]
+        s = self.subjectivity[word[last]]
+        chained = modified[last]
+        with np.errstate(divide='ignore'):
+            intensity = self.intensity[word[previous[chained]]]
+            intensity = np.where(negated[previous[chained]], 1.0 / intensity, intensity)
+        p[chained] = np.clip(p[chained] * intensity, -1.0, 1.0)
+        s[chained] = np.clip(s[chained] * intensity, -1.0, 1.0)
+
+        # Exclamation marks after an assessment's last word boost it by 25% each
+        exclamations = np.flatnonzero(codes == EXCLAMATION)
+        boosted = assessment_of[exclamations]
+        target = np.maximum(boosted, 0)
+        valid = (boosted >= 0) & (owner[target] == text_ids[exclamations]) & (last[target] < exclamations)
+        boosts = np.bincount(boosted[valid], minlength=total)
+        p = np.where(boosts > 0, np.clip(p * 1.25 ** boosts, -1.0, 1.0), p)
+
+        # "not good" = slightly bad, "not bad" = slightly good
+        is_negated = np.bincount(assessment_of[known & negated], minlength=total) > 0
+        attached_to = assessment_of[np.flatnonzero(attached)]
+        is_negated[attached_to[attached_to >= 0]] = True
+        p = np.where(is_negated, p * -0.5, p)
+
+        assessments = np.bincount(owner, minlength=text_count)
+        divisor = np.maximum(assessments, 1)
+        return (
+            np.bincount(owner, weights=p, minlength=text_count) / divisor,
+            np.bincount(owner, weights=s, minlength=text_count) / divisor
+        )
+
+def _last_before(mask):
+    """For each position, the index of the last earlier True in mask, or -1."""
+    marked = np.where(mask, np.arange(len(mask)), -1)
+    result = np.empty(len(mask), dtype=np.int64)
+    result[0] = -1
+    np.maximum.accumulate(marked[:-1], out=result[1:])
+    return result
+
+_engine = None
+_engine_lock = Lock()
+
+def get_engine():
+    """Return the shared engine, loading the lexicon on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = LexiconSentiment()
+    return _engine
@@ -0,0 +1,226 @@
+"""
+LLM providers: where conversation responses come from.
+
+Every provider answers chat completions through the same interface, one call
+at a time (complete), word by word (stream) or several at once (batch), each
+with an async counterpart for asgi.py:
+
+- MockProvider: canned replies picked by keywords, without any network
+  (the default without an OpenAI key);
+- OpenAIProvider: the OpenAI API through an openai_transport.OpenAIGateway
+  (pooling, retries, circuit breaker);
+- StubProvider: an OpenAI-compatible fake_llm_server.FakeLLMServer on
+  localhost, with configurable latency and injected errors, for load tests
+  and benchmarks. It starts the server in-process unless given a URL.
+
+resources.get_llm_provider() picks one per deployment (LLM_PROVIDER).
+"""
+
+import asyncio
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+LLM_PROVIDERS = ('openai', 'mock', 'stub')
+
+# Placeholder responses for conversation simulation
+MOCK_RESPONSES = {
+    "greeting": "Hello! I'm your social skills coach. What would you like to work on today?",
+    "nervousness": "It's completely normal to feel nervous in social situations. Start small by preparing a few conversation starters, focusing on open-ended questions about the event or shared interests. Remember that most people enjoy talking about themselves, so showing genuine interest can make conversations flow more naturally.",
+    "listening": "To improve active listening, try the RASA technique: Receive the information without interrupting, Appreciate what's being said with nodding or small verbal cues, Summarize their main points to confirm understanding, and Ask follow-up questions that show you were truly listening.",
+    "default": "That's an interesting point. Could you tell me more about how this affects your social interactions? I'm here to help you develop strategies that work for your specific situation."
+}
+
+def split_words(text):
+    """Split text into words with their trailing whitespace (for streaming canned text)."""
+    return re.findall(r"\S+\s*", text)
+
+class LLMProvider:
+    """
+    Interface of the providers.
+
+    Subclasses implement complete, stream, acomplete and astream; batch and
+    abatch run several completions concurrently on top of them.
+    """
+
+    name = None
+
+    def complete(self, messages, model, **params):
+        """
+        Return the assistant's reply to messages.
+
+        Args:
+            messages: Chat messages ({"role": ..., "content": ...})
+            model: Model name (ignored by the mock)
+            params: Generation parameters such as max_tokens and temperature
+
+        Raises:
+            Exception: The call failed (see openai_transport for what is retried)
+        """
+        raise NotImplementedError
+
+    def stream(self, messages, model, **params):
+        """Yield the reply to messages in pieces as they are produced."""
+        raise NotImplementedError
+
+    async def acomplete(self, messages, model, **params):
+        """Async counterpart of complete()."""
+        raise NotImplementedError
+
+    async def astream(self, messages, model, **params):
+        """Async counterpart of stream()."""
+        raise NotImplementedError
+        yield  # An async generator
+
+    def batch(self, requests, max_workers=8):
+        """
+        Complete several requests concurrently.
+
+        Args:
+            requests: Dicts of complete() arguments (messages, model and params)
+            max_workers: Requests in flight at once
+
+        Returns:
+            list: Reply or exception for each request, in order
+        """
+        def run(request):
+            try:
+                return self.complete(**request)
+            except Exception as e:
+                return e
+
+        if not requests:
+            return []
+        with ThreadPoolExecutor(min(max_workers, len(requests)), thread_name_prefix='llm-batch') as executor:
+            return list(executor.map(run, requests))
+
+    async def abatch(self, requests, max_workers=8):
+        """Async counterpart of batch()."""
+        slots = asyncio.Semaphore(max_workers)
+
+        async def run(request):
+            async with slots:
+                return await self.acomplete(**request)
+
+        return list(await asyncio.gather(*[run(request) for request in requests], return_exceptions=True))
+
+    def warm_up(self):
+        """Create clients and connections ahead of the first call."""
+
+    def close(self):
+        """Release connections and servers."""
+
+    async def aclose(self):
+        """Release the connections of the async calls."""
+
+class MockProvider(LLMProvider):
+    """Canned replies chosen by keywords in the last user message."""
+
+    name = 'mock'
+
+    @staticmethod
+    def reply(messages):
+        user_messages = [message["content"] for message in messages if message["role"] == "user"]
+        user_input_lower = user_messages[-1].lower() if user_messages else ""
+
+        if "hello" in user_input_lower or "hi" in user_input_lower:
+            return MOCK_RESPONSES["greeting"]
+        elif "nervous" in user_input_lower or "anxiety" in user_input_lower or "shy" in user_input_lower:
+            return MOCK_RESPONSES["nervousness"]
+        elif "listen" in user_input_lower or "listening" in user_input_lower:
+            return MOCK_RESPONSES["listening"]
+        else:
+            return MOCK_RESPONSES["default"]
+
+    def complete(self, messages, model, **params):
+        return self.reply(messages)
+
+    def stream(self, messages, model, **params):
+        yield from split_words(self.reply(messages))
+
+    async def acomplete(self, messages, model, **params):
+        return self.reply(messages)
+
+    async def astream(self, messages, model, **params):
+        for word in split_words(self.reply(messages)):
+            yield word
+
+class OpenAIProvider(LLMProvider):
+    """
+    Chat completions from an OpenAI-compatible API.
+
+    Args:
+        gateway: openai_transport.OpenAIGateway that makes the calls
+    """
+
+    name = 'openai'
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+
+    def complete(self, messages, model, **params):
+        response = self.gateway.chat(model=model, messages=messages, **params)
+        return response.choices[0].message.content
+
+    def stream(self, messages, model, **params):
+        # Opening the stream is retried; once text has been produced it is not
+        stream = self.gateway.chat(model=model, messages=messages, stream=True, **params)
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def acomplete(self, messages, model, **params):
+        response = await self.gateway.achat(model=model, messages=messages, **params)
+        return response.choices[0].message.content
+
+    async def astream(self, messages, model, **params):
+        stream = await self.gateway.achat(model=model, messages=messages, stream=True, **params)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def warm_up(self):
+        self.gateway.client
+
+    def close(self):
+        self.gateway.close()
+
+    async def aclose(self):
+        await self.gateway.aclose()
+
+class StubProvider(OpenAIProvider):
+    """
+    OpenAI-compatible stub on localhost with realistic latency.
+
+    Args:
+        gateway_factory: Function of the stub's base URL that returns the
+            OpenAIGateway to call it with
+        url: Base URL of a running fake_llm_server.py; None starts one in-process
+        latency: Seconds before the first word (in-process stub only)
+        token_delay: Seconds between words (in-process stub only)
+        error_rate: Fraction of requests answered with error_status (in-process stub only)
+        error_status: HTTP status of the injected errors
+    """
+
+    name = 'stub'
+
+    def __init__(self, gateway_factory, url=None, latency=0.5, token_delay=0.02, error_rate=0.0, error_status=503):
+        self.server = None
+        if url is None:
+            from fake_llm_server import FakeLLMServer
+
+            self.server = FakeLLMServer(first_token_delay=latency, token_delay=token_delay,
+                                        error_rate=error_rate, fail_status=error_status)
+            self.server.start()
+            url = self.server.url
+            logger.info(f"Started the LLM stub at {url} ({latency:.2f}s latency, {error_rate:.0%} errors)")
+        self.url = url
+        super().__init__(gateway_factory(url))
+
+    def close(self):
+        super().close()
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
@@ -0,0 +1,513 @@
+"""
+In-process metrics for the API, exported at /metrics in the Prometheus text format.
+
+Durations are recorded in nanoseconds from time.perf_counter_ns() into
+HDR-style histograms: values below 128 ns get one bucket each, and every
+power of two above is split into 64 linear sub-buckets. Any value lands in
+a bucket whose width is at most 1/64 (1.6%) of the value, so percentiles
+are accurate from microseconds to hours with no configured bounds. Only the
+buckets that were hit are stored, and recording is a dict update under a
+per-series lock. The export folds the buckets into the cumulative `le`
+buckets Prometheus expects (METRICS_BUCKETS); percentile() reads them at
+full resolution.
+
+Two histogram families are recorded:
+
+    coach_handler_duration_seconds{resource, method}  API handlers (measure_performance)
+    coach_stage_duration_seconds{stage}               cache_lookup, llm_call, sentiment,
+                                                      db_commit and stripe_call
+
+and components register their own with REGISTRY.histogram(), e.g. the SQL
+statement times in query_log.py and the similarity of semantic cache hits,
+which has its own buckets since it is not a duration.
+
+Counters and gauges are not recorded here: REGISTRY.counter() and
+REGISTRY.gauge() families read them at scrape time from the objects that
+keep them (the stats() of caches, the OpenAI gateway, the rate policies and
+so on), which register with family.track(owner, read). A family holds its
+owners weakly and adds up the live ones.
+
+With several workers (gunicorn), each has its own registry. If METRICS_DIR
+is set, every worker writes its series to metrics-<pid>.json in that
+directory every METRICS_WRITE_INTERVAL seconds, and the worker that answers
+a scrape adds up all the files (its own series are read live). Files of
+workers that exited are kept, so totals never go backwards, but their
+gauges are skipped: a recycled worker's calls in flight are not in flight
+anymore. Empty the directory when the whole service restarts.
+"""
+
+import atexit
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+import weakref
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+SUB_BUCKET_BITS = 7
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def bucket_index(value):
+    """Return the histogram bucket of a non-negative integer value."""
+    if value < (1 << SUB_BUCKET_BITS):
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return (shift << (SUB_BUCKET_BITS - 1)) + (value >> shift)
+
+def bucket_upper_bound(index):
+    """Return the largest value that falls in bucket index."""
+    if index < (1 << SUB_BUCKET_BITS):
+        return index
+    shift = (index >> (SUB_BUCKET_BITS - 1)) - 1
+    sub_bucket = index - (shift << (SUB_BUCKET_BITS - 1))
+    return ((sub_bucket + 1) << shift) - 1
+
+class Histogram:
+    """One labeled series of durations in nanoseconds."""
+
+    __slots__ = ('counts', 'count', 'sum', '_lock')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum = 0
+        self._lock = Lock()
+
+    def observe_ns(self, value):
+        """Record a duration in nanoseconds."""
+        value = value if value > 0 else 0
+        index = bucket_index(value)
+        with self._lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.sum += value
+
+    def observe(self, seconds):
+        """Record a duration in seconds."""
+        self.observe_ns(int(seconds * 1e9))
+
+    def time(self):
+        """Return a context manager that records the time spent in its block."""
+        return Timer(self)
+
+    def snapshot(self):
+        """Return {'counts': {bucket: count}, 'count': n, 'sum': nanoseconds}."""
+        with self._lock:
+            return {"counts": dict(self.counts), "count": self.count, "sum": self.sum}
+
+    def reset(self):
+        with self._lock:
+            self.counts, self.count, self.sum = {}, 0, 0
+
+    def percentile(self, fraction):
+        """Return the duration (seconds) below which fraction of the recorded values fall, 0.0 if none."""
+        return snapshot_percentile(self.snapshot(), fraction)
+
+def snapshot_percentile(snapshot, fraction):
+    """Return the percentile of a histogram snapshot, in seconds."""
+    if not snapshot["count"]:
+        return 0.0
+    rank = max(1, math.ceil(fraction * snapshot["count"]))
+    seen = 0
+    for index in sorted(snapshot["counts"]):
+        seen += snapshot["counts"][index]
+        if seen >= rank:
+            return bucket_upper_bound(index) / 1e9
+    return bucket_upper_bound(max(snapshot["counts"])) / 1e9
+
+def merge_snapshots(into, snapshot):
+    """Add snapshot's counts to into (both as returned by Histogram.snapshot)."""
+    counts = into["counts"]
+    for index, count in snapshot["counts"].items():
+        counts[index] = counts.get(index, 0) + count
+    into["count"] += snapshot["count"]
+    into["sum"] += snapshot["sum"]
+
+class Timer:
+    """Context manager that records its block's duration into a Histogram."""
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe_ns(time.perf_counter_ns() - self.start)
+
+class HistogramFamily:
+    """
+    A histogram metric with its labeled series.
+
+    Args:
+        name: Metric name, e.g. coach_stage_duration_seconds
+        documentation: HELP text
+        labelnames: Names of the labels that identify a series
+        buckets: `le` bounds of the export, the render() buckets if None;
+            for values that are not durations, such as similarities
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if buckets else None
+        self._series = {}
+        self._lock = Lock()
+
+    def labels(self, *values):
+        """Return the series for the label values (strings, in labelnames order)."""
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {', '.join(self.labelnames)}, got {values!r}")
+            with self._lock:
+                series = self._series.setdefault(values, Histogram())
+        return series
+
+    def collect(self):
+        """Return {label values: snapshot} for the series recorded in this process."""
+        with self._lock:
+            items = list(self._series.items())
+        return {values: series.snapshot() for values, series in items}
+
+    def reset(self):
+        with self._lock:
+            for series in self._series.values():
+                series.reset()
+
+class CallbackFamily:
+    """
+    A counter or gauge whose values are read from their owners when collected.
+
+    Args:
+        name: Metric name, e.g. coach_llm_shed_total
+        documentation: HELP text
+        kind: 'counter' or 'gauge'
+        labelnames: Names of the labels that identify a series
+    """
+
+    def __init__(self, name, documentation, kind, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._sources = []
+        self._lock = Lock()
+
+    def track(self, owner, read):
+        """
+        Add read(owner) to the family's values while owner is alive.
+
+        Args:
+            owner: Object that keeps the values (held by a weak reference)
+            read: Function of owner returning {label values: number}; it must not refer to owner itself
+        """
+        with self._lock:
+            self._sources.append((weakref.ref(owner), read))
+
+    def collect(self):
+        """Return {label values: number}, summed over the live owners."""
+        with self._lock:
+            self._sources = [(ref, read) for ref, read in self._sources if ref() is not None]
+            sources = list(self._sources)
+        values = {}
+        for ref, read in sources:
+            owner = ref()
+            if owner is None:
+                continue
+            try:
+                samples = read(owner)
+            except Exception as e:
+                logger.warning(f"Could not read {self.name}: {str(e)}")
+                continue
+            for key, value in samples.items():
+                values[key] = values.get(key, 0) + value
+        return values
+
+    def reset(self):
+        pass  # The values belong to their owners
+
+class MetricsRegistry:
+    """The metric families of this process, and their export."""
+
+    def __init__(self):
+        self._families = {}
+        self._lock = Lock()
+        self.directory = None
+        self.write_interval = 5.0
+        self._writer = None
+        self._stop = threading.Event()
+
+    def histogram(self, name, documentation, labelnames=(), buckets=None):
+        """Return the histogram family called name (see HistogramFamily), creating it on first use."""
+        return self._family(name, lambda: HistogramFamily(name, documentation, labelnames, buckets))
+
+    def counter(self, name, documentation, labelnames=()):
+        """Return the counter family called name (see CallbackFamily), creating it on first use."""
+        return self._family(name, lambda: CallbackFamily(name, documentation, 'counter', labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        """Return the gauge family called name (see CallbackFamily), creating it on first use."""
+        return self._family(name, lambda: CallbackFamily(name, documentation, 'gauge', labelnames))
+
+    def _family(self, name, create):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = create()
+            return family
+
+    def reset(self):
+        """Forget every recorded value (the series stay registered)."""
+        for family in list(self._families.values()):
+            family.reset()
+
+    def collect(self, directory=None):
+        """
+        Return {name: (family, {label values: snapshot})}, adding up the other
+        workers' files in directory (see write) to this process's series.
+        Counter and gauge series have a number in place of the snapshot.
+        Gauges are only added from the files of workers that are alive.
+        """
+        collected = {name: (family, family.collect()) for name, family in list(self._families.items())}
+        if not directory:
+            return collected
+
+        own_file = self._path(directory)
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            if path == own_file:
+                continue
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping metrics file {path}: {str(e)}")
+                continue
+            pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+            alive = pid.isdigit() and pid_alive(int(pid))
+            for name, entry in data.items():
+                kind = entry.get("type", "histogram")
+                if kind == "gauge" and not alive:
+                    continue
+                if name not in collected:
+                    if kind == "histogram":
+                        family = HistogramFamily(name, entry["help"], entry["labels"], entry.get("buckets"))
+                    else:
+                        family = CallbackFamily(name, entry["help"], kind, entry["labels"])
+                    collected[name] = (family, {})
+                series = collected[name][1]
+                for key, snapshot in entry["series"].items():
+                    values = tuple(json.loads(key))
+                    if kind != "histogram":
+                        series[values] = series.get(values, 0) + snapshot
+                        continue
+                    snapshot["counts"] = {int(index): count for index, count in snapshot["counts"].items()}
+                    if values in series:
+                        merge_snapshots(series[values], snapshot)
+                    else:
+                        series[values] = snapshot
+        return collected
+
+    def render(self, directory=None, buckets=DEFAULT_BUCKETS):
+        """
+        Return every metric in the Prometheus text exposition format (version 0.0.4).
+
+        Histograms are folded into the buckets bounds, unless their family has its own.
+        """
+        lines = []
+        for name, (family, series) in sorted(self.collect(directory).items()):
+            kind = family.kind
+            if kind == "histogram":
+                bounds = [('le="%r"' % float(bound), int(bound * 1e9)) for bound in sorted(family.buckets or buckets)]
+                bounds.append(('le="+Inf"', None))
+            lines.append(f"# HELP {name} {family.documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for values, snapshot in sorted(series.items()):
+                labels = [f'{label}="{escape_label(value)}"' for label, value in zip(family.labelnames, values)]
+                if kind != "histogram":
+                    label_text = f"{{{','.join(labels)}}}" if labels else ""
+                    lines.append(f"{name}{label_text} {snapshot!r}")
+                    continue
+                indexes = sorted(snapshot["counts"])
+                position = cumulative = 0
+                for le, limit in bounds:
+                    # Buckets wholly at or below the bound (within the 1.6% bucket width)
+                    while position < len(indexes) and (limit is None or bucket_upper_bound(indexes[position]) <= limit):
+                        cumulative += snapshot["counts"][indexes[position]]
+                        position += 1
+                    lines.append(f"{name}_bucket{{{','.join(labels + [le])}}} {cumulative}")
+                label_text = f"{{{','.join(labels)}}}" if labels else ""
+                lines.append(f"{name}_sum{label_text} {snapshot['sum'] / 1e9!r}")
+                lines.append(f"{name}_count{label_text} {snapshot['count']}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _path(directory):
+        return os.path.join(directory, f"metrics-{os.getpid()}.json")
+
+    def write(self, directory=None):
+        """Write this process's series to metrics-<pid>.json in directory (atomically)."""
+        directory = directory or self.directory
+        data = {
+            name: {
+                "type": family.kind,
+                "help": family.documentation,
+                "labels": list(family.labelnames),
+                **({"buckets": list(family.buckets)} if getattr(family, 'buckets', None) else {}),
+                "series": {json.dumps(list(values)): snapshot for values, snapshot in series.items()}
+            }
+            for name, (family, series) in self.collect().items()
+        }
+        path = self._path(directory)
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(data, f)
+        os.replace(temporary, path)
+
+    def start_writer(self, directory, interval=5.0):
+        """
+        Write this process's series to directory every interval seconds, and at exit.
+
+        A forked child starts with empty series and its own writer.
+        """
+        os.makedirs(directory, exist_ok=True)
+        if self.directory is None:
+            atexit.register(self.close)
+        self.directory = directory
+        self.write_interval = interval
+        if self._writer is None or not self._writer.is_alive():
+            self._stop.clear()
+            self._writer = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+            self._writer.start()
+
+    def _run(self):
+        while not self._stop.wait(self.write_interval):
+            self._write_logged()
+
+    def _write_logged(self):
+        try:
+            self.write()
+        except Exception as e:
+            logger.error(f"Could not write metrics to {self.directory}: {str(e)}")
+
+    def close(self):
+        """Stop the writer after one last write."""
+        if self._writer is not None:
+            self._stop.set()
+            self._writer.join(timeout=1)
+            self._writer = None
+            self._write_logged()
+
+    def _after_fork(self):
+        # The parent's values are in the parent's file; the thread did not survive the fork
+        self.reset()
+        self._writer = None
+        self._stop = threading.Event()
+        if self.directory:
+            self.start_writer(self.directory, self.write_interval)
+
+def pid_alive(pid):
+    """Return whether a process with pid exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by another user
+    return True
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+REGISTRY = MetricsRegistry()
+os.register_at_fork(after_in_child=REGISTRY._after_fork)
+
+HANDLER_SECONDS = REGISTRY.histogram('coach_handler_duration_seconds', "Time spent in API handlers.", ('resource', 'method'))
+STAGE_SECONDS = REGISTRY.histogram('coach_stage_duration_seconds', "Time spent in each stage of a request.", ('stage',))
+
+STAGES = ('cache_lookup', 'llm_call', 'sentiment', 'db_commit', 'stripe_call')
+_stage_series = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+
+def stage_timer(stage):
+    """Return a context manager that records its block as one `stage` of a request."""
+    return Timer(_stage_series.get(stage) or STAGE_SECONDS.labels(stage))
+
+def timed_iteration(stage, iterable):
+    """
+    Yield from iterable, recording the time spent producing its items as one `stage`.
+
+    The time the consumer spends between items (a client reading a streamed
+    reply) is not counted. The total is recorded when the iteration ends,
+    fails or is closed.
+    """
+    series = _stage_series.get(stage) or STAGE_SECONDS.labels(stage)
+    iterator = iter(iterable)
+    elapsed = 0
+    try:
+        while True:
+            started = time.perf_counter_ns()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter_ns() - started
+            yield item
+    finally:
+        series.observe_ns(elapsed)
+        if hasattr(iterator, 'close'):
+            iterator.close()
+
+async def async_timed_iteration(stage, iterable):
+    """Async counterpart of timed_iteration, for an async iterable."""
+    series = _stage_series.get(stage) or STAGE_SECONDS.labels(stage)
+    iterator = iterable.__aiter__()
+    elapsed = 0
+    try:
+        while True:
+            started = time.perf_counter_ns()
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                elapsed += time.perf_counter_ns() - started
+            yield item
+    finally:
+        series.observe_ns(elapsed)
+        if hasattr(iterator, 'aclose'):
+            await iterator.aclose()
+
+def instrument_commits():
+    """Record every SQLAlchemy session commit (with its flush) as the db_commit stage."""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    if event.contains(Session, 'before_commit', _before_commit):
+        return
+    event.listen(Session, 'before_commit', _before_commit)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_soft_rollback', _after_rollback)
+
+def _before_commit(session):
+    session.info['commit_started_ns'] = time.perf_counter_ns()
+
+def _after_commit(session):
+    started = session.info.pop('commit_started_ns', None)
+    if started is not None:
+        _stage_series['db_commit'].observe_ns(time.perf_counter_ns() - started)
+
+def _after_rollback(session, previous_transaction):
+    session.info.pop('commit_started_ns', None)
@@ -0,0 +1,107 @@
+"""
+Database models for the Social Skills Coach API.
+
+The SQLAlchemy instance is created here without an app and bound to each
+application by create_app() (see factory.py), so tools and services can
+import the models without building the web application.
+"""
+
+from datetime import datetime, date
+from flask_sqlalchemy import SQLAlchemy
+from passlib.hash import sha256_crypt
+
+db = SQLAlchemy()
+
+class User(db.Model):
+    __tablename__ = 'users'
+
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
+
+    # Subscription related fields
+    stripe_customer_id = db.Column(db.String(255), nullable=True)
+    subscription_id = db.Column(db.String(255), nullable=True)
+    subscription_status = db.Column(db.String(50), nullable=True)
+    tier = db.Column(db.String(50), default='free')
+    scenarios_accessed = db.Column(db.Integer, default=0)
+    last_reset = db.Column(db.Date, default=date.today)
+
+    # Relationships
+    conversations = db.relationship('Conversation', backref='user', lazy=True, cascade='all, delete-orphan')
+
+    def __init__(self, email, password):
+        self.email = email
+        self.password_hash = sha256_crypt.hash(password)
+        self.tier = 'free'
+        self.scenarios_accessed = 0
+        self.last_reset = date.today()
+
+    def verify_password(self, password):
+        return sha256_crypt.verify(password, self.password_hash)
+
+class Conversation(db.Model):
+    __tablename__ = 'conversations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    user_input = db.Column(db.Text, nullable=False)
+    ai_response = db.Column(db.Text, nullable=False)
+    category = db.Column(db.String(50), nullable=True)
+
+    # Turns of a practice session; tokens are counted locally for session turns
+    session_id = db.Column(db.Integer, db.ForeignKey('practice_sessions.id', ondelete='CASCADE'), nullable=True, index=True)
+    prompt_tokens = db.Column(db.Integer, nullable=True)
+    completion_tokens = db.Column(db.Integer, nullable=True)
+
+    # Id of a record stored through the write-behind queue, so a replayed record is stored once
+    write_id = db.Column(db.String(36), nullable=True, unique=True)
+
+    # Relationships
+    feedbacks = db.relationship('Feedback', backref='conversation', lazy=True, cascade='all, delete-orphan')
+
+class PracticeSession(db.Model):
+    __tablename__ = 'practice_sessions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    category = db.Column(db.String(50), nullable=False)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    ended_at = db.Column(db.DateTime, nullable=True)
+
+    # Rolling summary of the turns that no longer fit the context budget (see session_context.py)
+    summary = db.Column(db.Text, nullable=True)
+    summarized_through_id = db.Column(db.Integer, nullable=True)  # Last conversation folded into the summary
+
+    # Running totals over the session's messages
+    turn_count = db.Column(db.Integer, nullable=False, default=0)
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    completion_tokens = db.Column(db.Integer, nullable=False, default=0)
+
+    # Relationships
+    user = db.relationship('User', backref=db.backref('practice_sessions', lazy=True, cascade='all, delete-orphan'))
+    turns = db.relationship('Conversation', backref='practice_session', lazy=True, order_by='Conversation.id')
+
+class Feedback(db.Model):
+    __tablename__ = 'feedbacks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
+    feedback_text = db.Column(db.Text, nullable=False)
+    score = db.Column(db.Float, nullable=True)  # Store feedback score for analytics
+
+class UserProgressRollup(db.Model):
+    __tablename__ = 'user_progress_rollup'
+
+    # One row per user, week and category, maintained on write by progress_service
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    iso_week = db.Column(db.String(10), primary_key=True)  # Week label as shown in trends, e.g. "2025-W13"
+    category = db.Column(db.String(50), primary_key=True)  # 'uncategorized' for conversations without one
+
+    # Running totals
+    conversation_count = db.Column(db.Integer, nullable=False, default=0)
+    score_total = db.Column(db.Float, nullable=False, default=0)
+    score_count = db.Column(db.Integer, nullable=False, default=0)
+    pattern_hits = db.Column(db.JSON, nullable=False, default=dict)  # {pattern_key: {"count", "first_conversation_id"}}
+    first_conversation_id = db.Column(db.Integer, nullable=True)  # Keeps category ordering stable
@@ -0,0 +1,419 @@
+"""
+Connection pooling, retries and a circuit breaker for OpenAI calls.
+
+OpenAIGateway owns the OpenAI clients (sync for the Flask resources, async
+for asgi.py). Both send requests through one pooled httpx transport each,
+with keep-alive and, when the h2 package is installed, HTTP/2. Every chat
+completion goes through the gateway's retry loop:
+
+- each attempt has its own timeout, and all attempts together share a total
+  deadline (the request timeout), so a slow upstream cannot hold a request
+  for longer than before;
+- only timeouts, connection errors and retryable statuses (408, 409, 429 and
+  5xx) are retried, with full-jitter exponential backoff that honours
+  Retry-After;
+- a circuit breaker counts calls that failed after their retries. Once it
+  opens, calls fail immediately with CircuitOpenError (the resources answer
+  with the fallback response) until a single probe call after the reset
+  timeout succeeds.
+
+The SDK's own retries are disabled. stats() reports the call counters, the
+breaker state and the connection pools, which /metrics serves (summed over
+the gateways) as coach_openai_events_total{event}, coach_openai_in_flight,
+coach_openai_breaker_state{state} and coach_openai_pool_connections{pool, state}.
+"""
+
+import asyncio
+import importlib.util
+import logging
+import random
+import time
+from threading import Lock
+import httpx
+import tracing
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+OPENAI_EVENTS = REGISTRY.counter('coach_openai_events_total', "OpenAI gateway calls, attempts, retries and failures, "
+                                 "and circuit breaker openings and rejected calls.", ('event',))
+OPENAI_IN_FLIGHT = REGISTRY.gauge('coach_openai_in_flight', "OpenAI calls in progress.")
+OPENAI_BREAKER_STATE = REGISTRY.gauge('coach_openai_breaker_state',
+                                      "OpenAI gateways whose circuit breaker is in each state.", ('state',))
+OPENAI_POOL_CONNECTIONS = REGISTRY.gauge('coach_openai_pool_connections', "Open connections to the OpenAI API, by pool.",
+                                         ('pool', 'state'))
+
+# Statuses worth another attempt; other 4xx responses would fail the same way again
+RETRYABLE_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+class RetryPolicy:
+    """
+    When and how long to wait before retrying a failed call.
+
+    Args:
+        max_attempts: Attempts per call, including the first
+        base_delay: Backoff before the first retry, doubled for each later one
+        max_delay: Upper bound for one backoff (and for Retry-After)
+        attempt_timeout: Seconds one attempt may take
+        total_timeout: Seconds all attempts and backoffs of one call may take
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.25, max_delay=2.0, attempt_timeout=5.0, total_timeout=10.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self.total_timeout = total_timeout
+
+    @staticmethod
+    def is_retryable(error):
+        """Whether error is a timeout, a connection error or a retryable status."""
+        import openai
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in RETRYABLE_STATUSES
+        # APITimeoutError is a subclass of APIConnectionError
+        return isinstance(error, (openai.APIConnectionError, httpx.TransportError))
+
+    def backoff(self, retry, error=None):
+        """
+        Return the seconds to wait before retry number retry (1 for the first).
+
+        Full jitter: a random delay up to base_delay * 2 ** (retry - 1), capped at
+        max_delay, or the upstream's Retry-After if that is longer.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                delay = max(delay, min(self.max_delay, float(response.headers.get('retry-after', 0))))
+            except ValueError:
+                pass  # An HTTP date; the jittered delay is used
+        return delay
+
+class CircuitBreaker:
+    """
+    Fail fast while upstream is unhealthy.
+
+    Closed: calls go through; failure_threshold consecutive failed calls open
+    the breaker. Open: calls are rejected until reset_timeout has passed, then
+    one probe call is let through (half-open). The probe closes the breaker if
+    it succeeds and opens it again if it fails.
+
+    Args:
+        failure_threshold: Consecutive failed calls that open the breaker
+        reset_timeout: Seconds the breaker stays open before the probe
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = Lock()
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def allow(self):
+        """Return whether a call may go upstream now (counts the rejections)."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("OpenAI circuit breaker closed")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_abandoned(self):
+        """A call ended without an outcome (cancelled); let another probe through."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                logger.warning(f"OpenAI circuit breaker opened after {self._failures} failed calls")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+                self._stats["opened"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._failures, **self._stats}
+
+def http2_available():
+    """Whether httpx can negotiate HTTP/2 (needs the h2 package)."""
+    return importlib.util.find_spec('h2') is not None
+
+class PooledTransport(httpx.HTTPTransport):
+    """httpx transport that reports its connection pool."""
+
+    def __init__(self, limits, http2=False):
+        super().__init__(limits=limits, http2=http2)
+        self.limits = limits
+        self.http2 = http2
+
+    def pool_stats(self):
+        return _pool_stats(self._pool.connections, self.limits, self.http2)
+
+class AsyncPooledTransport(httpx.AsyncHTTPTransport):
+    """Async httpx transport that reports its connection pool."""
+
+    def __init__(self, limits, http2=False):
+        super().__init__(limits=limits, http2=http2)
+        self.limits = limits
+        self.http2 = http2
+
+    def pool_stats(self):
+        return _pool_stats(self._pool.connections, self.limits, self.http2)
+
+def _pool_stats(connections, limits, http2):
+    connections = list(connections)
+    return {
+        "connections": len(connections),
+        "idle": sum(1 for connection in connections if connection.is_idle()),
+        "max_connections": limits.max_connections,
+        "max_keepalive": limits.max_keepalive_connections,
+        "http2": http2
+    }
+
+class OpenAIGateway:
+    """
+    Make chat completion calls with pooled connections, retries and a breaker.
+
+    The clients are created on first use, from config unless api_key and
+    base_url are given.
+
+    Args:
+        policy: RetryPolicy for every call
+        breaker: CircuitBreaker shared by the sync and async calls
+        max_connections: Connections per pool
+        max_keepalive: Idle connections kept open per pool
+        keepalive_expiry: Seconds an idle connection is kept open
+        connect_timeout: Seconds to establish a connection (within the attempt timeout)
+        http2: Use HTTP/2 if the h2 package is installed
+        api_key: OpenAI API key, config.OPENAI_API_KEY if None
+        base_url: OpenAI base URL, config.OPENAI_BASE_URL if None
+    """
+
+    def __init__(self, policy=None, breaker=None, max_connections=100, max_keepalive=20, keepalive_expiry=30.0,
+                 connect_timeout=2.0, http2=True, api_key=None, base_url=None):
+        self.policy = policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                   keepalive_expiry=keepalive_expiry)
+        self.connect_timeout = connect_timeout
+        self.http2 = http2 and http2_available()
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None
+        self._async_client = None
+        self._transport = None
+        self._async_transport = None
+        self._lock = Lock()
+        self._in_flight = 0
+        self._stats = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0}
+        OPENAI_EVENTS.track(self, _gateway_events)
+        OPENAI_IN_FLIGHT.track(self, lambda gateway: {(): gateway.stats()["in_flight"]})
+        OPENAI_BREAKER_STATE.track(self, _gateway_breaker_state)
+        OPENAI_POOL_CONNECTIONS.track(self, _gateway_pool_connections)
+
+    def _client_options(self):
+        import config
+        return {
+            "api_key": self.api_key if self.api_key is not None else config.OPENAI_API_KEY,
+            "base_url": self.base_url if self.base_url is not None else config.OPENAI_BASE_URL,
+            "max_retries": 0,  # The gateway retries
+            "timeout": httpx.Timeout(self.policy.attempt_timeout, connect=self.connect_timeout)
+        }
+
+    @property
+    def client(self):
+        """OpenAI client, created on first use."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._transport = PooledTransport(self.limits, self.http2)
+                    options = self._client_options()
+                    http_client = httpx.Client(transport=self._transport, timeout=options["timeout"], follow_redirects=True)
+                    self._client = OpenAI(http_client=http_client, **options)
+        return self._client
+
+    @property
+    def async_client(self):
+        """AsyncOpenAI client, created on first use (by the event loop's thread)."""
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+            self._async_transport = AsyncPooledTransport(self.limits, self.http2)
+            options = self._client_options()
+            http_client = httpx.AsyncClient(transport=self._async_transport, timeout=options["timeout"], follow_redirects=True)
+            self._async_client = AsyncOpenAI(http_client=http_client, **options)
+        return self._async_client
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _begin(self):
+        """Check the breaker and return the call's deadline."""
+        if not self.breaker.allow():
+            raise CircuitOpenError("OpenAI circuit breaker is open")
+        with self._lock:
+            self._stats["calls"] += 1
+            self._in_flight += 1
+        return time.monotonic() + self.policy.total_timeout
+
+    def _attempt_timeout(self, deadline):
+        remaining = max(0.001, deadline - time.monotonic())
+        return httpx.Timeout(min(self.policy.attempt_timeout, remaining), connect=min(self.connect_timeout, remaining))
+
+    def _retry_delay(self, error, attempt, deadline):
+        """Return the backoff before the next attempt, or None to give up (recording the failure)."""
+        retryable = self.policy.is_retryable(error)
+        if retryable and attempt < self.policy.max_attempts:
+            delay = self.policy.backoff(attempt, error)
+            if time.monotonic() + delay < deadline:
+                self._count("retries")
+                logger.warning(f"OpenAI attempt {attempt} failed ({error}), retrying in {delay:.2f}s")
+                return delay
+        import openai
+        self._count("failures")
+        if retryable:
+            self.breaker.record_failure()
+        elif isinstance(error, openai.APIStatusError):
+            # Upstream answered; the request itself was wrong
+            self.breaker.record_success()
+        else:
+            # Failed before an answer (e.g. a bad argument): says nothing about upstream
+            self.breaker.record_abandoned()
+        return None
+
+    def _end(self, settled):
+        with self._lock:
+            self._in_flight -= 1
+        if not settled:
+            self.breaker.record_abandoned()
+
+    def chat(self, **params):
+        """
+        Return client.chat.completions.create(**params), retrying as the policy allows.
+
+        With stream=True, only opening the stream is retried.
+
+        Raises:
+            CircuitOpenError: The breaker is open; upstream was not called
+            openai.OpenAIError: The last attempt's error
+        """
+        deadline = self._begin()
+        settled = False
+        attempt = 0
+        call_span = tracing.span('openai.chat', **{"llm.model": params.get('model', ''), "llm.stream": bool(params.get('stream'))})
+        try:
+            with call_span:
+                while True:
+                    attempt += 1
+                    self._count("attempts")
+                    try:
+                        result = self.client.chat.completions.create(timeout=self._attempt_timeout(deadline), **params)
+                    except Exception as e:
+                        delay = self._retry_delay(e, attempt, deadline)
+                        if delay is None:
+                            settled = True
+                            raise
+                        time.sleep(delay)
+                    else:
+                        settled = True
+                        self.breaker.record_success()
+                        return result
+        finally:
+            call_span.set_attribute("attempts", attempt)
+            self._end(settled)
+
+    async def achat(self, **params):
+        """Async counterpart of chat(), with async_client."""
+        deadline = self._begin()
+        settled = False
+        attempt = 0
+        call_span = tracing.span('openai.chat', **{"llm.model": params.get('model', ''), "llm.stream": bool(params.get('stream'))})
+        try:
+            with call_span:
+                while True:
+                    attempt += 1
+                    self._count("attempts")
+                    try:
+                        result = await self.async_client.chat.completions.create(timeout=self._attempt_timeout(deadline), **params)
+                    except Exception as e:
+                        delay = self._retry_delay(e, attempt, deadline)
+                        if delay is None:
+                            settled = True
+                            raise
+                        await asyncio.sleep(delay)
+                    else:
+                        settled = True
+                        self.breaker.record_success()
+                        return result
+        finally:
+            call_span.set_attribute("attempts", attempt)
+            self._end(settled)
+
+    def close(self):
+        """Close the sync client's connections."""
+        if self._client is not None:
+            self._client.close()
+
+    async def aclose(self):
+        """Close the async client's connections."""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+    def stats(self):
+        with self._lock:
+            stats = {**self._stats, "in_flight": self._in_flight}
+        stats["breaker"] = self.breaker.stats()
+        stats["pool"] = self._transport.pool_stats() if self._transport is not None else None
+        stats["async_pool"] = self._async_transport.pool_stats() if self._async_transport is not None else None
+        return stats
+
+def _gateway_events(gateway):
+    stats = gateway.stats()
+    events = {(event,): stats[event] for event in ("calls", "attempts", "retries", "failures")}
+    events[("breaker_opened",)] = stats["breaker"]["opened"]
+    events[("breaker_rejected",)] = stats["breaker"]["rejected"]
+    return events
+
+def _gateway_breaker_state(gateway):
+    state = gateway.breaker.stats()["state"]
+    states = (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)
+    return {(name,): int(name == state) for name in states}
+
+def _gateway_pool_connections(gateway):
+    stats = gateway.stats()
+    connections = {}
+    for pool, pool_stats in (('sync', stats["pool"]), ('async', stats["async_pool"])):
+        if pool_stats is not None:
+            connections[(pool, 'active')] = pool_stats["connections"] - pool_stats["idle"]
+            connections[(pool, 'idle')] = pool_stats["idle"]
+    return connections
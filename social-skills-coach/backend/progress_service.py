@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Progress Service for Social Skills Coach API.
+
+This module maintains the user_progress_rollup table, which holds running
+totals per (user, week, category), and computes the statistics returned by
+/api/progress from it. Reads are O(weeks) instead of O(conversations).
+
+Writers call record_conversation / record_feedback_score before committing,
+so the rollup changes in the same transaction as the underlying rows.
+"""
+
+import logging
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from models import db, Conversation, User, UserProgressRollup
+from feedback_patterns import feedback_matcher
+from query_log import query_budget
+
+logger = logging.getLogger(__name__)
+
+def week_label(timestamp):
+    """Return the week label used for trends, e.g. "2025-W13"."""
+    return timestamp.strftime("%Y-W%V")
+
+def _new_delta():
+    return {
+        "conversation_count": 0,
+        "score_total": 0,
+        "score_count": 0,
+        "pattern_hits": {},
+        "first_conversation_id": None
+    }
+
+def _add_conversation(delta, conversation, feedbacks):
+    """Accumulate one conversation and its feedback into a delta."""
+    delta["conversation_count"] += 1
+    if delta["first_conversation_id"] is None or conversation.id < delta["first_conversation_id"]:
+        delta["first_conversation_id"] = conversation.id
+
+    for feedback in feedbacks:
+        if feedback.score is not None:
+            delta["score_total"] += feedback.score
+            delta["score_count"] += 1
+        for key in feedback_matcher.match_keys(feedback.feedback_text):
+            hit = delta["pattern_hits"].setdefault(key, {"count": 0, "first_conversation_id": conversation.id})
+            hit["count"] += 1
+            hit["first_conversation_id"] = min(hit["first_conversation_id"], conversation.id)
+
+def _lock_rollup_row(session, user_id, iso_week, category):
+    """
+    Fetch a rollup row for update, creating it if it does not exist yet.
+
+    The insert runs in a savepoint so that a concurrent writer creating the
+    same row makes us fall back to locking theirs instead of failing.
+    """
+    query = session.query(UserProgressRollup).filter_by(
+        user_id=user_id, iso_week=iso_week, category=category
+    ).with_for_update()
+
+    row = query.first()
+    if row is None:
+        row = UserProgressRollup(
+            user_id=user_id,
+            iso_week=iso_week,
+            category=category,
+            conversation_count=0,
+            score_total=0,
+            score_count=0,
+            pattern_hits={}
+        )
+        try:
+            with session.begin_nested():
+                session.add(row)
+        except IntegrityError:
+            row = query.first()
+    return row
+
+def _merge_delta(row, delta):
+    """Add a delta to a locked rollup row."""
+    row.conversation_count += delta["conversation_count"]
+    row.score_total += delta["score_total"]
+    row.score_count += delta["score_count"]
+
+    if delta["first_conversation_id"] is not None:
+        if row.first_conversation_id is None or delta["first_conversation_id"] < row.first_conversation_id:
+            row.first_conversation_id = delta["first_conversation_id"]
+
+    if delta["pattern_hits"]:
+        # Reassign rather than mutate so the JSON column is marked dirty
+        pattern_hits = {key: dict(hit) for key, hit in (row.pattern_hits or {}).items()}
+        for key, hit in delta["pattern_hits"].items():
+            if key in pattern_hits:
+                pattern_hits[key]["count"] += hit["count"]
+                pattern_hits[key]["first_conversation_id"] = min(
+                    pattern_hits[key]["first_conversation_id"], hit["first_conversation_id"]
+                )
+            else:
+                pattern_hits[key] = dict(hit)
+        row.pattern_hits = pattern_hits
+
+def record_conversation(conversation, feedbacks, session=None):
+    """
+    Add a newly inserted conversation and its feedback to the rollup.
+
+    The conversation must have been flushed so that its id and timestamp
+    are set. The caller commits.
+
+    Args:
+        conversation: Conversation object
+        feedbacks: Feedback objects belonging to the conversation
+        session: Session the conversation was added to, db.session if None
+    """
+    record_conversations([(conversation, feedbacks)], session)
+
+def record_conversations(entries, session=None):
+    """
+    Add several newly inserted conversations to the rollup, locking each
+    affected rollup row once. The caller commits.
+
+    Args:
+        entries: (conversation, feedbacks) tuples, flushed as for record_conversation
+        session: Session the conversations were added to, db.session if None
+    """
+    deltas = {}
+    for conversation, feedbacks in entries:
+        key = (conversation.user_id, week_label(conversation.timestamp), conversation.category or 'uncategorized')
+        if key not in deltas:
+            deltas[key] = _new_delta()
+        _add_conversation(deltas[key], conversation, feedbacks)
+
+    for (user_id, iso_week, category), delta in deltas.items():
+        _merge_delta(_lock_rollup_row(session or db.session, user_id, iso_week, category), delta)
+
+def record_feedback_score(feedback, previous_score):
+    """
+    Apply a change of Feedback.score to the rollup. The caller commits.
+
+    Args:
+        feedback: Feedback object with the new score set
+        previous_score: Score before the change (None if unscored)
+    """
+    record_feedback_scores([(feedback.conversation, previous_score, feedback.score)])
+
+def record_feedback_scores(changes):
+    """
+    Apply several Feedback.score changes to the rollup, locking each
+    affected rollup row once. The caller commits.
+
+    Args:
+        changes: (conversation, previous_score, new_score) tuples
+    """
+    deltas = {}
+    for conversation, previous_score, new_score in changes:
+        if new_score == previous_score:
+            continue
+
+        key = (conversation.user_id, week_label(conversation.timestamp), conversation.category or 'uncategorized')
+        if key not in deltas:
+            deltas[key] = _new_delta()
+        if previous_score is not None:
+            deltas[key]["score_total"] -= previous_score
+            deltas[key]["score_count"] -= 1
+        if new_score is not None:
+            deltas[key]["score_total"] += new_score
+            deltas[key]["score_count"] += 1
+
+    # Wait for a rebuild of these users' rows (see rebuild_progress_rollup)
+    _lock_users(db.session, {user_id for user_id, _, _ in deltas})
+    for (user_id, iso_week, category), delta in deltas.items():
+        _merge_delta(_lock_rollup_row(db.session, user_id, iso_week, category), delta)
+
+def _lock_users(session, user_ids, exclusive=False):
+    """
+    Lock users rows in id order: shared (FOR KEY SHARE) for rollup writers,
+    exclusive (FOR UPDATE) for a rebuild, so writes and rebuilds of one
+    user's rows take turns. Inserting a conversation takes the shared lock
+    on its user through the foreign key.
+    """
+    if user_ids:
+        session.query(User.id).filter(User.id.in_(sorted(user_ids))).order_by(User.id).with_for_update(
+            read=not exclusive, key_share=not exclusive
+        ).all()
+
+def rebuild_progress_rollup(batch_size=500, user_id=None):
+    """
+    Rebuild the rollup from the conversations and feedbacks tables, one user per transaction.
+
+    For each user, the users row is locked FOR UPDATE, then the user's rollup
+    rows are deleted and rebuilt from their conversations, read in id order
+    in batches of batch_size (with their feedback loaded in one extra query
+    per batch), and the transaction is committed. Readers see the old rows
+    until the commit. The lock waits for transactions that insert the user's
+    conversations or change their scores, and holds new ones back until the
+    commit, so every conversation and score change is counted exactly once.
+
+    Args:
+        batch_size: Conversations read per query
+        user_id: Only rebuild this user's rows (all users if None)
+
+    Returns:
+        int: Number of conversations processed
+    """
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        # Users with conversations, and users with rows left over to delete
+        user_ids = sorted(
+            {row[0] for row in db.session.query(Conversation.user_id).distinct()} |
+            {row[0] for row in db.session.query(UserProgressRollup.user_id).distinct()}
+        )
+        db.session.commit()
+
+    processed = 0
+    for rebuild_user_id in user_ids:
+        try:
+            processed += _rebuild_user_rollup(db.session, rebuild_user_id, batch_size)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        logger.info(f"Rebuilt progress rollup for user {rebuild_user_id} ({processed} conversations processed)")
+    return processed
+
+def _rebuild_user_rollup(session, user_id, batch_size):
+    """Replace a user's rollup rows in the current transaction; the caller commits."""
+    _lock_users(session, {user_id}, exclusive=True)
+    session.query(UserProgressRollup).filter(UserProgressRollup.user_id == user_id).delete(synchronize_session=False)
+
+    conversations = session.query(Conversation).filter(Conversation.user_id == user_id).options(
+        selectinload(Conversation.feedbacks)
+    ).order_by(Conversation.id)
+    deltas = {}
+    processed = 0
+    last_id = 0
+    while True:
+        # The session only holds weak references, so earlier batches are released
+        batch = conversations.filter(Conversation.id > last_id).limit(batch_size).all()
+        if not batch:
+            break
+        for conversation in batch:
+            if conversation.timestamp is None:
+                continue
+            key = (week_label(conversation.timestamp), conversation.category or 'uncategorized')
+            if key not in deltas:
+                deltas[key] = _new_delta()
+            _add_conversation(deltas[key], conversation, conversation.feedbacks)
+        processed += len(batch)
+        last_id = batch[-1].id
+
+    for (iso_week, category), delta in deltas.items():
+        _merge_delta(_lock_rollup_row(session, user_id, iso_week, category), delta)
+    return processed
+
+@query_budget(1)
+def get_rollup_rows(user_id):
+    """
+    Load all rollup rows for a user.
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        list: UserProgressRollup objects
+    """
+    return UserProgressRollup.query.filter_by(user_id=user_id).all()
+
+def count_conversations(rows):
+    """Total number of conversations covered by the rollup rows."""
+    return sum(row.conversation_count for row in rows)
+
+def get_category_summary(rows):
+    """
+    Compute the category breakdown and feedback score averages.
+
+    Args:
+        rows: Rollup rows from get_rollup_rows
+
+    Returns:
+        dict: category_stats, average_feedback_score and
+              category_averages (ordered by first conversation)
+    """
+    categories = {}
+    for row in sorted(rows, key=lambda r: r.first_conversation_id or 0):
+        if row.category not in categories:
+            categories[row.category] = {"conversations": 0, "total": 0, "count": 0}
+        categories[row.category]["conversations"] += row.conversation_count
+        categories[row.category]["total"] += row.score_total
+        categories[row.category]["count"] += row.score_count
+
+    score_total = sum(c["total"] for c in categories.values())
+    score_count = sum(c["count"] for c in categories.values())
+
+    average_score = 0
+    if score_count > 0:
+        average_score = round(score_total / score_count, 1)
+
+    return {
+        "category_stats": {category: c["conversations"] for category, c in categories.items()},
+        "average_feedback_score": average_score,
+        "category_averages": [
+            (category, round(c["total"] / c["count"], 1))
+            for category, c in categories.items() if c["count"] > 0
+        ]
+    }
+
+def get_weekly_trends(rows):
+    """
+    Build weekly conversation counts and score averages for charting.
+
+    Args:
+        rows: Rollup rows from get_rollup_rows
+
+    Returns:
+        dict: labels, conversation_counts and score_averages
+    """
+    weekly_counts = {}
+    weekly_scores = {}
+    for row in rows:
+        if row.iso_week not in weekly_counts:
+            weekly_counts[row.iso_week] = 0
+            weekly_scores[row.iso_week] = {"total": 0, "count": 0}
+        weekly_counts[row.iso_week] += row.conversation_count
+        weekly_scores[row.iso_week]["total"] += row.score_total
+        weekly_scores[row.iso_week]["count"] += row.score_count
+
+    weekly_averages = {}
+    for week, data in weekly_scores.items():
+        if data["count"] > 0:
+            weekly_averages[week] = round(data["total"] / data["count"], 1)
+        else:
+            weekly_averages[week] = 0
+
+    labels = sorted(weekly_counts.keys())
+    return {
+        "labels": labels,
+        "conversation_counts": [weekly_counts[week] for week in labels],
+        "score_averages": [weekly_averages[week] for week in labels]
+    }
+
+@query_budget(0)  # Works on the rows already read
+def get_improvement_areas(rows, category_averages):
+    """
+    Calculate areas for improvement based on feedback patterns.
+
+    Args:
+        rows: Rollup rows from get_rollup_rows
+        category_averages: (category, average_score) pairs from get_category_summary
+
+    Returns:
+        dict: common_issues and weakest_categories
+    """
+    pattern_order = {key: index for index, key in enumerate(feedback_matcher.keys)}
+
+    pattern_counts = {}
+    first_seen = {}
+    for row in rows:
+        for key, hit in (row.pattern_hits or {}).items():
+            pattern_counts[key] = pattern_counts.get(key, 0) + hit["count"]
+            first_seen[key] = min(first_seen.get(key, hit["first_conversation_id"]), hit["first_conversation_id"])
+
+    # Ties keep the order in which each pattern was first seen
+    ordered_patterns = sorted(
+        pattern_counts.items(),
+        key=lambda x: (first_seen[x[0]], pattern_order.get(x[0], len(pattern_order)))
+    )
+
+    # Find common patterns and low-scoring categories
+    common_patterns = sorted(ordered_patterns, key=lambda x: x[1], reverse=True)[:3]
+    worst_categories = sorted(category_averages, key=lambda x: x[1])[:2]
+
+    return {
+        "common_issues": [{"pattern": p[0], "count": p[1]} for p in common_patterns],
+        "weakest_categories": [{"category": c[0], "average_score": c[1]} for c in worst_categories]
+    }
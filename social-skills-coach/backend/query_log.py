@@ -0,0 +1,262 @@
+"""
+SQL statement accounting for the API: query counts, the slow-query log and query budgets.
+
+Every statement run through a SQLAlchemy engine is timed with engine events.
+During a request its statements are added up in a RequestQueries (count,
+total time, the slow ones), and the request's totals go to the app's
+QueryLog counters when it ends. A statement slower than SLOW_QUERY_SECONDS
+is logged as it finishes, normalized (literals replaced by ?, placeholder
+lists collapsed) and with the line of application code that ran it:
+
+    Slow query (212.4 ms) at resources.py:1391 in get: SELECT feedback.id, ... WHERE feedback.conversation_id = ?
+
+A handler or helper that must stay cheap declares its budget:
+
+    @query_budget(2)
+    def get(self): ...
+
+Running more statements than that is logged as a warning with the
+statements it ran. When the app is testing (or QUERY_BUDGET_ENFORCE is set)
+it raises QueryBudgetExceeded instead, so a change that adds a query per
+row fails the tests that cover the endpoint.
+
+For dashboards, every statement is recorded in
+coach_db_query_duration_seconds{resource, method} at /metrics (see
+metrics.py). Its _count divided by the handler's is the queries per
+request, its _sum is the database time, and its buckets above the
+threshold count the slow queries. Statements outside a request are
+labeled resource="none". The QueryLog's slow-query and over-budget
+counters are there too, as coach_db_slow_queries_total and
+coach_db_over_budget_total.
+"""
+
+import contextvars
+import functools
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from threading import Lock
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+QUERY_SECONDS = REGISTRY.histogram('coach_db_query_duration_seconds', "Time spent in SQL statements, by the handler that ran them.",
+                                   ('resource', 'method'))
+_background_series = QUERY_SECONDS.labels('none', 'none')
+SLOW_QUERIES = REGISTRY.counter('coach_db_slow_queries_total',
+                                "SQL statements run by requests that were slower than SLOW_QUERY_SECONDS.")
+OVER_BUDGET = REGISTRY.counter('coach_db_over_budget_total',
+                               "Calls that ran more SQL statements than their query budget.")
+
+_current = contextvars.ContextVar('request_queries', default=None)
+_slow_query_ns = 100_000_000
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+_THIS_FILE = os.path.abspath(__file__)
+
+class QueryBudgetExceeded(Exception):
+    """A function ran more SQL statements than its declared budget."""
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+def normalize_sql(statement):
+    """Return statement on one line, with its literals replaced by ? and lists of placeholders collapsed to (?, ...)."""
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    statement = _LITERALS.sub('?', statement)
+    return _PLACEHOLDER_LISTS.sub('(?, ...)', statement)
+
+def caller_location():
+    """Return 'file.py:line in function' of the innermost application frame on the stack, '?' if there is none."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(APP_ROOT) and filename != _THIS_FILE and 'site-packages' not in filename:
+            return f"{os.path.relpath(filename, APP_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return '?'
+
+class RequestQueries:
+    """
+    The statements of one request (or one budgeted call outside a request).
+
+    Args:
+        log: QueryLog the totals go to, None for none
+        resource: Resource (or endpoint) name for the metrics label
+        method: HTTP method, lowercase
+    """
+
+    __slots__ = ('log', 'resource', 'method', 'series', 'count', 'total_ns', 'statements', 'slow', '_token')
+
+    def __init__(self, log, resource, method):
+        self.log = log
+        self.resource = resource
+        self.method = method
+        self.series = QUERY_SECONDS.labels(resource, method) if log is not None else _background_series
+        self.count = 0
+        self.total_ns = 0
+        self.statements = []
+        self.slow = []
+        self._token = None
+
+    def activate(self):
+        self._token = _current.set(self)
+        return self
+
+    def deactivate(self):
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                _current.set(None)  # Ended in another context, e.g. a stream finished by the server
+            self._token = None
+
+class QueryLog:
+    """
+    Per-request query accounting for a Flask app, and its counters.
+
+    Args:
+        enforce_budgets: Raise QueryBudgetExceeded when a budget is exceeded, rather than log a
+            warning, even when the app is not testing
+    """
+
+    def __init__(self, enforce_budgets=False):
+        self.enforce_budgets = enforce_budgets
+        self._lock = Lock()
+        self._stats = {"requests": 0, "queries": 0, "query_seconds": 0.0, "slow_queries": 0, "over_budget": 0,
+                       "max_queries": 0}
+        SLOW_QUERIES.track(self, lambda log: {(): log.stats()["slow_queries"]})
+        OVER_BUDGET.track(self, lambda log: {(): log.stats()["over_budget"]})
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def start(self, resource, method):
+        """Start counting the statements of a request (made current until finish())."""
+        return RequestQueries(self, resource, method).activate()
+
+    def finish(self, queries):
+        """Stop counting a request's statements and add them to the counters."""
+        queries.deactivate()
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["queries"] += queries.count
+            self._stats["query_seconds"] += queries.total_ns / 1e9
+            self._stats["slow_queries"] += len(queries.slow)
+            self._stats["max_queries"] = max(self._stats["max_queries"], queries.count)
+        if queries.slow:
+            logger.warning(f"{queries.resource}.{queries.method} ran {queries.count} queries in "
+                           f"{queries.total_ns / 1e6:.1f} ms, {len(queries.slow)} slower than {_slow_query_ns / 1e6:g} ms")
+
+    def enforcing(self):
+        """Whether an exceeded budget raises: enforce_budgets is set, or the current app is testing (read now)."""
+        from flask import current_app, has_app_context
+        return self.enforce_budgets or (has_app_context() and current_app.testing)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+def current_queries():
+    """Return the RequestQueries being counted, None outside a request."""
+    return _current.get()
+
+def query_budget(limit):
+    """
+    Declare the most SQL statements a function may run per call.
+
+    Args:
+        limit: Statements allowed, counting those of the functions it calls
+
+    Raises:
+        QueryBudgetExceeded: From the decorated function, if it ran more while budgets are enforced
+    """
+    def decorator(func):
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            queries = _current.get()
+            outside_request = queries is None
+            if outside_request:
+                queries = RequestQueries(None, 'none', 'none').activate()
+            before = len(queries.statements)
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                if outside_request:
+                    queries.deactivate()
+            statements = queries.statements[before:]
+            if len(statements) > limit:
+                over_budget(name, statements, limit, queries.log)
+            return result
+        return wrapper
+    return decorator
+
+def over_budget(name, statements, limit, log):
+    """Report a call that ran more statements than its budget (raising when log enforces budgets)."""
+    counts = Counter(normalize_sql(statement) for statement in statements)
+    summary = "; ".join(f"{count} x {sql}" for sql, count in counts.most_common())
+    message = f"{name} ran {len(statements)} queries, over its budget of {limit}: {summary}"
+    if log is not None:
+        log._count("over_budget")
+        if log.enforcing():
+            raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+def init_app(app, log):
+    """Count the statements of each of app's requests in log, labeled by resource and method."""
+    from flask import g, request
+
+    def start_request_queries():
+        view = app.view_functions.get(request.endpoint)
+        resource = getattr(getattr(view, 'view_class', None), '__name__', None) or request.endpoint or 'none'
+        g.request_queries = log.start(resource, request.method.lower())
+
+    def finish_request_queries(error=None):
+        queries = g.pop('request_queries', None)
+        if queries is not None:
+            log.finish(queries)
+
+    app.before_request(start_request_queries)
+    app.teardown_request(finish_request_queries)
+
+def instrument_engines(slow_query_seconds=0.1):
+    """Time every SQLAlchemy statement, logging those slower than slow_query_seconds."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    global _slow_query_ns
+    _slow_query_ns = int(slow_query_seconds * 1e9)
+    if event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started_ns = time.perf_counter_ns()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started_ns', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter_ns() - started
+    queries = _current.get()
+    if queries is not None:
+        queries.count += 1
+        queries.total_ns += elapsed
+        queries.statements.append(statement)
+        queries.series.observe_ns(elapsed)
+    else:
+        _background_series.observe_ns(elapsed)
+    if elapsed >= _slow_query_ns:
+        location = caller_location()
+        sql = normalize_sql(statement)
+        if queries is not None:
+            queries.slow.append((elapsed, sql, location))
+        logger.warning(f"Slow query ({elapsed / 1e6:.1f} ms) at {location}: {sql}")
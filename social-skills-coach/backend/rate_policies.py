@@ -0,0 +1,340 @@
+"""
+Rate limit policies for the API.
+
+A policy set maps each endpoint and client class to a limit, and each client
+class to the LLM calls it may have in flight in one worker. The client class
+is 'anonymous' for requests without a token, otherwise the user's tier
+('free', 'basic' or 'premium'). Limits are looked up in the order:
+
+    limits[endpoint][client class]
+    limits[endpoint]['authenticated']   (any signed-in user)
+    limits[endpoint]['*']               (anyone)
+
+and an endpoint without a matching entry is not limited. A limit is written
+"N/seconds" or {"limit": N, "period": seconds, "burst": N}:
+
+    {
+        "limits": {
+            "conversation": {"anonymous": "10/60", "free": "10/60", "premium": "60/60"},
+            "login": {"*": {"limit": 10, "period": 60, "burst": 3}}
+        },
+        "llm_concurrency": {"anonymous": 32, "free": 64}
+    }
+
+The policies from config.py can be overridden by a JSON file in that format.
+Its entries replace the configured ones per endpoint and client class, and
+the file is checked for changes every few seconds, so limits can be raised
+or lowered without a restart. A file that does not parse is logged and the
+policies in force are kept.
+
+Rejections happen before the request touches the database or the model:
+the rate limit check is the first thing a limited resource does, and the
+concurrency cap is taken before the LLM call, so a flood of anonymous or
+free traffic gets 429/503 responses while paid users keep their own budget.
+"""
+
+import json
+import logging
+import os
+import time
+from threading import Lock
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CLIENT_CLASSES = ('anonymous', 'free', 'basic', 'premium')
+
+LLM_SHED = REGISTRY.counter('coach_llm_shed_total',
+                            "LLM calls refused because their client class was at its concurrency cap.")
+LLM_IN_FLIGHT = REGISTRY.gauge('coach_llm_in_flight', "LLM calls in progress, by client class.", ('client_class',))
+
+class Policy:
+    """
+    Limit for one endpoint and client class.
+
+    Args:
+        limit: Requests allowed per period
+        period: Seconds
+        burst: Requests allowed at once, limit if None
+    """
+
+    __slots__ = ('limit', 'period', 'burst')
+
+    def __init__(self, limit, period, burst=None):
+        self.limit = limit
+        self.period = period
+        self.burst = burst
+
+    def __eq__(self, other):
+        return isinstance(other, Policy) and (self.limit, self.period, self.burst) == (other.limit, other.period, other.burst)
+
+    def __repr__(self):
+        return f"Policy({self.limit}/{self.period:g}, burst={self.burst})"
+
+def parse_policy(spec):
+    """
+    Parse "N/seconds" or {"limit": N, "period": seconds, "burst": N} into a Policy.
+
+    Raises:
+        ValueError: If spec is not a valid limit
+    """
+    if isinstance(spec, str):
+        limit, _, period = spec.partition('/')
+        spec = {"limit": limit, "period": period or 60}
+    if not isinstance(spec, dict) or 'limit' not in spec:
+        raise ValueError(f"expected 'N/seconds' or an object with a limit, got {spec!r}")
+    try:
+        limit = int(spec['limit'])
+        period = float(spec.get('period', 60))
+        burst = int(spec['burst']) if spec.get('burst') is not None else None
+    except (TypeError, ValueError):
+        raise ValueError(f"limit, period and burst must be numbers, got {spec!r}")
+    if limit < 1 or period <= 0 or (burst is not None and burst < 1):
+        raise ValueError(f"limit, period and burst must be positive, got {spec!r}")
+    return Policy(limit, period, burst)
+
+def parse_policies(limits, llm_concurrency=None):
+    """
+    Validate a policy set.
+
+    Args:
+        limits: {endpoint: {client class: limit}}
+        llm_concurrency: {client class: in-flight LLM calls per worker}, 0 for no cap
+
+    Returns:
+        tuple: ({endpoint: {client class: Policy}}, {client class: cap})
+
+    Raises:
+        ValueError: Naming the first invalid entry
+    """
+    known = CLIENT_CLASSES + ('authenticated', '*')
+    parsed = {}
+    for endpoint, classes in (limits or {}).items():
+        if not isinstance(classes, dict):
+            raise ValueError(f"Rate limits for '{endpoint}' must map client classes to limits")
+        parsed[endpoint] = {}
+        for client_class, spec in classes.items():
+            if client_class not in known:
+                raise ValueError(f"Unknown client class '{client_class}'. Available classes: {', '.join(known)}")
+            try:
+                parsed[endpoint][client_class] = parse_policy(spec)
+            except ValueError as e:
+                raise ValueError(f"Invalid rate limit for '{endpoint}' ({client_class}): {e}")
+
+    caps = {}
+    for client_class, cap in (llm_concurrency or {}).items():
+        if client_class not in CLIENT_CLASSES + ('*',):
+            raise ValueError(f"Unknown client class '{client_class}'. Available classes: {', '.join(CLIENT_CLASSES)}, *")
+        if not isinstance(cap, int) or isinstance(cap, bool) or cap < 0:
+            raise ValueError(f"LLM concurrency for '{client_class}' must be a non-negative integer, got {cap!r}")
+        caps[client_class] = cap
+    return parsed, caps
+
+def merge_policies(base, override):
+    """Return base with override's entries replacing it per endpoint and client class."""
+    merged = {endpoint: dict(classes) for endpoint, classes in (base or {}).items()}
+    for endpoint, classes in (override or {}).items():
+        merged.setdefault(endpoint, {}).update(classes if isinstance(classes, dict) else {'*': classes})
+    return merged
+
+class LLMSlot:
+    """One in-flight LLM call of a client class; release() is idempotent, so cleanup paths may overlap."""
+
+    __slots__ = ('_engine', 'client_class', '_released')
+
+    def __init__(self, engine, client_class):
+        self._engine = engine
+        self.client_class = client_class
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._engine._release(self.client_class)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+class TierCache:
+    """
+    Tiers of signed-in users, so a rate limit check costs a database read
+    once per ttl seconds per user rather than once per request.
+
+    Args:
+        ttl: Seconds a tier is trusted; a subscription change reaches the other
+            workers within it (the worker that handles the webhook forgets it at once)
+        max_size: Users kept before expired entries are dropped
+    """
+
+    def __init__(self, ttl=60.0, max_size=100000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._tiers = {}
+        self._lock = Lock()
+
+    def get(self, identity, load):
+        """Return identity's tier, calling load(identity) if it is unknown or stale ('free' if it returns None)."""
+        now = time.monotonic()
+        entry = self._tiers.get(identity)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        tier = load(identity) or 'free'
+        with self._lock:
+            if len(self._tiers) >= self.max_size:
+                self._tiers = {key: value for key, value in self._tiers.items() if value[1] > now}
+            self._tiers[identity] = (tier, now + self.ttl)
+        return tier
+
+    def forget(self, identity):
+        """Drop identity's tier, e.g. after its subscription changed in this process."""
+        with self._lock:
+            self._tiers.pop(identity, None)
+
+class PolicyEngine:
+    """
+    Apply per-endpoint, per-class limits and LLM concurrency caps.
+
+    Args:
+        limiter: ratelimit.RateLimiter that keeps the counters
+        limits: {endpoint: {client class: limit}} from config
+        llm_concurrency: {client class: cap} from config
+        path: JSON file whose policies override those, None for none
+        reload_interval: Seconds between checks of the file for changes
+        tier_ttl: Seconds a user's tier is cached (see TierCache)
+    """
+
+    def __init__(self, limiter, limits, llm_concurrency=None, path=None, reload_interval=5.0, tier_ttl=60.0):
+        self.limiter = limiter
+        self.path = path
+        self.reload_interval = reload_interval
+        self.tiers = TierCache(ttl=tier_ttl)
+        self._base = (limits or {}, llm_concurrency or {})
+        self._limits, self._caps = parse_policies(*self._base)  # Invalid configuration fails at startup
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = Lock()
+        self._in_flight = {}
+        self._stats = {"llm_shed": 0, "reloads": 0, "reload_errors": 0}
+        LLM_SHED.track(self, lambda engine: {(): engine.stats()["llm_shed"]})
+        LLM_IN_FLIGHT.track(self, lambda engine: {(client_class,): count for client_class, count
+                                                  in engine.stats()["llm_in_flight"].items()})
+        if path:
+            self.reload(force=True)
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def update(self, limits=None, llm_concurrency=None):
+        """
+        Replace the entries given, per endpoint and client class, until the next change of the file.
+
+        Raises:
+            ValueError: If the result is not a valid policy set
+        """
+        with self._lock:
+            base_limits, base_caps = self._base
+            merged = (merge_policies(base_limits, limits), {**base_caps, **(llm_concurrency or {})})
+            self._limits, self._caps = parse_policies(*merged)
+            self._base = merged
+
+    def reload(self, force=False):
+        """
+        Load the policy file if it changed since the last load.
+
+        Returns:
+            bool: Whether new policies were applied
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime and not force:
+            return False
+        self._mtime = mtime
+
+        overrides = {}
+        if mtime is not None:
+            try:
+                with open(self.path) as f:
+                    overrides = json.load(f)
+                if not isinstance(overrides, dict):
+                    raise ValueError("expected an object with 'limits' and 'llm_concurrency'")
+                base_limits, base_caps = self._base
+                limits, caps = parse_policies(merge_policies(base_limits, overrides.get('limits')),
+                                              {**base_caps, **(overrides.get('llm_concurrency') or {})})
+            except (OSError, ValueError) as e:
+                self._count("reload_errors")
+                logger.error(f"Keeping the current rate limit policies, {self.path} is invalid: {e}")
+                return False
+        else:
+            limits, caps = parse_policies(*self._base)
+
+        with self._lock:
+            self._limits, self._caps = limits, caps
+            self._stats["reloads"] += 1
+        logger.info(f"Loaded rate limit policies from {self.path if mtime is not None else 'config'}")
+        return True
+
+    def _maybe_reload(self):
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        self.reload()
+
+    def policy(self, endpoint, client_class):
+        """Return the Policy for endpoint and client_class, None if it is not limited."""
+        self._maybe_reload()
+        classes = self._limits.get(endpoint)
+        if not classes:
+            return None
+        policy = classes.get(client_class)
+        if policy is None and client_class != 'anonymous':
+            policy = classes.get('authenticated')
+        return policy or classes.get('*')
+
+    def check(self, endpoint, client, client_class, cost=1):
+        """
+        Count a request to endpoint by client (user or address) against its class's limit.
+
+        Returns:
+            ratelimit.RateLimitResult, or None if the endpoint is not limited for the class
+        """
+        policy = self.policy(endpoint, client_class)
+        if policy is None:
+            return None
+        return self.limiter.hit(f"{endpoint}:{client}", policy.limit, policy.period, burst=policy.burst, cost=cost)
+
+    def llm_slot(self, client_class):
+        """
+        Take one of the class's in-flight LLM calls.
+
+        Returns:
+            LLMSlot to release when the call ends, or None if the class is at its cap
+        """
+        self._maybe_reload()
+        cap = self._caps.get(client_class, self._caps.get('*', 0))
+        with self._lock:
+            in_flight = self._in_flight.get(client_class, 0)
+            if cap and in_flight >= cap:
+                self._stats["llm_shed"] += 1
+                return None
+            self._in_flight[client_class] = in_flight + 1
+        return LLMSlot(self, client_class)
+
+    def _release(self, client_class):
+        with self._lock:
+            self._in_flight[client_class] -= 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["llm_in_flight"] = {key: value for key, value in self._in_flight.items() if value}
+        stats["limiter"] = self.limiter.stats()
+        return stats
@@ -0,0 +1,259 @@
+"""
+Rate limiter for the API.
+
+Limits are enforced with GCRA (the generic cell rate algorithm, a token
+bucket kept as one number): each key stores the theoretical arrival time
+(TAT) at which its bucket would be full again. A request is allowed if,
+after adding its cost, the TAT is at most `burst` emission intervals ahead
+of now. Each check is O(1), whatever the limit or the traffic, and a key
+whose TAT has passed holds no information, so idle keys simply expire.
+
+Two stores keep the TATs:
+
+    memory  Per process, in independently locked shards. Expired keys are
+            swept when a shard doubles in size, so idle users cost nothing.
+    socket  Shared by every worker through a Redis-protocol store (Redis,
+            or cache_server.py over a Unix socket). The check runs as one
+            atomic script (GCRA_SCRIPT) with the store's clock, so N workers
+            enforce the configured limit rather than N times it.
+
+If the shared store cannot be reached, requests are allowed (and counted as
+'unavailable'): the limiter protects the service, it must not take it down.
+"""
+
+import hashlib
+import logging
+import math
+import time
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKENDS = ('memory', 'socket')
+
+def gcra(tat, now, interval, burst, cost=1):
+    """
+    Apply one request to a GCRA bucket.
+
+    Args:
+        tat: Stored theoretical arrival time, None for a new key
+        now: Current time, on the same clock as tat
+        interval: Seconds per token (period / limit)
+        burst: Tokens the bucket holds
+        cost: Tokens the request takes
+
+    Returns:
+        tuple: (allowed, new tat or None if rejected, retry_after, reset_after)
+            where reset_after is the seconds until the bucket is full again
+    """
+    if tat is None or tat < now:
+        tat = now
+    new_tat = tat + interval * cost
+    allow_at = new_tat - interval * burst
+    if now < allow_at:
+        return False, None, allow_at - now, tat - now
+    return True, new_tat, 0.0, new_tat - now
+
+# The same algorithm for the shared store, with the store's clock. cache_server.py
+# runs it natively (see cache_server.SCRIPTS); Redis runs the Lua source.
+GCRA_SCRIPT = """
+redis.replicate_commands()  -- Redis < 5 only allows writes after TIME with effects replication
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval * cost
+local allow_at = new_tat - interval * burst
+if now < allow_at then
+  return {0, tostring(allow_at - now), tostring(tat - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.max(1, math.ceil((new_tat - now) * 1000)))
+return {1, '0', tostring(new_tat - now)}
+"""
+
+def script_sha(script):
+    """Return the SHA-1 that EVALSHA uses for script."""
+    return hashlib.sha1(script.encode()).hexdigest()
+
+class RateLimitResult:
+    """
+    Outcome of one rate limit check.
+
+    Args:
+        allowed: Whether the request may proceed
+        limit: Requests allowed per period
+        period: Seconds of the period
+        remaining: Requests that would be allowed right now
+        reset_after: Seconds until the full limit is available again
+        retry_after: Seconds until the request would be allowed (0 if allowed)
+    """
+
+    __slots__ = ('allowed', 'limit', 'period', 'remaining', 'reset_after', 'retry_after')
+
+    def __init__(self, allowed, limit, period, remaining, reset_after, retry_after=0.0):
+        self.allowed = allowed
+        self.limit = limit
+        self.period = period
+        self.remaining = remaining
+        self.reset_after = reset_after
+        self.retry_after = retry_after
+
+    def headers(self):
+        """Return the RateLimit-* headers, with Retry-After if the request was rejected."""
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_after)),
+            "RateLimit-Policy": f"{self.limit};w={int(self.period)}"
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+class MemoryRateLimitStore:
+    """
+    Per-process GCRA store, sharded so that threads rarely wait on each other.
+
+    Args:
+        shards: Independently locked segments
+        sweep_size: Keys a shard may hold before its first sweep of expired keys
+    """
+
+    name = 'memory'
+
+    def __init__(self, shards=16, sweep_size=1024):
+        self.sweep_size = sweep_size
+        self._shards = [{} for _ in range(shards)]
+        self._locks = [Lock() for _ in range(shards)]
+        self._sweep_at = [sweep_size] * shards
+        self._clock = time.monotonic
+
+    def acquire(self, key, interval, burst, cost=1):
+        """
+        Take cost tokens from key's bucket.
+
+        Returns:
+            tuple: (allowed, retry_after, reset_after) as from gcra()
+        """
+        index = hash(key) % len(self._shards)
+        entries = self._shards[index]
+        with self._locks[index]:
+            now = self._clock()
+            allowed, new_tat, retry_after, reset_after = gcra(entries.get(key), now, interval, burst, cost)
+            if allowed:
+                entries[key] = new_tat
+                if len(entries) >= self._sweep_at[index]:
+                    self._sweep(index, now)
+        return allowed, retry_after, reset_after
+
+    def _sweep(self, index, now):
+        """Drop the keys of a shard whose buckets are full again (amortized O(1) per request)."""
+        entries = self._shards[index]
+        for key in [key for key, tat in entries.items() if tat <= now]:
+            del entries[key]
+        self._sweep_at[index] = max(self.sweep_size, 2 * len(entries))
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._shards)
+
+class SocketRateLimitStore:
+    """
+    GCRA store shared by all workers through a Redis-protocol store.
+
+    Args:
+        url: unix:///path/to/socket or redis://host:port/db
+        prefix: Prepended to every key in the store
+        timeout: Socket timeout in seconds
+    """
+
+    name = 'socket'
+
+    def __init__(self, url, prefix='ratelimit:', timeout=0.2):
+        from cache import SocketCache
+
+        self.connection = SocketCache(url, prefix=prefix, timeout=timeout)
+
+    def acquire(self, key, interval, burst, cost=1):
+        """
+        Take cost tokens from key's bucket in one atomic script.
+
+        Returns:
+            tuple: (allowed, retry_after, reset_after), None if the store is unreachable
+        """
+        reply = self.connection.evaluate(GCRA_SCRIPT, [key], [interval, burst, cost])
+        if not isinstance(reply, list) or len(reply) != 3:
+            return None
+        allowed, retry_after, reset_after = reply
+        return bool(allowed), float(retry_after), float(reset_after)
+
+    def __len__(self):
+        return 0  # Expiry is left to the store
+
+class RateLimiter:
+    """
+    Check requests against per-key limits.
+
+    Args:
+        store: MemoryRateLimitStore or SocketRateLimitStore
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = Lock()
+        self._stats = {"allowed": 0, "limited": 0, "unavailable": 0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def hit(self, key, limit, period, burst=None, cost=1):
+        """
+        Count a request against key's limit.
+
+        Args:
+            key: Identifies the limited client, e.g. "endpoint:user"
+            limit: Requests allowed per period
+            period: Seconds
+            burst: Requests allowed at once, limit if None
+            cost: Requests this one counts as
+
+        Returns:
+            RateLimitResult
+        """
+        burst = burst or limit
+        interval = period / limit
+        outcome = self.store.acquire(key, interval, burst, cost)
+        if outcome is None:
+            self._count("unavailable")
+            return RateLimitResult(True, limit, period, burst, 0.0)
+
+        allowed, retry_after, reset_after = outcome
+        self._count("allowed" if allowed else "limited")
+        # Tokens left in the bucket, counted from how far its TAT is ahead of now
+        remaining = max(0, min(burst, int((burst * interval - reset_after) / interval + 1e-9)))
+        return RateLimitResult(allowed, limit, period, remaining, reset_after, retry_after)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["store"] = self.store.name
+        stats["keys"] = len(self.store)
+        return stats
+
+def create_rate_limiter(backend='memory', url=None, shards=16):
+    """
+    Create a rate limiter with the given store.
+
+    Args:
+        backend: 'memory' or 'socket'
+        url: Store URL for the socket backend
+        shards: Segments of the memory backend
+    """
+    if backend == 'memory':
+        return RateLimiter(MemoryRateLimitStore(shards=shards))
+    if backend == 'socket':
+        return RateLimiter(SocketRateLimitStore(url))
+    raise ValueError(f"Unknown rate limit backend '{backend}'. Available backends: {', '.join(RATE_LIMIT_BACKENDS)}")
@@ -0,0 +1,1541 @@
+"""
+REST resources and routes for the Social Skills Coach API.
+
+Nothing here is bound to an application at import time: create_app() (see
+factory.py) registers the resources on its Api and keeps per-app state (the
+conversation cache, the sentiment analyzer and the rate limiter) in
+app.extensions, where the resources look it up through current_app.
+"""
+
+from flask import Blueprint, Response, current_app, g, jsonify, request, stream_with_context
+from flask_restful import Resource
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from datetime import date, datetime
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+import config
+from feedback_patterns import feedback_matcher
+from llm_providers import MOCK_RESPONSES
+from cache import conversation_cache_key, conversation_context
+from models import db, User, Conversation, Feedback, PracticeSession
+from metrics import HANDLER_SECONDS, REGISTRY, stage_timer, timed_iteration
+from query_log import query_budget
+from session_context import build_context, summarize_turns, token_counter
+from write_behind import WriteBehindFull
+import stripe_service
+import tracing
+import progress_service
+import functools
+import json
+import time
+import logging
+import uuid
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+# LLM Configuration
+# The OpenAI SDK is imported when the client is first needed (see
+# factory.warm_up), so scripts that only use the models do not pay for it.
+# One gateway per process shares the connection pool and the circuit breaker
+# (see openai_transport.py), and one provider per process answers the
+# conversations (see llm_providers.py)
+_openai_gateway = None
+_llm_providers = {}
+_llm_lock = Lock()
+
+def create_openai_gateway(api_key=None, base_url=None):
+    """
+    Return an OpenAIGateway with the transport, retry and breaker settings from config.
+
+    Args:
+        api_key: API key, config.OPENAI_API_KEY if None
+        base_url: API base URL, config.OPENAI_BASE_URL if None
+    """
+    from openai_transport import CircuitBreaker, OpenAIGateway, RetryPolicy
+    return OpenAIGateway(
+        policy=RetryPolicy(
+            max_attempts=config.OPENAI_MAX_ATTEMPTS,
+            base_delay=config.OPENAI_RETRY_BASE_DELAY,
+            max_delay=config.OPENAI_RETRY_MAX_DELAY,
+            attempt_timeout=config.OPENAI_ATTEMPT_TIMEOUT,
+            total_timeout=config.REQUEST_TIMEOUT
+        ),
+        breaker=CircuitBreaker(config.OPENAI_BREAKER_THRESHOLD, config.OPENAI_BREAKER_RESET),
+        max_connections=config.OPENAI_MAX_CONNECTIONS,
+        max_keepalive=config.OPENAI_MAX_KEEPALIVE,
+        keepalive_expiry=config.OPENAI_KEEPALIVE_EXPIRY,
+        connect_timeout=config.OPENAI_CONNECT_TIMEOUT,
+        http2=config.OPENAI_HTTP2,
+        api_key=api_key,
+        base_url=base_url
+    )
+
+def get_openai_gateway():
+    """Return the shared OpenAIGateway, creating it on first use."""
+    global _openai_gateway
+    if _openai_gateway is None:
+        with _llm_lock:
+            if _openai_gateway is None:
+                _openai_gateway = create_openai_gateway()
+    return _openai_gateway
+
+def get_openai_client():
+    """Return the shared OpenAI client, creating it on first use."""
+    return get_openai_gateway().client
+
+def llm_provider_name():
+    """Return the configured provider, 'openai' with an OpenAI key and 'mock' without by default."""
+    return config.LLM_PROVIDER or ('openai' if config.OPENAI_API_KEY else 'mock')
+
+def create_llm_provider(name):
+    """Create the provider called name from config."""
+    from llm_providers import MockProvider, OpenAIProvider, StubProvider
+    if name == 'openai':
+        return OpenAIProvider(get_openai_gateway())
+    if name == 'mock':
+        return MockProvider()
+    if name == 'stub':
+        return StubProvider(
+            lambda url: create_openai_gateway(api_key='stub', base_url=url),
+            url=config.LLM_STUB_URL,
+            latency=config.LLM_STUB_LATENCY,
+            token_delay=config.LLM_STUB_TOKEN_DELAY,
+            error_rate=config.LLM_STUB_ERROR_RATE,
+            error_status=config.LLM_STUB_ERROR_STATUS
+        )
+    raise ValueError(f"Unknown LLM provider '{name}'")
+
+def get_llm_provider():
+    """Return the shared provider for this deployment, creating it on first use."""
+    name = llm_provider_name()
+    provider = _llm_providers.get(name)
+    if provider is None:
+        with _llm_lock:
+            provider = _llm_providers.get(name)
+            if provider is None:
+                provider = _llm_providers[name] = create_llm_provider(name)
+    return provider
+
+# Conversation categories and tier requirements
+CATEGORIES = {
+    'small_talk': 'free',
+    'introductions': 'free',
+    'networking': 'basic',
+    'conflict_resolution': 'basic',
+    'job_interviews': 'premium',
+    'dating': 'premium'
+}
+
+# Tier order for comparison
+TIER_ORDER = {'free': 0, 'basic': 1, 'premium': 2}
+
+# Prompt and parameters for conversation responses; both are part of the cache key
+SYSTEM_PROMPT = "You are a social skills coach providing helpful, encouraging advice for the '{category}' context. Keep responses concise and practical."
+GENERATION_PARAMS = {"max_tokens": 150, "temperature": 0.7}
+
+def conversation_model(category):
+    """Return the model that answers conversations in category ('mock' for the mock provider)."""
+    if llm_provider_name() == 'mock':
+        return 'mock'
+    return config.CONVERSATION_MODELS.get(category, config.OPENAI_MODEL)
+
+def conversation_messages(user_input, system_prompt):
+    """Return the chat messages sent to the model for user_input."""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_input}
+    ]
+
+def user_tier(email):
+    """Return the tier of the user with email, None if there is no such user."""
+    return db.session.query(User.tier).filter(User.email == email).scalar()
+
+def client_class(identity):
+    """Return the rate limit class of a request: 'anonymous' without an identity, otherwise the user's tier."""
+    if not identity:
+        return 'anonymous'
+    return current_app.extensions['rate_policies'].tiers.get(identity, user_tier)
+
+def request_identity():
+    """Return the JWT identity of the request, None if it has none or the route does not read tokens."""
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None  # No @jwt_required on the route, e.g. /api/login
+
+def rate_limit_result(endpoint, client, client_class, cost=1):
+    """
+    Count a call to endpoint by client (user or address) against the current app's policies.
+
+    Args:
+        cost: Calls this one counts as
+
+    Returns:
+        RateLimitResult, or None if the endpoint is not limited for client_class
+    """
+    return current_app.extensions['rate_policies'].check(endpoint, client, client_class, cost)
+
+def rate_limit_exceeded(result):
+    """Return the 429 response (with Retry-After) for a rejected RateLimitResult."""
+    return {
+        "success": False, 
+        "message": "Rate limit exceeded. Please try again later."
+    }, 429, result.headers()
+
+def check_rate_limit(endpoint, client, client_class, cost=1):
+    """
+    Count a call to endpoint by client, as cost calls, against the current app's policies.
+
+    The result is kept in flask.g for the RateLimit-* response headers (see
+    rate_limit_headers).
+
+    Returns:
+        tuple: The 429 response if the limit is exceeded, otherwise None
+    """
+    result = g.rate_limit = rate_limit_result(endpoint, client, client_class, cost)
+    if result is not None and not result.allowed:
+        return rate_limit_exceeded(result)
+    return None
+
+def rate_limit_headers(response):
+    """Add the RateLimit-* headers of the request's rate limit check to its response (after_request)."""
+    result = g.pop('rate_limit', None)
+    if result is not None:
+        for name, value in result.headers().items():
+            response.headers.setdefault(name, value)
+    return response
+
+def llm_slot(client_class):
+    """Take an in-flight LLM call for client_class (see PolicyEngine.llm_slot); None if the class is at its cap."""
+    return current_app.extensions['rate_policies'].llm_slot(client_class)
+
+class LLMCapacityExceeded(Exception):
+    """Raised by the call that would have taken an LLM slot when its class is at its cap."""
+
+def llm_capacity_exceeded():
+    """Return the 503 response for a request shed by its class's LLM concurrency cap."""
+    return {
+        "success": False,
+        "message": "The coach is busy right now. Please try again in a moment."
+    }, 503, {"Retry-After": "1"}
+
+# Rate limiting decorator
+def rate_limit(endpoint, cost=None):
+    """
+    Limit calls to a resource with the endpoint's policy for the client's class.
+
+    Runs before the resource touches the database or the model; the client
+    class is kept in flask.g.client_class for llm_slot. cost, if given, is
+    called with no arguments and returns how many calls the request counts
+    as (1 otherwise).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            identity = request_identity()
+            g.client_class = client_class(identity)
+            
+            exceeded = check_rate_limit(endpoint, identity or request.remote_addr, g.client_class,
+                                        cost() if cost else 1)
+            if exceeded:
+                return exceeded
+            
+            return func(*args, **kwargs)
+        
+        return wrapper
+    return decorator
+
+# Performance monitoring decorator
+def measure_performance(func):
+    """
+    Record the execution time of a resource method in the handler histogram
+    (coach_handler_duration_seconds{resource, method}, see metrics.py).
+    """
+    resource, _, method = func.__qualname__.rpartition('.')
+    series = HANDLER_SECONDS.labels(resource or func.__module__, method)
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            series.observe_ns(time.perf_counter_ns() - start)
+    return wrapper
+
+# Fallback response when API fails
+FALLBACK_RESPONSE = "I'm currently experiencing high demand. Please try again in a moment. In the meantime, remember that good conversation skills involve active listening, asking open-ended questions, and showing genuine interest in the other person."
+
+# Mock data for demonstration (will be replaced by database)
+conversations_temp = []  # Temporary storage for conversations
+progress_data = {
+    'conversation_count': [5, 8, 12, 10],
+    'week_labels': ['Week 1', 'Week 2', 'Week 3', 'Week 4'],
+    'skill_scores': [
+        {'skill': 'Conversation Flow', 'score': 78},
+        {'skill': 'Active Listening', 'score': 65},
+        {'skill': 'Empathy', 'score': 82},
+        {'skill': 'Clarity', 'score': 70}
+    ]
+}
+
+# Basic route to check if API is running
+def home():
+    return 'Social Skills Coach API Running'
+
+# Metrics route, registered by the 'api' subsystem
+metrics_routes = Blueprint('metrics', __name__)
+
+@metrics_routes.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Return the metrics of all workers in the Prometheus text format."""
+    return Response(REGISTRY.render(config.METRICS_DIR, config.METRICS_BUCKETS),
+                    mimetype='text/plain; version=0.0.4')
+
+# Stripe webhook route, registered by the 'stripe' subsystem
+stripe_webhooks = Blueprint('stripe_webhooks', __name__)
+
+@stripe_webhooks.route('/stripe-webhook', methods=['POST'])
+def stripe_webhook():
+    stripe = stripe_service.get_stripe()
+
+    # Get the webhook request payload
+    payload = request.data
+    sig_header = request.headers.get('Stripe-Signature')
+    
+    try:
+        # Verify webhook signature
+        event = stripe.Webhook.construct_event(
+            payload, sig_header, config.STRIPE_WEBHOOK_SECRET
+        )
+        
+        # Handle the event based on its type
+        event_type = event['type']
+        logger.info(f"Received Stripe event: {event_type}")
+        
+        if event_type == 'customer.subscription.created':
+            success, message = stripe_service.handle_subscription_created(event)
+        elif event_type == 'customer.subscription.updated':
+            success, message = stripe_service.handle_subscription_updated(event)
+        elif event_type == 'customer.subscription.deleted':
+            success, message = stripe_service.handle_subscription_deleted(event)
+        else:
+            # Log but ignore other event types
+            logger.info(f"Ignoring event type: {event_type}")
+            return jsonify({"status": "ignored", "message": f"Event type {event_type} ignored"}), 200
+        
+        # Return response based on handler result
+        if success:
+            return jsonify({"status": "success", "message": message}), 200
+        else:
+            logger.error(f"Error handling {event_type}: {message}")
+            return jsonify({"status": "error", "message": message}), 400
+            
+    except ValueError as e:
+        # Invalid payload
+        logger.error(f"Invalid Stripe webhook payload: {str(e)}")
+        return jsonify({"status": "error", "message": "Invalid payload"}), 400
+    except stripe.error.SignatureVerificationError as e:
+        # Invalid signature
+        logger.error(f"Invalid Stripe signature: {str(e)}")
+        return jsonify({"status": "error", "message": "Invalid signature"}), 400
+    except Exception as e:
+        # Any other exceptions
+        logger.error(f"Error handling Stripe webhook: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def conversation_feedback(user_input):
+    """Return the short feedback sent with a conversation response."""
+    if len(user_input.split()) < 5:
+        return "Try to be more detailed in your responses."
+    elif '?' not in user_input:
+        return "Consider asking questions to engage the other person."
+    else:
+        return "Good job with your communication!"
+
+def generate_reply(messages, model):
+    """
+    Return the model's reply to chat messages from the deployment's LLM provider.
+
+    Returns FALLBACK_RESPONSE if the call fails after its retries or the
+    circuit breaker is open.
+    """
+    try:
+        with stage_timer('llm_call'), tracing.span('llm.complete', **{"llm.model": model}):
+            return get_llm_provider().complete(messages, model, **GENERATION_PARAMS).strip()
+    except Exception as e:
+        logger.error(f"LLM provider error: {str(e)}")
+        # Return fallback response
+        return FALLBACK_RESPONSE
+
+def generate_conversation_response(user_input, model, system_prompt):
+    """Return the coach's reply to user_input (FALLBACK_RESPONSE if the call fails)."""
+    return generate_reply(conversation_messages(user_input, system_prompt), model)
+
+def stream_conversation_response(user_input, model, system_prompt):
+    """
+    Yield the coach's reply to user_input in pieces as the model produces them.
+
+    Unlike generate_conversation_response, errors are raised to the caller,
+    which may already have sent part of the reply.
+    """
+    pieces = get_llm_provider().stream(conversation_messages(user_input, system_prompt), model, **GENERATION_PARAMS)
+    # llm_call is the time spent waiting for the model, not for the client to read the pieces
+    yield from tracing.traced_generator('llm.stream', timed_iteration('llm_call', pieces), **{"llm.model": model})
+
+def get_feedback_tier(current_user_email):
+    """Return the tier that decides how detailed feedback is (free if anonymous)."""
+    if current_user_email:
+        user = User.query.filter_by(email=current_user_email).first()
+        return user.tier if user else 'free'
+    return 'free'
+
+def analyze_user_input(user_input, user_tier, sentiment=None):
+    """
+    Analyze one user input and build the /api/feedback response body.
+    
+    Args:
+        user_input: Text to analyze
+        user_tier: Tier of the requesting user
+        sentiment: Precomputed (polarity, subjectivity), analyzed here if None
+    
+    Returns:
+        tuple: (response_body, score), score is None for free users
+    """
+    # For free users, return a static message
+    if user_tier == 'free':
+        return {
+            "success": True,
+            "feedback": "Good job! Keep practicing.",
+            "analysis": {
+                "word_count": len(user_input.split()),
+                "tier_limited": True
+            }
+        }, None
+    
+    # For paid users, provide detailed feedback
+    # Analyze sentiment (SENTIMENT_ENGINE, possibly on the worker pool)
+    if sentiment is None:
+        with stage_timer('sentiment'):
+            sentiment = current_app.extensions['sentiment_analyzer'].analyze(user_input)
+    polarity, subjectivity = sentiment
+    
+    # Check for patterns in the text (single pass over the input)
+    pattern_feedbacks = feedback_matcher.match_feedback(user_input)
+    
+    # Generate feedback based on combined rules
+    feedback_text = ""
+    if polarity < -0.2:
+        feedback_text = "Try to sound more positive in your responses."
+    elif polarity > 0.6:
+        feedback_text = "Your positivity is great, just make sure to remain authentic."
+    elif len(user_input.split()) < 5:
+        feedback_text = "Try to elaborate more to create engaging conversations."
+    elif subjectivity > 0.8:
+        feedback_text = "Consider balancing subjective opinions with objective facts."
+    elif '?' not in user_input and len(user_input.split()) > 20:
+        feedback_text = "Try including questions to engage the other person."
+    else:
+        feedback_text = "Good response! Your communication is balanced and effective."
+    
+    # Add pattern-based feedback if found
+    if pattern_feedbacks:
+        feedback_text += " " + pattern_feedbacks[0]  # Add the first matched pattern feedback
+    
+    # Calculate a feedback score (0-100) based on various factors
+    score = 50  # Base score
+    
+    # Adjust based on sentiment
+    if -0.1 <= polarity <= 0.5:  # Neutral to slightly positive is good
+        score += 10
+    elif polarity > 0.5:  # Too positive might be inauthentic
+        score += 5
+    elif polarity < -0.2:  # Too negative is not good
+        score -= 10
+        
+    # Adjust based on word count (neither too short nor too long)
+    word_count = len(user_input.split())
+    if 10 <= word_count <= 30:
+        score += 10
+    elif word_count < 5:
+        score -= 10
+        
+    # Adjust based on questions (engagement)
+    if '?' in user_input:
+        score += 10
+        
+    # Adjust based on pattern matches (poor communication habits)
+    score -= len(pattern_feedbacks) * 5
+    
+    # Ensure score is within 0-100 range
+    score = max(0, min(100, score))
+    
+    return {
+        "success": True,
+        "feedback": feedback_text,
+        "analysis": {
+            "polarity": polarity,
+            "subjectivity": subjectivity,
+            "word_count": word_count,
+            "pattern_matches": pattern_feedbacks,
+            "score": score
+        }
+    }, score
+
+def save_feedback_scores(scores_by_conversation, user):
+    """
+    Store feedback scores for several of a user's conversations with a single UPDATE.
+    
+    As with /api/feedback, the first feedback record of each conversation
+    receives the score. Conversations of other users, and conversations
+    without feedback, are left alone. Errors are logged and rolled back.
+    
+    Args:
+        scores_by_conversation: {conversation_id: score}
+        user: User who owns the conversations
+    
+    Returns:
+        list: Sorted ids of the conversations whose score was not saved
+    """
+    try:
+        records = Feedback.query.options(
+            joinedload(Feedback.conversation)
+        ).filter(
+            Feedback.conversation_id.in_(list(scores_by_conversation.keys())),
+            Feedback.conversation.has(Conversation.user_id == user.id)
+        ).order_by(Feedback.id).all()
+        
+        first_records = {}
+        for record in records:
+            first_records.setdefault(record.conversation_id, record)
+        unmatched = sorted(set(scores_by_conversation) - set(first_records))
+        if unmatched:
+            logger.warning(f"Not saving feedback scores for conversation(s) {unmatched}: not found for user {user.id}")
+        if not first_records:
+            return unmatched
+        
+        new_scores = {record.id: scores_by_conversation[conversation_id] for conversation_id, record in first_records.items()}
+        feedbacks = Feedback.__table__
+        owned = select(Conversation.id).where(Conversation.user_id == user.id)
+        db.session.execute(
+            feedbacks.update()
+            .where(feedbacks.c.id.in_(list(new_scores.keys())))
+            .where(feedbacks.c.conversation_id.in_(owned))
+            .values(score=case(new_scores, value=feedbacks.c.id))
+        )
+        
+        # Records still hold the previous scores, which the rollup needs
+        progress_service.record_feedback_scores([
+            (record.conversation, record.score, new_scores[record.id])
+            for record in first_records.values()
+        ])
+        db.session.commit()
+        logger.info(f"Updated feedback scores for {len(new_scores)} conversation(s)")
+        return unmatched
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error saving feedback scores: {str(e)}")
+        return sorted(scores_by_conversation)
+
+# Feedback Resource with enhanced logic
+class FeedbackResource(Resource):
+    @jwt_required(optional=True)
+    @measure_performance
+    @rate_limit('feedback')
+    def post(self):
+        data = request.get_json()
+        
+        if not data or 'user_input' not in data:
+            return {"success": False, "message": "User input is required"}, 400
+        
+        user_input = data.get('user_input')
+        
+        # Check if the user is authenticated
+        current_user_email = get_jwt_identity()
+        user_tier = get_feedback_tier(current_user_email)
+        
+        response, score = analyze_user_input(user_input, user_tier)
+        
+        # Save the feedback score if user is authenticated
+        if score is not None and current_user_email and 'conversation_id' in data:
+            try:
+                conversation_id = data.get('conversation_id')
+                feedback_record = Feedback.query.filter_by(conversation_id=conversation_id).first()
+                if feedback_record:
+                    previous_score = feedback_record.score
+                    feedback_record.score = score
+                    progress_service.record_feedback_score(feedback_record, previous_score)
+                    db.session.commit()
+                    logger.info(f"Updated feedback score for conversation {conversation_id}")
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error saving feedback score: {str(e)}")
+        
+        return response, 200
+
+def feedback_batch_cost():
+    """Count each input of a /api/feedback/batch request as one feedback call (an invalid batch as one)."""
+    data = request.get_json(silent=True)
+    inputs = data.get('inputs') if isinstance(data, dict) else None
+    if not isinstance(inputs, list) or len(inputs) > config.FEEDBACK_BATCH_MAX_SIZE:
+        return 1
+    return max(1, len(inputs))
+
+# Batch Feedback Resource for dashboards and re-scoring jobs
+class FeedbackBatchResource(Resource):
+    @jwt_required(optional=True)
+    @measure_performance
+    @rate_limit('feedback', cost=feedback_batch_cost)
+    def post(self):
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('inputs'), list):
+            return {"success": False, "message": "A list of inputs is required"}, 400
+        
+        inputs = data.get('inputs')
+        if len(inputs) > config.FEEDBACK_BATCH_MAX_SIZE:
+            return {
+                "success": False,
+                "message": f"Too many inputs. The maximum batch size is {config.FEEDBACK_BATCH_MAX_SIZE}"
+            }, 400
+        
+        # Resolve the user's tier once for the whole batch
+        current_user_email = get_jwt_identity()
+        user_tier = get_feedback_tier(current_user_email)
+        
+        # Analyze the sentiment of all valid paid-tier inputs in one submission
+        valid = [isinstance(item, dict) and isinstance(item.get('user_input'), str) for item in inputs]
+        sentiments = [None] * len(inputs)
+        if user_tier != 'free':
+            texts = [item['user_input'] for item, ok in zip(inputs, valid) if ok]
+            with stage_timer('sentiment'):
+                analyzed = iter(current_app.extensions['sentiment_analyzer'].analyze_many(texts))
+            sentiments = [next(analyzed) if ok else None for ok in valid]
+        
+        results = []
+        scores_by_conversation = {}
+        for item, ok, sentiment in zip(inputs, valid, sentiments):
+            # Errors are reported per item so one bad input does not fail the batch
+            if not ok:
+                results.append({"success": False, "message": "User input is required"})
+                continue
+            
+            try:
+                response, score = analyze_user_input(item['user_input'], user_tier, sentiment)
+            except Exception as e:
+                logger.error(f"Error analyzing batch input: {str(e)}")
+                results.append({"success": False, "message": "Could not analyze input"})
+                continue
+            results.append(response)
+            
+            if score is not None and current_user_email and 'conversation_id' in item:
+                try:
+                    # Later items win, as with sequential /api/feedback calls
+                    scores_by_conversation[int(item['conversation_id'])] = score
+                except (TypeError, ValueError):
+                    logger.warning(f"Ignoring invalid conversation_id in batch: {item['conversation_id']}")
+        
+        response = {"success": True, "results": results}
+        if scores_by_conversation:
+            user = User.query.filter_by(email=current_user_email).first()
+            unsaved = save_feedback_scores(scores_by_conversation, user) if user else sorted(scores_by_conversation)
+            if unsaved:
+                response["unsaved_conversation_ids"] = unsaved
+        
+        return response, 200
+
+def scenarios_used(user, today=None):
+    """Return the scenarios user has used this month (0 if the counter is from an earlier month)."""
+    today = today or date.today()
+    if user.last_reset is None or user.last_reset.month != today.month or user.last_reset.year != today.year:
+        return 0
+    return user.scenarios_accessed or 0
+
+def conversation_access(user_input, category, current_user_email, session=None):
+    """
+    Check a conversation request against the categories and the user's tier.
+
+    Free users are limited to 5 scenarios a month. This only checks the
+    limit; the caller counts the scenario with charge_scenario() once the
+    response is produced, so requests shed or failed on the way are free.
+
+    Args:
+        user_input: The user's message
+        category: Requested conversation category
+        current_user_email: JWT identity, None for anonymous requests
+        session: SQLAlchemy session, db.session if None
+
+    Returns:
+        tuple: (user or None, None) if allowed, otherwise (None, (body, status))
+    """
+    # Validate the category
+    if category not in CATEGORIES:
+        return None, ({
+            "success": False,
+            "message": f"Invalid category. Available categories: {', '.join(CATEGORIES.keys())}"
+        }, 400)
+    
+    # Get the current user if authenticated
+    if session is None:
+        session = db.session
+    user = None
+    
+    if current_user_email:
+        user = session.query(User).filter_by(email=current_user_email).first()
+        
+        if user:
+            # Get user tier and required tier for the category
+            user_tier = user.tier or 'free'
+            required_tier = CATEGORIES[category]
+            
+            # Check if user has access to this category based on their tier
+            if TIER_ORDER[user_tier] < TIER_ORDER[required_tier]:
+                return None, ({
+                    "success": False,
+                    "message": f"Upgrade to {required_tier} tier to access the {category} category",
+                    "upgrade_needed": True,
+                    "required_tier": required_tier
+                }, 403)
+            
+            # For free users, check monthly usage limits (the counter starts over each month)
+            if user_tier == 'free' and scenarios_used(user) >= 5:
+                return None, ({
+                    "success": False,
+                    "message": "Monthly limit reached. Upgrade for unlimited access.",
+                    "upgrade_needed": True,
+                    "scenarios_used": scenarios_used(user),
+                    "scenarios_limit": 5
+                }, 403)
+    
+    return user, None
+
+def charge_scenario(user, session=None):
+    """
+    Count one of a free user's monthly scenarios (other tiers are not counted).
+
+    The counter is incremented in SQL, restarting at 1 in a new month, so
+    concurrent requests each count; user's scenarios_accessed and last_reset
+    are then set to the stored values.
+
+    Args:
+        user: User from conversation_access, None for anonymous requests
+        session: SQLAlchemy session, db.session if None
+    """
+    if user is None or (user.tier or 'free') != 'free':
+        return
+    if session is None:
+        session = db.session
+    today = date.today()
+    this_month = User.last_reset >= today.replace(day=1)
+    session.query(User).filter(User.id == user.id).update({
+        User.scenarios_accessed: case((this_month, func.coalesce(User.scenarios_accessed, 0) + 1), else_=1),
+        User.last_reset: case((this_month, User.last_reset), else_=today)
+    }, synchronize_session=False)
+    session.commit()
+    used, last_reset = session.query(User.scenarios_accessed, User.last_reset).filter(User.id == user.id).one()
+    set_committed_value(user, 'scenarios_accessed', used)
+    set_committed_value(user, 'last_reset', last_reset)
+    logger.info(f"Incremented scenario count for user {user.id} to {used}")
+
+def cached_conversation(user_input, category, model, system_prompt):
+    """
+    Look up a response in the exact-match cache, then the semantic cache.
+
+    Returns:
+        tuple: (cache_key, semantic_context, (ai_text, feedback) or None)
+    """
+    with stage_timer('cache_lookup'):
+        # Stable key over the input, model, prompt and parameters (shared across workers)
+        conversation_cache = current_app.extensions['conversation_cache']
+        cache_key = conversation_cache_key(user_input, category, model, system_prompt, GENERATION_PARAMS)
+        with tracing.span('cache.get') as lookup_span:
+            cached_response = conversation_cache.get(cache_key)
+            lookup_span.set_attribute("cache.hit", cached_response is not None)
+        
+        # Near-duplicate prompts reuse the response text; the feedback is for this input
+        semantic_cache = current_app.extensions.get('semantic_cache')
+        semantic_context = conversation_context(model, system_prompt, GENERATION_PARAMS)
+        if not cached_response and semantic_cache is not None:
+            similar_text = semantic_cache.get(category, semantic_context, user_input)
+            if similar_text is not None:
+                logger.info("Semantic cache hit for conversation response")
+                cached_response = (similar_text, conversation_feedback(user_input))
+                conversation_cache.put(cache_key, cached_response)
+    
+    return cache_key, semantic_context, cached_response
+
+def cache_conversation(cache_key, semantic_context, category, user_input, ai_text, feedback):
+    """Store a generated response in the exact-match and semantic caches (never the fallback)."""
+    if ai_text == FALLBACK_RESPONSE:
+        return
+    with tracing.span('cache.put'):
+        current_app.extensions['conversation_cache'].put(cache_key, (ai_text, feedback))
+    semantic_cache = current_app.extensions.get('semantic_cache')
+    if semantic_cache is not None:
+        semantic_cache.put(category, semantic_context, user_input, ai_text)
+
+def new_conversation(user_id, user_input, ai_text, feedback, category, **fields):
+    """
+    Build a conversation with its feedback attached through the feedbacks
+    relationship, so one flush inserts both: the conversation first, getting
+    its id back with the insert (INSERT ... RETURNING, lastrowid on SQLite),
+    then the feedback with that id.
+
+    Args:
+        fields: Other Conversation columns, e.g. session_id or timestamp
+
+    Returns:
+        Conversation: The new, unsaved conversation
+    """
+    return Conversation(
+        user_id=user_id,
+        user_input=user_input,
+        ai_response=ai_text,
+        category=category,
+        feedbacks=[Feedback(feedback_text=feedback)],
+        **fields
+    )
+
+def save_conversation(user, user_input, ai_text, feedback, category, session=None, practice_session=None, usage=None):
+    """
+    Store a conversation and its feedback for user; database errors are logged.
+
+    The conversation, its feedback and the progress rollup are written with
+    one flush and one commit.
+
+    Args:
+        practice_session: PracticeSession the conversation is a turn of, if any;
+            its compacted summary and totals are committed with the turn
+        usage: Token counts of the request (prompt_tokens, completion_tokens)
+
+    Returns:
+        Conversation: The stored conversation, None if it could not be stored
+    """
+    if session is None:
+        session = db.session
+    user_email = user.email  # Read before the commit expires the user
+    try:
+        fields = {}
+        if practice_session is not None:
+            fields = {
+                "session_id": practice_session.id,
+                "prompt_tokens": usage["prompt_tokens"],
+                "completion_tokens": usage["completion_tokens"]
+            }
+            # Added in the UPDATE, so concurrent turns of the session do not overwrite each other's totals
+            practice_session.turn_count = PracticeSession.turn_count + 1
+            practice_session.prompt_tokens = PracticeSession.prompt_tokens + usage["prompt_tokens"]
+            practice_session.completion_tokens = PracticeSession.completion_tokens + usage["completion_tokens"]
+        conversation = new_conversation(user.id, user_input, ai_text, feedback, category, **fields)
+        session.add(conversation)
+        session.flush()  # Inserts the conversation and its feedback, assigning their ids
+        
+        # Update the progress rollup in the same transaction
+        progress_service.record_conversation(conversation, conversation.feedbacks, session)
+        
+        conversation_id = conversation.id
+        session.commit()
+        # Keep the id loaded, so reading it does not query the conversation again
+        set_committed_value(conversation, 'id', conversation_id)
+    
+        # For compatibility with old code, also store in temporary list
+        conversations_temp.append({
+            'user_email': user_email,
+            'user_message': user_input,
+            'ai_response': ai_text,
+            'feedback': feedback,
+            'category': category,
+            'timestamp': 'Just now'
+        })
+        return conversation
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Database error: {str(e)}")
+        # Continue without storing in DB if there's an error
+        return None
+
+def enqueue_conversation(user, user_input, ai_text, feedback, category):
+    """
+    Queue a conversation for the write-behind flusher (see write_behind.py).
+
+    Returns:
+        bool: Whether it was queued; False if the queue is disabled or stayed full
+    """
+    queue = current_app.extensions.get('write_behind')
+    if queue is None:
+        return False
+    try:
+        queue.put({
+            'write_id': str(uuid.uuid4()),
+            'user_id': user.id,
+            'user_input': user_input,
+            'ai_response': ai_text,
+            'feedback': feedback,
+            'category': category,
+            'timestamp': datetime.utcnow().isoformat()  # Time of the request, not of the flush
+        })
+    except WriteBehindFull as e:
+        logger.warning(f"{str(e)}, storing the conversation synchronously")
+        return False
+
+    # For compatibility with old code, also store in temporary list
+    conversations_temp.append({
+        'user_email': user.email,
+        'user_message': user_input,
+        'ai_response': ai_text,
+        'feedback': feedback,
+        'category': category,
+        'timestamp': 'Just now'
+    })
+    return True
+
+def persist_conversation(user, user_input, ai_text, feedback, category):
+    """Store a conversation through the write-behind queue if enabled and not full, otherwise before returning."""
+    if not enqueue_conversation(user, user_input, ai_text, feedback, category):
+        save_conversation(user, user_input, ai_text, feedback, category)
+
+def store_queued_conversations(records, session=None):
+    """
+    Store conversations queued by enqueue_conversation() in one transaction.
+
+    Records already stored (replayed after a crash) are skipped. Errors are
+    raised, so the flusher keeps the batch and retries it.
+
+    Args:
+        records: Queued records (dicts)
+        session: Session to store them with, db.session if None
+    """
+    if session is None:
+        session = db.session
+    try:
+        stored = set(session.scalars(
+            db.select(Conversation.write_id).where(Conversation.write_id.in_([r['write_id'] for r in records]))
+        ))
+        entries = []
+        for record in records:
+            if record['write_id'] in stored:
+                continue
+            stored.add(record['write_id'])
+            conversation = new_conversation(
+                record['user_id'], record['user_input'], record['ai_response'], record['feedback'], record['category'],
+                write_id=record['write_id'],
+                timestamp=datetime.fromisoformat(record['timestamp'])
+            )
+            entries.append((conversation, conversation.feedbacks))
+        if not entries:
+            return
+        session.add_all([conversation for conversation, _ in entries])
+        session.flush()  # Multi-row inserts for the conversations, then their feedback
+        progress_service.record_conversations(entries, session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+def conversation_usage(user):
+    """Return the usage fields sent to free users."""
+    if user and user.tier == 'free':
+        used = scenarios_used(user)
+        return {
+            "scenarios_used": used,
+            "scenarios_limit": 5,
+            "remaining": 5 - used
+        }
+    return {}
+
+# OpenAI Conversation Resource with optimizations
+class ConversationResource(Resource):
+    @jwt_required(optional=True)
+    @measure_performance
+    @rate_limit('conversation')
+    def post(self):
+        data = request.get_json()
+        
+        if not data or 'user_input' not in data:
+            return {"success": False, "message": "User input is required"}, 400
+        
+        user_input = data.get('user_input')
+        category = data.get('category', 'small_talk')  # Default to small_talk if not specified
+        
+        user, error = conversation_access(user_input, category, get_jwt_identity())
+        if error:
+            return error
+        
+        # Include the category in the prompt for more contextual responses
+        system_prompt = SYSTEM_PROMPT.format(category=category)
+        model = conversation_model(category)
+        cache_key, semantic_context, cached_response = cached_conversation(user_input, category, model, system_prompt)
+        
+        if cached_response:
+            logger.info("Cache hit for conversation response")
+            ai_text, feedback = cached_response
+        else:
+            logger.info("Cache miss for conversation response")
+            client_class = g.client_class
+            
+            def generate_and_cache():
+                # Only the leader calls the model, so only the leader takes a slot; waiters hold none
+                slot = llm_slot(client_class)
+                if slot is None:
+                    raise LLMCapacityExceeded(client_class)
+                with slot:
+                    ai_text = generate_conversation_response(user_input, model, system_prompt)
+                feedback = conversation_feedback(user_input)
+                cache_conversation(cache_key, semantic_context, category, user_input, ai_text, feedback)
+                return ai_text, feedback
+            
+            try:
+                # Concurrent misses for the same key share one upstream call
+                single_flight = current_app.extensions['single_flight']
+                ai_text, feedback = single_flight.do(cache_key, generate_and_cache, timeout=config.SINGLE_FLIGHT_TIMEOUT)
+            except LLMCapacityExceeded:
+                return llm_capacity_exceeded()
+            except Exception as e:
+                logger.error(f"Error generating response: {str(e)}")
+                # Return fallback response
+                ai_text = FALLBACK_RESPONSE
+                feedback = "Try again later for more personalized feedback."
+        
+        # A free user's scenario counts once there is a response
+        if ai_text != FALLBACK_RESPONSE:
+            charge_scenario(user)
+        
+        # Store conversation in database if user is authenticated
+        if user:
+            persist_conversation(user, user_input, ai_text, feedback, category)
+        
+        return {
+            "success": True,
+            "response": ai_text,
+            "feedback": feedback,
+            "category": category,
+            "tier_required": CATEGORIES[category],
+            **conversation_usage(user)
+        }, 200
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Streaming variant of the conversation endpoint (Server-Sent Events)
+class ConversationStreamResource(Resource):
+    """
+    Relay the response to the client as it is generated.
+
+    Sends `token` events ({"text": ...}) as the model produces text, then one
+    `done` event with the full response, the feedback and the usage fields,
+    like /api/conversation. If generation fails, an `error` event is sent and
+    `done` carries the fallback response, which replaces any text sent so far.
+    """
+
+    @jwt_required(optional=True)
+    @measure_performance
+    @rate_limit('conversation')
+    def post(self):
+        data = request.get_json()
+        
+        if not data or 'user_input' not in data:
+            return {"success": False, "message": "User input is required"}, 400
+        
+        user_input = data.get('user_input')
+        category = data.get('category', 'small_talk')  # Default to small_talk if not specified
+        
+        user, error = conversation_access(user_input, category, get_jwt_identity())
+        if error:
+            return error
+        
+        system_prompt = SYSTEM_PROMPT.format(category=category)
+        model = conversation_model(category)
+        cache_key, semantic_context, cached_response = cached_conversation(user_input, category, model, system_prompt)
+        slot = None
+        if not cached_response:
+            slot = llm_slot(g.client_class)
+            if slot is None:
+                return llm_capacity_exceeded()
+        
+        def events():
+            if cached_response:
+                logger.info("Cache hit for streamed conversation response")
+                ai_text, feedback = cached_response
+                yield sse_event('token', {"text": ai_text})
+            else:
+                logger.info("Cache miss for streamed conversation response")
+                parts = []
+                try:
+                    for text in stream_conversation_response(user_input, model, system_prompt):
+                        parts.append(text)
+                        yield sse_event('token', {"text": text})
+                    ai_text = "".join(parts).strip()
+                    feedback = conversation_feedback(user_input)
+                    cache_conversation(cache_key, semantic_context, category, user_input, ai_text, feedback)
+                except Exception as e:
+                    logger.error(f"Error streaming response: {str(e)}")
+                    yield sse_event('error', {"message": "The response could not be completed."})
+                    ai_text = FALLBACK_RESPONSE
+                    feedback = "Try again later for more personalized feedback."
+                finally:
+                    slot.release()
+            
+            # A free user's scenario counts once there is a response
+            if ai_text != FALLBACK_RESPONSE:
+                charge_scenario(user)
+            if user:
+                persist_conversation(user, user_input, ai_text, feedback, category)
+            
+            yield sse_event('done', {
+                "success": True,
+                "response": ai_text,
+                "feedback": feedback,
+                "category": category,
+                "tier_required": CATEGORIES[category],
+                **conversation_usage(user)
+            })
+        
+        # Proxies such as nginx would otherwise buffer the whole stream
+        response = Response(stream_with_context(events()), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        if slot is not None:
+            response.call_on_close(slot.release)  # The client may leave before the stream starts
+        return response
+
+# Prompt for the 'llm' session summarizer
+SUMMARY_PROMPT = ("Summarize this practice conversation between a user and a social skills coach in a few short "
+                  "bullet points: what the user wants to practice, what they said and the advice they were given.")
+
+def llm_summarizer(model):
+    """
+    Return a session summarizer that asks the model to fold turns into the summary.
+
+    Falls back to the extractive summary if the call fails.
+    """
+    def summarize(summary, turns, max_tokens):
+        transcript = "\n".join(f"User: {turn.user_input}\nCoach: {turn.ai_response}" for turn in turns)
+        if summary:
+            transcript = f"Summary so far:\n{summary}\n\nNew turns:\n{transcript}"
+        try:
+            reply = get_llm_provider().complete(
+                [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+                model, max_tokens=max_tokens, temperature=0
+            )
+            return reply.strip()
+        except Exception as e:
+            logger.error(f"Session summary error: {str(e)}")
+            return summarize_turns(summary, turns, max_tokens)
+    return summarize
+
+def owned_practice_session(session_id, current_user_email):
+    """
+    Return the user's practice session with session_id.
+
+    Returns:
+        tuple: (practice_session, None) or (None, (body, status))
+    """
+    practice_session = (PracticeSession.query
+                        .join(User, PracticeSession.user_id == User.id)
+                        .filter(PracticeSession.id == session_id, User.email == current_user_email)
+                        .first())
+    if practice_session is None:
+        return None, ({"success": False, "message": "Practice session not found"}, 404)
+    return practice_session, None
+
+# Multi-turn practice sessions
+class PracticeSessionResource(Resource):
+    """Start a practice session; starting one counts as a scenario for free users."""
+
+    @jwt_required()
+    def post(self):
+        data = request.get_json(silent=True) or {}
+        category = data.get('sessionType') or data.get('category') or 'small_talk'
+        
+        user, error = conversation_access(None, category, get_jwt_identity())
+        if error:
+            return error
+        if not user:
+            return {"success": False, "message": "User not found"}, 404
+        charge_scenario(user)
+        
+        practice_session = PracticeSession(user_id=user.id, category=category)
+        db.session.add(practice_session)
+        db.session.commit()
+        
+        return {
+            "success": True,
+            "session_id": practice_session.id,
+            "category": category,
+            "tier_required": CATEGORIES[category],
+            **conversation_usage(user)
+        }, 201
+
+class PracticeSessionMessageResource(Resource):
+    """
+    Answer a message in a practice session with the session's earlier turns.
+
+    The history is compacted to SESSION_CONTEXT_TOKENS (see session_context.py);
+    the response reports the request's token counts.
+    """
+
+    @jwt_required()
+    @measure_performance
+    @rate_limit('practice_session')
+    def post(self, session_id):
+        data = request.get_json()
+        
+        if not data or not data.get('message'):
+            return {"success": False, "message": "Message is required"}, 400
+        
+        practice_session, error = owned_practice_session(session_id, get_jwt_identity())
+        if error:
+            return error
+        if practice_session.ended_at is not None:
+            return {"success": False, "message": "Practice session has ended"}, 409
+        
+        user_input = data['message']
+        category = practice_session.category
+        model = conversation_model(category)
+        turns = (Conversation.query
+                 .filter(Conversation.session_id == practice_session.id,
+                         Conversation.id > (practice_session.summarized_through_id or 0))
+                 .order_by(Conversation.id)
+                 .all())
+        summarizer = llm_summarizer(model) if config.SESSION_SUMMARIZER == 'llm' else None
+        # The slot covers the summary call as well as the reply
+        slot = llm_slot(g.client_class)
+        if slot is None:
+            return llm_capacity_exceeded()
+        with slot:
+            messages, usage = build_context(
+                practice_session, turns, SYSTEM_PROMPT.format(category=category), user_input,
+                config.SESSION_CONTEXT_TOKENS, config.SESSION_SUMMARY_TOKENS, summarizer
+            )
+            ai_text = generate_reply(messages, model)
+        
+        feedback = conversation_feedback(user_input)
+        usage["completion_tokens"] = token_counter.count(ai_text)
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        logger.info(f"Practice session {practice_session.id}: {usage['prompt_tokens']} prompt tokens, "
+                    f"{usage['turns_in_context']} turns in context, {usage['turns_compacted']} compacted")
+        
+        conversation = save_conversation(practice_session.user, user_input, ai_text, feedback, category,
+                                         practice_session=practice_session, usage=usage)
+        if conversation is None:
+            return {"success": False, "message": "The message could not be stored"}, 500
+        
+        return {
+            "success": True,
+            "session_id": practice_session.id,
+            "message_id": conversation.id,
+            "response": ai_text,
+            "feedback": feedback,
+            "usage": usage
+        }, 200
+
+class PracticeSessionEndResource(Resource):
+    """End a practice session and report its totals."""
+
+    @jwt_required()
+    def post(self, session_id):
+        practice_session, error = owned_practice_session(session_id, get_jwt_identity())
+        if error:
+            return error
+        if practice_session.ended_at is None:
+            practice_session.ended_at = datetime.utcnow()
+            db.session.commit()
+        
+        return {
+            "success": True,
+            "session_id": practice_session.id,
+            "turns": practice_session.turn_count,
+            "prompt_tokens": practice_session.prompt_tokens,
+            "completion_tokens": practice_session.completion_tokens,
+            "summary": practice_session.summary
+        }, 200
+
+# User Registration Resource
+class UserRegister(Resource):
+    @rate_limit('register')
+    def post(self):
+        data = request.get_json()
+        
+        if not data:
+            return {"success": False, "message": "No input data provided"}, 400
+        
+        email = data.get('email')
+        password = data.get('password')
+        
+        # Validate inputs
+        if not email or not password:
+            return {"success": False, "message": "Email and password are required"}, 400
+        
+        # Check if user already exists
+        existing_user = User.query.filter_by(email=email).first()
+        if existing_user:
+            return {"success": False, "message": "Email already registered"}, 400
+        
+        # Create new user and add to database
+        new_user = User(email=email, password=password)
+        db.session.add(new_user)
+        db.session.commit()
+        
+        # Create Stripe customer for the user
+        stripe_customer_created = stripe_service.create_stripe_customer(new_user)
+        if not stripe_customer_created:
+            logger.warning(f"Failed to create Stripe customer for user {new_user.id}")
+            # Continue anyway, we can create customer later
+        
+        return {"success": True, "message": "User registered successfully"}, 201
+
+# User Login Resource
+class UserLogin(Resource):
+    @rate_limit('login')
+    def post(self):
+        data = request.get_json()
+        
+        if not data:
+            return {"success": False, "message": "No input data provided"}, 400
+        
+        email = data.get('email')
+        password = data.get('password')
+        
+        # Validate inputs
+        if not email or not password:
+            return {"success": False, "message": "Email and password are required"}, 400
+        
+        # Check if user exists and verify password
+        user = User.query.filter_by(email=email).first()
+        if user and user.verify_password(password):
+            # Generate access token
+            access_token = create_access_token(identity=email)
+            return {
+                "success": True,
+                "message": "Login successful",
+                "access_token": access_token,
+                "user": {
+                    "email": email, 
+                    "id": user.id,
+                    "tier": user.tier,
+                    "subscription_status": user.subscription_status
+                }
+            }, 200
+        
+        return {"success": False, "message": "Invalid credentials"}, 401
+
+# Subscription Resource
+class SubscriptionResource(Resource):
+    @jwt_required()
+    def get(self):
+        """Get current user's subscription info"""
+        current_user_email = get_jwt_identity()
+        user = User.query.filter_by(email=current_user_email).first()
+        
+        if not user:
+            return {"success": False, "message": "User not found"}, 404
+        
+        # Get tier information from subscription_manager
+        tier = user.tier or 'free'
+        tier_info = stripe_service.SUBSCRIPTION_TIERS.get(tier, stripe_service.SUBSCRIPTION_TIERS['free'])
+        
+        # Calculate days until reset
+        today = date.today()
+        if user.last_reset:
+            # If it's a new month, the reset date would be today
+            if user.last_reset.month != today.month or user.last_reset.year != today.year:
+                next_reset = today
+            else:
+                # Otherwise, the reset will be on the same day next month
+                next_month = today.month + 1 if today.month < 12 else 1
+                next_year = today.year if today.month < 12 else today.year + 1
+                next_reset = date(next_year, next_month, user.last_reset.day)
+        else:
+            next_reset = today
+        
+        return {
+            "success": True,
+            "tier": tier,
+            "status": user.subscription_status,
+            "scenarios_used": user.scenarios_accessed,
+            "scenarios_limit": tier_info['monthly_scenarios'] if tier_info['monthly_scenarios'] != float('inf') else "unlimited",
+            "reset_date": next_reset.strftime('%Y-%m-%d'),
+            "features": {
+                "advanced_features": tier_info['advanced_features'],
+                "feedback_analysis": tier_info['feedback_analysis']
+            }
+        }, 200
+        
+    @jwt_required()
+    def post(self):
+        """Create a subscription checkout session"""
+        current_user_email = get_jwt_identity()
+        user = User.query.filter_by(email=current_user_email).first()
+        
+        if not user:
+            return {"success": False, "message": "User not found"}, 404
+        
+        data = request.get_json()
+        if not data or 'tier' not in data:
+            return {"success": False, "message": "Tier is required"}, 400
+            
+        tier = data.get('tier')
+        
+        # Validate tier
+        if tier not in ['basic', 'premium']:
+            return {"success": False, "message": "Invalid tier. Choose 'basic' or 'premium'"}, 400
+        
+        # Create checkout session
+        checkout_url = stripe_service.create_checkout_session(user, tier)
+        
+        if not checkout_url:
+            return {"success": False, "message": "Failed to create checkout session"}, 500
+            
+        return {
+            "success": True,
+            "checkout_url": checkout_url
+        }, 200
+
+# Subscription Cancel Resource
+class SubscriptionCancelResource(Resource):
+    @jwt_required()
+    def post(self):
+        """Cancel user's subscription"""
+        current_user_email = get_jwt_identity()
+        user = User.query.filter_by(email=current_user_email).first()
+        
+        if not user:
+            return {"success": False, "message": "User not found"}, 404
+            
+        if not user.subscription_id:
+            return {"success": False, "message": "No active subscription found"}, 400
+            
+        # Cancel the subscription
+        success = stripe_service.cancel_subscription(user)
+        
+        if not success:
+            return {"success": False, "message": "Failed to cancel subscription"}, 500
+            
+        return {
+            "success": True,
+            "message": "Subscription canceled successfully"
+        }, 200
+
+# Conversation Practice Resource
+class ConversationPractice(Resource):
+    @jwt_required()
+    @rate_limit('practice')
+    def post(self):
+        # Get the current user from JWT
+        current_user_email = get_jwt_identity()
+        user = User.query.filter_by(email=current_user_email).first()
+        
+        if not user:
+            return {"success": False, "message": "User not found"}, 404
+        
+        data = request.get_json()
+        user_message = data.get('message')
+        
+        # In a real app, this would use an AI model to generate responses
+        ai_response = "That's great! Can you tell me more about how you would handle this situation?"
+        
+        # Generate feedback based on the message
+        feedback = "Try to speak more confidently and make eye contact. Your response was clear, but could include more specific details."
+        
+        # Store in database, with the progress rollup in the same transaction
+        if save_conversation(user, user_message, ai_response, feedback, None) is None:
+            return {"success": False, "message": "The message could not be stored"}, 500
+        
+        return jsonify({
+            'response': ai_response,
+            'feedback': feedback
+        })
+    
+    @jwt_required()
+    @query_budget(2)
+    def get(self):
+        # Get the current user from JWT
+        current_user_email = get_jwt_identity()
+        user = User.query.filter_by(email=current_user_email).first()
+        
+        if not user:
+            return {"success": False, "message": "User not found"}, 404
+        
+        # Get conversations with their feedback in one query
+        db_conversations = Conversation.query.options(joinedload(Conversation.feedbacks)).filter_by(user_id=user.id).all()
+        
+        # Format results
+        results = []
+        for convo in db_conversations:
+            # Get the feedback for this conversation
+            feedback_record = min(convo.feedbacks, key=lambda feedback: feedback.id, default=None)
+            feedback_text = feedback_record.feedback_text if feedback_record else "No feedback available."
+            
+            results.append({
+                'user_email': current_user_email,
+                'user_message': convo.user_input,
+                'ai_response': convo.ai_response,
+                'feedback': feedback_text,
+                'timestamp': convo.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+            })
+        
+        # Return conversation history
+        return jsonify(results)
+
+# Progress Tracking Resource
+class ProgressTracking(Resource):
+    @jwt_required()
+    @query_budget(2)
+    def get(self):
+        # Get the current user from JWT
+        current_user_email = get_jwt_identity()
+        user = User.query.filter_by(email=current_user_email).first()
+        
+        if not user:
+            return {"success": False, "message": "User not found"}, 404
+        
+        # Get user's tier
+        user_tier = user.tier or 'free'
+        
+        # Read the user's weekly rollup rows (one query, O(weeks) rows)
+        rollup_rows = progress_service.get_rollup_rows(user.id)
+        
+        # Base response for free users
+        response = {
+            "success": True,
+            "scenarios_completed": progress_service.count_conversations(rollup_rows),
+            "tier": user_tier
+        }
+        
+        # For basic and premium users, add category stats
+        if user_tier in ['basic', 'premium']:
+            summary = progress_service.get_category_summary(rollup_rows)
+            response.update({
+                "category_stats": summary["category_stats"],
+                "average_feedback_score": summary["average_feedback_score"]
+            })
+        
+        # For premium users, include trends over time
+        if user_tier == 'premium':
+            response.update({
+                "trends": progress_service.get_weekly_trends(rollup_rows),
+                "improvement_areas": progress_service.get_improvement_areas(
+                    rollup_rows, summary["category_averages"]
+                )
+            })
+        
+        return jsonify(response)
+
+def register_resources(api):
+    """Add the REST resources and the home route to a Flask-RESTful Api."""
+    api.app.add_url_rule('/', 'home', home)
+    api.add_resource(UserRegister, '/api/register')
+    api.add_resource(UserLogin, '/api/login')
+    api.add_resource(ConversationPractice, '/api/practice')
+    api.add_resource(PracticeSessionResource, '/api/practice/session')
+    api.add_resource(PracticeSessionMessageResource, '/api/practice/session/<int:session_id>/message')
+    api.add_resource(PracticeSessionEndResource, '/api/practice/session/<int:session_id>/end')
+    api.add_resource(ProgressTracking, '/api/progress')
+    api.add_resource(ConversationResource, '/api/conversation')
+    api.add_resource(ConversationStreamResource, '/api/conversation/stream')
+    api.add_resource(FeedbackResource, '/api/feedback')
+    api.add_resource(FeedbackBatchResource, '/api/feedback/batch')
+    api.add_resource(SubscriptionResource, '/api/subscription')
+    api.add_resource(SubscriptionCancelResource, '/api/subscription/cancel')
@@ -0,0 +1,187 @@
+"""
+Semantic cache for conversation responses.
+
+Catches near-duplicate prompts that the exact-match conversation cache
+misses, such as "how do I make small talk at parties?" and "how can I make
+small talk at a party". Each input gets a locally computed signature:
+words (stop words removed, lightly stemmed), word pairs and character
+trigrams, hashed into a fixed-size vector and L2-normalized. A lookup is one
+NumPy matrix-vector product against the signatures cached for the
+category; the best match is returned if its cosine similarity reaches the
+threshold. Runs on the CPU, with no model to download.
+"""
+
+import re
+import zlib
+from threading import Lock
+import numpy as np
+from cache import normalize_text
+from metrics import REGISTRY
+
+DIMENSIONS = 1024
+
+NEAR_MISSES = REGISTRY.counter('coach_semantic_cache_near_misses_total',
+                               "Semantic cache misses within the near-miss margin of the threshold.")
+HIT_SIMILARITY = REGISTRY.histogram('coach_semantic_cache_hit_similarity',
+                                    "Cosine similarity of semantic cache hits to the cached input.",
+                                    buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 0.99))
+
+# Function words that rarely change what is being asked
+STOP_WORDS = frozenset(
+    "a an the i me my to do does did can could would should will how what is are am be "
+    "of in on at for with and or it that this you your".split()
+)
+
+WORD_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.5
+
+WORD_RE = re.compile(r"[\w']+")
+
+def _stem(word):
+    """Strip common English suffixes ("parties" -> "party", "meeting" -> "meet")."""
+    for suffix, replacement in (("ies", "y"), ("ing", ""), ("ed", ""), ("es", ""), ("s", "")):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)] + replacement
+    return word
+
+def embed(text):
+    """
+    Return the unit-length signature vector of a text.
+
+    Features are hashed with CRC32, so signatures are the same in every
+    process.
+    """
+    words = [_stem(word) for word in WORD_RE.findall(normalize_text(text)) if word not in STOP_WORDS]
+    features = [(f"w:{word}", WORD_WEIGHT) for word in words]
+    features += [(f"p:{first} {second}", WORD_WEIGHT) for first, second in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        features += [(f"c:{padded[i:i + 3]}", TRIGRAM_WEIGHT) for i in range(len(padded) - 2)]
+
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for feature, weight in features:
+        h = zlib.crc32(feature.encode())
+        # The top bit picks the sign, so colliding features tend to cancel out
+        vector[h % DIMENSIONS] += weight if h & 0x80000000 else -weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class _CategoryIndex:
+    """Signatures and responses cached for one category."""
+
+    def __init__(self, context, capacity):
+        self.context = context
+        self.vectors = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        self.values = [None] * capacity
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+
+    def best_match(self, vector):
+        """Return (row, similarity) of the closest signature, or (None, 0.0)."""
+        if not self.size:
+            return None, 0.0
+        similarities = self.vectors[:self.size] @ vector
+        row = int(np.argmax(similarities))
+        return row, float(similarities[row])
+
+class SemanticCache:
+    """
+    Near-duplicate cache of conversation responses, one index per category.
+
+    Each category keeps at most capacity entries and evicts the least
+    recently used one when full. The context (model, prompt and parameters,
+    see cache.conversation_context) is stored with each category's index;
+    when it changes, that index is cleared.
+
+    Args:
+        threshold: Minimum cosine similarity for a hit
+        capacity: Entries kept per category
+        near_miss_margin: Misses within this distance of the threshold are
+            counted as near misses, to help tune the threshold
+    """
+
+    def __init__(self, threshold=0.9, capacity=500, near_miss_margin=0.1):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.near_miss_margin = near_miss_margin
+        self._indexes = {}
+        self._clock = 0
+        self._lock = Lock()
+        self._stats = {"hits": 0, "misses": 0, "near_misses": 0, "evictions": 0, "invalidations": 0}
+        self._hit_similarity_total = 0.0
+        self._hit_similarity_min = None
+        NEAR_MISSES.track(self, _near_misses)
+
+    def _index(self, category, context):
+        index = self._indexes.get(category)
+        if index is not None and index.context != context:
+            self._stats["invalidations"] += index.size
+            index = None
+        if index is None:
+            index = self._indexes[category] = _CategoryIndex(context, self.capacity)
+        return index
+
+    def get(self, category, context, text):
+        """
+        Return the cached response for the most similar earlier input.
+
+        Args:
+            category: Conversation category
+            context: Digest of the model, prompt and parameters
+            text: User input
+
+        Returns:
+            The cached value, or None if nothing is similar enough
+        """
+        vector = embed(text)
+        with self._lock:
+            index = self._index(category, context)
+            row, similarity = index.best_match(vector)
+            if row is None or similarity < self.threshold:
+                self._stats["misses"] += 1
+                if row is not None and similarity >= self.threshold - self.near_miss_margin:
+                    self._stats["near_misses"] += 1
+                return None
+
+            self._clock += 1
+            index.last_used[row] = self._clock
+            self._stats["hits"] += 1
+            self._hit_similarity_total += similarity
+            if self._hit_similarity_min is None or similarity < self._hit_similarity_min:
+                self._hit_similarity_min = similarity
+            HIT_SIMILARITY.labels().observe(similarity)
+            return index.values[row]
+
+    def put(self, category, context, text, value):
+        """Cache value for text, replacing an entry with the same signature."""
+        vector = embed(text)
+        with self._lock:
+            index = self._index(category, context)
+            row, similarity = index.best_match(vector)
+            if row is None or similarity < 0.999:
+                if index.size < self.capacity:
+                    row = index.size
+                    index.size += 1
+                else:
+                    row = int(np.argmin(index.last_used))
+                    self._stats["evictions"] += 1
+            self._clock += 1
+            index.vectors[row] = vector
+            index.values[row] = value
+            index.last_used[row] = self._clock
+
+    def stats(self):
+        """Return hit and miss counters, hit similarity and entries per category."""
+        with self._lock:
+            stats = dict(self._stats)
+            hits = stats["hits"]
+            lookups = hits + stats["misses"]
+            stats["hit_rate"] = hits / lookups if lookups else 0.0
+            stats["hit_similarity_mean"] = self._hit_similarity_total / hits if hits else None
+            stats["hit_similarity_min"] = self._hit_similarity_min
+            stats["entries"] = {category: index.size for category, index in self._indexes.items()}
+            stats["threshold"] = self.threshold
+            return stats
+
+def _near_misses(cache):
+    return {(): cache.stats()["near_misses"]}
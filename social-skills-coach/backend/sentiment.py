@@ -0,0 +1,305 @@
+"""
+Sentiment analysis for the Social Skills Coach API.
+
+Polarity and subjectivity come from TextBlob or from the vectorized
+lexicon engine in lexicon_sentiment.py (SENTIMENT_ENGINE in config.py),
+which uses the same lexicon and scores whole batches with NumPy.
+
+TextBlob sentiment is pure Python and holds the GIL, so a long input
+analyzed on the request thread stalls every other request in the worker.
+SentimentAnalyzer runs analysis inline, in a thread pool or in a process
+pool (SENTIMENT_EXECUTOR in config.py). Pool workers load the lexicon once
+when they start and stay warm. Pooled requests wait at most
+SENTIMENT_TIMEOUT seconds and fall back to a cheap word-list heuristic when
+the pool is saturated or too slow.
+
+This module must stay cheap to import: process pool workers import it.
+"""
+
+import logging
+import multiprocessing
+import re
+import time
+from concurrent.futures import (
+    BrokenExecutor, ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+)
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ('inline', 'thread', 'process')
+ENGINES = ('textblob', 'lexicon')
+
+# Small word lists for the fallback heuristic
+POSITIVE_WORDS = frozenset([
+    'good', 'great', 'love', 'like', 'happy', 'glad', 'nice', 'enjoy', 'excited', 'helpful',
+    'interesting', 'appreciate', 'thanks', 'thank', 'wonderful', 'excellent', 'fun', 'confident',
+    'awesome', 'amazing', 'better', 'best', 'kind', 'calm', 'comfortable'
+])
+NEGATIVE_WORDS = frozenset([
+    'bad', 'hate', 'sad', 'angry', 'awful', 'terrible', 'nervous', 'anxious', 'afraid', 'scared',
+    'worried', 'boring', 'hard', 'difficult', 'awkward', 'uncomfortable', 'worse', 'worst',
+    'sorry', 'upset', 'lonely', 'shy', 'annoying', 'stupid', 'wrong'
+])
+WORD_RE = re.compile(r"[a-z']+")
+
+def analyze_text(text, engine='textblob'):
+    """
+    Return (polarity, subjectivity) for a text.
+
+    Args:
+        text: Text to analyze
+        engine: 'textblob' or 'lexicon'
+
+    Returns:
+        tuple: (polarity, subjectivity)
+    """
+    if engine == 'lexicon':
+        from lexicon_sentiment import get_engine
+        return get_engine().analyze(text)
+
+    from textblob import TextBlob
+
+    sentiment = TextBlob(text).sentiment
+    return sentiment.polarity, sentiment.subjectivity
+
+def analyze_batch(texts, engine='textblob'):
+    """
+    Return (polarity, subjectivity) for each text, in order.
+
+    The pooled modes run this as one task per chunk of a batch, so the
+    lexicon engine scores the whole chunk in one call.
+    """
+    if engine == 'lexicon':
+        from lexicon_sentiment import get_engine
+        return get_engine().analyze_many(texts)
+    return [analyze_text(text, engine) for text in texts]
+
+def heuristic_sentiment(text):
+    """
+    Cheap fallback estimate of (polarity, subjectivity) from word lists.
+
+    Polarity is the balance of positive and negative words scaled to
+    [-0.5, 0.5]; subjectivity grows with the share of opinion words.
+    """
+    words = WORD_RE.findall(text.lower())
+    positive = sum(1 for word in words if word in POSITIVE_WORDS)
+    negative = sum(1 for word in words if word in NEGATIVE_WORDS)
+    opinion = positive + negative
+    if opinion == 0:
+        return 0.0, 0.0
+    polarity = 0.5 * (positive - negative) / opinion
+    subjectivity = min(1.0, 0.3 + opinion / max(len(words), 1))
+    return polarity, subjectivity
+
+def _warm_worker(engine='textblob'):
+    """Pool initializer: load the engine and its lexicon once per worker."""
+    analyze_text("Warming up the sentiment analyzer.", engine)
+
+class SentimentAnalyzer:
+    """
+    Run sentiment analysis inline or on a warm thread or process pool.
+
+    Args:
+        mode: 'inline', 'thread' or 'process'
+        engine: 'textblob' or 'lexicon'
+        workers: Pool size for the thread and process modes
+        timeout: Seconds a request waits for pooled results before falling back
+        max_pending: Submitted but unfinished pool tasks allowed before new
+            batches fall back immediately (defaults to 4 per worker)
+        start_method: multiprocessing start method for the process pool
+    """
+
+    def __init__(self, mode='inline', engine='textblob', workers=2, timeout=2.0, max_pending=None,
+                 start_method='spawn'):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Invalid sentiment executor '{mode}'. Choose one of: {', '.join(EXECUTOR_MODES)}")
+        if engine not in ENGINES:
+            raise ValueError(f"Invalid sentiment engine '{engine}'. Choose one of: {', '.join(ENGINES)}")
+        self.mode = mode
+        self.engine = engine
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending if max_pending is not None else workers * 4
+        self.start_method = start_method
+
+        self._executor = None
+        self._lock = Lock()
+        self._pending = 0
+        self._stats = {"analyzed": 0, "saturated": 0, "timeouts": 0, "errors": 0}
+
+    def _get_executor(self):
+        # Created on first use so that each forked web worker gets its own pool
+        with self._lock:
+            if self._executor is None:
+                if self.mode == 'thread':
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix='sentiment',
+                        initializer=_warm_worker,
+                        initargs=(self.engine,)
+                    )
+                else:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(self.start_method),
+                        initializer=_warm_worker,
+                        initargs=(self.engine,)
+                    )
+            return self._executor
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _task_done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _discard_executor(self, executor, error):
+        """Drop a broken or shut down pool so that the next call starts a new one."""
+        logger.error(f"Sentiment pool unusable, restarting it: {str(error)}")
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, texts):
+        """
+        Submit texts as at most one task per worker.
+
+        The pool's free slots are checked once for the whole batch. Chunks
+        that cannot be submitted, because the pool is saturated or broken,
+        get None instead of a future.
+
+        Returns:
+            list: (chunk, future) pairs covering the texts in order
+        """
+        executor = self._get_executor()
+        with self._lock:
+            free = self.max_pending - self._pending
+            if free <= 0:
+                self._stats["saturated"] += len(texts)
+                return [(texts, None)]
+            size = -(-len(texts) // min(self.workers, free, len(texts)))
+            chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+            self._pending += len(chunks)
+
+        tasks = []
+        for index, chunk in enumerate(chunks):
+            try:
+                future = executor.submit(analyze_batch, chunk, self.engine)
+            except (BrokenExecutor, RuntimeError) as e:
+                # A process pool whose worker died stays broken, and a shut
+                # down pool refuses work
+                self._discard_executor(executor, e)
+                unsubmitted = chunks[index:]
+                with self._lock:
+                    self._pending -= len(unsubmitted)
+                    self._stats["errors"] += sum(len(chunk) for chunk in unsubmitted)
+                return tasks + [(chunk, None) for chunk in unsubmitted]
+            future.add_done_callback(self._task_done)
+            tasks.append((chunk, future))
+        return tasks
+
+    def _analyze_inline(self, text):
+        try:
+            result = analyze_text(text, self.engine)
+        except Exception as e:
+            logger.error(f"Sentiment analysis failed: {str(e)}")
+            self._count("errors")
+            return heuristic_sentiment(text)
+        self._count("analyzed")
+        return result
+
+    def _analyze_batch_inline(self, texts):
+        """Score all texts in one lexicon engine call."""
+        from lexicon_sentiment import get_engine
+
+        try:
+            results = get_engine().analyze_many(texts)
+        except Exception as e:
+            logger.error(f"Sentiment analysis failed: {str(e)}")
+            self._count("errors", len(texts))
+            return [heuristic_sentiment(text) for text in texts]
+        self._count("analyzed", len(texts))
+        return results
+
+    def analyze(self, text):
+        """
+        Return (polarity, subjectivity) for one text.
+
+        Args:
+            text: Text to analyze
+
+        Returns:
+            tuple: (polarity, subjectivity)
+        """
+        return self.analyze_many([text])[0]
+
+    def analyze_many(self, texts):
+        """
+        Return (polarity, subjectivity) for each text, in order.
+
+        Inline, the lexicon engine scores the whole list in one call. In the
+        pooled modes the list is split into one task per worker and the tasks
+        share one deadline; texts whose task cannot be submitted or does not
+        finish in time get the heuristic estimate.
+
+        Args:
+            texts: List of texts
+
+        Returns:
+            list: (polarity, subjectivity) tuples
+        """
+        if self.mode == 'inline':
+            if self.engine == 'lexicon':
+                return self._analyze_batch_inline(texts)
+            return [self._analyze_inline(text) for text in texts]
+        if not texts:
+            return []
+
+        tasks = self._submit(texts)
+        deadline = time.monotonic() + self.timeout
+
+        results = []
+        fallbacks = 0
+        for chunk, future in tasks:
+            if future is not None:
+                try:
+                    results.extend(future.result(timeout=max(0, deadline - time.monotonic())))
+                    self._count("analyzed", len(chunk))
+                    continue
+                except FutureTimeoutError:
+                    future.cancel()
+                    self._count("timeouts", len(chunk))
+                except Exception as e:
+                    logger.error(f"Sentiment analysis failed: {str(e)}")
+                    self._count("errors", len(chunk))
+            results.extend(heuristic_sentiment(text) for text in chunk)
+            fallbacks += len(chunk)
+
+        if fallbacks:
+            logger.warning(f"Used heuristic sentiment for {fallbacks} of {len(texts)} input(s)")
+        return results
+
+    def warm_up(self):
+        """Start the pool and wait until every worker has loaded the lexicon."""
+        if self.mode == 'inline':
+            _warm_worker(self.engine)
+            return
+        executor = self._get_executor()
+        for future in [executor.submit(analyze_text, "Warm up.", self.engine) for _ in range(self.workers)]:
+            future.result()
+
+    def stats(self):
+        """Return counters for analyzed texts and each kind of fallback."""
+        with self._lock:
+            return dict(self._stats, pending=self._pending)
+
+    def shutdown(self, wait=True):
+        """Stop the pool, if one was started."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,181 @@
+"""
+Prompt context for multi-turn practice sessions.
+
+Each message in a practice session is answered with the session's earlier
+turns, compacted to a token budget: the latest turns are sent verbatim, and
+turns that no longer fit are folded into a rolling summary. The summary is
+stored on the session (PracticeSession.summary) and only extended with the
+turns that newly fall out of the window, so a request summarizes a few turns
+at most and never re-reads the whole history.
+
+Tokens are counted locally: with tiktoken if it is installed (and its
+encoding is available offline), otherwise with an approximation of the same
+tokenizer (one token per word or punctuation mark, more for long words).
+"""
+
+import logging
+import re
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_HEADING = "Summary of the earlier conversation:"
+
+# Longest excerpt of a message kept in the extractive summary, in words
+SUMMARY_EXCERPT_WORDS = 30
+
+class TokenCounter:
+    """
+    Count tokens of text and chat messages.
+
+    Args:
+        encoding: tiktoken encoding name
+    """
+
+    # Per-message framing tokens and reply priming, as counted by the chat API
+    TOKENS_PER_MESSAGE = 4
+    TOKENS_PER_REPLY = 3
+
+    _pieces = re.compile(r"\w+|[^\w\s]")
+
+    def __init__(self, encoding='cl100k_base'):
+        self.encoding_name = encoding
+        self._encoding = None
+        self._loaded = False
+        self._lock = Lock()
+
+    def _load(self):
+        with self._lock:
+            if not self._loaded:
+                try:
+                    import tiktoken
+                    self._encoding = tiktoken.get_encoding(self.encoding_name)
+                except Exception as e:
+                    logger.info(f"Counting tokens approximately (tiktoken unavailable: {e})")
+                self._loaded = True
+
+    @property
+    def exact(self):
+        """Whether counts come from tiktoken."""
+        if not self._loaded:
+            self._load()
+        return self._encoding is not None
+
+    def count(self, text):
+        """Return the number of tokens in text."""
+        if not text:
+            return 0
+        if self.exact:
+            return len(self._encoding.encode(text))
+        return sum(1 + (len(piece) - 1) // 8 for piece in self._pieces.findall(text))
+
+    def count_messages(self, messages):
+        """Return the prompt tokens of chat messages, including the message framing."""
+        return self.TOKENS_PER_REPLY + sum(self.TOKENS_PER_MESSAGE + self.count(message["content"]) for message in messages)
+
+    def count_turn(self, turn):
+        """Return the tokens a turn (user_input and ai_response) adds to a prompt."""
+        return 2 * self.TOKENS_PER_MESSAGE + self.count(turn.user_input) + self.count(turn.ai_response)
+
+# Shared instance
+token_counter = TokenCounter()
+
+def excerpt(text, max_words=SUMMARY_EXCERPT_WORDS):
+    """Return the first sentence of text, cut to max_words words."""
+    text = " ".join(text.split())
+    sentence = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    words = sentence.split()
+    if len(words) > max_words:
+        return " ".join(words[:max_words]) + "..."
+    return sentence
+
+def summarize_turns(summary, turns, max_tokens, counter=token_counter):
+    """
+    Extend a summary with one line per turn, dropping its oldest lines beyond max_tokens.
+
+    Args:
+        summary: Current summary, None or empty for a new one
+        turns: Turns to add, oldest first (with user_input and ai_response)
+        max_tokens: Token budget of the summary
+
+    Returns:
+        str: The new summary
+    """
+    lines = summary.splitlines() if summary else []
+    lines += [f"- User: {excerpt(turn.user_input)} Coach: {excerpt(turn.ai_response)}" for turn in turns]
+    sizes = [counter.count(line) + 1 for line in lines]  # +1 for the newline
+    total = sum(sizes)
+    start = 0
+    while start < len(lines) and total > max_tokens:
+        total -= sizes[start]
+        start += 1
+    return "\n".join(lines[start:])
+
+def split_history(turns, budget, counter=token_counter):
+    """
+    Split turns into the older ones to summarize and the latest ones that fit budget.
+
+    Returns:
+        tuple: (older turns, recent turns, tokens of the recent turns)
+    """
+    used = 0
+    keep = 0
+    for turn in reversed(turns):
+        tokens = counter.count_turn(turn)
+        if used + tokens > budget:
+            break
+        used += tokens
+        keep += 1
+    split = len(turns) - keep
+    return turns[:split], turns[split:], used
+
+def session_messages(system_prompt, summary, turns, user_input):
+    """Return the chat messages for user_input after the summary and the recent turns."""
+    messages = [{"role": "system", "content": system_prompt}]
+    if summary:
+        messages.append({"role": "system", "content": f"{SUMMARY_HEADING}\n{summary}"})
+    for turn in turns:
+        messages.append({"role": "user", "content": turn.user_input})
+        messages.append({"role": "assistant", "content": turn.ai_response})
+    messages.append({"role": "user", "content": user_input})
+    return messages
+
+def build_context(practice_session, turns, system_prompt, user_input, context_tokens, summary_tokens,
+                  summarizer=None, counter=token_counter):
+    """
+    Compact a session's history and return the messages for its next turn.
+
+    Turns that do not fit the budget left by the system prompt, the message
+    and the summary's reserve are folded into practice_session.summary, and
+    practice_session.summarized_through_id moves past them (the caller
+    commits the session).
+
+    Args:
+        practice_session: PracticeSession being continued
+        turns: Its turns after summarized_through_id, oldest first
+        system_prompt: System prompt for the session's category
+        user_input: The new message
+        context_tokens: Token budget of the whole prompt
+        summary_tokens: Tokens reserved for the summary
+        summarizer: Function (summary, turns, max_tokens) -> summary, summarize_turns if None
+
+    Returns:
+        tuple: (messages, usage) with the prompt tokens and how the history was used
+    """
+    fixed = counter.count_messages([{"role": "system", "content": system_prompt}, {"role": "user", "content": user_input}])
+    reserve = summary_tokens + counter.TOKENS_PER_MESSAGE + counter.count(SUMMARY_HEADING) + 1
+    older, recent, history_tokens = split_history(turns, max(0, context_tokens - fixed - reserve), counter)
+
+    if older:
+        summarize = summarizer or summarize_turns
+        practice_session.summary = summarize(practice_session.summary, older, summary_tokens)
+        practice_session.summarized_through_id = older[-1].id
+
+    messages = session_messages(system_prompt, practice_session.summary, recent, user_input)
+    return messages, {
+        "prompt_tokens": counter.count_messages(messages),
+        "history_tokens": history_tokens,
+        "summary_tokens": counter.count(practice_session.summary),
+        "turns_in_context": len(recent),
+        "turns_compacted": len(older)
+    }
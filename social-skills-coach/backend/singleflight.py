@@ -0,0 +1,247 @@
+"""
+Request coalescing (single-flight) for expensive calls.
+
+When many requests miss the conversation cache for the same key at the same
+moment, only the first one (the leader) makes the upstream call; the others
+wait for it and share its result or its exception.
+
+Within a process, waiters block on an event. With a shared store (a
+cache.SocketCache), leaders in different worker processes also coordinate:
+the leader takes a lock in the store with SET NX, and leaders in other
+workers poll the store for the published result instead of calling
+upstream themselves.
+
+AsyncSingleFlight does the same for coroutines on one event loop (the async
+serving mode, see asgi.py).
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from threading import Event, Lock
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SINGLE_FLIGHT_EVENTS = REGISTRY.counter('coach_single_flight_events_total',
+                                        "Upstream calls made by single-flight leaders, callers that shared one "
+                                        "(coalesced, shared_coalesced), timeouts and errors.", ('event',))
+
+class SingleFlightTimeout(TimeoutError):
+    """Raised when the leader's result does not arrive in time."""
+
+class SharedFlightError(Exception):
+    """Raised in other workers when the leader's call failed."""
+
+class _Call:
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls that share a key.
+
+    Args:
+        shared: Optional cache.SocketCache used as the lock and result store
+            between worker processes
+        poll_interval: Seconds between checks for another worker's result
+        result_ttl: Seconds a published result stays readable by other workers
+        shared_errors: Exception classes that other workers raise again, with
+            the leader's message, instead of SharedFlightError
+    """
+
+    def __init__(self, shared=None, poll_interval=0.05, result_ttl=5.0, shared_errors=()):
+        self.shared = shared
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self.shared_errors = {error.__name__: error for error in shared_errors}
+        self._calls = {}
+        self._lock = Lock()
+        self._stats = {"calls": 0, "coalesced": 0, "shared_coalesced": 0, "timeouts": 0, "errors": 0}
+        SINGLE_FLIGHT_EVENTS.track(self, _flight_events)
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def do(self, key, fn, timeout):
+        """
+        Return fn(), sharing one call among all concurrent callers with key.
+
+        Args:
+            key: Identifies calls that return the same result
+            fn: Function without arguments that makes the call
+            timeout: Seconds a waiter waits for the leader
+
+        Returns:
+            The result of fn() from whichever caller made the call
+
+        Raises:
+            SingleFlightTimeout: The leader did not finish in time
+            Exception: The leader's exception (from another worker, SharedFlightError
+                unless its class is one of shared_errors)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(timeout):
+                self._count("timeouts")
+                raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for an in-flight call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if self.shared is not None:
+                call.result = self._do_shared(key, fn, timeout)
+            else:
+                self._count("calls")
+                call.result = fn()
+            return call.result
+        except Exception as e:
+            if not isinstance(e, SingleFlightTimeout):
+                self._count("errors")
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _do_shared(self, key, fn, timeout):
+        """Run fn in at most one worker, waiting for another worker's result if needed."""
+        lock_key = f"lock:{key}"
+        deadline = time.monotonic() + timeout
+        token = uuid.uuid4().hex
+
+        while time.monotonic() < deadline:
+            acquired = self.shared.add(lock_key, token, ttl=timeout)
+            if acquired is None:
+                # Store unavailable: fall back to coalescing within this process
+                self._count("calls")
+                return fn()
+
+            if acquired:
+                # Results are published under the leader's token, so waiters never see an older flight's result
+                result_key = f"result:{key}:{token}"
+                self._count("calls")
+                try:
+                    result = fn()
+                except Exception as e:
+                    self.shared.put(result_key, {"error": f"{type(e).__name__}: {str(e)}", "type": type(e).__name__,
+                                                 "message": str(e)}, ttl=self.result_ttl)
+                    raise
+                else:
+                    self.shared.put(result_key, {"result": result}, ttl=self.result_ttl)
+                    return result
+                finally:
+                    # Only release our own lock; it may have expired and been taken over
+                    if self.shared.peek(lock_key) == token:
+                        self.shared.delete(lock_key)
+
+            # Another worker is making the call; wait for its result
+            leader_token = self.shared.peek(lock_key)
+            if leader_token is None:
+                continue  # The lock was just released; try to lead
+            result_key = f"result:{key}:{leader_token}"
+            while time.monotonic() < deadline:
+                published = self.shared.peek(result_key)
+                if published is None and self.shared.peek(lock_key) != leader_token:
+                    # The leader is done: it published just now or gave up without a result
+                    published = self.shared.peek(result_key)
+                    if published is None:
+                        break
+                if published is not None:
+                    self._count("shared_coalesced")
+                    if "error" in published:
+                        error = self.shared_errors.get(published.get("type"))
+                        if error is not None:
+                            raise error(published["message"])
+                        raise SharedFlightError(published["error"])
+                    return published["result"]
+                time.sleep(self.poll_interval)
+
+        self._count("timeouts")
+        raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for another worker's call")
+
+    def stats(self):
+        """Return upstream calls, coalesced waiters, timeouts and errors."""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+class AsyncSingleFlight:
+    """
+    Deduplicate concurrent coroutine calls that share a key.
+
+    Coalesces calls within one event loop; unlike SingleFlight it does not
+    coordinate with other worker processes.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._stats = {"calls": 0, "coalesced": 0, "timeouts": 0, "errors": 0}
+        SINGLE_FLIGHT_EVENTS.track(self, _flight_events)
+
+    async def do(self, key, fn, timeout):
+        """
+        Return await fn(), sharing one call among all concurrent callers with key.
+
+        Args:
+            key: Identifies calls that return the same result
+            fn: Coroutine function without arguments that makes the call
+            timeout: Seconds a waiter waits for the leader
+
+        Returns:
+            The result of fn() from whichever caller made the call
+
+        Raises:
+            SingleFlightTimeout: The leader did not finish in time
+            Exception: The leader's exception
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self._stats["coalesced"] += 1
+            try:
+                # Shielded so that a waiter timing out does not cancel the shared call
+                return await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                self._stats["timeouts"] += 1
+                raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for an in-flight call") from None
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        self._stats["calls"] += 1
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._stats["errors"] += 1
+            if isinstance(e, Exception):
+                future.set_exception(e)
+            else:
+                # The leader was cancelled (e.g. its client went away); the waiters still need an answer
+                future.set_exception(RuntimeError("The in-flight call was cancelled"))
+            future.exception()  # Retrieved here, so an unawaited future does not log a warning
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def stats(self):
+        """Return upstream calls, coalesced waiters, timeouts and errors."""
+        return dict(self._stats, in_flight=len(self._calls))
+
+def _flight_events(flight):
+    return {(event,): count for event, count in flight.stats().items() if event != "in_flight"}
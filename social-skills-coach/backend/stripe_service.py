@@ -5,12 +5,13 @@ Stripe Service for Social Skills Coach API.
 This module handles interactions with the Stripe API for subscription management.
 """
 
-import stripe
 import logging
 from datetime import datetime, date
 from flask import current_app
 import config
-from app import app, db
+from metrics import stage_timer
+import tracing
+from models import db, User
 
 # Configure logging
 logging.basicConfig(
@@ -19,8 +20,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Configure Stripe
-stripe.api_key = config.STRIPE_API_KEY
+def get_stripe():
+    """
+    Return the Stripe SDK, configured with the API key.
+
+    The SDK takes about a second to import, so it is loaded on first use
+    rather than when the app starts.
+    """
+    import stripe
+
+    stripe.api_key = config.STRIPE_API_KEY
+    return stripe
 
 # Product and price IDs (to be configured in Stripe dashboard)
 STRIPE_PRODUCTS = {
@@ -72,14 +82,16 @@ def create_stripe_customer(user):
         logger.info(f"User {user.id} already has Stripe customer: {user.stripe_customer_id}")
         return True
     
+    stripe = get_stripe()
     try:
         # Create a new Stripe customer
-        customer = stripe.Customer.create(
-            email=user.email,
-            metadata={
-                'user_id': str(user.id)
-            }
-        )
+        with stage_timer('stripe_call'), tracing.span('stripe.customer.create'):
+            customer = stripe.Customer.create(
+                email=user.email,
+                metadata={
+                    'user_id': str(user.id)
+                }
+            )
         
         # Update user with Stripe customer ID
         user.stripe_customer_id = customer.id
@@ -105,9 +117,6 @@ def update_user_subscription(event):
         tuple: (success, message)
     """
     try:
-        # Import User model here to avoid circular imports
-        from app import User
-        
         # Extract subscription data from the event
         subscription = event.data.object
         customer_id = subscription.customer
@@ -115,7 +124,7 @@ def update_user_subscription(event):
         status = subscription.status
         
         # Find the user by Stripe customer ID
-        with app.app_context():
+        with current_app.app_context():
             user = User.query.filter_by(stripe_customer_id=customer_id).first()
             
             if not user:
@@ -145,6 +154,7 @@ def update_user_subscription(event):
                 user.tier = 'free'
             
             db.session.commit()
+            forget_cached_tier(user)
             
             logger.info(f"Updated subscription for user {user.id}: {status}, tier: {user.tier}")
             return True, f"Subscription updated: {status}, tier: {user.tier}"
@@ -153,6 +163,12 @@ def update_user_subscription(event):
         logger.error(f"Error processing subscription event: {str(e)}")
         return False, f"Error processing subscription event: {str(e)}"
 
+def forget_cached_tier(user):
+    """Make this worker's rate limits read user's new tier now rather than when it expires (see rate_policies.TierCache)."""
+    policies = current_app.extensions.get('rate_policies')
+    if policies is not None:
+        policies.tiers.forget(user.email)
+
 def handle_subscription_created(event):
     """Handle subscription.created event"""
     logger.info("Processing subscription.created event")
@@ -189,23 +205,25 @@ def create_checkout_session(user, tier):
         if not success:
             return None
     
+    stripe = get_stripe()
     try:
         # Create a checkout session
-        checkout_session = stripe.checkout.Session.create(
-            customer=user.stripe_customer_id,
-            payment_method_types=['card'],
-            line_items=[{
-                'price': STRIPE_PRODUCTS[tier]['price_id'],
-                'quantity': 1,
-            }],
-            mode='subscription',
-            success_url='https://yourapp.com/success?session_id={CHECKOUT_SESSION_ID}',
-            cancel_url='https://yourapp.com/cancel',
-            metadata={
-                'user_id': str(user.id),
-                'tier': tier
-            }
-        )
+        with stage_timer('stripe_call'), tracing.span('stripe.checkout.create'):
+            checkout_session = stripe.checkout.Session.create(
+                customer=user.stripe_customer_id,
+                payment_method_types=['card'],
+                line_items=[{
+                    'price': STRIPE_PRODUCTS[tier]['price_id'],
+                    'quantity': 1,
+                }],
+                mode='subscription',
+                success_url='https://yourapp.com/success?session_id={CHECKOUT_SESSION_ID}',
+                cancel_url='https://yourapp.com/cancel',
+                metadata={
+                    'user_id': str(user.id),
+                    'tier': tier
+                }
+            )
         
         return checkout_session.url
     except stripe.error.StripeError as e:
@@ -229,12 +247,14 @@ def cancel_subscription(user):
         logger.error(f"User {user.id} has no subscription to cancel")
         return False
     
+    stripe = get_stripe()
     try:
         # Cancel the subscription at period end (won't charge again)
-        stripe.Subscription.modify(
-            user.subscription_id,
-            cancel_at_period_end=True
-        )
+        with stage_timer('stripe_call'), tracing.span('stripe.subscription.modify'):
+            stripe.Subscription.modify(
+                user.subscription_id,
+                cancel_at_period_end=True
+            )
         
         # Update local status
         user.subscription_status = 'canceling'
@@ -300,8 +320,5 @@ def get_user_by_stripe_customer(customer_id):
     Returns:
         User object or None
     """
-    # Import User model here to avoid circular imports
-    from app import User
-    
-    with app.app_context():
+    with current_app.app_context():
         return User.query.filter_by(stripe_customer_id=customer_id).first() 
\ No newline at end of file
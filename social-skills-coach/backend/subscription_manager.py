@@ -7,7 +7,8 @@ check scenario limits, and update subscription statuses.
 """
 
 from datetime import date, timedelta
-from app import app, db, User
+from factory import create_app
+from models import db, User
 import logging
 
 # Configure logging
@@ -17,6 +18,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Database-only app, without the API or the SDKs
+app = create_app(subsystems=())
+
 # Subscription tiers and their limits
 SUBSCRIPTION_TIERS = {
     'free': {
@@ -0,0 +1,186 @@
+"""
+Tests for the async (ASGI) serving mode in asgi.py.
+
+Drives the ASGI app in-process with httpx and checks that the conversation
+endpoints answer like the WSGI resources, that hundreds of slow model calls
+run concurrently in one worker, that identical requests share one call, that
+authenticated requests are stored through the async session, that rate
+limits and their headers are shared with the WSGI resources and checked off
+the event loop, and that the other routes are served by Flask.
+"""
+
+import asyncio
+import json
+import time
+import httpx
+import pytest
+import config
+from asgi import create_asgi_app, async_database_url
+from fake_llm_server import DEFAULT_REPLY
+from models import User, Conversation, UserProgressRollup
+
+@pytest.fixture
+def flask_app(make_app, tmp_path):
+    # A file database, so the sync and async engines see the same tables
+    return make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'asgi.db'}")
+
+@pytest.fixture
+def llm(llm):
+    llm.first_token_delay = 0.5
+    return llm
+
+def run(asgi_app, scenario):
+    """Run scenario(client) against asgi_app on a new event loop."""
+    async def main():
+        transport = httpx.ASGITransport(app=asgi_app, client=("127.0.0.1", 5000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=30) as client:
+            try:
+                return await scenario(client)
+            finally:
+                await asgi_app.close()
+    return asyncio.run(main())
+
+def test_async_database_url():
+    assert str(async_database_url("sqlite:///app.db")) == "sqlite+aiosqlite:///app.db"
+    assert str(async_database_url("postgresql://coach:secret@db:5432/social")).startswith("postgresql+asyncpg://coach:")
+
+def test_responses_match_wsgi(flask_app):
+    requests = [
+        {"json": {"user_input": "hello, how do I start a conversation?", "category": "small_talk"}},
+        {"json": {"category": "small_talk"}},
+        {"json": {"user_input": "hi", "category": "astrology"}},
+        {"content": b"user_input=hi", "headers": {"Content-Type": "application/x-www-form-urlencoded"}},
+        {"content": b"{not json", "headers": {"Content-Type": "application/json"}}
+    ]
+    wsgi_responses = []
+    for request in requests:
+        response = flask_app.test_client().post('/api/conversation', data=request.get("content"),
+                                                json=request.get("json"), headers=request.get("headers"))
+        wsgi_responses.append((response.status_code, response.get_json()))
+
+    async def scenario(client):
+        responses = []
+        for request in requests:
+            response = await client.post('/api/conversation', **request)
+            responses.append((response.status_code, response.json()))
+        return responses
+
+    assert run(create_asgi_app(flask_app), scenario) == wsgi_responses
+
+def test_hundreds_of_concurrent_model_calls(flask_app, llm):
+    flask_app.extensions['rate_policies'].update({'conversation': {'anonymous': '1000/60'}}, {'anonymous': 0})
+    asgi_app = create_asgi_app(flask_app)
+
+    async def scenario(client):
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post('/api/conversation', json={"user_input": f"How do I talk to people at party {i}?"})
+            for i in range(200)
+        ])
+        return responses, time.perf_counter() - start
+
+    responses, elapsed = run(asgi_app, scenario)
+    assert all(response.json()["response"] == DEFAULT_REPLY for response in responses)
+    assert len(llm.requests) == 200
+    # 200 calls of 0.5s each would take 100s one at a time
+    assert elapsed < 5
+
+def test_identical_requests_share_one_call(flask_app, llm):
+    asgi_app = create_asgi_app(flask_app)
+
+    async def scenario(client):
+        return await asyncio.gather(*[
+            client.post('/api/conversation', json={"user_input": "How do I join a group conversation?"})
+            for _ in range(5)
+        ])
+
+    responses = run(asgi_app, scenario)
+    assert [response.json()["response"] for response in responses] == [DEFAULT_REPLY] * 5
+    assert len(llm.requests) == 1
+    assert asgi_app.single_flight.stats()['coalesced'] == 4
+
+def test_authenticated_conversation_is_stored(flask_app, auth):
+    headers = auth(flask_app, "free@example.com")
+
+    async def scenario(client):
+        first = await client.post('/api/conversation', json={"user_input": "hello there"}, headers=headers)
+        denied = await client.post('/api/conversation', json={"user_input": "hello", "category": "dating"}, headers=headers)
+        bad_token = await client.post('/api/conversation', json={"user_input": "hello"}, headers={"Authorization": "Bearer nonsense"})
+        return first, denied, bad_token
+
+    first, denied, bad_token = run(create_asgi_app(flask_app), scenario)
+    assert first.json()["scenarios_used"] == 1
+    assert (denied.status_code, denied.json()["required_tier"]) == (403, 'premium')
+    assert bad_token.status_code == 422
+
+    with flask_app.app_context():
+        conversation = Conversation.query.one()
+        assert conversation.user.email == "free@example.com"
+        assert conversation.feedbacks[0].feedback_text == "Try to be more detailed in your responses."
+        assert UserProgressRollup.query.one().conversation_count == 1
+        assert User.query.filter_by(email="free@example.com").one().scenarios_accessed == 1
+
+def test_stream_relays_words(flask_app, llm):
+    llm.first_token_delay = 0.0
+    asgi_app = create_asgi_app(flask_app)
+
+    async def scenario(client):
+        return await client.post('/api/conversation/stream', json={"user_input": "How do I end a conversation politely?"})
+
+    response = run(asgi_app, scenario)
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    tokens = [json.loads(data[len("data: "):])["text"] for event, data in events if event == "event: token"]
+    assert "".join(tokens) == DEFAULT_REPLY
+    assert events[-1][0] == "event: done"
+    assert json.loads(events[-1][1][len("data: "):])["response"] == DEFAULT_REPLY
+
+def test_rate_limit_is_shared_with_wsgi(flask_app):
+    for _ in range(config.CONVERSATION_RATE_LIMIT - 2):
+        flask_app.test_client().post('/api/conversation', json={"user_input": "hi"}, environ_base={'REMOTE_ADDR': '127.0.0.1'})
+
+    async def scenario(client):
+        return [await client.post('/api/conversation', json={"user_input": "hi"}) for _ in range(3)]
+
+    responses = run(create_asgi_app(flask_app), scenario)
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert [r.headers["RateLimit-Remaining"] for r in responses] == ["1", "0", "0"]
+    assert int(responses[-1].headers["Retry-After"]) >= 1
+
+def test_slow_rate_limit_store_does_not_block_the_loop(flask_app):
+    limiter = flask_app.extensions['rate_limiter']
+    hit = limiter.hit
+
+    def slow_hit(*args, **kwargs):
+        time.sleep(0.3)  # A shared store that answers slowly
+        return hit(*args, **kwargs)
+
+    limiter.hit = slow_hit
+    flask_app.extensions['rate_policies'].update({'conversation': {'anonymous': '1000/60'}})
+
+    async def scenario(client):
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post('/api/conversation', json={"user_input": f"How do I greet person {i}?"}) for i in range(8)
+        ])
+        return responses, time.perf_counter() - start
+
+    responses, elapsed = run(create_asgi_app(flask_app), scenario)
+    assert all(response.status_code == 200 for response in responses)
+    assert elapsed < 1.5  # Eight checks one after another on the loop would take 2.4s
+
+def test_other_routes_are_served_by_flask(flask_app):
+    async def scenario(client):
+        registered = await client.post('/api/register', json={"email": "bridge@example.com", "password": "password123"})
+        login = await client.post('/api/login', json={"email": "bridge@example.com", "password": "password123"})
+        missing = await client.get('/api/does-not-exist')
+        return registered, login, missing
+
+    registered, login, missing = run(create_asgi_app(flask_app), scenario)
+    assert registered.status_code == 201
+    assert "access_token" in login.json()
+    assert missing.status_code == 404
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the database and the fake server
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,184 @@
+"""
+Tests for the conversation cache backends.
+
+Runs the shared backend against the bundled cache_server.py daemon on a
+temporary Unix socket, with one SocketCache per simulated worker.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import pytest
+from cache import LRUCache, SocketCache, create_cache, conversation_cache_key
+from cache_server import CacheServer
+
+@pytest.fixture
+def server():
+    path = os.path.join(tempfile.mkdtemp(), 'cache.sock')
+    server = CacheServer(path, capacity=3)
+    server.start()
+    yield server
+    server.stop()
+
+def test_memory_backend_counts_hits():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.put('c', 3)  # Evicts 'a'
+    assert [cache.get(key) for key in ['a', 'b', 'c']] == [None, 2, 3]
+    stats = cache.stats()
+    assert (stats['backend'], stats['hits'], stats['misses']) == ('memory', 2, 1)
+    assert stats['hit_rate'] == pytest.approx(2 / 3)
+
+def test_memory_entries_expire():
+    cache = LRUCache(10, ttl=0.05)
+    cache.put('a', 1)
+    cache.put('b', 2, ttl=60)  # Per-entry TTL overrides the default
+    assert cache.get('a') == 1
+    time.sleep(0.1)
+    assert (cache.get('a'), cache.get('b')) == (None, 2)
+    assert cache.stats()['expirations'] == 1
+
+def test_memory_byte_budget():
+    cache = LRUCache(100, max_bytes=20)
+    cache.put('a', ("x" * 8, "y"))
+    cache.put('b', "é" * 4)  # 8 bytes in UTF-8
+    assert cache.stats()['bytes'] == 17
+    cache.put('c', "z" * 10)  # Evicts 'a', the least recently used
+    assert [cache.get(key) for key in ['a', 'b', 'c']] == [None, "é" * 4, "z" * 10]
+    cache.put('d', "w" * 21)  # Larger than the whole budget
+    stats = cache.stats()
+    assert (stats['bytes'], stats['entries'], stats['evictions'], stats['rejections']) == (18, 2, 1, 1)
+
+def scan_resistance(admission):
+    """Return how many of 5 hot keys survive a scan of one-off keys."""
+    cache = LRUCache(10, admission=admission)
+    hot = [f"hot-{i}" for i in range(5)]
+    for _ in range(3):
+        for key in hot:
+            if cache.get(key) is None:
+                cache.put(key, key)
+    for i in range(100):
+        key = f"once-{i}"
+        if cache.get(key) is None:
+            cache.put(key, key)
+    return sum(cache.get(key) is not None for key in hot)
+
+def test_tinylfu_keeps_hot_entries():
+    assert scan_resistance(None) == 0
+    assert scan_resistance('tinylfu') == 5
+    assert scan_resistance('w-tinylfu') == 5
+
+    # The window admits new entries right away
+    cache = LRUCache(200, admission='w-tinylfu')
+    for key in ['a', 'b', 'c']:
+        cache.put(key, key)
+    assert [cache.get(key) for key in ['a', 'b', 'c']] == ['a', 'b', 'c']
+    with pytest.raises(ValueError):
+        LRUCache(10, admission='lfu')
+
+def test_sharded_cache_under_threads():
+    cache = LRUCache(400, shards=4, admission='tinylfu')
+    assert len(cache.segments) == 4
+
+    def worker(offset):
+        for i in range(2000):
+            key = f"key-{(i * 7 + offset) % 300}"
+            if cache.get(key) is None:
+                cache.put(key, key.upper())
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = cache.stats()
+    assert stats['shards'] == 4
+    assert stats['hits'] + stats['misses'] == 16000
+    assert 0 < stats['entries'] == len(cache) <= 400
+    assert all(cache.get(f"key-{i}") in (None, f"KEY-{i}") for i in range(300))
+
+def test_shared_between_workers(server):
+    first = SocketCache(f"unix://{server.path}")
+    second = SocketCache(f"unix://{server.path}")
+
+    first.put('greeting', ["Hello!", "Good job with your communication!"])
+    assert second.get('greeting') == ["Hello!", "Good job with your communication!"]
+    assert second.get('missing') is None
+    assert (second.stats()['hits'], second.stats()['misses']) == (1, 1)
+
+    # Least recently used keys are evicted once the store is full
+    for key in ['a', 'b', 'c']:
+        first.put(key, key.upper())
+    assert [second.get(key) for key in ['greeting', 'a', 'b', 'c']] == [None, 'A', 'B', 'C']
+
+def test_entries_expire(server):
+    cache = SocketCache(f"unix://{server.path}", ttl=1)
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(1.1)
+    assert cache.get('a') is None
+
+def test_unreachable_store_is_a_miss():
+    cache = SocketCache("unix:///nonexistent/cache.sock", retry_interval=60)
+    cache.put('a', 1)
+    assert (cache.get('a'), cache.get('b')) == (None, None)
+    stats = cache.stats()
+    assert stats['misses'] == 2
+    assert stats['errors'] == 1  # Later calls skip the store until the retry interval has passed
+    with pytest.raises(ValueError):
+        SocketCache("http://localhost/")
+    with pytest.raises(ValueError):
+        create_cache('disk')
+
+KEY_ARGS = ("I get nervous at parties", 'small_talk', 'gpt-3.5-turbo', "You are a coach.", {"max_tokens": 150, "temperature": 0.7})
+
+def test_keys_are_stable_across_processes():
+    script = f"from cache import conversation_cache_key\nprint(conversation_cache_key(*{KEY_ARGS!r}))"
+    keys = {
+        subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=dict(os.environ, PYTHONHASHSEED=str(seed))
+        ).stdout.strip()
+        for seed in (1, 2)
+    }
+    assert keys == {conversation_cache_key(*KEY_ARGS)}
+
+def test_keys_cover_everything_that_changes_the_response():
+    key = conversation_cache_key(*KEY_ARGS)
+    user_input, category, model, system_prompt, params = KEY_ARGS
+
+    # Case, Unicode composition and whitespace do not matter
+    assert conversation_cache_key("  i GET nervous   at\tparties ", category, model, system_prompt, params) == key
+    assert conversation_cache_key("Cafe\u0301", category, model, system_prompt, params) == \
+        conversation_cache_key("Caf\u00e9", category, model, system_prompt, params)
+
+    variants = [
+        ("I get nervous at parties?", category, model, system_prompt, params),
+        (user_input, 'dating', model, system_prompt, params),
+        (user_input, category, 'gpt-4o-mini', system_prompt, params),
+        (user_input, category, model, "You are a friendly coach.", params),
+        (user_input, category, model, system_prompt, dict(params, temperature=0.2)),
+    ]
+    keys = {conversation_cache_key(*args) for args in variants}
+    assert len(keys) == len(variants) and key not in keys
+
+def test_conversation_endpoint_uses_shared_cache(server, make_app):
+    first, second = make_app(), make_app()
+    for app in (first, second):
+        app.extensions['conversation_cache'] = SocketCache(f"unix://{server.path}")
+
+    payload = {"user_input": "I get nervous at parties", "category": "small_talk"}
+    response = first.test_client().post('/api/conversation', json=payload).get_json()
+    cached = second.test_client().post('/api/conversation', json=payload).get_json()
+    assert cached == response
+    assert first.extensions['conversation_cache'].stats()['misses'] == 1
+    assert second.extensions['conversation_cache'].stats()['hits'] == 1
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the cache server and the app
+    raise SystemExit(pytest.main([__file__, "-q"]))
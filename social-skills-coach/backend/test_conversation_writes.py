@@ -0,0 +1,86 @@
+"""
+Tests for the conversation insert path (resources.save_conversation).
+
+Stores 10,000 exchanges and checks that each conversation is stored with its
+feedback, that the progress rollup counts all of them, and how many database
+round trips an exchange takes: one flush for the conversation (INSERT ...
+RETURNING, or lastrowid on SQLite) and its feedback, the rollup row, and
+one commit.
+"""
+
+import pytest
+from types import SimpleNamespace
+from sqlalchemy import event, func
+import resources
+from models import db, User, Conversation, Feedback, UserProgressRollup
+
+EXCHANGES = 10000
+
+class RoundTrips:
+    """Count the statements and commits sent to an engine."""
+
+    def __init__(self, engine):
+        self.statements = []
+        self.commits = 0
+        event.listen(engine, 'before_cursor_execute', self.execute)
+        event.listen(engine, 'commit', self.commit)
+
+    def execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def commit(self, conn):
+        self.commits += 1
+
+    def __len__(self):
+        return len(self.statements) + self.commits
+
+def test_exchanges_take_one_flush_and_one_commit(app):
+    with app.app_context():
+        # The request has loaded its user before storing the exchange
+        user_id = User.query.filter_by(email="learner@example.com").one().id
+        user = SimpleNamespace(id=user_id, email="learner@example.com")
+        trips = RoundTrips(db.engine)
+        for i in range(EXCHANGES):
+            conversation = resources.save_conversation(user, f"Question {i}", f"Answer {i}", f"Feedback {i}",
+                                                       'small_talk' if i % 2 else 'networking')
+            assert conversation is not None
+        assert conversation.id == EXCHANGES  # Without another query
+
+        # Per exchange: INSERT conversation, INSERT feedback, SELECT rollup row, UPDATE it, COMMIT
+        # (the first exchange of each rollup row inserts it instead, in a savepoint)
+        per_exchange = len(trips) / EXCHANGES
+        print(f"\n{per_exchange:.3f} round trips per exchange")
+        assert per_exchange < 5.01
+        assert trips.commits == EXCHANGES
+        inserts = [s for s in trips.statements if s.startswith("INSERT INTO conversations")]
+        assert len(inserts) == EXCHANGES
+        # The new id comes back with the insert: RETURNING, or the cursor's lastrowid on SQLite
+        if not db.engine.dialect.postfetch_lastrowid:
+            assert all("RETURNING" in s for s in inserts)
+        resources.conversations_temp.clear()
+
+        db.session.expire_all()
+        assert Feedback.query.count() == EXCHANGES
+        mismatched = (db.session.query(func.count(Feedback.id))
+                      .join(Conversation, Conversation.id == Feedback.conversation_id)
+                      .filter(Feedback.feedback_text != func.replace(Conversation.ai_response, 'Answer', 'Feedback'))
+                      .scalar())
+        assert mismatched == 0
+        rollups = UserProgressRollup.query.filter_by(user_id=user_id).all()
+        assert sum(r.conversation_count for r in rollups) == EXCHANGES
+
+def test_practice_stores_the_feedback(app, auth):
+    headers = auth(app)
+    client = app.test_client()
+    response = client.post('/api/practice', json={"message": "Hello there"}, headers=headers)
+    assert response.status_code == 200
+
+    history = client.get('/api/practice', headers=headers).get_json()
+    assert history[-1]["feedback"] == response.get_json()["feedback"]
+    with app.app_context():
+        conversation = Conversation.query.one()
+        assert [f.feedback_text for f in conversation.feedbacks] == [response.get_json()["feedback"]]
+
+if __name__ == "__main__":
+    # The tests use a pytest fixture for the app
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
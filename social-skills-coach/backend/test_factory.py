@@ -0,0 +1,91 @@
+"""
+Tests for the application factory.
+
+Checks that create_app() builds only the requested subsystems, that a
+database-only app does not import the web stack, and that several apps in
+one process keep separate databases, caches and rate limits.
+"""
+
+import os
+import subprocess
+import sys
+import pytest
+from factory import create_app, resolve_subsystems, SUBSYSTEMS
+from models import db, User
+
+WEB_MODULES = ['resources', 'flask_restful', 'flask_jwt_extended', 'flask_migrate', 'sentiment']
+
+def test_database_only_app():
+    app = create_app(subsystems=())
+    assert [rule.endpoint for rule in app.url_map.iter_rules()] == ['static']
+    assert 'sqlalchemy' in app.extensions
+    for name in ['migrate', 'flask-jwt-extended', 'sentiment_analyzer', 'conversation_cache']:
+        assert name not in app.extensions
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email="factory@example.com", password="password123"))
+        db.session.commit()
+        assert User.query.count() == 1
+
+def test_database_only_app_skips_web_stack():
+    script = (
+        "import sys\nfrom factory import create_app\ncreate_app(subsystems=())\n"
+        f"print(','.join(m for m in {WEB_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', script],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    assert result.stdout.strip() == ''
+
+def test_subsystems():
+    assert resolve_subsystems(['api']) == {'api', 'sentiment'}
+    assert resolve_subsystems(SUBSYSTEMS) == set(SUBSYSTEMS)
+    with pytest.raises(ValueError):
+        create_app(subsystems=['api', 'billing'])
+
+    app = create_app(subsystems=['stripe'])
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+    assert endpoints == {'static', 'stripe_webhooks.stripe_webhook'}
+
+    app = create_app(subsystems=['api', 'migrate'])
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+    assert {'home', 'feedbackresource', 'conversationresource'} <= endpoints
+    assert 'stripe_webhooks.stripe_webhook' not in endpoints
+    assert {'migrate', 'sentiment_analyzer', 'conversation_cache'} <= set(app.extensions)
+
+def test_apps_are_isolated():
+    first, second = (create_app(subsystems=['api']) for _ in range(2))
+    for app in (first, second):
+        with app.app_context():
+            db.create_all()
+
+    # Each in-memory SQLite app has its own database
+    with first.app_context():
+        db.session.add(User(email="first@example.com", password="password123"))
+        db.session.commit()
+    with second.app_context():
+        assert User.query.count() == 0
+
+    assert first.extensions['conversation_cache'] is not second.extensions['conversation_cache']
+    assert first.extensions['sentiment_analyzer'] is not second.extensions['sentiment_analyzer']
+
+    # Using up the conversation rate limit on one app leaves the other untouched
+    payload = {"user_input": "Hello, how are you?", "category": "small_talk"}
+    statuses = [first.test_client().post('/api/conversation', json=payload).status_code for _ in range(11)]
+    assert statuses == [200] * 10 + [429]
+    assert second.test_client().post('/api/conversation', json=payload).status_code == 200
+    assert len(first.extensions['conversation_cache']) == 1
+
+if __name__ == "__main__":
+    print("Testing the application factory")
+    print("===============================")
+    test_database_only_app()
+    print("✓ A database-only app has no routes or web extensions")
+    test_database_only_app_skips_web_stack()
+    print("✓ A database-only app does not import the web stack")
+    test_subsystems()
+    print("✓ Subsystems are opt-in")
+    test_apps_are_isolated()
+    print("✓ Apps in one process are isolated")
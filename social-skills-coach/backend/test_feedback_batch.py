@@ -0,0 +1,132 @@
+"""
+Tests for the /api/feedback/batch endpoint.
+
+Runs against an in-memory SQLite database and checks that each batch
+result matches the single-item /api/feedback response, that bad items are
+reported without failing the batch, and that scores are written with one
+UPDATE statement, to the user's own conversations only.
+"""
+
+import pytest
+from sqlalchemy import event
+import config
+import progress_service
+from models import db, User, Conversation, Feedback, UserProgressRollup
+
+INPUTS = [
+    "I hate this",
+    "Hello there",
+    "I am sorry but I am very nervous and maybe I should not be here. I think this is not for me.",
+    "Um, like, I kind of want to talk to people but you know I get nervous.",
+    "This is interesting and I appreciate your help with my social skills. What should I practice next?",
+    "I love talking to you and this has been very helpful for me"
+]
+
+def add_conversations(email, conversation_count):
+    """Add unscored conversations to a user and return their ids."""
+    user = User.query.filter_by(email=email).one()
+    conversation_ids = []
+    for i in range(conversation_count):
+        conversation = Conversation(user_id=user.id, user_input=f"Message {i}", ai_response="Response", category='small_talk')
+        db.session.add(conversation)
+        db.session.flush()
+        feedback = Feedback(conversation_id=conversation.id, feedback_text="Good job with your communication!")
+        db.session.add(feedback)
+        progress_service.record_conversation(conversation, [feedback])
+        conversation_ids.append(conversation.id)
+    db.session.commit()
+    return conversation_ids
+
+def test_batch_results_match_single_endpoint(app, auth):
+    client = app.test_client()
+    for headers in [{}, auth(app, "free@example.com"), auth(app)]:
+        expected = [
+            client.post('/api/feedback', headers=headers, json={"user_input": text}).get_json()
+            for text in INPUTS
+        ]
+        response = client.post('/api/feedback/batch', headers=headers, json={
+            "inputs": [{"user_input": text} for text in INPUTS]
+        })
+        assert response.status_code == 200
+        assert response.get_json()["results"] == expected
+
+def test_bad_items_are_isolated(app, auth):
+    client = app.test_client()
+    response = client.post('/api/feedback/batch', headers=auth(app), json={
+        "inputs": [{"user_input": INPUTS[2]}, {"text": "missing"}, "not an object", {"user_input": 42}, {"user_input": INPUTS[4]}]
+    })
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert len(results) == 5
+    assert results[0]["success"] and results[4]["success"]
+    assert [r["success"] for r in results[1:4]] == [False, False, False]
+
+def test_invalid_batches_are_rejected(app):
+    client = app.test_client()
+    assert client.post('/api/feedback/batch', json={"inputs": "text"}).status_code == 400
+    too_many = [{"user_input": "hi"}] * (config.FEEDBACK_BATCH_MAX_SIZE + 1)
+    assert client.post('/api/feedback/batch', json={"inputs": too_many}).status_code == 400
+
+def test_scores_written_with_single_update(app, auth):
+    client = app.test_client()
+    email = "learner@example.com"
+    with app.app_context():
+        conversation_ids = add_conversations(email, 5)
+        engine = db.engine
+
+    statements = []
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    items = [{"user_input": INPUTS[i], "conversation_id": cid} for i, cid in enumerate(conversation_ids)]
+    items.append({"user_input": INPUTS[5], "conversation_id": conversation_ids[0]})  # Later item wins
+    event.listen(engine, "before_cursor_execute", record_statement)
+    try:
+        response = client.post('/api/feedback/batch', headers=auth(app), json={"inputs": items})
+    finally:
+        event.remove(engine, "before_cursor_execute", record_statement)
+
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    feedback_updates = [s for s in statements if s.lstrip().upper().startswith("UPDATE FEEDBACKS")]
+    assert len(feedback_updates) == 1
+
+    with app.app_context():
+        scores = {
+            f.conversation_id: f.score
+            for f in Feedback.query.filter(Feedback.conversation_id.in_(conversation_ids)).all()
+        }
+        assert scores[conversation_ids[0]] == results[5]["analysis"]["score"]
+        for i in range(1, 5):
+            assert scores[conversation_ids[i]] == results[i]["analysis"]["score"]
+
+        # The rollup matches a rebuild from the stored rows
+        user = User.query.filter_by(email=email).first()
+        row = UserProgressRollup.query.filter_by(user_id=user.id).one()
+        assert row.score_count == 5
+        assert row.score_total == sum(scores.values())
+        progress_service.rebuild_progress_rollup(user_id=user.id)
+        assert UserProgressRollup.query.filter_by(user_id=user.id).one().score_total == sum(scores.values())
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the app and the users
+    raise SystemExit(pytest.main([__file__, "-q"]))
+
+def test_other_users_conversations_are_not_scored(app, auth):
+    client = app.test_client()
+    with app.app_context():
+        own = add_conversations("learner@example.com", 1)[0]
+        other = add_conversations("other@example.com", 1)[0]
+
+    response = client.post('/api/feedback/batch', headers=auth(app), json={"inputs": [
+        {"user_input": INPUTS[4], "conversation_id": own},
+        {"user_input": INPUTS[5], "conversation_id": other},
+        {"user_input": INPUTS[1], "conversation_id": 999999}
+    ]})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["unsaved_conversation_ids"] == [other, 999999]
+
+    with app.app_context():
+        scores = {f.conversation_id: f.score for f in Feedback.query.filter(Feedback.conversation_id.in_([own, other])).all()}
+        assert scores == {own: data["results"][0]["analysis"]["score"], other: None}
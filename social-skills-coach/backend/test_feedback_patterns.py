@@ -0,0 +1,80 @@
+"""
+Tests for the compiled feedback pattern matcher.
+
+Generates random texts around the pattern keywords (word boundaries,
+punctuation, casing, near-miss words) and checks that the single-pass
+matcher finds exactly what one re.search per pattern finds.
+"""
+
+import re
+import random
+from feedback_patterns import FEEDBACK_PATTERNS, FeedbackPatternMatcher, feedback_matcher, pattern_key
+
+KEYWORDS = [
+    "sorry", "apologize", "apologies", "um", "uh", "like", "you know", "i think",
+    "cant", "cannot", "can't", "won't", "wont", "never", "always", "maybe", "perhaps", "possibly"
+]
+NEAR_MISSES = [
+    "sorrying", "unapologized", "umbrella", "uhh", "likely", "alike", "you knows", "i thinker",
+    "think", "canteen", "cannoted", "won'tt", "wonton", "nevermore", "alwaysly", "maybelline",
+    "perhapsy", "impossibly", "ithink", "you", "know", "can", "won"
+]
+FILLER = ["the", "party", "people", "talk", "work", "really", "it's", "we'd", "I", "You", "x_y", "42"]
+SEPARATORS = [" ", "  ", ", ", ". ", "! ", "? ", "-", "'", "\n", "_", ""]
+
+def legacy_match(text):
+    """The original matching loop: one re.search per pattern."""
+    return [index for index, (pattern, _) in enumerate(FEEDBACK_PATTERNS) if re.search(pattern, text.lower())]
+
+def random_text(rng):
+    words = []
+    for _ in range(rng.randint(0, 25)):
+        pool = rng.choice([KEYWORDS, NEAR_MISSES, FILLER, FILLER])
+        word = rng.choice(pool)
+        casing = rng.random()
+        if casing < 0.15:
+            word = word.upper()
+        elif casing < 0.3:
+            word = word.capitalize()
+        words.append(word)
+        words.append(rng.choice(SEPARATORS))
+    return "".join(words)
+
+def test_matches_legacy_on_random_texts():
+    rng = random.Random(20250402)
+    for _ in range(20000):
+        text = random_text(rng)
+        assert feedback_matcher.match(text) == legacy_match(text), repr(text)
+
+def test_feedback_and_keys_follow_pattern_order():
+    text = "Maybe I THINK I'm sorry, um, I can't say never."
+    assert feedback_matcher.match_feedback(text) == [feedback for _, feedback in FEEDBACK_PATTERNS]
+    assert feedback_matcher.match_keys(text) == [pattern_key(pattern) for pattern, _ in FEEDBACK_PATTERNS]
+    assert feedback_matcher.keys[0] == "sorry_apologize_apologies"
+    assert feedback_matcher.match("Nothing to see here") == []
+
+def test_overlapping_and_non_literal_patterns_are_exact():
+    # "can" and "can't" can match at the same position, and \w+ is not a literal
+    patterns = [
+        (r'\b(can|will)\b', "a"),
+        (r"\b(can't|won't)\b", "b"),
+        (r'\bth\w+\b', "c"),
+        (r'\b(no|nope)\b', "d")
+    ]
+    matcher = FeedbackPatternMatcher(patterns)
+    rng = random.Random(7)
+    vocabulary = ["can", "can't", "will", "won't", "the", "those", "no", "nope", "nothing", "x"]
+    for _ in range(5000):
+        text = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 8)))
+        expected = [i for i, (pattern, _) in enumerate(patterns) if re.search(pattern, text.lower())]
+        assert matcher.match(text) == expected, repr(text)
+
+if __name__ == "__main__":
+    print("Testing feedback pattern matcher")
+    print("================================")
+    test_matches_legacy_on_random_texts()
+    print("✓ Matches re.search on 20000 random texts")
+    test_feedback_and_keys_follow_pattern_order()
+    print("✓ Feedback and keys follow pattern order")
+    test_overlapping_and_non_literal_patterns_are_exact()
+    print("✓ Overlapping and non-literal patterns stay exact")
@@ -0,0 +1,108 @@
+"""
+Tests for the vectorized lexicon sentiment engine.
+
+Compares polarity and subjectivity with TextBlob's PatternAnalyzer on
+hand-written sentences and on random texts built from lexicon words,
+negations, intensifiers, punctuation and emoticons, and checks that batch and
+single-text scoring agree.
+"""
+
+import random
+from textblob import TextBlob
+from lexicon_sentiment import LexiconSentiment, get_engine
+from sentiment import SentimentAnalyzer
+
+# Largest difference from TextBlob allowed (float rounding only)
+TOLERANCE = 1e-9
+
+SENTENCES = [
+    "I hate this",
+    "Hello there",
+    "not a good day",
+    "I am not very happy",
+    "really not good",
+    "never really good",
+    "very very good!!",
+    "It's not bad at all! Really great!",
+    "I am sorry but I am very nervous and maybe I should not be here.",
+    "I love talking to you and this has been very helpful for me",
+    "Um, like, I kind of want to talk to people but you know I get nervous.",
+    "That was extremely awkward... I felt terribly shy, e.g. at the party.",
+    "Mr. Smith was quite nice (really) but the U.S. trip was boring",
+    "The meeting went well :) thanks",
+    "",
+]
+
+WORDS = (
+    "i you we the a it is was to and but so really very not no never don't can't isn't "
+    "good bad great nervous happy sad awkward terribly extremely quite too totally absolutely "
+    "slightly pretty love hate friend party people talk helpful boring interesting kind of "
+    "well-known e.g. Mr. U.S. \"fine\" 'okay' (really) sorry maybe ! !! . ... , ? :) :( :-D ;) <3 (!) : )"
+).split()
+
+def generate_texts(count, seed=7):
+    rng = random.Random(seed)
+    engine = get_engine()
+    lexicon = sorted(word for word, i in engine.index.items() if not engine.is_emoticon[i])
+    words = WORDS + rng.sample(lexicon, 300)
+    texts = []
+    for _ in range(count):
+        text = [rng.choice(words) for _ in range(rng.randint(1, 30))]
+        texts.append(" ".join(w.capitalize() if w.isalpha() and rng.random() < 0.1 else w for w in text))
+    return texts
+
+def textblob_sentiment(text):
+    sentiment = TextBlob(text).sentiment
+    return sentiment.polarity, sentiment.subjectivity
+
+def assert_close(actual, expected, text):
+    assert abs(actual[0] - expected[0]) <= TOLERANCE, (text, actual, expected)
+    assert abs(actual[1] - expected[1]) <= TOLERANCE, (text, actual, expected)
+
+def test_sentences_match_textblob():
+    engine = get_engine()
+    for text, result in zip(SENTENCES, engine.analyze_many(SENTENCES)):
+        assert_close(result, textblob_sentiment(text), text)
+
+def test_random_texts_match_textblob():
+    texts = generate_texts(5000)
+    for text, result in zip(texts, get_engine().analyze_many(texts)):
+        assert_close(result, textblob_sentiment(text), text)
+
+def test_negation_and_intensifiers():
+    engine = get_engine()
+    good = engine.analyze("good")[0]
+    assert engine.analyze("not good")[0] == -0.5 * good
+    assert engine.analyze("very good")[0] > good
+    assert engine.analyze("good!")[0] > good
+    assert engine.analyze("not bad")[0] > 0
+
+def test_batch_matches_single_texts():
+    engine = LexiconSentiment()
+    texts = generate_texts(200, seed=3) + ["separator \x00 inside", "   ", "!!!"]
+    assert engine.analyze_many(texts) == [engine.analyze(text) for text in texts]
+    assert engine.analyze_many([]) == []
+
+def test_analyzer_uses_lexicon_engine():
+    expected = get_engine().analyze_many(SENTENCES)
+    for mode in ['inline', 'thread']:
+        analyzer = SentimentAnalyzer(mode=mode, engine='lexicon', workers=2, timeout=60, max_pending=100)
+        try:
+            assert analyzer.analyze_many(SENTENCES) == expected, mode
+            assert analyzer.stats()["analyzed"] == len(SENTENCES)
+        finally:
+            analyzer.shutdown()
+
+if __name__ == "__main__":
+    print("Testing lexicon sentiment engine")
+    print("================================")
+    test_sentences_match_textblob()
+    print("✓ Sentences match TextBlob")
+    test_random_texts_match_textblob()
+    print("✓ Random texts match TextBlob")
+    test_negation_and_intensifiers()
+    print("✓ Negation and intensifiers shift polarity")
+    test_batch_matches_single_texts()
+    print("✓ Batch scoring matches single texts")
+    test_analyzer_uses_lexicon_engine()
+    print("✓ SentimentAnalyzer runs the lexicon engine")
@@ -0,0 +1,92 @@
+"""
+Tests for the LLM providers (llm_providers.py).
+
+Checks that the mock provider gives the keyword replies through every call
+style, that the stub provider adds its latency and injected errors, that
+batches run concurrently and report failures in place, and that the
+deployment's provider and per-category models are used by the API.
+"""
+
+import asyncio
+import time
+import openai
+import pytest
+import config
+from fake_llm_server import DEFAULT_REPLY
+from llm_providers import MOCK_RESPONSES, MockProvider, StubProvider
+from openai_transport import OpenAIGateway, RetryPolicy
+
+def messages(text):
+    return [{"role": "system", "content": "You are a coach."}, {"role": "user", "content": text}]
+
+def stub_gateway(url):
+    return OpenAIGateway(policy=RetryPolicy(max_attempts=2, base_delay=0.01, max_delay=0.01), api_key='stub', base_url=url)
+
+@pytest.fixture
+def stub():
+    provider = StubProvider(stub_gateway, latency=0.2, token_delay=0.0)
+    yield provider
+    provider.close()
+
+async def collect(stream):
+    return [text async for text in stream]
+
+def test_mock_provider_call_styles():
+    provider = MockProvider()
+    assert provider.complete(messages("hello there"), 'mock') == MOCK_RESPONSES["greeting"]
+    assert "".join(provider.stream(messages("I feel shy"), 'mock')) == MOCK_RESPONSES["nervousness"]
+    assert asyncio.run(provider.acomplete(messages("how do I listen?"), 'mock')) == MOCK_RESPONSES["listening"]
+    assert "".join(asyncio.run(collect(provider.astream(messages("what now"), 'mock')))) == MOCK_RESPONSES["default"]
+    assert provider.batch([{"messages": messages("hi"), "model": 'mock'}] * 3) == [MOCK_RESPONSES["greeting"]] * 3
+
+def test_stub_provider_has_realistic_latency(stub):
+    start = time.perf_counter()
+    assert stub.complete(messages("How do I start?"), 'fake-model') == DEFAULT_REPLY
+    assert time.perf_counter() - start >= 0.2
+    assert "".join(stub.stream(messages("How do I start?"), 'fake-model')) == DEFAULT_REPLY
+    assert stub.server.requests[0]["model"] == 'fake-model'
+
+def test_stub_provider_injects_errors(stub):
+    stub.server.error_rate, stub.server.fail_status = 1.0, 503
+    with pytest.raises(openai.InternalServerError):
+        stub.complete(messages("How do I start?"), 'fake-model')
+    # 503 is retryable, so the gateway tried twice
+    assert len(stub.server.requests) == 2
+
+def test_batch_runs_concurrently_and_keeps_failures_in_place(stub):
+    stub.server.fail_count, stub.server.fail_status = 1, 400
+    requests = [{"messages": messages(f"question {i}"), "model": 'fake-model'} for i in range(8)]
+
+    start = time.perf_counter()
+    results = stub.batch(requests)
+    assert time.perf_counter() - start < 1.0  # 8 x 0.2s one at a time
+    assert sum(isinstance(result, openai.BadRequestError) for result in results) == 1
+    assert results.count(DEFAULT_REPLY) == 7
+
+    async def abatch():
+        try:
+            return await stub.abatch(requests)
+        finally:
+            await stub.aclose()
+
+    start = time.perf_counter()
+    assert asyncio.run(abatch()) == [DEFAULT_REPLY] * 8
+    assert time.perf_counter() - start < 1.0
+
+def test_stub_deployment_routes_categories_to_models(app, llm, monkeypatch):
+    monkeypatch.setattr(config, 'CONVERSATION_MODELS', {'small_talk': 'small-model'})
+    client = app.test_client()
+    for category in ('small_talk', 'introductions'):
+        response = client.post('/api/conversation', json={"user_input": "How do I say hello?", "category": category})
+        assert response.get_json()["response"] == DEFAULT_REPLY
+
+    assert [request["model"] for request in llm.requests] == ['small-model', config.OPENAI_MODEL]
+
+def test_unknown_provider_is_rejected(make_app, monkeypatch):
+    monkeypatch.setattr(config, 'LLM_PROVIDER', 'carrier-pigeon')
+    with pytest.raises(ValueError, match="carrier-pigeon"):
+        make_app()
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the stub server
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,235 @@
+"""
+Tests for the metrics registry and /metrics (metrics.py).
+
+Checks that the histogram buckets cover every value within 1/64 of it, that
+percentiles come out at that precision, that API requests record their
+handler and stage timings, that /metrics is valid Prometheus text with
+cumulative buckets, that a scrape adds up the series other worker
+processes wrote to the multiprocess directory (gauges only while the worker
+is alive), and that the counters and gauges of the caches, single-flight,
+rate policies, OpenAI gateway and query log, and the semantic cache's hit
+similarity, are served with them while their owners exist.
+"""
+
+import gc
+import os
+import random
+import re
+import pytest
+import config
+import metrics
+from cache import LRUCache, conversation_context, track_cache
+from openai_transport import OpenAIGateway
+from semantic_cache import SemanticCache
+
+def counts(family):
+    """Return {label values: count} of a family's series in this process."""
+    return {values: snapshot["count"] for values, snapshot in family.collect().items()}
+
+def parse(text):
+    """Return {(name, labels): value} from Prometheus text."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            match = re.fullmatch(r'([a-z_]+)(\{.*\})? (\S+)', line)
+            assert match, line
+            samples[(match.group(1), match.group(2) or '')] = float(match.group(3))
+    return samples
+
+def test_buckets_are_within_one_sixty_fourth():
+    rng = random.Random(5)
+    for value in list(range(300)) + [rng.randrange(1, 1 << 45) for _ in range(20000)]:
+        index = metrics.bucket_index(value)
+        upper = metrics.bucket_upper_bound(index)
+        lower = metrics.bucket_upper_bound(index - 1) + 1 if index else 0
+        assert lower <= value <= upper
+        assert upper - lower <= max(0, value / 64)
+
+    histogram = metrics.Histogram()
+    for microseconds in range(1, 100001):
+        histogram.observe_ns(microseconds * 1000)
+    for fraction in (0.5, 0.9, 0.99, 0.999):
+        assert histogram.percentile(fraction) == pytest.approx(fraction * 0.1, rel=1 / 64)
+    assert metrics.Histogram().percentile(0.99) == 0.0
+
+def test_requests_record_handler_and_stage_timings(app, auth):
+    handlers_before = counts(metrics.HANDLER_SECONDS)
+    stages_before = counts(metrics.STAGE_SECONDS)
+    headers = auth(app, "basic@example.com")  # Paid tiers get the sentiment analysis
+    client = app.test_client()
+    assert client.post('/api/conversation', json={"user_input": "How do I open a conversation?"},
+                       headers=headers).status_code == 200
+    assert client.post('/api/feedback', json={"user_input": "I asked them about their weekend"},
+                       headers=headers).status_code == 200
+
+    handlers = counts(metrics.HANDLER_SECONDS)
+    stages = counts(metrics.STAGE_SECONDS)
+    def added(now, before, key):
+        return now.get(key, 0) - before.get(key, 0)
+    assert added(handlers, handlers_before, ('ConversationResource', 'post')) == 1
+    assert added(handlers, handlers_before, ('FeedbackResource', 'post')) == 1
+    assert added(stages, stages_before, ('cache_lookup',)) == 1
+    assert added(stages, stages_before, ('llm_call',)) == 1
+    assert added(stages, stages_before, ('sentiment',)) == 1
+    assert added(stages, stages_before, ('db_commit',)) >= 1  # At least the stored conversation
+
+def test_metrics_endpoint(app):
+    client = app.test_client()
+    client.post('/api/conversation', json={"user_input": "How do I end a conversation?"})
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert "# TYPE coach_handler_duration_seconds histogram" in text
+
+    samples = parse(text)
+    series = '{resource="ConversationResource",method="post"'
+    buckets = [(float(labels.rsplit('le="', 1)[1][:-2].replace('+Inf', 'inf')), value)
+               for (name, labels), value in samples.items()
+               if name == 'coach_handler_duration_seconds_bucket' and labels.startswith(series)]
+    assert [le for le, _ in buckets] == sorted(config.METRICS_BUCKETS) + [float('inf')]
+    values = [value for _, value in buckets]
+    assert values == sorted(values)  # Cumulative
+    count = samples[('coach_handler_duration_seconds_count', series + '}')]
+    assert values[-1] == count >= 1
+    assert samples[('coach_handler_duration_seconds_sum', series + '}')] > 0
+
+def test_scrape_adds_up_other_workers(tmp_path):
+    family = metrics.REGISTRY.histogram('coach_test_fork_seconds', "Observations made around a fork.", ('side',))
+    family.labels('parent').observe(0.5)  # Before the fork: the child must not report it again
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            family.labels('parent').observe(0.002)
+            for _ in range(3):
+                family.labels('child').observe(0.004)
+            metrics.REGISTRY.write(str(tmp_path))
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert (tmp_path / f"metrics-{pid}.json").exists()
+
+    family.labels('parent').observe(0.2)
+    samples = parse(metrics.REGISTRY.render(str(tmp_path)))
+    assert samples[('coach_test_fork_seconds_count', '{side="parent"}')] == 3
+    assert samples[('coach_test_fork_seconds_count', '{side="child"}')] == 3
+    assert samples[('coach_test_fork_seconds_bucket', '{side="child",le="0.005"}')] == 3
+    assert samples[('coach_test_fork_seconds_sum', '{side="parent"}')] == pytest.approx(0.702, rel=1e-6)
+    # Without the directory only this process's series are served
+    assert parse(metrics.REGISTRY.render())[('coach_test_fork_seconds_count', '{side="parent"}')] == 2
+
+def test_component_counters_are_served(app):
+    gc.collect()  # Apps of earlier tests would drop out of the sums between the scrapes
+    gateway = OpenAIGateway(api_key='test-key')  # Its counters are served while it exists
+    client = app.test_client()
+    before = parse(client.get('/metrics').get_data(as_text=True))
+    for _ in range(2):
+        assert client.post('/api/conversation', json={"user_input": "How do I join a group?"}).status_code == 200
+    text = client.get('/metrics').get_data(as_text=True)
+    assert "# TYPE coach_cache_lookups_total counter" in text
+    assert "# TYPE coach_llm_in_flight gauge" in text
+
+    samples = parse(text)
+    def added(name, labels=''):
+        return samples[(name, labels)] - before.get((name, labels), 0)
+    assert added('coach_cache_lookups_total', '{cache="conversation",result="miss"}') == 1
+    assert added('coach_cache_lookups_total', '{cache="conversation",result="hit"}') == 1
+    assert ('coach_cache_removals_total', '{cache="conversation",reason="eviction"}') in samples
+    assert samples[('coach_cache_entries', '{cache="conversation"}')] >= 1
+    assert samples[('coach_cache_bytes', '{cache="conversation"}')] > 0
+    assert added('coach_single_flight_events_total', '{event="calls"}') == 1
+    assert added('coach_llm_shed_total') == 0
+    assert added('coach_db_over_budget_total') == 0
+    assert samples[('coach_openai_breaker_state', '{state="closed"}')] >= 1
+    assert ('coach_openai_events_total', '{event="retries"}') in samples
+    assert gateway.stats()["calls"] == 0
+
+def test_cache_removals_and_size_are_served():
+    cache = LRUCache(2, max_bytes=10)
+    track_cache(cache, 'test')
+    for key in ['a', 'b', 'c']:
+        cache.put(key, key * 3)  # 'c' evicts 'a'
+    cache.put('d', "x" * 11)  # Larger than the budget
+
+    samples = parse(metrics.REGISTRY.render())
+    assert samples[('coach_cache_removals_total', '{cache="test",reason="eviction"}')] == 1
+    assert samples[('coach_cache_removals_total', '{cache="test",reason="rejection"}')] == 1
+    assert samples[('coach_cache_removals_total', '{cache="test",reason="expiration"}')] == 0
+    assert samples[('coach_cache_entries', '{cache="test"}')] == 2
+    assert samples[('coach_cache_bytes', '{cache="test"}')] == 6
+
+def test_semantic_cache_hit_quality_is_served():
+    before = parse(metrics.REGISTRY.render())
+    cache = SemanticCache()
+    context = conversation_context('gpt-3.5-turbo', "You are a coach.", {})
+    cache.put('small_talk', context, "how do I make small talk at parties?", "answer")
+    assert cache.get('small_talk', context, "how can I make small talk at a party") == "answer"
+    assert cache.get('small_talk', context, "how do I make small talk at parties quickly?") is None  # 0.87
+
+    samples = parse(metrics.REGISTRY.render())
+    def added(name, labels=''):
+        return samples[(name, labels)] - before.get((name, labels), 0)
+    assert added('coach_semantic_cache_near_misses_total') == 1
+    assert added('coach_semantic_cache_hit_similarity_count') == 1
+    assert added('coach_semantic_cache_hit_similarity_bucket', '{le="0.99"}') == 0
+    assert added('coach_semantic_cache_hit_similarity_bucket', '{le="+Inf"}') == 1
+
+def test_counters_are_read_from_live_owners(tmp_path):
+    class Owner:
+        def __init__(self, value):
+            self.value = value
+
+    family = metrics.REGISTRY.counter('coach_test_owned_total', "Values kept by test objects.", ('owner',))
+    def read(owner):
+        return {('test',): owner.value}
+    owners = [Owner(2), Owner(3)]
+    family.track(owners[0], read)
+    family.track(owners[1], read)
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            owners[0].value = 10
+            metrics.REGISTRY.write(str(tmp_path))
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+    assert "# TYPE coach_test_owned_total counter" in metrics.REGISTRY.render()
+    assert parse(metrics.REGISTRY.render())[('coach_test_owned_total', '{owner="test"}')] == 5
+    assert parse(metrics.REGISTRY.render(str(tmp_path)))[('coach_test_owned_total', '{owner="test"}')] == 18
+    del owners[:]
+    gc.collect()
+    assert ('coach_test_owned_total', '{owner="test"}') not in parse(metrics.REGISTRY.render())
+
+def test_gauges_of_exited_workers_are_skipped(tmp_path):
+    class Owner:
+        value = 1
+
+    family = metrics.REGISTRY.gauge('coach_test_in_flight', "Values kept by test objects.")
+    def read(owner):
+        return {(): owner.value}
+    owner = Owner()
+    family.track(owner, read)
+
+    written, exit = os.pipe(), os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            metrics.REGISTRY.write(str(tmp_path))
+            os.write(written[1], b"1")
+            os.read(exit[0], 1)  # Stay alive until the parent has scraped
+        finally:
+            os._exit(0)
+    os.read(written[0], 1)
+    assert parse(metrics.REGISTRY.render(str(tmp_path)))[('coach_test_in_flight', '')] == 2
+    os.write(exit[1], b"1")
+    os.waitpid(pid, 0)
+    assert parse(metrics.REGISTRY.render(str(tmp_path)))[('coach_test_in_flight', '')] == 1
+    for fd in written + exit:
+        os.close(fd)
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the app and the metrics directory
+    raise SystemExit(pytest.main([__file__, "-q"]))
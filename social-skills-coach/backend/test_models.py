@@ -5,9 +5,12 @@ This script creates some sample data to test the models
 and their relationships.
 """
 
-from app import app, db, User, Conversation, Feedback
+from factory import create_app
+from models import db, User, Conversation, Feedback
 import config
 
+app = create_app(subsystems=())
+
 def test_models():
     """Test the database models by creating sample data."""
     print("Testing database models...")
@@ -0,0 +1,168 @@
+"""
+Tests for the OpenAI transport (openai_transport.py).
+
+Runs the gateway against fake_llm_server.FakeLLMServer and checks that
+connections are reused, that only retryable failures are retried and within
+the total deadline, that the circuit breaker opens, fails fast and closes
+again after a successful probe (but not after an error raised before
+upstream answered), and that the conversation endpoint answers
+with the fallback (without caching it) while the breaker is open.
+"""
+
+import asyncio
+import time
+import openai
+import pytest
+import config
+import resources
+from fake_llm_server import DEFAULT_REPLY, FakeLLMServer
+from llm_providers import OpenAIProvider
+from openai_transport import CircuitBreaker, CircuitOpenError, OpenAIGateway, RetryPolicy
+
+MESSAGES = [{"role": "user", "content": "How do I start talking to people at a party?"}]
+
+# The gateways are tested on their own server; the conftest llm fixture serves the app's stub provider
+@pytest.fixture
+def llm_server():
+    server = FakeLLMServer()
+    server.start()
+    yield server
+    server.stop()
+
+def gateway_for(server, **policy):
+    policy = {"base_delay": 0.01, "max_delay": 0.05, **policy}
+    return OpenAIGateway(policy=RetryPolicy(**policy), breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.3),
+                         api_key='test-key', base_url=server.url)
+
+def reply(response):
+    return response.choices[0].message.content
+
+def test_connections_are_kept_alive(llm_server):
+    gateway = gateway_for(llm_server)
+    for _ in range(5):
+        assert reply(gateway.chat(model='fake', messages=MESSAGES)) == DEFAULT_REPLY
+
+    pool = gateway.stats()['pool']
+    assert pool['connections'] == 1 and pool['idle'] == 1
+    assert pool['max_connections'] == 100
+
+def test_retryable_status_is_retried(llm_server):
+    llm_server.fail_count, llm_server.fail_status = 2, 503
+    gateway = gateway_for(llm_server)
+
+    assert reply(gateway.chat(model='fake', messages=MESSAGES)) == DEFAULT_REPLY
+    assert len(llm_server.requests) == 3
+    stats = gateway.stats()
+    assert (stats['calls'], stats['attempts'], stats['retries'], stats['failures']) == (1, 3, 2, 0)
+    assert stats['breaker']['state'] == 'closed'
+
+def test_client_errors_are_not_retried(llm_server):
+    llm_server.fail, llm_server.fail_status = True, 400
+    gateway = gateway_for(llm_server)
+
+    for _ in range(3):
+        with pytest.raises(openai.BadRequestError):
+            gateway.chat(model='fake', messages=MESSAGES)
+    assert len(llm_server.requests) == 3
+    # Upstream is answering, so the breaker stays closed
+    assert gateway.stats()['breaker']['state'] == 'closed'
+
+def test_attempts_share_the_total_deadline(llm_server):
+    llm_server.first_token_delay = 1.0
+    gateway = gateway_for(llm_server, max_attempts=5, attempt_timeout=0.3, total_timeout=0.7)
+
+    start = time.perf_counter()
+    with pytest.raises(openai.APITimeoutError):
+        gateway.chat(model='fake', messages=MESSAGES)
+    assert time.perf_counter() - start < 1.0
+    assert 2 <= gateway.stats()['attempts'] <= 3
+
+def test_breaker_fails_fast_and_recovers(llm_server):
+    llm_server.fail = True
+    gateway = gateway_for(llm_server, max_attempts=2)
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            gateway.chat(model='fake', messages=MESSAGES)
+    assert gateway.stats()['breaker']['state'] == 'open'
+
+    calls = len(llm_server.requests)
+    start = time.perf_counter()
+    with pytest.raises(CircuitOpenError):
+        gateway.chat(model='fake', messages=MESSAGES)
+    assert time.perf_counter() - start < 0.05
+    assert len(llm_server.requests) == calls
+
+    # After the reset timeout one probe goes through and closes the breaker
+    llm_server.fail = False
+    time.sleep(0.35)
+    assert reply(gateway.chat(model='fake', messages=MESSAGES)) == DEFAULT_REPLY
+    assert gateway.stats()['breaker'] == {"state": "closed", "consecutive_failures": 0, "opened": 1, "rejected": 1}
+
+def test_failed_probe_opens_the_breaker_again(llm_server):
+    llm_server.fail = True
+    gateway = gateway_for(llm_server, max_attempts=1)
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            gateway.chat(model='fake', messages=MESSAGES)
+    time.sleep(0.35)
+    with pytest.raises(openai.InternalServerError):
+        gateway.chat(model='fake', messages=MESSAGES)
+
+    assert gateway.stats()['breaker']['state'] == 'open'
+    assert gateway.stats()['breaker']['opened'] == 2
+
+def test_local_errors_leave_the_breaker_alone(llm_server):
+    llm_server.fail = True
+    gateway = gateway_for(llm_server, max_attempts=1)
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            gateway.chat(model='fake', messages=MESSAGES)
+    time.sleep(0.35)
+
+    # The probe fails before reaching upstream: the breaker is not closed, and the next call probes
+    with pytest.raises(TypeError):
+        gateway.chat(model='fake', messages=MESSAGES, not_an_argument=True)
+    assert gateway.stats()['breaker']['state'] == 'half_open'
+    with pytest.raises(openai.InternalServerError):
+        gateway.chat(model='fake', messages=MESSAGES)
+    assert gateway.stats()['breaker'] == {"state": "open", "consecutive_failures": 3, "opened": 2, "rejected": 0}
+
+def test_async_calls_are_retried(llm_server):
+    llm_server.fail_count, llm_server.fail_status = 1, 429
+    gateway = gateway_for(llm_server)
+
+    async def call():
+        try:
+            return await gateway.achat(model='fake', messages=MESSAGES)
+        finally:
+            await gateway.aclose()
+
+    assert reply(asyncio.run(call())) == DEFAULT_REPLY
+    assert gateway.stats()['retries'] == 1
+
+def test_open_breaker_answers_with_the_uncached_fallback(llm_server, app, monkeypatch):
+    monkeypatch.setattr(config, 'OPENAI_API_KEY', 'test-key')
+    monkeypatch.setattr(resources, '_llm_providers', {'openai': OpenAIProvider(gateway_for(llm_server, max_attempts=1))})
+    client = app.test_client()
+
+    llm_server.fail = True
+    for i in range(2):
+        response = client.post('/api/conversation', json={"user_input": f"How do I join a group conversation {i}?"})
+        assert response.get_json()["response"] == resources.FALLBACK_RESPONSE
+    calls = len(llm_server.requests)
+
+    start = time.perf_counter()
+    response = client.post('/api/conversation', json={"user_input": "How do I join a group conversation 0?"})
+    assert time.perf_counter() - start < 0.5
+    assert response.get_json()["response"] == resources.FALLBACK_RESPONSE
+    assert len(llm_server.requests) == calls
+
+    # The fallback was not cached, so the same question is answered once upstream recovers
+    llm_server.fail = False
+    time.sleep(0.35)
+    response = client.post('/api/conversation', json={"user_input": "How do I join a group conversation 0?"})
+    assert response.get_json()["response"] == DEFAULT_REPLY
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the fake server
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,258 @@
+"""
+Tests for the /api/progress endpoint.
+
+Runs against an in-memory SQLite database and checks that the progress
+rollup returns the same data as the original per-conversation loops, that
+it is kept up to date by the write endpoints and the backfill, and that
+the number of queries does not grow with the user's history.
+"""
+
+import re
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from feedback_patterns import FEEDBACK_PATTERNS
+from models import db, User, Conversation, Feedback, UserProgressRollup
+from resources import CATEGORIES
+import progress_service
+
+FEEDBACK_TEXTS = [
+    "Try to be more detailed in your responses.",
+    "Consider asking questions to engage the other person.",
+    "Good job with your communication!",
+    "Try to avoid apologizing too much. Maybe say it once, I think.",
+    "You never ask follow-up questions and always change the topic."
+]
+
+def add_history(email, conversation_count):
+    """Add to a user's deterministic conversation and feedback history; return the user."""
+    user = User.query.filter_by(email=email).one()
+
+    # Start on a Monday close to a year boundary to exercise week labels
+    start = datetime(2024, 12, 23, 9, 0, 0)
+    categories = list(CATEGORIES.keys()) + [None]
+    existing = Conversation.query.filter_by(user_id=user.id).count()
+    for i in range(existing, existing + conversation_count):
+        conversation = Conversation(
+            user_id=user.id,
+            user_input=f"Practice message {i}",
+            ai_response="Coach response",
+            category=categories[i % len(categories)],
+            timestamp=start + timedelta(hours=17 * i)
+        )
+        db.session.add(conversation)
+        db.session.flush()
+        feedback = Feedback(
+            conversation_id=conversation.id,
+            feedback_text=FEEDBACK_TEXTS[i % len(FEEDBACK_TEXTS)],
+            score=None if i % 4 == 0 else 40 + (i * 7) % 55
+        )
+        db.session.add(feedback)
+        progress_service.record_conversation(conversation, [feedback])
+    db.session.commit()
+    return user
+
+def legacy_progress(user):
+    """Reference implementation: the original per-conversation query loops."""
+    conversations = Conversation.query.filter_by(user_id=user.id).all()
+    response = {"success": True, "scenarios_completed": len(conversations), "tier": user.tier}
+    if user.tier in ['basic', 'premium']:
+        category_stats = {}
+        avg_score, feedback_count = 0, 0
+        for convo in conversations:
+            category = convo.category or 'uncategorized'
+            category_stats[category] = category_stats.get(category, 0) + 1
+            for feedback in Feedback.query.filter_by(conversation_id=convo.id).all():
+                if feedback.score is not None:
+                    avg_score += feedback.score
+                    feedback_count += 1
+        if feedback_count > 0:
+            avg_score = round(avg_score / feedback_count, 1)
+        response.update({"category_stats": category_stats, "average_feedback_score": avg_score})
+    if user.tier == 'premium':
+        weekly_counts, weekly_scores = {}, {}
+        pattern_counts, category_scores = {}, {}
+        for convo in conversations:
+            week_key = convo.timestamp.strftime("%Y-W%V")
+            weekly_counts[week_key] = weekly_counts.get(week_key, 0) + 1
+            weekly_scores.setdefault(week_key, {"total": 0, "count": 0})
+            category = convo.category or 'uncategorized'
+            category_scores.setdefault(category, {"total": 0, "count": 0})
+            for feedback in Feedback.query.filter_by(conversation_id=convo.id).all():
+                for pattern, _ in FEEDBACK_PATTERNS:
+                    pattern_key = pattern.replace(r'\b', '').replace('|', '_').replace('(', '').replace(')', '')
+                    if re.search(pattern, feedback.feedback_text.lower()):
+                        pattern_counts[pattern_key] = pattern_counts.get(pattern_key, 0) + 1
+                if feedback.score is not None:
+                    weekly_scores[week_key]["total"] += feedback.score
+                    weekly_scores[week_key]["count"] += 1
+                    category_scores[category]["total"] += feedback.score
+                    category_scores[category]["count"] += 1
+        weekly_averages = {
+            week: round(data["total"] / data["count"], 1) if data["count"] > 0 else 0
+            for week, data in weekly_scores.items()
+        }
+        category_averages = {
+            category: round(data["total"] / data["count"], 1)
+            for category, data in category_scores.items() if data["count"] > 0
+        }
+        labels = sorted(weekly_counts.keys())
+        response.update({
+            "trends": {
+                "labels": labels,
+                "conversation_counts": [weekly_counts[week] for week in labels],
+                "score_averages": [weekly_averages[week] for week in labels]
+            },
+            "improvement_areas": {
+                "common_issues": [
+                    {"pattern": p, "count": c}
+                    for p, c in sorted(pattern_counts.items(), key=lambda x: x[1], reverse=True)[:3]
+                ],
+                "weakest_categories": [
+                    {"category": c, "average_score": s}
+                    for c, s in sorted(category_averages.items(), key=lambda x: x[1])[:2]
+                ]
+            }
+        })
+    return response
+
+def rollup_snapshot(user_id=None):
+    """Return the rollup table as comparable tuples."""
+    query = UserProgressRollup.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    return sorted(
+        (r.user_id, r.iso_week, r.category, r.conversation_count, r.score_total,
+         r.score_count, r.pattern_hits, r.first_conversation_id)
+        for r in query.all()
+    )
+
+def get_progress(client, headers):
+    """Call /api/progress with a user's headers and return (json, query_count)."""
+    statements = []
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with client.application.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", count_query)
+    try:
+        response = client.get('/api/progress', headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_query)
+
+    assert response.status_code == 200
+    return response.get_json(), len(statements)
+
+def test_progress_matches_legacy_computation(app, auth):
+    """Grouped queries return the same payload as the original loops."""
+    client = app.test_client()
+    for email in ["free@example.com", "basic@example.com", "learner@example.com"]:
+        with app.app_context():
+            expected = legacy_progress(add_history(email, 60))
+        data, _ = get_progress(client, auth(app, email))
+        assert data == expected, f"Mismatch for {email}"
+
+def test_progress_query_count_is_flat(app, auth):
+    """The number of queries does not grow with conversation history."""
+    client = app.test_client()
+    counts = {}
+    previous = 0
+    for size in [1, 10, 200]:
+        with app.app_context():
+            add_history("learner@example.com", size - previous)
+        previous = size
+        data, counts[size] = get_progress(client, auth(app))
+        assert data["scenarios_completed"] == size
+
+    print(f"Queries per /api/progress call: {counts}")
+    assert counts[1] == counts[10] == counts[200]
+    assert counts[200] <= 2
+
+def test_rebuild_matches_incremental_rollup(app):
+    """The batched backfill produces the same rows as the write path."""
+    with app.app_context():
+        add_history("other@example.com", 20)
+        user = add_history("learner@example.com", 75)
+        incremental = rollup_snapshot()
+
+        processed = progress_service.rebuild_progress_rollup(batch_size=7)
+        assert processed == Conversation.query.count()
+        assert rollup_snapshot() == incremental
+
+        # Rebuilding a single user leaves the other users untouched
+        processed = progress_service.rebuild_progress_rollup(batch_size=50, user_id=user.id)
+        assert processed == 75
+        assert rollup_snapshot() == incremental
+
+def test_rebuild_replaces_each_user_in_one_transaction(app):
+    """Each user's rows are deleted and rebuilt in one commit, and leftover rows are removed."""
+    with app.app_context():
+        user = add_history("learner@example.com", 30)
+        other = add_history("other@example.com", 0)
+        db.session.add(UserProgressRollup(user_id=other.id, iso_week="2024-W01", category='small_talk',
+                                          conversation_count=3, score_total=0, score_count=0, pattern_hits={}))
+        db.session.commit()
+        incremental = rollup_snapshot(user.id)
+
+        commits = []
+        statements = []
+        listen = [(db.engine, 'commit', lambda connection: commits.append(len(statements))),
+                  (db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))]
+        for target, name, listener in listen:
+            event.listen(target, name, listener)
+        try:
+            progress_service.rebuild_progress_rollup(batch_size=4)
+        finally:
+            for target, name, listener in listen:
+                event.remove(target, name, listener)
+
+        assert rollup_snapshot(user.id) == incremental
+        assert rollup_snapshot(other.id) == []
+        # One commit per user after the delete and the inserts, none between them
+        user_count = len({row[0] for row in db.session.query(Conversation.user_id).distinct()} | {other.id})
+        assert len(commits) == user_count + 1  # And one after listing the users
+        deletes = [i for i, statement in enumerate(statements) if statement.startswith("DELETE FROM user_progress_rollup")]
+        assert len(deletes) == user_count
+        assert all(any(a < delete <= b for a, b in zip(commits, commits[1:])) for delete in deletes)
+
+def test_write_endpoints_update_rollup(app, auth):
+    """Conversation, practice and feedback writes keep /api/progress current."""
+    client = app.test_client()
+    email = "learner@example.com"
+    headers = auth(app)
+
+    response = client.post('/api/conversation', headers=headers, json={
+        "user_input": "I am sorry, I always get nervous when I meet new people at work",
+        "category": "networking"
+    })
+    assert response.status_code == 200
+    response = client.post('/api/practice', headers=headers, json={"message": "Hello there"})
+    assert response.status_code == 200
+
+    with app.app_context():
+        user = User.query.filter_by(email=email).first()
+        conversation = Conversation.query.filter_by(user_id=user.id, category='networking').first()
+        conversation_id = conversation.id
+
+    for score_input in ["Hi", "I think this went well and I would like to practice more often with you?"]:
+        response = client.post('/api/feedback', headers=headers, json={
+            "user_input": score_input,
+            "conversation_id": conversation_id
+        })
+        assert response.status_code == 200
+
+    data, _ = get_progress(client, headers)
+    with app.app_context():
+        user = User.query.filter_by(email=email).first()
+        assert data == legacy_progress(user)
+        incremental = rollup_snapshot(user.id)
+        progress_service.rebuild_progress_rollup(user_id=user.id)
+        assert rollup_snapshot(user.id) == incremental
+
+    assert data["scenarios_completed"] == 2
+    assert data["category_stats"] == {"networking": 1, "uncategorized": 1}
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the app and the users
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
@@ -0,0 +1,96 @@
+"""
+Tests for the query log and query budgets (query_log.py).
+
+Checks that statements are normalized, that the history and progress
+endpoints stay within their declared budgets however many conversations a
+user has, that a handler over its budget fails while testing and is logged
+otherwise, that slow statements are logged with the code that ran them, and
+that every statement is counted per request and on /metrics.
+"""
+
+import logging
+import pytest
+import config
+import query_log
+from models import db, User, Conversation, Feedback
+from query_log import QueryBudgetExceeded, normalize_sql, query_budget
+
+@pytest.fixture
+def make_app(make_app):
+    def make_budget_app(testing, conversations=0):
+        app = make_app(TESTING=testing)
+        with app.app_context():
+            user = User.query.filter_by(email="learner@example.com").one()
+            for i in range(conversations):
+                conversation = Conversation(user_id=user.id, user_input=f"Hello {i}", ai_response="Hi there!", category='small_talk')
+                db.session.add(conversation)
+                db.session.flush()
+                db.session.add(Feedback(conversation_id=conversation.id, feedback_text=f"Feedback {i}", score=70))
+            db.session.commit()
+
+        @app.route('/test/n-plus-one')
+        @query_budget(1)
+        def n_plus_one():
+            return {"emails": [User.query.get(user_id).email for user_id in (1, 1, 1)]}
+
+        return app
+    return make_budget_app
+
+def test_normalize_sql():
+    statement = """SELECT users.id FROM users
+                   WHERE users.email = 'o''brien@example.com' AND users.id IN (?, ?, ?) AND users.tier_2 > 10 LIMIT ?"""
+    assert normalize_sql(statement) == ("SELECT users.id FROM users WHERE users.email = ? AND users.id IN (?, ...) "
+                                        "AND users.tier_2 > ? LIMIT ?")
+
+def test_endpoints_stay_within_their_budgets(make_app, auth):
+    app = make_app(testing=True, conversations=20)
+    before = {values: snapshot["count"] for values, snapshot in query_log.QUERY_SECONDS.collect().items()}
+    client = app.test_client()
+    history = client.get('/api/practice', headers=auth(app))
+    assert history.status_code == 200
+    assert len(history.get_json()) == 20
+    assert history.get_json()[3]["feedback"] == "Feedback 3"
+    progress = client.get('/api/progress', headers=auth(app))
+    assert progress.status_code == 200 and "improvement_areas" in progress.get_json()
+
+    after = query_log.QUERY_SECONDS.collect()
+    assert after[('ConversationPractice', 'get')]["count"] - before.get(('ConversationPractice', 'get'), 0) == 2
+    assert after[('ProgressTracking', 'get')]["count"] - before.get(('ProgressTracking', 'get'), 0) == 2
+    stats = app.extensions['query_log'].stats()
+    assert (stats["requests"], stats["queries"], stats["over_budget"]) == (2, 4, 0)
+    assert stats["query_seconds"] > 0
+
+def test_over_budget_fails_while_testing(make_app, caplog):
+    with pytest.raises(QueryBudgetExceeded, match=r"n_plus_one ran 3 queries, over its budget of 1: 3 x SELECT users\.id"):
+        make_app(testing=True).test_client().get('/test/n-plus-one')
+
+    app = make_app(testing=False)
+    with caplog.at_level(logging.WARNING, logger='query_log'):
+        assert app.test_client().get('/test/n-plus-one').status_code == 200
+    assert "over its budget of 1" in caplog.text
+    assert app.extensions['query_log'].stats()["over_budget"] == 1
+
+    app.testing = True  # Read when the budget is exceeded, not when the app was created
+    with pytest.raises(QueryBudgetExceeded):
+        app.test_client().get('/test/n-plus-one')
+
+def test_slow_queries_are_logged_with_their_caller(make_app, auth, caplog):
+    app = make_app(testing=True)
+    query_log.instrument_engines(0)  # Every statement is slow
+    try:
+        with caplog.at_level(logging.WARNING, logger='query_log'):
+            response = app.test_client().get('/api/practice', headers=auth(app))
+    finally:
+        query_log.instrument_engines(config.SLOW_QUERY_SECONDS)
+    assert response.status_code == 200
+
+    slow = [record.getMessage() for record in caplog.records if record.getMessage().startswith("Slow query")]
+    assert len(slow) == 2
+    assert " at resources.py:" in slow[0] and " in get: SELECT users.id" in slow[0]
+    assert "WHERE users.email = ?" in slow[0]
+    assert any(record.getMessage().startswith("ConversationPractice.get ran 2 queries") for record in caplog.records)
+    assert app.extensions['query_log'].stats()["slow_queries"] == 2
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the app and pytest's log capture
+    raise SystemExit(pytest.main([__file__, "-q"]))
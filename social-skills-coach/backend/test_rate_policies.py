@@ -0,0 +1,172 @@
+"""
+Tests for the rate limit policies (rate_policies.py).
+
+Checks how limits are looked up per endpoint and client class, that paid
+tiers get their own limits on the API, that a feedback batch counts each of
+its inputs, that a subscription change applies to the next request, that
+rejected requests never reach the database, that the LLM concurrency cap
+sheds one class while another keeps being served without using up a free
+user's scenarios, and that the policy file is reloaded when it changes.
+"""
+
+import json
+import os
+import pytest
+from types import SimpleNamespace
+from sqlalchemy import event
+import stripe_service
+from models import db, User
+from rate_policies import Policy, PolicyEngine, parse_policies
+from ratelimit import MemoryRateLimitStore, RateLimiter
+
+LIMITS = {
+    'conversation': {'anonymous': '2/60', 'premium': {'limit': 6, 'period': 60}, 'authenticated': '3/60'},
+    'login': {'*': '1/10'}
+}
+
+def statuses(client, count, path='/api/conversation', **kwargs):
+    return [client.post(path, json={"user_input": f"Hello number {i}"}, **kwargs).status_code for i in range(count)]
+
+def test_lookup_order():
+    engine = PolicyEngine(RateLimiter(MemoryRateLimitStore()), LIMITS)
+    assert engine.policy('conversation', 'anonymous') == Policy(2, 60)
+    assert engine.policy('conversation', 'premium') == Policy(6, 60)
+    assert engine.policy('conversation', 'basic') == Policy(3, 60)  # Any signed-in user
+    assert engine.policy('login', 'premium') == Policy(1, 10)
+    assert engine.policy('progress', 'anonymous') is None
+    assert engine.check('progress', '127.0.0.1', 'anonymous') is None
+
+    with pytest.raises(ValueError, match="Unknown client class 'gold'"):
+        parse_policies({'conversation': {'gold': '5/60'}})
+    with pytest.raises(ValueError, match="Invalid rate limit for 'login'"):
+        parse_policies({'login': {'*': '0/60'}})
+    with pytest.raises(ValueError, match="non-negative integer"):
+        parse_policies({}, {'free': -1})
+
+def test_tiers_get_their_own_limits(app, auth):
+    # Entries replace the configured ones per class: free users keep theirs unless it is given
+    app.extensions['rate_policies'].update({'conversation': {'anonymous': '2/60', 'free': '3/60', 'premium': '6/60'}})
+    client = app.test_client()
+    assert statuses(client, 3) == [200, 200, 429]
+    assert statuses(client, 4, headers=auth(app, "free@example.com")) == [200] * 3 + [429]
+    premium = [client.post('/api/conversation', json={"user_input": f"Hi {i}"}, headers=auth(app))
+               for i in range(7)]
+    assert [r.status_code for r in premium] == [200] * 6 + [429]
+    assert premium[0].headers["RateLimit-Policy"] == "6;w=60"
+
+def test_subscription_change_applies_to_the_next_request(app, auth):
+    app.extensions['rate_policies'].update({'conversation': {'free': '3/60', 'premium': '6/60'}})
+    client = app.test_client()
+    headers = auth(app, "free@example.com")
+    def ask():
+        return client.post('/api/conversation', json={"user_input": "How do I say hello?"}, headers=headers)
+    assert ask().headers["RateLimit-Policy"] == "3;w=60"  # The free tier is cached now
+
+    with app.app_context():
+        User.query.filter_by(email="free@example.com").one().stripe_customer_id = "cus_test"
+        db.session.commit()
+        price = SimpleNamespace(id=stripe_service.STRIPE_PRODUCTS['premium']['price_id'])
+        subscription = SimpleNamespace(customer="cus_test", id="sub_test", status="active",
+                                       items=SimpleNamespace(data=[SimpleNamespace(price=price)]))
+        assert stripe_service.handle_subscription_updated(SimpleNamespace(data=SimpleNamespace(object=subscription)))[0]
+    assert ask().headers["RateLimit-Policy"] == "6;w=60"
+
+def test_batch_feedback_counts_each_input(app, auth):
+    app.extensions['rate_policies'].update({'feedback': {'premium': '5/60'}})
+    client = app.test_client()
+    def batch(size):
+        inputs = [{"user_input": f"Hello number {i}"} for i in range(size)]
+        return client.post('/api/feedback/batch', json={"inputs": inputs}, headers=auth(app))
+    response = batch(3)
+    assert response.status_code == 200
+    assert response.headers["RateLimit-Remaining"] == "2"
+    assert batch(3).status_code == 429
+    assert batch(2).status_code == 200
+    assert client.post('/api/feedback', json={"user_input": "Hello"}, headers=auth(app)).status_code == 429
+
+def test_rejected_requests_do_not_reach_the_database(app, auth):
+    client = app.test_client()
+    credentials = {"email": "free@example.com", "password": "wrong"}
+    # The default login policy allows a burst of 5 per address
+    assert [client.post('/api/login', json=credentials).status_code for _ in range(5)] == [401] * 5
+
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    response = client.post('/api/login', json=credentials)
+    assert response.status_code == 429 and int(response.headers["Retry-After"]) >= 1
+    assert statements == []
+
+    # A user's tier is read once, then served from the cache
+    headers = auth(app, "free@example.com")
+    client.post('/api/feedback', json={"user_input": "I tried to start a conversation"}, headers=headers)
+    client.post('/api/feedback', json={"user_input": "I tried again"}, headers=headers)
+    assert len([s for s in statements if s.startswith("SELECT users.tier")]) == 1
+
+def test_llm_concurrency_sheds_one_class(app, auth):
+    policies = app.extensions['rate_policies']
+    policies.update(llm_concurrency={'anonymous': 1})
+    client = app.test_client()
+
+    with app.app_context():
+        held = policies.llm_slot('anonymous')  # A call in flight
+    response = client.post('/api/conversation', json={"user_input": "How do I say hello?"})
+    assert (response.status_code, response.headers["Retry-After"]) == (503, "1")
+    assert client.post('/api/conversation/stream', json={"user_input": "How do I say hello?"}).status_code == 503
+    # Paid users are not capped
+    paid = client.post('/api/conversation', json={"user_input": "How do I say hello?"}, headers=auth(app))
+    assert paid.status_code == 200
+
+    held.release()
+    held.release()  # Releasing twice frees one slot
+    assert client.post('/api/conversation', json={"user_input": "How do I say goodbye?"}).status_code == 200
+    stream = client.post('/api/conversation/stream', json={"user_input": "How do I say thanks?"})
+    assert stream.status_code == 200 and "event: done" in stream.get_data(as_text=True)
+    stats = policies.stats()
+    assert stats["llm_shed"] == 2 and stats["llm_in_flight"] == {}
+
+def test_shed_requests_do_not_use_scenarios(app, auth):
+    policies = app.extensions['rate_policies']
+    policies.update(llm_concurrency={'free': 1})
+    client = app.test_client()
+    headers = auth(app, "free@example.com")
+
+    with app.app_context():
+        held = policies.llm_slot('free')
+    for path in ('/api/conversation', '/api/conversation/stream'):
+        assert client.post(path, json={"user_input": "How do I say hello?"}, headers=headers).status_code == 503
+    with app.app_context():
+        assert User.query.filter_by(email="free@example.com").one().scenarios_accessed == 0
+
+    held.release()
+    response = client.post('/api/conversation', json={"user_input": "How do I say hello?"}, headers=headers)
+    assert response.status_code == 200 and response.get_json()["scenarios_used"] == 1
+    with app.app_context():
+        assert User.query.filter_by(email="free@example.com").one().scenarios_accessed == 1
+
+def test_policy_file_is_reloaded(tmp_path):
+    path = tmp_path / "policies.json"
+    path.write_text(json.dumps({"limits": {"conversation": {"anonymous": "5/60"}}}))
+    engine = PolicyEngine(RateLimiter(MemoryRateLimitStore()), LIMITS, path=str(path), reload_interval=0)
+    assert engine.policy('conversation', 'anonymous') == Policy(5, 60)
+    assert engine.policy('conversation', 'premium') == Policy(6, 60)  # Entries the file leaves alone
+
+    path.write_text(json.dumps({"limits": {"conversation": {"anonymous": {"limit": 1, "period": 1}}},
+                                "llm_concurrency": {"anonymous": 1}}))
+    os.utime(path, ns=(0, 10 ** 9))  # A new mtime even on coarse filesystem clocks
+    assert engine.policy('conversation', 'anonymous') == Policy(1, 1)
+    slot = engine.llm_slot('anonymous')
+    assert engine.llm_slot('anonymous') is None
+    slot.release()
+
+    path.write_text("{not json")
+    os.utime(path, ns=(0, 2 * 10 ** 9))
+    assert engine.policy('conversation', 'anonymous') == Policy(1, 1)  # The last good policies stay
+    assert engine.stats()["reload_errors"] == 1
+
+    path.unlink()
+    assert engine.policy('conversation', 'anonymous') == Policy(2, 60)  # Back to the configured policies
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the app and the policy file
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,116 @@
+"""
+Tests for the rate limiter (ratelimit.py).
+
+Checks the GCRA arithmetic against a controlled clock, that idle keys are
+swept from the memory store, that workers sharing the socket store (the
+bundled cache_server.py) enforce one limit between them, that an
+unreachable store lets requests through, and that the API sends the
+RateLimit-* and Retry-After headers.
+"""
+
+import os
+import tempfile
+import threading
+import pytest
+import config
+from cache_server import CacheServer
+from ratelimit import MemoryRateLimitStore, RateLimiter, SocketRateLimitStore
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def server():
+    path = os.path.join(tempfile.mkdtemp(), 'cache.sock')
+    server = CacheServer(path)
+    server.start()
+    yield server
+    server.stop()
+
+def memory_limiter(**kwargs):
+    limiter = RateLimiter(MemoryRateLimitStore(**kwargs))
+    clock = limiter.store._clock = Clock()
+    return limiter, clock
+
+def test_bucket_allows_the_burst_then_refills():
+    limiter, clock = memory_limiter()
+    results = [limiter.hit("user", 10, 60) for _ in range(11)]
+    assert [r.allowed for r in results] == [True] * 10 + [False]
+    assert [r.remaining for r in results[:3]] == [9, 8, 7]
+    assert results[-1].remaining == 0
+    assert results[-1].retry_after == pytest.approx(6.0)
+    assert results[-1].headers()["Retry-After"] == "6"
+
+    # One token comes back every 6 seconds
+    clock.now += 6
+    assert limiter.hit("user", 10, 60).allowed
+    assert not limiter.hit("user", 10, 60).allowed
+    clock.now += 60
+    result = limiter.hit("user", 10, 60)
+    assert result.remaining == 9 and result.reset_after == pytest.approx(6.0)
+    assert limiter.hit("other", 10, 60).remaining == 9  # Keys are independent
+
+def test_burst_and_cost():
+    limiter, clock = memory_limiter()
+    assert [limiter.hit("user", 60, 60, burst=3).allowed for _ in range(4)] == [True, True, True, False]
+    clock.now += 3
+    assert not limiter.hit("user", 60, 60, burst=3, cost=4).allowed  # More than the bucket holds
+    assert limiter.hit("user", 60, 60, burst=3, cost=3).allowed
+
+def test_idle_keys_are_swept():
+    limiter, clock = memory_limiter(shards=4, sweep_size=64)
+    for i in range(5000):
+        limiter.hit(f"user-{i}", 10, 1)
+        clock.now += 0.01  # Each key is idle (its bucket full again) after 0.1s
+    assert len(limiter.store) < 4 * 128
+    assert limiter.stats()["allowed"] == 5000
+
+def test_memory_store_under_threads():
+    limiter = RateLimiter(MemoryRateLimitStore(shards=4))
+    allowed = []
+
+    def client():
+        allowed.append(sum(limiter.hit("shared", 100, 3600).allowed for _ in range(200)))
+
+    threads = [threading.Thread(target=client) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(allowed) == 100
+
+def test_workers_share_one_limit(server):
+    workers = [RateLimiter(SocketRateLimitStore(f"unix://{server.path}")) for _ in range(3)]
+    results = [workers[i % 3].hit("user", 10, 60) for i in range(12)]
+    assert [r.allowed for r in results] == [True] * 10 + [False] * 2
+    assert results[-1].retry_after == pytest.approx(6.0, abs=0.5)
+    assert [r.remaining for r in results[:3]] == [9, 8, 7]
+    # The key expires in the store once its bucket is full again
+    assert server.store.size() == 1
+
+def test_unreachable_store_allows_requests():
+    limiter = RateLimiter(SocketRateLimitStore("unix:///nonexistent/rate.sock"))
+    assert all(limiter.hit("user", 1, 60).allowed for _ in range(3))
+    assert limiter.stats()["unavailable"] == 3
+
+def test_conversation_endpoint_sends_rate_limit_headers(server, make_app, monkeypatch):
+    monkeypatch.setattr(config, 'RATE_LIMIT_BACKEND', 'socket')
+    monkeypatch.setattr(config, 'RATE_LIMIT_URL', f"unix://{server.path}")
+    # Two apps stand in for two workers
+    clients = [make_app().test_client() for _ in range(2)]
+
+    responses = [clients[i % 2].post('/api/conversation', json={"user_input": "Hello there"}) for i in range(11)]
+    assert [r.status_code for r in responses] == [200] * 10 + [429]
+    assert responses[0].headers["RateLimit-Limit"] == str(config.CONVERSATION_RATE_LIMIT)
+    assert responses[0].headers["RateLimit-Policy"] == f"{config.CONVERSATION_RATE_LIMIT};w=60"
+    assert [r.headers["RateLimit-Remaining"] for r in responses[-2:]] == ["0", "0"]
+    assert int(responses[-1].headers["Retry-After"]) >= 1
+    assert responses[-1].get_json()["message"] == "Rate limit exceeded. Please try again later."
+
+if __name__ == "__main__":
+    # The tests use a pytest fixture for the cache server
+    raise SystemExit(pytest.main([__file__, "-q"]))
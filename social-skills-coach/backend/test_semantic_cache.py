@@ -0,0 +1,90 @@
+"""
+Tests for the semantic conversation cache.
+
+Checks that paraphrases hit and different questions miss at the default
+threshold, that categories and contexts are kept apart, that each category
+is capped with LRU eviction, and that /api/conversation answers a
+near-duplicate prompt from the cache with feedback for the new input.
+"""
+
+import pytest
+from cache import conversation_context
+from semantic_cache import SemanticCache, embed
+
+CONTEXT = conversation_context('gpt-3.5-turbo', "You are a coach.", {"max_tokens": 150, "temperature": 0.7})
+
+PARAPHRASES = [
+    ("how do I make small talk at parties?", "how can I make small talk at a party"),
+    ("How do I start a conversation with a stranger?", "how can i start conversations with strangers"),
+    ("What should I say in a job interview?", "what do I say at a job interview"),
+]
+
+DIFFERENT = [
+    ("how do I make small talk at parties?", "how do I avoid small talk at parties?"),
+    ("how do I make small talk at parties?", "how do I make small talk at work?"),
+    ("What should I say in a job interview?", "What should I say on a first date?"),
+    ("how do I apologize to my friend", "how do I apologize to my boss"),
+]
+
+def test_signatures_are_unit_vectors():
+    vector = embed("How do I start a conversation?")
+    assert abs(float(vector @ vector) - 1.0) < 1e-5
+    assert not embed("").any()
+
+def test_paraphrases_hit_and_different_questions_miss():
+    for cached, asked in PARAPHRASES:
+        cache = SemanticCache()
+        cache.put('small_talk', CONTEXT, cached, "answer")
+        assert cache.get('small_talk', CONTEXT, asked) == "answer", asked
+
+    for cached, asked in DIFFERENT:
+        cache = SemanticCache()
+        cache.put('small_talk', CONTEXT, cached, "answer")
+        assert cache.get('small_talk', CONTEXT, asked) is None, asked
+        assert cache.stats()['near_misses'] == 0
+
+def test_categories_and_contexts_are_separate():
+    cache = SemanticCache()
+    cache.put('small_talk', CONTEXT, "how do I make small talk at parties?", "small talk answer")
+    assert cache.get('networking', CONTEXT, "how do I make small talk at parties?") is None
+
+    # A new model or prompt clears the category's entries
+    other = conversation_context('gpt-4o-mini', "You are a coach.", {"max_tokens": 150, "temperature": 0.7})
+    assert cache.get('small_talk', other, "how do I make small talk at parties?") is None
+    assert cache.get('small_talk', CONTEXT, "how do I make small talk at parties?") is None
+    assert cache.stats()['invalidations'] == 1
+
+def test_capacity_per_category():
+    cache = SemanticCache(capacity=2)
+    cache.put('dating', CONTEXT, "how do I ask someone out", "ask")
+    cache.put('dating', CONTEXT, "what should I wear on a first date", "wear")
+    cache.get('dating', CONTEXT, "how do I ask someone out")  # Now most recently used
+    cache.put('dating', CONTEXT, "how do I end a date politely", "end")
+    cache.put('dating', CONTEXT, "how do I ask someone out", "ask again")  # Replaces, no eviction
+
+    assert cache.get('dating', CONTEXT, "what should I wear on a first date") is None
+    assert cache.get('dating', CONTEXT, "How can I ask someone out?") == "ask again"
+    stats = cache.stats()
+    assert (stats['evictions'], stats['entries'], stats['hits']) == (1, {'dating': 2}, 2)
+    assert stats['hit_similarity_min'] >= stats['threshold']
+    assert stats['hit_similarity_min'] <= stats['hit_similarity_mean'] <= 1.0 + 1e-6
+
+def test_conversation_endpoint_uses_semantic_cache(app):
+    app.extensions['semantic_cache'] = SemanticCache()
+    client = app.test_client()
+
+    first = client.post('/api/conversation', json={
+        "user_input": "how do I make small talk at parties?", "category": "small_talk"
+    }).get_json()
+    second = client.post('/api/conversation', json={
+        "user_input": "how can I make small talk at a party", "category": "small_talk"
+    }).get_json()
+
+    assert second["response"] == first["response"]
+    assert first["feedback"] == "Good job with your communication!"
+    assert second["feedback"] == "Consider asking questions to engage the other person."
+    assert app.extensions['semantic_cache'].stats()['hits'] == 1
+
+if __name__ == "__main__":
+    # The endpoint test uses the pytest fixture for the app
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,106 @@
+"""
+Tests for the sentiment analysis executor.
+
+Checks that the thread and process pools return the same values as inline
+TextBlob analysis and that saturated or slow pools fall back to the
+heuristic instead of blocking the request.
+"""
+
+import os
+import time
+import sentiment
+from sentiment import SentimentAnalyzer, analyze_text, heuristic_sentiment
+
+TEXTS = [
+    "I hate this",
+    "I love talking to you and this has been very helpful for me",
+    "The meeting is at three and the room is on the second floor.",
+    "I am sorry but I am very nervous and maybe I should not be here."
+]
+
+def test_pooled_modes_match_inline():
+    expected = [analyze_text(text) for text in TEXTS]
+    for mode in ['inline', 'thread', 'process']:
+        analyzer = SentimentAnalyzer(mode=mode, workers=2, timeout=60)
+        try:
+            analyzer.warm_up()
+            assert analyzer.analyze_many(TEXTS) == expected, mode
+            assert analyzer.analyze(TEXTS[0]) == expected[0], mode
+            assert analyzer.stats()["analyzed"] == len(TEXTS) + 1
+        finally:
+            analyzer.shutdown()
+
+def test_large_batch_is_not_saturated():
+    texts = [f"{text} ({i})" for i, text in enumerate(TEXTS * 13)]
+    analyzer = SentimentAnalyzer(mode='thread', workers=2, timeout=60)
+    try:
+        assert analyzer.analyze_many(texts) == [analyze_text(text) for text in texts]
+        assert analyzer.stats()["saturated"] == 0
+        assert analyzer.stats()["analyzed"] == len(texts)
+    finally:
+        analyzer.shutdown()
+
+def test_saturated_pool_uses_heuristic():
+    analyzer = SentimentAnalyzer(mode='thread', workers=1, timeout=5, max_pending=0)
+    try:
+        assert analyzer.analyze_many(TEXTS) == [heuristic_sentiment(text) for text in TEXTS]
+        assert analyzer.stats()["saturated"] == len(TEXTS)
+    finally:
+        analyzer.shutdown()
+
+def test_slow_analysis_times_out_to_heuristic():
+    original = sentiment.analyze_text
+    def slow_analyze(text, engine='textblob'):
+        time.sleep(0.5)
+        return original(text, engine)
+    sentiment.analyze_text = slow_analyze
+
+    analyzer = SentimentAnalyzer(mode='thread', workers=1, timeout=0.05)
+    try:
+        start = time.monotonic()
+        result = analyzer.analyze(TEXTS[1])
+        assert time.monotonic() - start < 0.4
+        assert result == heuristic_sentiment(TEXTS[1])
+        assert analyzer.stats()["timeouts"] == 1
+    finally:
+        analyzer.shutdown(wait=False)
+        sentiment.analyze_text = original
+
+def test_broken_pool_is_replaced():
+    analyzer = SentimentAnalyzer(mode='process', workers=1, timeout=60)
+    try:
+        analyzer.warm_up()
+        crashed = analyzer._get_executor().submit(os._exit, 1)
+        try:
+            crashed.result()
+        except Exception:
+            pass
+
+        # The broken pool is dropped, and the next call starts a new one
+        assert analyzer.analyze(TEXTS[1]) == heuristic_sentiment(TEXTS[1])
+        assert analyzer.stats()["errors"] == 1
+        assert analyzer.analyze(TEXTS[1]) == analyze_text(TEXTS[1])
+        assert analyzer.stats()["pending"] == 0
+    finally:
+        analyzer.shutdown()
+
+def test_heuristic_direction():
+    assert heuristic_sentiment("I love this, it is great")[0] > 0
+    assert heuristic_sentiment("I hate this, it is awful")[0] < 0
+    assert heuristic_sentiment("The room is on the second floor") == (0.0, 0.0)
+
+if __name__ == "__main__":
+    print("Testing sentiment analysis executor")
+    print("===================================")
+    test_pooled_modes_match_inline()
+    print("✓ Thread and process pools match inline analysis")
+    test_large_batch_is_not_saturated()
+    print("✓ A large batch is analyzed, not saturated")
+    test_saturated_pool_uses_heuristic()
+    print("✓ Saturated pool falls back to the heuristic")
+    test_slow_analysis_times_out_to_heuristic()
+    print("✓ Slow analysis times out to the heuristic")
+    test_broken_pool_is_replaced()
+    print("✓ A broken process pool is replaced")
+    test_heuristic_direction()
+    print("✓ Heuristic polarity has the right sign")
@@ -0,0 +1,173 @@
+"""
+Tests for multi-turn practice sessions (/api/practice/session).
+
+Checks that messages are answered with the session's earlier turns, that
+the history is compacted to the token budget with an incrementally extended
+summary, that token counts are reported and stored per request, that the
+session totals add up turns stored concurrently, and that sessions are
+private to their user and closed by /end.
+"""
+
+import pytest
+from types import SimpleNamespace
+from sqlalchemy.orm import Session
+import config
+import resources
+from fake_llm_server import DEFAULT_REPLY
+from models import db, User, Conversation, PracticeSession
+from session_context import SUMMARY_HEADING, TokenCounter, build_context, split_history, summarize_turns
+
+def start_session(client, headers, session_type='small_talk'):
+    response = client.post('/api/practice/session', json={"sessionType": session_type}, headers=headers)
+    assert response.status_code == 201
+    return response.get_json()["session_id"]
+
+def turn(user_input, ai_response, id=0):
+    return SimpleNamespace(id=id, user_input=user_input, ai_response=ai_response)
+
+def test_messages_carry_the_earlier_turns(llm, app, auth):
+    client = app.test_client()
+    headers = auth(app)
+    session_id = start_session(client, headers)
+
+    for message in ("I want to practice small talk at work.", "What should I say first?"):
+        response = client.post(f'/api/practice/session/{session_id}/message', json={"message": message}, headers=headers)
+        assert response.status_code == 200
+    body = response.get_json()
+
+    assert body["response"] == DEFAULT_REPLY
+    assert [m["role"] for m in llm.requests[-1]["messages"]] == ['system', 'user', 'assistant', 'user']
+    assert llm.requests[-1]["messages"][1]["content"] == "I want to practice small talk at work."
+    usage = body["usage"]
+    assert usage["turns_in_context"] == 1 and usage["turns_compacted"] == 0
+    assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
+
+    with app.app_context():
+        conversation = db.session.get(Conversation, body["message_id"])
+        assert conversation.session_id == session_id
+        assert (conversation.prompt_tokens, conversation.completion_tokens) == (usage["prompt_tokens"], usage["completion_tokens"])
+        practice_session = db.session.get(PracticeSession, session_id)
+        assert practice_session.turn_count == 2
+        assert practice_session.prompt_tokens > usage["prompt_tokens"]
+
+def test_history_is_compacted_to_the_budget(llm, app, monkeypatch, auth):
+    monkeypatch.setattr(config, 'SESSION_CONTEXT_TOKENS', 350)
+    monkeypatch.setattr(config, 'SESSION_SUMMARY_TOKENS', 120)
+    client = app.test_client()
+    headers = auth(app)
+    session_id = start_session(client, headers)
+
+    summaries = []
+    for i in range(8):
+        response = client.post(f'/api/practice/session/{session_id}/message',
+                               json={"message": f"Question number {i}: how do I keep the conversation going?"}, headers=headers)
+        usage = response.get_json()["usage"]
+        assert usage["prompt_tokens"] <= 350
+        with app.app_context():
+            summaries.append(db.session.get(PracticeSession, session_id).summary)
+
+    # Older turns were folded into the summary, which the model receives
+    assert summaries[-1].startswith("- User: Question number")
+    assert 0 < usage["summary_tokens"] <= 120
+    messages = llm.requests[-1]["messages"]
+    assert messages[1]["role"] == 'system' and messages[1]["content"].startswith(SUMMARY_HEADING)
+    assert messages[-1]["content"].startswith("Question number 7")
+    assert 0 < usage["turns_in_context"] < 7
+    # Each compaction extends the previous summary rather than rebuilding it
+    grown = [(before, after) for before, after in zip(summaries, summaries[1:]) if before and after != before]
+    assert grown and all(after.splitlines()[0] in before.splitlines() for before, after in grown)
+
+def test_llm_summarizer_asks_the_model(llm, app, monkeypatch, auth):
+    monkeypatch.setattr(config, 'SESSION_SUMMARIZER', 'llm')
+    monkeypatch.setattr(config, 'SESSION_CONTEXT_TOKENS', 250)
+    client = app.test_client()
+    headers = auth(app)
+    session_id = start_session(client, headers)
+    for i in range(4):
+        client.post(f'/api/practice/session/{session_id}/message', json={"message": f"Question {i}?"}, headers=headers)
+
+    summary_requests = [r for r in llm.requests if r["messages"][0]["content"] == resources.SUMMARY_PROMPT]
+    assert summary_requests and summary_requests[0]["max_tokens"] == config.SESSION_SUMMARY_TOKENS
+    with app.app_context():
+        assert db.session.get(PracticeSession, session_id).summary == DEFAULT_REPLY
+
+def test_summary_drops_its_oldest_lines_beyond_budget():
+    turns = [turn(f"Turn {i} from the user. More detail.", f"Advice {i}. Extra.", i) for i in range(20)]
+    summary = summarize_turns(None, turns[:10], max_tokens=1000)
+    assert summary.count("\n") == 9
+    assert "More detail" not in summary and "Extra" not in summary
+
+    rolled = summarize_turns(summary, turns[10:], max_tokens=80)
+    assert rolled.splitlines()[-1].startswith("- User: Turn 19")
+    assert "Turn 0 " not in rolled
+    assert TokenCounter().count(rolled) <= 80
+
+def test_split_keeps_the_latest_turns_within_budget():
+    counter = TokenCounter()
+    turns = [turn("word " * 20, "reply " * 20, i) for i in range(5)]
+    per_turn = counter.count_turn(turns[0])
+    older, recent, used = split_history(turns, per_turn * 2 + 1, counter)
+    assert [t.id for t in older] == [0, 1, 2] and [t.id for t in recent] == [3, 4]
+    assert used == per_turn * 2
+
+def test_build_context_uses_the_summarizer_only_for_new_turns():
+    calls = []
+
+    def summarizer(summary, turns, max_tokens):
+        calls.append([t.id for t in turns])
+        return (summary or "") + "".join(f"[{t.id}]" for t in turns)
+
+    practice_session = SimpleNamespace(summary=None, summarized_through_id=None)
+    turns = [turn("word " * 40, "reply " * 40, i) for i in range(1, 6)]
+    messages, usage = build_context(practice_session, turns, "You are a coach.", "Next?", 300, 50, summarizer)
+    assert calls == [[1, 2, 3]] and practice_session.summarized_through_id == 3
+    assert usage["turns_in_context"] == 2
+    assert messages[1]["content"] == f"{SUMMARY_HEADING}\n[1][2][3]"
+
+def test_token_counts_are_local_and_plausible():
+    counter = TokenCounter()
+    assert counter.count("") == 0
+    assert 8 <= counter.count("How do I start a conversation with a stranger at a party?") <= 16
+    assert counter.count_messages([{"role": "user", "content": "hi"}]) == 3 + 4 + counter.count("hi")
+
+def test_sessions_are_private_and_end(app, auth):
+    client = app.test_client()
+    headers = auth(app)
+    session_id = start_session(client, headers)
+    client.post(f'/api/practice/session/{session_id}/message', json={"message": "hello"}, headers=headers)
+
+    other = client.post(f'/api/practice/session/{session_id}/message', json={"message": "hello"}, headers=auth(app, "other@example.com"))
+    assert other.status_code == 404
+    assert client.post(f'/api/practice/session/{session_id}/message', json={}, headers=headers).status_code == 400
+
+    ended = client.post(f'/api/practice/session/{session_id}/end', headers=headers).get_json()
+    assert ended["turns"] == 1 and ended["prompt_tokens"] > 0
+    late = client.post(f'/api/practice/session/{session_id}/message', json={"message": "hello"}, headers=headers)
+    assert late.status_code == 409
+
+def test_concurrent_turns_add_up(app, auth):
+    session_id = start_session(app.test_client(), auth(app))
+    usage = {"prompt_tokens": 10, "completion_tokens": 5}
+    with app.app_context():
+        # Two requests load the session before either stores its turn
+        sessions = [Session(db.engine), Session(db.engine)]
+        loaded = [session.get(PracticeSession, session_id) for session in sessions]
+        for session, practice_session in zip(sessions, loaded):
+            user = SimpleNamespace(id=practice_session.user_id, email="learner@example.com")
+            assert resources.save_conversation(user, "hello", "Hi there!", "Nice opener.", 'small_talk', session=session,
+                                               practice_session=practice_session, usage=usage) is not None
+            session.close()
+
+        practice_session = db.session.get(PracticeSession, session_id)
+        assert (practice_session.turn_count, practice_session.prompt_tokens, practice_session.completion_tokens) == (2, 20, 10)
+
+def test_session_category_follows_the_tier(app, auth):
+    with app.app_context():
+        User.query.filter_by(email="other@example.com").one().tier = 'free'
+        db.session.commit()
+    response = app.test_client().post('/api/practice/session', json={"sessionType": "dating"}, headers=auth(app, "other@example.com"))
+    assert response.status_code == 403
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the app and the fake server
+    raise SystemExit(pytest.main([__file__, "-q"]))
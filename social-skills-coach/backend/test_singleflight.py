@@ -0,0 +1,181 @@
+"""
+Tests for request coalescing (singleflight.py).
+
+Checks that concurrent callers with one key share a single call, that the
+leader's exception reaches every waiter, that waiters give up after the
+timeout, that two workers sharing a cache_server.CacheServer make one call
+between them and both answer 503 when the leader's worker is at its LLM
+concurrency cap, and that concurrent identical /api/conversation requests
+make one upstream call that takes one LLM concurrency slot.
+"""
+
+import threading
+import time
+from unittest import mock
+import pytest
+from cache import SocketCache
+from cache_server import CacheServer
+from singleflight import SharedFlightError, SingleFlight, SingleFlightTimeout
+
+def run_concurrently(count, target):
+    """Call target(index) from count threads; return the results and exceptions in a list."""
+    results = [None] * count
+    start = threading.Barrier(count)
+
+    def worker(index):
+        start.wait()
+        try:
+            results[index] = target(index)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def slow_call(calls, result="answer", delay=0.2, error=None):
+    def call():
+        calls.append(1)
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+    return call
+
+@pytest.fixture
+def server(tmp_path):
+    server = CacheServer(str(tmp_path / 'cache.sock'))
+    server.start()
+    yield server
+    server.stop()
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    results = run_concurrently(8, lambda index: flight.do('key', slow_call(calls), timeout=5))
+
+    assert results == ["answer"] * 8
+    assert len(calls) == 1
+    stats = flight.stats()
+    assert (stats['calls'], stats['coalesced'], stats['in_flight']) == (1, 7, 0)
+
+    # The flight is over: the next call runs again
+    assert flight.do('key', lambda: "fresh", timeout=5) == "fresh"
+
+def test_error_reaches_every_waiter():
+    flight = SingleFlight()
+    calls = []
+    failure = RuntimeError("upstream failed")
+    results = run_concurrently(4, lambda index: flight.do('key', slow_call(calls, error=failure), timeout=5))
+
+    assert results == [failure] * 4
+    assert len(calls) == 1
+    assert flight.stats()['errors'] == 1
+
+def test_waiters_time_out():
+    flight = SingleFlight()
+    calls = []
+    leader = threading.Thread(target=flight.do, args=('key', slow_call(calls, delay=0.5), 5))
+    leader.start()
+    time.sleep(0.05)
+
+    with pytest.raises(SingleFlightTimeout):
+        flight.do('key', slow_call(calls), timeout=0.1)
+    leader.join()
+    assert len(calls) == 1
+    assert flight.stats()['timeouts'] == 1
+
+def test_workers_share_one_call_through_the_store(server):
+    url = f"unix://{server.path}"
+    workers = [SingleFlight(shared=SocketCache(url, prefix='flight:'), poll_interval=0.01) for _ in range(2)]
+    calls = []
+    results = run_concurrently(2, lambda index: workers[index].do('key', slow_call(calls, result=["text", "feedback"]), timeout=5))
+
+    assert results == [["text", "feedback"]] * 2
+    assert len(calls) == 1
+    assert sum(worker.stats()['shared_coalesced'] for worker in workers) == 1
+    assert server.store.size() == 1  # Only the published result is left; the lock was released
+
+def test_worker_error_reaches_other_workers(server):
+    url = f"unix://{server.path}"
+    leader = SingleFlight(shared=SocketCache(url, prefix='flight:'))
+    follower = SingleFlight(shared=SocketCache(url, prefix='flight:'), poll_interval=0.01)
+    calls = []
+    thread = threading.Thread(target=lambda: pytest.raises(RuntimeError, leader.do, 'key',
+                                                           slow_call(calls, error=RuntimeError("upstream failed")), 5))
+    thread.start()
+    time.sleep(0.05)
+
+    with pytest.raises(SharedFlightError, match="upstream failed"):
+        follower.do('key', slow_call(calls), timeout=5)
+    thread.join()
+    assert len(calls) == 1
+
+def test_capacity_error_reaches_other_workers_as_itself(server, make_app):
+    import resources
+
+    url = f"unix://{server.path}"
+    workers = [make_app(), make_app()]
+    for app in workers:
+        app.extensions['single_flight'] = SingleFlight(shared=SocketCache(url, prefix='flight:'), poll_interval=0.01,
+                                                       shared_errors=(resources.LLMCapacityExceeded,))
+    # The leader's worker is at its cap; its check is slowed so the follower joins the flight
+    policies = workers[0].extensions['rate_policies']
+    policies.update(llm_concurrency={'anonymous': 1})
+    held = policies.llm_slot('anonymous')
+    take_slot = policies.llm_slot
+    def slow_llm_slot(client_class):
+        time.sleep(0.2)
+        return take_slot(client_class)
+
+    def request(index):
+        time.sleep(0.05 * index)
+        with workers[index].test_client() as client:
+            return client.post('/api/conversation', json={"user_input": "how do I join a conversation?"})
+
+    with mock.patch.object(policies, 'llm_slot', slow_llm_slot), \
+            mock.patch.object(resources, 'generate_conversation_response') as generate:
+        responses = run_concurrently(2, request)
+    held.release()
+
+    assert [response.status_code for response in responses] == [503, 503]
+    assert workers[1].extensions['single_flight'].stats()['shared_coalesced'] == 1
+    generate.assert_not_called()
+
+def test_unreachable_store_falls_back_to_local_coalescing(tmp_path):
+    flight = SingleFlight(shared=SocketCache(f"unix://{tmp_path / 'missing.sock'}", timeout=0.1))
+    assert flight.do('key', lambda: "answer", timeout=5) == "answer"
+    assert flight.stats()['calls'] == 1
+
+def test_conversation_endpoint_coalesces_identical_requests(app):
+    import resources
+
+    # Waiters do not hold LLM slots, so a cap of one still serves them all
+    app.extensions['rate_policies'].update(llm_concurrency={'anonymous': 1})
+    calls = []
+
+    def generate(user_input, model, system_prompt):
+        calls.append(user_input)
+        time.sleep(0.2)
+        return "Ask them about their weekend."
+
+    def request(index):
+        with app.test_client() as client:
+            return client.post('/api/conversation', json={
+                "user_input": "how do I make small talk at parties?", "category": "small_talk"
+            }).get_json()
+
+    with mock.patch.object(resources, 'generate_conversation_response', generate):
+        responses = run_concurrently(5, request)
+
+    assert [response["response"] for response in responses] == ["Ask them about their weekend."] * 5
+    assert len(calls) == 1
+    assert app.extensions['single_flight'].stats()['coalesced'] == 4
+    assert app.extensions['rate_policies'].stats()['llm_shed'] == 0
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the cache server and the app
+    raise SystemExit(pytest.main([__file__, "-q"]))
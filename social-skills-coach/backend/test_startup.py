@@ -0,0 +1,49 @@
+"""
+Tests for deferred loading of heavy dependencies.
+
+Checks in a fresh interpreter that importing the app does not load the
+OpenAI or Stripe SDKs or the sentiment engine, and that warm_up loads them.
+"""
+
+import os
+import subprocess
+import sys
+
+DEFERRED_MODULES = ['openai', 'stripe', 'textblob', 'numpy']
+
+def loaded_modules(code):
+    """Run code in a fresh interpreter and return which deferred modules it loaded."""
+    script = f"import sys\n{code}\nprint(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, '-c', script],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    return [name for name in result.stdout.strip().split(',') if name]
+
+def test_import_defers_heavy_modules():
+    assert loaded_modules("import app") == []
+
+def test_scripts_import_only_the_models():
+    assert loaded_modules("from app import app, db, User") == []
+
+def test_warm_up_loads_everything():
+    for engine, engine_module in [('textblob', 'textblob'), ('lexicon', 'numpy')]:
+        code = f"import os\nos.environ['SENTIMENT_ENGINE'] = '{engine}'\nimport app\napp.warm_up()"
+        loaded = loaded_modules(code)
+        assert {'openai', 'stripe', engine_module} <= set(loaded), (engine, loaded)
+
+def test_openai_client_is_shared():
+    import app
+    assert app.get_openai_client() is app.get_openai_client()
+
+if __name__ == "__main__":
+    print("Testing deferred imports")
+    print("========================")
+    test_import_defers_heavy_modules()
+    print("✓ Importing the app defers the heavy SDKs")
+    test_scripts_import_only_the_models()
+    print("✓ Scripts that use the models stay light")
+    test_warm_up_loads_everything()
+    print("✓ warm_up loads every deferred dependency")
+    test_openai_client_is_shared()
+    print("✓ The OpenAI client is created once")
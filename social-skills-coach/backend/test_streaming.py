@@ -0,0 +1,116 @@
+"""
+Tests for /api/conversation/stream (Server-Sent Events).
+
+Runs the API against fake_llm_server.FakeLLMServer and checks that words
+are relayed as separate events before the completion finishes, that the
+assembled text is cached and stored with its feedback, that cache hits are
+streamed without an upstream call, that the llm_call stage leaves out the
+time the client takes to read, and that upstream failures end the stream
+with the fallback response.
+"""
+
+import json
+import time
+import pytest
+import metrics
+import resources
+from fake_llm_server import DEFAULT_REPLY
+from models import Conversation
+
+QUESTION = {"user_input": "How do I start talking to people at a party?", "category": "small_talk"}
+
+def parse_events(body):
+    """Return [(event, data)] from a Server-Sent Events body."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+@pytest.fixture
+def llm(llm):
+    llm.token_delay = 0.01
+    return llm
+
+def test_stream_relays_words_and_assembles_the_reply(llm, app):
+    response = app.test_client().post('/api/conversation/stream', json=QUESTION)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = parse_events(response.get_data(as_text=True))
+    tokens = [data["text"] for event, data in events if event == 'token']
+    assert len(tokens) == len(DEFAULT_REPLY.split())
+    assert "".join(tokens) == DEFAULT_REPLY
+
+    event, done = events[-1]
+    assert event == 'done'
+    assert done["response"] == DEFAULT_REPLY
+    assert done["feedback"] == "Good job with your communication!"
+    assert llm.requests[0]["stream"] is True
+
+def test_first_event_arrives_before_the_reply_is_complete(llm, app):
+    llm.first_token_delay, llm.token_delay = 0.05, 0.03  # About 0.8s for the whole reply
+    start = time.perf_counter()
+    response = app.test_client().post('/api/conversation/stream', json=QUESTION, buffered=False)
+    first = next(response.iter_encoded())
+    time_to_first_event = time.perf_counter() - start
+    body = first + b"".join(response.iter_encoded())
+    total = time.perf_counter() - start
+
+    assert first.startswith(b"event: token")
+    assert time_to_first_event < total / 2
+    assert parse_events(body.decode())[-1][1]["response"] == DEFAULT_REPLY
+
+def test_llm_call_stage_excludes_the_client_reading(llm, app):
+    llm.token_delay = 0
+    before = metrics.STAGE_SECONDS.labels('llm_call').snapshot()
+    start = time.perf_counter()
+    response = app.test_client().post('/api/conversation/stream', json=QUESTION, buffered=False)
+    for _ in response.iter_encoded():
+        time.sleep(0.02)  # A slow client: about 0.6s to read the reply
+    total = time.perf_counter() - start
+
+    after = metrics.STAGE_SECONDS.labels('llm_call').snapshot()
+    assert after["count"] - before["count"] == 1
+    assert (after["sum"] - before["sum"]) / 1e9 < total / 3
+
+def test_cache_hit_is_streamed_without_upstream_call(llm, app):
+    client = app.test_client()
+    client.post('/api/conversation/stream', json=QUESTION).get_data()
+    events = parse_events(client.post('/api/conversation/stream', json=QUESTION).get_data(as_text=True))
+
+    assert [event for event, _ in events] == ['token', 'done']
+    assert events[0][1]["text"] == DEFAULT_REPLY
+    assert len(llm.requests) == 1
+
+    # The non-streaming endpoint shares the cache
+    assert client.post('/api/conversation', json=QUESTION).get_json()["response"] == DEFAULT_REPLY
+    assert len(llm.requests) == 1
+
+def test_streamed_conversation_is_stored(llm, app, auth):
+    events = parse_events(app.test_client().post('/api/conversation/stream', json=QUESTION,
+                                                 headers=auth(app, "free@example.com")).get_data(as_text=True))
+    assert events[-1][1]["scenarios_used"] == 1
+
+    with app.app_context():
+        conversation = Conversation.query.one()
+        assert conversation.ai_response == DEFAULT_REPLY
+        assert conversation.feedbacks[0].feedback_text == "Good job with your communication!"
+
+def test_upstream_failure_ends_with_fallback(llm, app):
+    llm.fail = True
+    events = parse_events(app.test_client().post('/api/conversation/stream', json=QUESTION).get_data(as_text=True))
+
+    assert [event for event, _ in events] == ['error', 'done']
+    assert events[-1][1]["response"] == resources.FALLBACK_RESPONSE
+    assert app.extensions['conversation_cache'].stats()['misses'] == 1
+
+def test_mock_responses_are_streamed_word_by_word(app):
+    events = parse_events(app.test_client().post('/api/conversation/stream', json={"user_input": "hello"}).get_data(as_text=True))
+
+    assert len(events) > 2
+    assert events[-1][1]["response"] == resources.MOCK_RESPONSES["greeting"]
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the fake server and the app
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,170 @@
+"""
+Tests for request tracing (tracing.py).
+
+Checks that a sampled request exports its span tree (cache, LLM, gateway
+and database spans under the request), that a streamed reply has one span
+counting its chunks, that an incoming traceparent is continued, that log
+lines carry the request's trace ID, that unsampled requests export nothing
+but still get an ID, that the OTLP exporter posts to a collector, and that
+a full export queue drops spans rather than block.
+"""
+
+import json
+import logging
+import pytest
+import config
+import tracing
+from fake_llm_server import DEFAULT_REPLY
+from fake_otlp_collector import FakeOTLPCollector
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+@pytest.fixture
+def traced(make_app, tmp_path, monkeypatch):
+    """Return (app, path of the exported spans) with every request sampled."""
+    monkeypatch.setattr(config, 'TRACE_EXPORTER', 'file')
+    monkeypatch.setattr(config, 'TRACE_FILE', str(tmp_path / "spans.jsonl"))
+    monkeypatch.setattr(config, 'TRACE_SAMPLE_RATE', 1.0)
+    app = make_app()
+    app.extensions['tracer'].flush()  # Nothing was traced outside a request
+    return app, tmp_path / "spans.jsonl"
+
+def exported(app, path):
+    """Flush app's tracer and return the exported spans."""
+    app.extensions['tracer'].flush()
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_sampled_request_exports_its_span_tree(traced, llm, auth):
+    app, path = traced
+    response = app.test_client().post('/api/conversation', json={"user_input": "How do I open a conversation?"},
+                                      headers=auth(app))
+    assert response.status_code == 200
+
+    spans = exported(app, path)
+    assert {span["traceId"] for span in spans} == {response.headers["X-Trace-Id"]}
+    root = next(span for span in spans if "parentSpanId" not in span)
+    assert root["name"] == "POST /api/conversation" and root["kind"] == 2
+    attributes = {a["key"]: a["value"] for a in root["attributes"]}
+    assert attributes["http.status_code"] == {"intValue": "200"}
+
+    children = {}
+    for span in spans:
+        children.setdefault(span.get("parentSpanId"), []).append(span)
+    under_root = {span["name"] for span in children[root["spanId"]]}
+    assert {"cache.get", "cache.put", "llm.complete", "db.query"} <= under_root
+    llm_span = next(span for span in children[root["spanId"]] if span["name"] == "llm.complete")
+    (gateway,) = children[llm_span["spanId"]]
+    assert gateway["name"] == "openai.chat"
+    assert {"key": "attempts", "value": {"intValue": "1"}} in gateway["attributes"]
+    statements = [a["value"]["stringValue"] for span in spans if span["name"] == "db.query"
+                  for a in span["attributes"] if a["key"] == "db.statement"]
+    assert any(statement.startswith("INSERT INTO conversations") for statement in statements)
+    for span in spans:
+        assert int(span["startTimeUnixNano"]) <= int(span["endTimeUnixNano"])
+
+def test_streamed_reply_has_one_span_with_its_chunks(traced, llm, auth):
+    app, path = traced
+    body = app.test_client().post('/api/conversation/stream', json={"user_input": "How do I join a conversation?"},
+                                  headers=auth(app)).get_data(as_text=True)
+    assert "event: done" in body
+
+    spans = exported(app, path)
+    (stream,) = [span for span in spans if span["name"] == "llm.stream"]
+    attributes = {a["key"]: a["value"] for a in stream["attributes"]}
+    assert attributes["chunks"] == {"intValue": str(len(DEFAULT_REPLY.split()))}
+    assert [span["name"] for span in spans if span.get("parentSpanId") == stream["spanId"]] == ["openai.chat"]
+
+def test_incoming_traceparent_is_continued(traced):
+    app, path = traced
+    client = app.test_client()
+    response = client.post('/api/conversation', json={"user_input": "How do I say hello?"},
+                           headers={"traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-01"})
+    assert response.headers["X-Trace-Id"] == TRACE_ID
+    root = next(span for span in exported(app, path) if span["name"] == "POST /api/conversation")
+    assert (root["traceId"], root["parentSpanId"]) == (TRACE_ID, "00f067aa0ba902b7")
+
+    # The caller decided not to sample: the ID is kept, nothing is recorded
+    unsampled = "0af7651916cd43dd8448eb211c80319c"
+    response = client.post('/api/conversation', json={"user_input": "How do I say goodbye?"},
+                           headers={"traceparent": f"00-{unsampled}-b7ad6b7169203331-00"})
+    assert response.headers["X-Trace-Id"] == unsampled
+    assert unsampled not in {span["traceId"] for span in exported(app, path)}
+
+    assert tracing.parse_traceparent("00-not-a-trace-01") is None
+    assert tracing.parse_traceparent(f"00-{'0' * 32}-00f067aa0ba902b7-01") is None
+
+def test_log_lines_carry_the_trace_id(traced, caplog, auth):
+    app, _ = traced
+    with caplog.at_level(logging.INFO):
+        response = app.test_client().post('/api/conversation', json={"user_input": "How do I keep talking?"},
+                                          headers=auth(app))
+    trace_id = response.headers["X-Trace-Id"]
+    request_records = [record for record in caplog.records if record.name == 'resources']
+    assert request_records and all(record.trace_id == trace_id for record in request_records)
+    assert "[-]" in logging.Formatter("[%(trace_id)s]").format(logging.getLogger(__name__).makeRecord(
+        __name__, logging.INFO, __file__, 0, "outside a request", (), None))
+
+def test_unsampled_requests_export_nothing(traced, make_app, monkeypatch):
+    monkeypatch.setattr(config, 'TRACE_SAMPLE_RATE', 0.0)
+    app = make_app()
+    response = app.test_client().post('/api/conversation', json={"user_input": "How do I say hello?"})
+    assert len(response.headers["X-Trace-Id"]) == 32
+    assert exported(app, traced[1]) == []
+    stats = app.extensions['tracer'].stats()
+    assert (stats["traces"], stats["sampled"], stats["spans"]) == (1, 0, 0)
+    assert tracing.span("outside") is tracing.NOOP_SPAN
+
+def test_otlp_exporter_posts_to_the_collector():
+    collector = FakeOTLPCollector()
+    collector.start()
+    try:
+        tracer = tracing.create_tracer('otlp', url=collector.url, service_name='coach-test', sample_rate=1.0)
+        root = tracer.start_trace("nightly job")
+        with tracing.span("step", items=3):
+            pass
+        with pytest.raises(RuntimeError):
+            with tracing.span("failing step"):
+                raise RuntimeError("out of items")
+        root.end()
+        tracer.close()
+    finally:
+        collector.stop()
+
+    assert collector.requests == 1
+    spans = {span["name"]: span for span in collector.spans}
+    assert set(spans) == {"nightly job", "step", "failing step"}
+    assert {span["service"] for span in collector.spans} == {"coach-test"}
+    assert spans["step"]["parentSpanId"] == spans["nightly job"]["spanId"]
+    assert spans["failing step"]["status"] == {"code": 2, "message": "RuntimeError: out of items"}
+    assert tracer.stats()["exported"] == 3
+    assert tracing.current_span() is None
+
+def test_full_queue_drops_spans():
+    class Exporter:
+        name = 'list'
+
+        def __init__(self):
+            self.spans = []
+
+        def export(self, spans):
+            self.spans.extend(spans)
+
+        def close(self):
+            pass
+
+    exporter = Exporter()
+    tracer = tracing.Tracer(exporter, sample_rate=1.0, max_queue=3, batch_size=100, export_interval=60)
+    with tracer.start_trace("burst"):
+        for i in range(5):
+            with tracing.span(f"span {i}"):
+                pass
+    stats = tracer.stats()
+    assert (stats["spans"], stats["queued"], stats["dropped"]) == (6, 3, 3)
+    tracer.close()
+    assert [span.name for span in exporter.spans] == ["span 0", "span 1", "span 2"]
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the app, the fake LLM server and the span file
+    raise SystemExit(pytest.main([__file__, "-q"]))
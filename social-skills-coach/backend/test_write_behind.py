@@ -0,0 +1,143 @@
+"""
+Tests for the write-behind queue (write_behind.py).
+
+Checks that conversations are answered before they are stored and then
+stored in batches with their feedback and progress rollup, that records left
+in the journal by a crashed worker are stored when the next one starts (once,
+even if they were stored before the crash), that a full journal makes
+requests wait and then store synchronously, and that the queue is off by
+default.
+"""
+
+import os
+import threading
+import time
+import pytest
+import config
+import resources
+from factory import warm_up
+from models import Conversation, Feedback, UserProgressRollup
+from write_behind import WriteBehindFull, WriteBehindQueue
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    path = str(tmp_path / "journal.db")
+    monkeypatch.setattr(config, 'WRITE_BEHIND_ENABLED', True)
+    monkeypatch.setattr(config, 'WRITE_BEHIND_PATH', path)
+    monkeypatch.setattr(config, 'WRITE_BEHIND_FLUSH_INTERVAL', 0.05)
+    return path
+
+@pytest.fixture
+def make_app(make_app, tmp_path):
+    # A database file: the flusher writes from its own thread, and an in-memory
+    # database is a single connection shared by every thread
+    def make_file_app():
+        return make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'app.db'}")
+    return make_file_app
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+def stored(app):
+    with app.app_context():
+        return Conversation.query.count()
+
+def record(write_id, user_id=1):
+    return {'write_id': write_id, 'user_id': user_id, 'user_input': f"Question {write_id}",
+            'ai_response': "Answer", 'feedback': "Good question!", 'category': 'small_talk',
+            'timestamp': '2025-04-14T09:30:00'}
+
+def test_conversations_are_stored_in_batches(journal, make_app, auth):
+    app = make_app()
+    queue = app.extensions['write_behind']
+    client = app.test_client()
+    headers = auth(app)
+
+    for i in range(8):
+        response = client.post('/api/conversation', json={"user_input": f"How do I start a conversation {i}?"}, headers=headers)
+        assert response.status_code == 200
+    wait_for(lambda: stored(app) == 8)
+    queue.close()
+
+    stats = queue.stats()
+    assert stats["enqueued"] == stats["flushed"] == 8 and stats["pending"] == 0
+    assert stats["batches"] < 8
+    with app.app_context():
+        assert Feedback.query.count() == 8
+        assert all(len(c.feedbacks) == 1 and c.write_id for c in Conversation.query)
+        rollup = UserProgressRollup.query.one()
+        assert rollup.conversation_count == 8
+
+def test_journal_is_replayed_on_start(journal, make_app):
+    # A worker queued two records and died before flushing them
+    crashed = WriteBehindQueue(journal, flush=lambda records: None)
+    crashed._pid = os.getpid()
+    crashed._thread = object()  # Keep put() from starting a flusher
+    crashed.put(record("a"))
+    crashed.put(record("b"))
+
+    app = make_app()
+    assert stored(app) == 0
+    warm_up(app)
+    wait_for(lambda: stored(app) == 2)
+    app.extensions['write_behind'].close()
+    with app.app_context():
+        assert {c.timestamp.isoformat() for c in Conversation.query} == {'2025-04-14T09:30:00'}
+
+def test_replayed_records_are_stored_once(journal, make_app):
+    app = make_app()
+    queue = app.extensions['write_behind']
+    with app.app_context():
+        resources.store_queued_conversations([record("a")])
+        # The batch is replayed after a crash between the commit and the journal update
+        resources.store_queued_conversations([record("a"), record("b"), record("b")])
+        assert Conversation.query.count() == 2
+        assert UserProgressRollup.query.one().conversation_count == 2
+    queue.close()
+
+def test_failed_flush_keeps_the_batch(tmp_path):
+    attempts = []
+
+    def flush(records):
+        attempts.append(len(records))
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+
+    queue = WriteBehindQueue(str(tmp_path / "journal.db"), flush, flush_interval=0.01)
+    queue.put(record("a"))
+    wait_for(lambda: queue.stats()["flushed"] == 1)
+    queue.close()
+    assert attempts == [1, 1]
+    assert queue.stats()["flush_errors"] == 1 and queue.pending() == 0
+
+def test_full_journal_falls_back_to_synchronous_writes(journal, monkeypatch, make_app, auth):
+    monkeypatch.setattr(config, 'WRITE_BEHIND_MAX_PENDING', 1)
+    monkeypatch.setattr(config, 'WRITE_BEHIND_PUT_TIMEOUT', 0.05)
+    app = make_app()
+    queue = app.extensions['write_behind']
+    stuck = threading.Event()
+    queue.flush = lambda records: stuck.wait(10)  # The flusher is stuck
+    queue.put(record("a"))
+    time.sleep(0.1)  # Claimed, so it still counts against max_pending
+
+    with pytest.raises(WriteBehindFull):
+        queue.put(record("b"))
+    response = app.test_client().post('/api/conversation', json={"user_input": "Hello there"}, headers=auth(app))
+    assert response.status_code == 200
+    assert stored(app) == 1
+    assert queue.stats()["full"] == 2
+    stuck.set()
+    queue.close()
+
+def test_writes_are_synchronous_by_default(make_app, auth):
+    app = make_app()
+    assert 'write_behind' not in app.extensions
+    app.test_client().post('/api/conversation', json={"user_input": "Hello there"}, headers=auth(app))
+    assert stored(app) == 1
+
+if __name__ == "__main__":
+    # The tests use pytest fixtures for the journal
+    raise SystemExit(pytest.main([__file__, "-q"]))
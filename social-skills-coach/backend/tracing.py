@@ -0,0 +1,483 @@
+"""
+Request-scoped tracing for the API.
+
+Every request gets a trace ID, taken from an incoming W3C `traceparent`
+header or generated, and returned in the X-Trace-Id response header. Log
+records carry it as %(trace_id)s (the format set up in factory.py), so the
+lines of one request can be found together. A sampled request also records
+spans, each timed with perf_counter_ns:
+
+    GET /api/conversation            the request (root span)
+      cache.get / cache.put          conversation cache
+      llm.complete / llm.stream      the LLM provider
+        openai.chat                  one gateway call, with its attempts
+      db.query                       every SQLAlchemy statement (engine events)
+      stripe.*                       Stripe API calls
+
+Which requests are sampled is decided once per trace from the trace ID
+(TRACE_SAMPLE_RATE), so every service that sees the same ID agrees, and an
+incoming `traceparent` keeps its caller's decision. An unsampled request
+costs one ID and one context variable; its spans are a shared no-op object.
+
+Finished spans go to a bounded queue that a background thread exports in
+batches: as JSON lines to a file, or as OTLP/HTTP JSON to a collector
+(fake_otlp_collector.py in development). When the queue is full, spans are
+dropped and counted rather than slowing requests down.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+import urllib.request
+from collections import deque
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTERS = ('none', 'file', 'otlp')
+
+_current = contextvars.ContextVar('current_span', default=None)
+
+# Every log record gets the trace ID of the request that emitted it, or '-'
+_record_factory = logging.getLogRecordFactory()
+
+def _trace_record_factory(*args, **kwargs):
+    record = _record_factory(*args, **kwargs)
+    span = _current.get()
+    record.trace_id = span.trace_id if span is not None else '-'
+    return record
+
+logging.setLogRecordFactory(_trace_record_factory)
+
+def parse_traceparent(header):
+    """
+    Parse a W3C traceparent header.
+
+    Returns:
+        tuple: (trace_id, parent span_id, sampled), None if the header is missing or invalid
+    """
+    if not header:
+        return None
+    parts = header.strip().split('-')
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or parts[0] == 'ff':
+        return None
+    try:
+        trace_id, span_id, flags = int(parts[1], 16), int(parts[2], 16), int(parts[3][:2], 16)
+    except ValueError:
+        return None
+    if not trace_id or not span_id:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+class Span:
+    """
+    One timed operation of a trace.
+
+    Use it as a context manager (it is the current span inside the block) or
+    call end(). Spans of unsampled traces only carry the trace ID.
+    """
+
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'sampled', 'attributes',
+                 'start_ns', 'end_ns', '_start_perf', 'error', '_token')
+
+    def __init__(self, tracer, trace_id, span_id, parent_id, name, sampled, attributes=None):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.sampled = sampled
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self._start_perf = time.perf_counter_ns()
+        self.end_ns = None
+        self.error = None
+        self._token = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def activate(self):
+        """Make this the current span until end()."""
+        self._token = _current.set(self)
+        return self
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._start_perf)
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                _current.set(None)  # Ended in another context, e.g. a stream finished by the server
+            self._token = None
+        if self.sampled:
+            self.tracer._finish(self)
+
+    def __enter__(self):
+        return self if self._token is not None else self.activate()
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc is not None and not isinstance(exc, GeneratorExit):
+            self.record_error(exc)
+        self.end()
+
+    def to_otlp(self):
+        """Return the span in the OTLP JSON encoding."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 2 if "http.method" in self.attributes else 1,  # Server for requests, internal otherwise
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+class _NoopSpan:
+    """Stands in for the spans of unsampled traces."""
+
+    __slots__ = ()
+    sampled = False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class FileSpanExporter:
+    """Append spans to a file, one OTLP JSON span per line (with the service name)."""
+
+    name = 'file'
+
+    def __init__(self, path, service_name):
+        self.path = path
+        self.service_name = service_name
+
+    def export(self, spans):
+        lines = "".join(json.dumps({"service": self.service_name, **span.to_otlp()}) + "\n" for span in spans)
+        with open(self.path, 'a') as f:
+            f.write(lines)
+
+    def close(self):
+        pass
+
+class OTLPSpanExporter:
+    """
+    Send spans to an OpenTelemetry collector over OTLP/HTTP with the JSON encoding.
+
+    Args:
+        url: Collector base URL, e.g. http://127.0.0.1:4318 (spans go to /v1/traces)
+        service_name: service.name resource attribute
+        timeout: Seconds per request
+    """
+
+    name = 'otlp'
+
+    def __init__(self, url, service_name, timeout=2.0):
+        self.endpoint = url.rstrip('/') + '/v1/traces'
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def export(self, spans):
+        body = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}]
+        }]}).encode()
+        request = urllib.request.Request(self.endpoint, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def close(self):
+        pass
+
+class Tracer:
+    """
+    Start traces and spans, and export the sampled ones in batches.
+
+    Args:
+        exporter: FileSpanExporter, OTLPSpanExporter or None to record nothing
+        sample_rate: Fraction of traces recorded (0 to 1)
+        max_queue: Finished spans held for export; more are dropped
+        batch_size: Spans per export
+        export_interval: Seconds between exports
+    """
+
+    def __init__(self, exporter=None, sample_rate=0.01, max_queue=2048, batch_size=512, export_interval=1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate if exporter is not None else 0.0
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.export_interval = export_interval
+        self._threshold = int(self.sample_rate * (1 << 64))
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._pid = None
+        self._lock = Lock()
+        self._stats = {"traces": 0, "sampled": 0, "spans": 0, "exported": 0, "dropped": 0, "export_errors": 0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    @staticmethod
+    def _new_id(bits):
+        # The random module is reseeded in forked children, so workers do not repeat IDs
+        return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+    def should_sample(self, trace_id):
+        """Decide from the trace ID's low 64 bits, so the decision is the same wherever the ID goes."""
+        return int(trace_id[16:], 16) < self._threshold
+
+    def start_trace(self, name, traceparent=None, **attributes):
+        """
+        Start the root span of a request and make it current (end() it when the request ends).
+
+        Args:
+            name: Span name, e.g. "POST /api/conversation"
+            traceparent: Incoming W3C traceparent header, continued if valid
+        """
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+            sampled = sampled and self.exporter is not None
+        else:
+            trace_id, parent_id = self._new_id(128), None
+            sampled = self.should_sample(trace_id)
+        with self._lock:
+            self._stats["traces"] += 1
+            if sampled:
+                self._stats["sampled"] += 1
+        span = Span(self, trace_id, self._new_id(64), parent_id, name, sampled, attributes)
+        return span.activate()
+
+    def start_span(self, name, parent, **attributes):
+        """Start a child of parent (not made current)."""
+        return Span(self, parent.trace_id, self._new_id(64), parent.span_id, name, True, attributes)
+
+    def _finish(self, span):
+        with self._lock:
+            self._stats["spans"] += 1
+            if len(self._queue) >= self.max_queue:
+                self._stats["dropped"] += 1
+                return
+            self._queue.append(span)
+            full = len(self._queue) >= self.batch_size
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def _ensure_thread(self):
+        # Started on first use in each process: a thread started before a fork is not in the child
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None:
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.export_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Export the queued spans now."""
+        while True:
+            with self._lock:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            if not batch:
+                return
+            try:
+                self.exporter.export(batch)
+                self._count("exported", len(batch))
+            except Exception as e:
+                self._count("export_errors")
+                self._count("dropped", len(batch))
+                logger.warning(f"Could not export {len(batch)} spans: {str(e)}")
+
+    def close(self):
+        """Export what is queued and stop the export thread."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=2)
+        if self.exporter is not None:
+            self.flush()
+            self.exporter.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["queued"] = len(self._queue)
+        stats["exporter"] = self.exporter.name if self.exporter is not None else 'none'
+        stats["sample_rate"] = self.sample_rate
+        return stats
+
+def current_span():
+    """Return the current span (a Span, possibly unsampled), None outside a trace."""
+    return _current.get()
+
+def span(name, **attributes):
+    """
+    Return a child span of the current span, to use as a context manager.
+
+    Outside a sampled trace this is NOOP_SPAN, which records nothing.
+    """
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return NOOP_SPAN
+    return parent.tracer.start_span(name, parent, **attributes)
+
+def traced_generator(name, iterable, **attributes):
+    """
+    Yield from iterable inside a span that ends with the iteration (for streamed responses).
+
+    The span gets a "chunks" attribute with the number of items yielded,
+    and closing the generator closes iterable.
+    """
+    with span(name, **attributes) as active:
+        count = 0
+        try:
+            for item in iterable:
+                count += 1
+                yield item
+        finally:
+            active.set_attribute("chunks", count)
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+async def async_traced_generator(name, iterable, **attributes):
+    """Async counterpart of traced_generator, for an async iterable."""
+    with span(name, **attributes) as active:
+        count = 0
+        try:
+            async for item in iterable:
+                count += 1
+                yield item
+        finally:
+            active.set_attribute("chunks", count)
+            if hasattr(iterable, 'aclose'):
+                await iterable.aclose()
+
+def create_tracer(exporter='none', path=None, url=None, service_name='social-skills-coach', sample_rate=0.01,
+                  max_queue=2048, batch_size=512, export_interval=1.0):
+    """
+    Create a tracer with the given exporter.
+
+    Args:
+        exporter: 'none', 'file' or 'otlp'
+        path: File for the file exporter
+        url: Collector base URL for the otlp exporter
+    """
+    if exporter == 'none':
+        span_exporter = None
+    elif exporter == 'file':
+        span_exporter = FileSpanExporter(path, service_name)
+    elif exporter == 'otlp':
+        span_exporter = OTLPSpanExporter(url, service_name)
+    else:
+        raise ValueError(f"Unknown trace exporter '{exporter}'. Available exporters: {', '.join(TRACE_EXPORTERS)}")
+    return Tracer(span_exporter, sample_rate=sample_rate, max_queue=max_queue, batch_size=batch_size,
+                  export_interval=export_interval)
+
+def init_app(app, tracer):
+    """Start a trace for each of app's requests (kept in flask.g), and add X-Trace-Id to its responses."""
+    from flask import g, request
+
+    def start_request_trace():
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        g.trace_span = tracer.start_trace(f"{request.method} {rule}", request.headers.get('traceparent'),
+                                          **{"http.method": request.method, "http.route": rule})
+
+    def trace_response(response):
+        root = g.get('trace_span')
+        if root is not None:
+            response.headers['X-Trace-Id'] = root.trace_id
+            if root.sampled:
+                root.set_attribute("http.status_code", response.status_code)
+        return response
+
+    def end_request_trace(error=None):
+        # After a streamed response, once the stream has ended
+        root = g.pop('trace_span', None)
+        if root is not None:
+            if error is not None:
+                root.record_error(error)
+            root.end()
+
+    app.before_request(start_request_trace)
+    app.after_request(trace_response)
+    app.teardown_request(end_request_trace)
+
+def instrument_engines():
+    """Record every SQLAlchemy statement of a sampled trace as a db.query span."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return
+    context._trace_span = parent.tracer.start_span('db.query', parent, **{
+        "db.system": conn.dialect.name,
+        "db.statement": statement[:1000]
+    })
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    query_span = getattr(context, '_trace_span', None)
+    if query_span is not None:
+        query_span.set_attribute("db.rows", cursor.rowcount)
+        query_span.end()
+        context._trace_span = None
+
+def _handle_error(exception_context):
+    query_span = getattr(exception_context.execution_context, '_trace_span', None)
+    if query_span is not None:
+        query_span.record_error(exception_context.original_exception)
+        query_span.end()
+        exception_context.execution_context._trace_span = None
@@ -0,0 +1,255 @@
+"""
+Write-behind queue for records that do not need to be stored before the
+response is sent.
+
+Requests append records to a journal: a local SQLite database in WAL mode,
+so an append is a local commit of well under a millisecond instead of a
+round trip and commit on the main database. A background flusher in each
+worker claims batches of records from the journal and hands them to a flush
+function that stores them in one transaction; they are deleted from the
+journal only after that transaction commits.
+
+- Backpressure: the journal holds at most max_pending records. put() waits
+  up to put_timeout for the flusher to make room, then raises
+  WriteBehindFull so the caller can write synchronously instead.
+- Crash recovery: records survive a crash of the process (and, with
+  synchronous=FULL, of the machine). Records left in the journal, including
+  claimed ones whose claim has expired because their worker died, are
+  flushed when a worker starts (see start()).
+- Several workers can share one journal: claims are made in a write
+  transaction, so each record is flushed by one worker at a time.
+
+Delivery is at least once: if a worker dies after its flush committed and
+before the journal was updated, the batch is flushed again, so the flush
+function must skip records it has already stored.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from threading import Event, Lock, Thread, local
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindFull(Exception):
+    """Raised by put() when the journal stays full for put_timeout seconds."""
+
+class WriteBehindQueue:
+    """
+    Durable local queue with a batching background flusher.
+
+    Args:
+        path: Journal file (SQLite, WAL mode)
+        flush: Function that stores a list of records (dicts) in one
+            transaction and raises if it fails
+        max_pending: Records the journal may hold before put() waits
+        batch_size: Records per flush
+        flush_interval: Seconds between flushes while records trickle in
+        put_timeout: Seconds put() waits for room in a full journal
+        claim_timeout: Seconds a claimed batch stays claimed; a batch whose
+            worker died is flushed again after this
+        durable: fsync every append (synchronous=FULL) rather than relying on
+            the WAL surviving a process crash (synchronous=NORMAL)
+    """
+
+    def __init__(self, path, flush, max_pending=10000, batch_size=500, flush_interval=0.2,
+                 put_timeout=0.5, claim_timeout=60.0, durable=False):
+        self.path = path
+        self.flush = flush
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.claim_timeout = claim_timeout
+        self.durable = durable
+        self._local = local()
+        self._lock = Lock()
+        self._wake = Event()
+        self._space = Event()
+        self._stopping = Event()
+        self._thread = None
+        self._pid = None
+        self._stats = {"enqueued": 0, "flushed": 0, "batches": 0, "flush_errors": 0, "full": 0, "replayed": 0}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, record TEXT NOT NULL, "
+            "enqueued_at REAL NOT NULL, claimed_by TEXT, claimed_until REAL)"
+        )
+
+    def _connection(self):
+        """Return this thread's journal connection (SQLite connections are per thread)."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA synchronous={'FULL' if self.durable else 'NORMAL'}")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def pending(self):
+        """Return the number of records in the journal, claimed or not."""
+        return self._connection().execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def put(self, record):
+        """
+        Append a record (JSON serializable) to the journal.
+
+        Raises:
+            WriteBehindFull: The journal stayed full for put_timeout seconds
+        """
+        self.start()
+        data = json.dumps(record)
+        deadline = time.monotonic() + self.put_timeout
+        connection = self._connection()
+        while True:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                if connection.execute("SELECT COUNT(*) FROM pending").fetchone()[0] < self.max_pending:
+                    connection.execute("INSERT INTO pending (record, enqueued_at) VALUES (?, ?)", (data, time.time()))
+                    connection.execute("COMMIT")
+                    break
+                connection.execute("ROLLBACK")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            # Full: flush now and wait for room
+            self._wake.set()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count("full")
+                raise WriteBehindFull(f"Write-behind journal has {self.max_pending} pending records")
+            self._space.clear()
+            self._space.wait(min(remaining, self.flush_interval))
+
+        self._count("enqueued")
+        self._wake.set()
+
+    def _claim(self, token):
+        """Claim up to batch_size unclaimed (or expired) records, oldest first."""
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute(
+                "SELECT id, record, claimed_by FROM pending WHERE claimed_until IS NULL OR claimed_until < ? "
+                "ORDER BY id LIMIT ?", (now, self.batch_size)
+            ).fetchall()
+            if rows:
+                connection.executemany(
+                    "UPDATE pending SET claimed_by = ?, claimed_until = ? WHERE id = ?",
+                    [(token, now + self.claim_timeout, row[0]) for row in rows]
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        replayed = sum(1 for row in rows if row[2] is not None)
+        if replayed:
+            logger.warning(f"Replaying {replayed} write-behind records claimed by a worker that did not finish")
+            self._count("replayed", replayed)
+        return [row[0] for row in rows], [json.loads(row[1]) for row in rows]
+
+    def _finish(self, ids, token, flushed):
+        """Delete a flushed batch from the journal, or release it for another attempt."""
+        connection = self._connection()
+        placeholders = ",".join("?" * len(ids))
+        if flushed:
+            connection.execute(f"DELETE FROM pending WHERE claimed_by = ? AND id IN ({placeholders})", (token, *ids))
+        else:
+            connection.execute(
+                f"UPDATE pending SET claimed_by = NULL, claimed_until = NULL WHERE claimed_by = ? AND id IN ({placeholders})",
+                (token, *ids)
+            )
+
+    def flush_once(self):
+        """
+        Flush one batch from the journal.
+
+        Returns:
+            int: Records flushed (0 if the journal had none to claim)
+
+        Raises:
+            Exception: The flush function's error; the batch stays in the journal
+        """
+        token = uuid.uuid4().hex
+        ids, records = self._claim(token)
+        if not ids:
+            return 0
+        try:
+            self.flush(records)
+        except Exception:
+            self._finish(ids, token, flushed=False)
+            self._count("flush_errors")
+            raise
+        self._finish(ids, token, flushed=True)
+        self._count("flushed", len(ids))
+        self._count("batches")
+        self._space.set()
+        return len(ids)
+
+    def _run(self):
+        backoff = self.flush_interval
+        while not self._stopping.is_set():
+            try:
+                flushed = self.flush_once()
+                backoff = self.flush_interval
+            except Exception as e:
+                logger.error(f"Write-behind flush failed, retrying in {backoff:.1f}s: {str(e)}")
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            if flushed < self.batch_size:
+                # Let records accumulate into the next batch
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+
+    def start(self):
+        """Start the flusher in this process (once per process; also flushes what a previous run left)."""
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = Thread(target=self._run, name='write-behind-flusher', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+        logger.info(f"Write-behind flusher started ({self.path})")
+
+    def close(self, timeout=5.0):
+        """
+        Flush what can be flushed within timeout, then stop the flusher.
+
+        Records that are not flushed stay in the journal for the next start.
+        """
+        deadline = time.monotonic() + timeout
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(max(0.0, deadline - time.monotonic()))
+        self._thread = None
+        while time.monotonic() < deadline:
+            try:
+                if not self.flush_once():
+                    break
+            except Exception as e:
+                logger.error(f"Write-behind flush failed during shutdown: {str(e)}")
+                break
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["pending"] = self.pending()
+        return stats